@@ -0,0 +1,139 @@
+"""Benchmark Gorilla-style chunk compression on synthetic fleet history.
+
+Simulates ``--hosts`` hosts for ``--ticks`` scrape intervals with
+`fleet_simulator.FleetSimulator` (cpu and memory, so ``2 * hosts`` series),
+optionally with per-sample scrape jitter, and writes the history to a chunk
+file with `series_chunks.ChunkWriter`. Values are stored twice: rounded to
+``--decimals`` (as in the JSON snapshots) and at full float64 precision.
+
+Reported per variant:
+- bytes per sample and compression ratio against the per-tick JSON snapshots
+  (`FleetSimulator.snapshot`, the shape `fetch_metrics` writes) and against
+  the 20-byte raw records of `metric_store.MetricStore`
+- encode samples/sec (whole file), decode samples/sec for full-series
+  `ChunkReader.query` and for streaming `ChunkReader.iter_samples`
+- seek latency: mean time of a ``--window``-second query at a random offset
+
+Usage:
+    python benchmarks/bench_chunks.py --hosts 200 --ticks 2880
+    python benchmarks/bench_chunks.py --hosts 200 --ticks 2880 --jitter-ms 50 --chunk-samples 240
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from fleet_simulator import COLUMNS, FleetSimulator  # noqa: E402
+from metric_store import RECORD_DTYPE, series_key  # noqa: E402
+from series_chunks import ChunkReader, ChunkWriter  # noqa: E402
+
+
+def _history(args: argparse.Namespace) -> Dict[str, Any]:
+    sim = FleetSimulator(hosts=args.hosts, interval=args.interval, seed=args.seed, start=1.7e9)
+    json_bytes = 0
+    stamps, values = [], []
+    for _ in range(args.ticks):
+        frame = sim.step()
+        json_bytes += len(json.dumps(sim.snapshot(frame), separators=(",", ":")))
+        stamps.append(frame.timestamp)
+        values.append(frame.values)
+    rng = np.random.default_rng(args.seed)
+    ts = np.array(stamps)[:, None] + rng.uniform(-args.jitter_ms, args.jitter_ms, (args.ticks, args.hosts)) / 1e3
+    return {"hosts": sim.hosts, "ts": ts, "values": np.stack(values), "json_bytes": json_bytes}
+
+
+def _run_variant(history: Dict[str, Any], values: np.ndarray, args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    hosts, ts = history["hosts"], history["ts"]
+    keys = [series_key(metric, {"host": host}) for host in hosts for metric in COLUMNS]
+    columns = [(ts[:, h], values[:, h, m]) for h in range(len(hosts)) for m in range(len(COLUMNS))]
+    n = len(keys) * args.ticks
+    path = workdir / "history.gch"
+
+    started = time.perf_counter()
+    with ChunkWriter(path, args.chunk_samples) as writer:
+        for key, (series_ts, series_values) in zip(keys, columns):
+            writer.add(key, series_ts, series_values)
+    encode_seconds = time.perf_counter() - started
+
+    with ChunkReader(path) as reader:
+        size = reader.nbytes
+        started = time.perf_counter()
+        for key in keys:
+            reader.query(key)
+        decode_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for key in keys:
+            for _ in reader.iter_samples(key):
+                pass
+        stream_seconds = time.perf_counter() - started
+
+        rng = np.random.default_rng(args.seed)
+        first, last = float(ts.min()), float(ts.max())
+        seeks: List[float] = []
+        for key in rng.choice(keys, size=min(args.seeks, len(keys))):
+            lo = rng.uniform(first, max(first, last - args.window))
+            started = time.perf_counter()
+            reader.query(str(key), lo, lo + args.window)
+            seeks.append(time.perf_counter() - started)
+
+    raw_bytes = n * RECORD_DTYPE.itemsize
+    return {
+        "bytes": size,
+        "bytes_per_sample": round(size / n, 3),
+        "ratio_vs_json": round(history["json_bytes"] / size, 2),
+        "ratio_vs_store_records": round(raw_bytes / size, 2),
+        "encode_samples_per_sec": round(n / encode_seconds),
+        "decode_samples_per_sec": round(n / decode_seconds),
+        "stream_samples_per_sec": round(n / stream_seconds),
+        "seek_mean_us": round(statistics.mean(seeks) * 1e6, 1),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    history = _history(args)
+    n = history["values"].size
+    with tempfile.TemporaryDirectory(prefix="bench-chunks-") as tmp:
+        variants = {
+            f"decimals_{args.decimals}": _run_variant(history, np.round(history["values"], args.decimals), args, Path(tmp)),
+            "full_precision": _run_variant(history, history["values"], args, Path(tmp)),
+        }
+    return {
+        "hosts": args.hosts,
+        "ticks": args.ticks,
+        "samples": n,
+        "chunk_samples": args.chunk_samples,
+        "jitter_ms": args.jitter_ms,
+        "json_bytes_per_sample": round(history["json_bytes"] / n, 2),
+        "store_bytes_per_sample": RECORD_DTYPE.itemsize,
+        "variants": variants,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark Gorilla chunk compression on fleet history")
+    parser.add_argument("--hosts", type=int, default=100)
+    parser.add_argument("--ticks", type=int, default=1440, help="scrape intervals per series")
+    parser.add_argument("--interval", type=float, default=15.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="uniform +/- scrape time jitter")
+    parser.add_argument("--decimals", type=int, default=3)
+    parser.add_argument("--chunk-samples", type=int, default=120)
+    parser.add_argument("--window", type=float, default=300.0, help="seek query window in seconds")
+    parser.add_argument("--seeks", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Load-test the dashboard's HTTP endpoints.
+
+For each path in ``--paths`` (default ``/``, ``/metrics`` and ``/health``) it
+runs ``--concurrency`` client threads for ``--duration`` seconds, each on its
+own keep-alive connection, and reports requests/sec, p50/p99 latency and the
+error count.
+
+The target is ``--url`` when given; otherwise ``--server`` starts one on a
+free local port and stops it afterwards:
+- ``dev``: Flask's development server (`python src/dashboard.py`), the old
+  Docker default
+- ``gunicorn``: `gunicorn -c config/gunicorn.conf.py wsgi:application`,
+  with ``--workers`` and ``--worker-class`` passed through the environment
+
+``--streams`` holds that many `/stream` (SSE) connections open for the whole
+run, the way dashboards left open in browser tabs do. Under the default
+gthread worker every stream client occupies one of ``--threads`` request
+threads until it disconnects, so `config/gunicorn.conf.py` caps stream
+clients per worker at ``threads - 2`` and answers the rest with 503; the
+``streams`` entry reports how many were accepted. Raising ``--streams``
+past ``workers x (threads - 2)`` shows the cap instead of starved
+requests; with ``--worker-class gevent`` a stream costs a greenlet and the
+cap follows ``DASHBOARD_WORKER_CONNECTIONS``.
+
+The client runs in one process, so at high rates it shares a CPU budget with
+the server when both are on the same machine; compare servers at the same
+``--concurrency`` on the same host.
+
+Usage:
+    python benchmarks/bench_dashboard_load.py --server dev --duration 10
+    python benchmarks/bench_dashboard_load.py --server gunicorn --workers 4 --duration 10
+    python benchmarks/bench_dashboard_load.py --server gunicorn --workers 2 --threads 8 --streams 16
+    python benchmarks/bench_dashboard_load.py --url http://10.0.0.5:5000 --concurrency 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+from urllib.parse import urlsplit
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(host: str, port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on {host}:{port} did not become ready in {timeout:.0f}s")
+
+
+@contextmanager
+def serve(server: str, workers: int, worker_class: str, threads: int) -> Iterator[str]:
+    """Run a dashboard server in a subprocess and yield its base URL."""
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=str(ROOT / "src"))
+    if server == "dev":
+        code = f"import dashboard; dashboard.app.run(host='127.0.0.1', port={port}, debug=False)"
+        cmd = [sys.executable, "-c", code]
+    else:
+        env.update(
+            DASHBOARD_BIND=f"127.0.0.1:{port}",
+            DASHBOARD_WORKERS=str(workers),
+            DASHBOARD_WORKER_CLASS=worker_class,
+            DASHBOARD_THREADS=str(threads),
+        )
+        cmd = [sys.executable, "-m", "gunicorn", "-c", str(ROOT / "config" / "gunicorn.conf.py"), "wsgi:application"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready("127.0.0.1", port)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+@contextmanager
+def hold_streams(url: str, count: int) -> Iterator[Dict[str, int]]:
+    """Keep ``count`` `/stream` connections open; yield accepted/rejected counts."""
+    parts = urlsplit(url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    conns: List[http.client.HTTPConnection] = []
+    counts = {"accepted": 0, "rejected": 0}
+    try:
+        for _ in range(count):
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            conn.request("GET", "/stream")
+            resp = conn.getresponse()
+            if resp.status == 200:
+                resp.read1(64)  # the retry preamble; the response stays open
+                counts["accepted"] += 1
+                conns.append(conn)
+            else:
+                resp.read()
+                counts["rejected"] += 1
+                conn.close()
+        yield counts
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+def _client(host: str, port: int, path: str, deadline: float, latencies: List[float], errors: List[int]) -> None:
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    while True:
+        started = time.perf_counter()
+        if started >= deadline:
+            break
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            if resp.status >= 400:
+                errors[0] += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            errors[0] += 1
+            conn.close()  # reconnects on the next request
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def load(url: str, path: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    """Drive ``path`` with ``concurrency`` keep-alive clients for ``duration`` seconds."""
+    parts = urlsplit(url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    per_thread: List[List[float]] = [[] for _ in range(concurrency)]
+    per_errors = [[0] for _ in range(concurrency)]
+    started = time.perf_counter()
+    deadline = started + duration
+    threads = [
+        threading.Thread(target=_client, args=(host, port, path, deadline, per_thread[i], per_errors[i]))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies = np.fromiter((x for chunk in per_thread for x in chunk), dtype=np.float64)
+    result: Dict[str, Any] = {
+        "requests": int(latencies.size),
+        "errors": sum(e[0] for e in per_errors),
+        "requests_per_sec": round(latencies.size / elapsed, 1),
+    }
+    if latencies.size:
+        p50, p99 = np.percentile(latencies, [50, 99])
+        result.update(p50_ms=round(p50 * 1e3, 3), p99_ms=round(p99 * 1e3, 3))
+    return result
+
+
+def run(
+    url: str, paths: List[str], concurrency: int, duration: float, warmup: float, streams: int = 0
+) -> Dict[str, Any]:
+    results: Dict[str, Any] = {"url": url, "concurrency": concurrency, "duration": duration, "paths": {}}
+    with hold_streams(url, streams) as held:
+        for path in paths:
+            if warmup > 0:
+                load(url, path, concurrency, warmup)
+            results["paths"][path] = load(url, path, concurrency, duration)
+    if streams:
+        results["streams"] = held
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the dashboard endpoints")
+    parser.add_argument("--url", help="Base URL of a running dashboard; omit to start --server locally")
+    parser.add_argument("--server", choices=["dev", "gunicorn"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--worker-class", default="gthread")
+    parser.add_argument("--threads", type=int, default=8, help="request threads per gthread worker")
+    parser.add_argument("--streams", type=int, default=0, help="/stream connections held open during the run")
+    parser.add_argument("--paths", nargs="+", default=["/", "/metrics", "/health"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    args = parser.parse_args()
+    if args.url:
+        results = run(args.url, args.paths, args.concurrency, args.duration, args.warmup, args.streams)
+    else:
+        with serve(args.server, args.workers, args.worker_class, args.threads) as url:
+            results = run(url, args.paths, args.concurrency, args.duration, args.warmup, args.streams)
+        results["server"] = args.server
+        if args.server == "gunicorn":
+            results.update(workers=args.workers, worker_class=args.worker_class, threads=args.threads)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
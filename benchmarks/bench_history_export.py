@@ -0,0 +1,113 @@
+"""Benchmark Parquet export and backfill of fleet metric history.
+
+Simulates ``--hosts`` hosts (`fleet_simulator.FleetSimulator`, cpu and
+memory every ``--interval`` seconds) for ``--hours`` hours - a day of a 10k
+host fleet by default - and streams every scrape through
+`history_export.HistoryExporter.write_frame` into a local directory.
+Simulation time is excluded from the write figures.
+
+Then reads the export back:
+- full scan with `history_export.iter_batches`
+- `history_export.load_training_matrix` (cpu/memory pivot for ml_detection)
+- `history_export.backfill_store` of the first ``--backfill-hours`` into a
+  fresh `metric_store.MetricStore`
+
+Reports rows/sec for each step, the export size in bytes per row, file count
+and the process peak RSS after each step. Export and scan are bounded by the
+exporter's buffers and one record batch; the training matrix step also holds
+its result (16 bytes per host and timestamp).
+
+Usage:
+    python benchmarks/bench_history_export.py                       # 10k hosts, 24 h
+    python benchmarks/bench_history_export.py --hosts 2000 --hours 2 --backfill-hours 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from fleet_simulator import COLUMNS, FleetSimulator  # noqa: E402
+from history_export import HistoryExporter, backfill_store, iter_batches, load_training_matrix  # noqa: E402
+from metric_store import MetricStore  # noqa: E402
+from samples import SampleFrame  # noqa: E402
+
+
+def _rate(rows: int, seconds: float) -> Dict[str, float]:
+    return {
+        "rows": rows,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": round(rows / seconds) if seconds else 0.0,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    start = 1.7e9 - 1.7e9 % 86400
+    sim = FleetSimulator(hosts=args.hosts, interval=args.interval, seed=args.seed, start=start)
+    ticks = int(args.hours * 3600 / args.interval)
+    with tempfile.TemporaryDirectory(prefix="bench-export-") as tmp:
+        root = Path(tmp) / "export"
+        exporter = HistoryExporter(root, host_groups=args.host_groups, compression=args.compression)
+        write_seconds = 0.0
+        for _ in range(ticks):
+            step = sim.step()
+            frame = SampleFrame(sim.hosts, COLUMNS, step.values, step.timestamp)
+            started = time.perf_counter()
+            exporter.write_frame(frame)
+            write_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        stats = exporter.close()
+        write_seconds += time.perf_counter() - started
+        write = _rate(stats.rows, write_seconds)
+
+        started = time.perf_counter()
+        scanned = sum(batch.num_rows for batch in iter_batches(root=root))
+        scan = _rate(scanned, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        matrix = load_training_matrix(root=root)
+        training = {**_rate(scanned, time.perf_counter() - started), "samples": int(matrix.shape[0])}
+        del matrix
+
+        started = time.perf_counter()
+        with MetricStore(Path(tmp) / "store") as store:
+            backfilled = backfill_store(store, root=root, end=start + args.backfill_hours * 3600)
+        backfill = {**_rate(backfilled["rows"], time.perf_counter() - started), "series": backfilled["series"]}
+
+    return {
+        "hosts": args.hosts,
+        "hours": args.hours,
+        "rows": stats.rows,
+        "files": len(stats.files),
+        "bytes": stats.bytes,
+        "bytes_per_row": round(stats.bytes / stats.rows, 3),
+        "write": write,
+        "scan": scan,
+        "training_matrix": training,
+        "backfill": backfill,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark Parquet export/backfill of fleet history")
+    parser.add_argument("--hosts", type=int, default=10_000)
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--interval", type=float, default=15.0)
+    parser.add_argument("--host-groups", type=int, default=16)
+    parser.add_argument("--compression", default="zstd")
+    parser.add_argument("--backfill-hours", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""Benchmark suite for the ingest -> detect -> remediate hot path.
+
+Micro-benchmarks cover each pipeline function on a synthetic fleet of
+``--hosts`` hosts x ``--metrics`` metrics:
+- ingest: `fetch_metrics` (synthetic snapshot, with a `MetricStore`, and a live
+  fleet scrape parsed from in-memory node_exporter payloads)
+- monitor: `get_latest_metrics` on a fleet snapshot file
+- detect: `detect_anomaly` per host and `detect_anomalies_batch` over the fleet
+- dashboard: `/`, `/health` and `/metrics` through the Flask test client
+and end-to-end `run_pipeline` throughput: a quiet cycle, an anomalous cycle
+(remediation plus S3 logging to an in-memory fake client) and a live fleet
+cycle with store and streaming detector. Everything runs offline.
+
+Each benchmark is timed over ``--repeats`` rounds of at least ``--min-time``
+seconds; the median round is reported as ``seconds_per_op`` (``best`` is the
+fastest round). Fleet-sized operations also report ``items_per_sec``.
+
+Results are printed as JSON with sorted keys. ``--save`` writes them to a
+file to serve as a baseline; ``--baseline`` compares against one and marks
+every benchmark whose median is more than ``--threshold`` slower, exiting
+with status 1 if any regressed. Baselines are machine specific: record and
+compare on the same host.
+
+Usage:
+    python benchmarks/bench_hot_path.py --hosts 1000 --save baseline.json
+    python benchmarks/bench_hot_path.py --hosts 1000 --baseline baseline.json --threshold 0.15
+    python benchmarks/bench_hot_path.py --only detect run_pipeline
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import main as pipeline  # noqa: E402
+import scraper as scraper_module  # noqa: E402
+from anomaly_detection import detect_anomalies_batch, detect_anomaly  # noqa: E402
+from data_ingestion import fetch_metrics  # noqa: E402
+from metric_store import MetricStore  # noqa: E402
+from monitor import get_latest_metrics  # noqa: E402
+from scraper import SUMMARY_FAMILIES, ScrapeResult, Scraper, _target_labels  # noqa: E402
+from streaming_detection import StreamingDetector  # noqa: E402
+
+
+# --------------------------------------------------------------------------- fleet
+
+def synthetic_fleet(hosts: int, metrics: int, cycles: int, seed: int = 0) -> Tuple[np.ndarray, Tuple[str, ...]]:
+    """Return ``(values, columns)`` with ``values`` of shape ``(cycles, hosts, metrics)``.
+
+    Columns are ``cpu``, ``memory`` and then ``metric_2`` ... Values are
+    percentages drifting around a per-host baseline, with about 1% of cells
+    above the default 90% threshold.
+    """
+    rng = np.random.default_rng(seed)
+    columns = ("cpu", "memory", *(f"metric_{i}" for i in range(2, metrics)))[:metrics]
+    base = rng.uniform(10, 70, size=(hosts, metrics))
+    values = base + rng.normal(0, 3, size=(cycles, hosts, metrics))
+    spikes = rng.random(values.shape) < 0.01
+    values[spikes] = rng.uniform(91, 100, size=int(spikes.sum()))
+    return np.clip(values, 0, 100), columns
+
+
+def node_payload(cpus: int, cpu_seconds: float, idle_fraction: float, mem_used_fraction: float) -> str:
+    """Render a minimal node_exporter payload with cpu counters and meminfo."""
+    lines = ["# HELP node_cpu_seconds_total Seconds the CPUs spent in each mode.",
+             "# TYPE node_cpu_seconds_total counter"]
+    per_cpu = cpu_seconds / cpus
+    for c in range(cpus):
+        lines.append(f'node_cpu_seconds_total{{cpu="{c}",mode="idle"}} {per_cpu * idle_fraction:.2f}')
+        lines.append(f'node_cpu_seconds_total{{cpu="{c}",mode="user"}} {per_cpu * (1 - idle_fraction):.2f}')
+    total = 16 * 2**30
+    lines += [
+        "# TYPE node_memory_MemTotal_bytes gauge",
+        f"node_memory_MemTotal_bytes {total:.6e}",
+        "# TYPE node_memory_MemAvailable_bytes gauge",
+        f"node_memory_MemAvailable_bytes {total * (1 - mem_used_fraction):.6e}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+class OfflineScraper(Scraper):
+    """`Scraper` serving pre-rendered payloads from memory instead of HTTP.
+
+    Parsing, CPU-rate bookkeeping and summarizing run exactly as in live mode;
+    only the network is removed. Configured targets are ignored in favour of
+    the fleet's own instances.
+    """
+
+    def __init__(self, payloads: Dict[str, str]) -> None:
+        super().__init__(max_workers=1, families=SUMMARY_FAMILIES)
+        self.payloads = payloads
+
+    def _scrape_one(self, job: str, instance: str) -> ScrapeResult:
+        """Parse the in-memory payload of ``instance`` as a scrape would."""
+        started = time.perf_counter()
+        samples = list(self._parser.parse(self.payloads[instance].split("\n"), _target_labels(instance, job)))
+        return ScrapeResult(job, instance, True, samples, None, time.perf_counter() - started)
+
+    def scrape(self, targets: Iterable[Tuple[str, str]]) -> List[ScrapeResult]:
+        """Scrape every fleet instance in turn; ``targets`` is ignored."""
+        return [self._scrape_one("node", instance) for instance in self.payloads]
+
+
+def fleet_payloads(values: np.ndarray, cycle: int = 0, cpus: int = 4, interval: float = 15.0) -> Dict[str, str]:
+    """One node_exporter payload per host from a ``(hosts, >=2)`` cpu/memory matrix.
+
+    CPU counters advance by ``interval`` seconds per CPU each ``cycle``.
+    """
+    return {
+        f"10.0.{i // 250}.{i % 250}:9100": node_payload(
+            cpus, 1e6 + (cycle * interval + i) * cpus, 1 - row[0] / 100, row[1] / 100
+        )
+        for i, row in enumerate(values)
+    }
+
+
+class _FakeS3Client:
+    """S3 client stand-in that only counts uploads."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:  # noqa: N803
+        """Count the upload and discard it."""
+        self.calls += 1
+
+
+@contextmanager
+def _default_scraper(scraper: Scraper) -> Iterator[None]:
+    """Make ``scraper`` the process-wide scraper used by `run_pipeline(live=True)`."""
+    previous = scraper_module._DEFAULT_SCRAPER
+    scraper_module._DEFAULT_SCRAPER = scraper
+    try:
+        yield
+    finally:
+        scraper_module._DEFAULT_SCRAPER = previous
+
+
+@contextmanager
+def _always_anomalous() -> Iterator[None]:
+    """Make `run_pipeline` see every snapshot as anomalous, so remediation and S3 logging run."""
+    previous = pipeline.detect_anomaly
+    pipeline.detect_anomaly = lambda metrics: True
+    try:
+        yield
+    finally:
+        pipeline.detect_anomaly = previous
+
+
+# --------------------------------------------------------------------------- timing
+
+def measure(fn: Callable[[], Any], min_time: float, repeats: int) -> Dict[str, float]:
+    """Time ``fn`` in ``repeats`` rounds of at least ``min_time`` seconds each."""
+    fn()  # warmup: imports, caches, first-touch allocation
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 4 or number >= 1 << 20:
+            break
+        number *= 4 if elapsed < min_time / 40 else 2
+    number = max(1, int(number * (min_time / max(elapsed, 1e-9))))
+    rounds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number)
+    median = statistics.median(rounds)
+    return {
+        "seconds_per_op": median,
+        "best": min(rounds),
+        "ops_per_sec": 1.0 / median,
+        "iterations": number,
+    }
+
+
+def run(
+    hosts: int,
+    metrics: int,
+    cycles: int,
+    min_time: float,
+    repeats: int,
+    only: Sequence[str] | None = None,
+) -> Dict[str, Any]:
+    """Run the selected benchmarks on a synthetic fleet; return ``{"meta", "results"}``.
+
+    ``only`` keeps benchmarks whose name contains any of its tokens.
+    """
+    cycles = max(cycles, 1)
+    values, columns = synthetic_fleet(hosts, max(metrics, 2), cycles)
+    workdir = Path(tempfile.mkdtemp(prefix="bench-hot-path-"))
+    snapshot_path = workdir / "fleet.json"
+    fleet_rows = values[0]
+    snapshot = {
+        "hosts": {f"host-{i}": dict(zip(columns, map(float, row))) for i, row in enumerate(fleet_rows)},
+        "cpu": float(fleet_rows[:, 0].max()),
+        "memory": float(fleet_rows[:, 1].max()),
+    }
+    snapshot_path.write_text(json.dumps(snapshot), encoding="utf-8")
+    host_dicts = list(snapshot["hosts"].values())
+    frames = [fleet_payloads(values[t], t) for t in range(cycles)]
+    offline = OfflineScraper(frames[0])
+    ticks = iter(range(1 << 62))
+
+    def next_frame() -> None:
+        """Advance the offline scraper to the next cycle's payloads."""
+        offline.payloads = frames[next(ticks) % cycles]
+
+    benches: List[Tuple[str, int, Callable[[], Any]]] = []
+
+    def bench(name: str, items: int = 1) -> Callable[[Callable[[], Any]], Callable[[], Any]]:
+        """Decorator registering a benchmark of ``items`` items per call under ``name``."""
+
+        def register(fn: Callable[[], Any]) -> Callable[[], Any]:
+            """Add ``fn`` to the benchmark list and return it unchanged."""
+            benches.append((name, items, fn))
+            return fn
+        return register
+
+    store = MetricStore(workdir / "store")
+    live_store = MetricStore(workdir / "live-store")
+
+    bench("ingest.fetch_metrics")(lambda: fetch_metrics(workdir / "metrics.json"))
+    bench("ingest.fetch_metrics_store")(lambda: fetch_metrics(workdir / "metrics.json", store=store))
+
+    def fetch_live() -> None:
+        """Ingest the next fleet scrape into the live store."""
+        next_frame()
+        fetch_metrics(workdir / "live.json", live=True, store=live_store, scraper=offline)
+
+    bench("ingest.fetch_metrics_live_fleet", hosts)(fetch_live)
+    bench("monitor.get_latest_metrics_fleet", hosts)(lambda: get_latest_metrics(snapshot_path))
+
+    def detect_per_host() -> None:
+        """Run the scalar detector once per host."""
+        for row in host_dicts:
+            detect_anomaly(row)
+
+    bench("detect.detect_anomaly_per_host", hosts)(detect_per_host)
+    bench("detect.detect_anomalies_batch", hosts)(lambda: detect_anomalies_batch(fleet_rows, columns))
+
+    import dashboard
+
+    dashboard._index_view.path = snapshot_path
+    client = dashboard.app.test_client()
+    for path in ("/", "/health", "/metrics"):
+        bench(f"dashboard.GET {path}")(lambda path=path: client.get(path).close())
+
+    fake = _FakeS3Client()
+    bench("run_pipeline.quiet")(lambda: pipeline.run_pipeline(workdir / "e2e.json"))
+
+    def anomalous() -> None:
+        """One pipeline cycle that remediates and logs to the fake S3 client."""
+        with _always_anomalous():
+            pipeline.run_pipeline(workdir / "e2e.json", s3_client=fake, bucket_name="bench")
+
+    bench("run_pipeline.anomalous_s3")(anomalous)
+
+    detector = StreamingDetector(max_series=hosts * 4 + 64)
+    fleet_store = MetricStore(workdir / "e2e-store")
+
+    def live_cycle() -> None:
+        """One live pipeline cycle over the next fleet scrape, with store and streaming detector."""
+        next_frame()
+        with _default_scraper(offline):
+            pipeline.run_pipeline(workdir / "e2e-live.json", live=True, store=fleet_store, detector=detector)
+
+    bench("run_pipeline.live_fleet", hosts)(live_cycle)
+
+    results: Dict[str, Any] = {}
+    try:
+        for name, items, fn in benches:
+            if only and not any(token in name for token in only):
+                continue
+            stats = measure(fn, min_time, repeats)
+            if items > 1:
+                stats["items_per_sec"] = items / stats["seconds_per_op"]
+            results[name] = {k: (round(v, 9) if isinstance(v, float) else v) for k, v in stats.items()}
+    finally:
+        offline.close()
+        for s in (store, live_store, fleet_store):
+            s.close()
+    return {
+        "meta": {
+            "hosts": hosts,
+            "metrics": len(columns),
+            "cycles": cycles,
+            "min_time": min_time,
+            "repeats": repeats,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+# --------------------------------------------------------------------------- baseline
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> Dict[str, Any]:
+    """Compare median times per benchmark; ``change`` is the relative slowdown."""
+    out: Dict[str, Any] = {}
+    base_results = baseline.get("results", {})
+    for name, stats in current["results"].items():
+        if name not in base_results:
+            continue
+        before = base_results[name]["seconds_per_op"]
+        after = stats["seconds_per_op"]
+        change = after / before - 1.0 if before > 0 else 0.0
+        out[name] = {
+            "baseline": before,
+            "current": after,
+            "change": round(change, 4),
+            "regression": change > threshold,
+        }
+    return out
+
+
+def main() -> None:
+    """Command-line entry point: run, optionally save, compare with a baseline and print."""
+    parser = argparse.ArgumentParser(description="Benchmark the ingest -> detect -> remediate hot path")
+    parser.add_argument("--hosts", type=int, default=1000)
+    parser.add_argument("--metrics", type=int, default=2, help="metrics per host (first two are cpu, memory)")
+    parser.add_argument("--cycles", type=int, default=4, help="fleet duration in scrape cycles")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per timing round")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--only", nargs="+", help="run benchmarks whose name contains any of these")
+    parser.add_argument("--save", type=Path, help="write results here (e.g. as the new baseline)")
+    parser.add_argument("--baseline", type=Path, help="compare against a saved result file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    results = run(args.hosts, args.metrics, args.cycles, args.min_time, args.repeats, args.only)
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    regressed = False
+    if args.baseline:
+        comparison = compare(results, json.loads(args.baseline.read_text(encoding="utf-8")), args.threshold)
+        results["comparison"] = {"threshold": args.threshold, "benchmarks": comparison}
+        regressed = any(entry["regression"] for entry in comparison.values())
+    print(json.dumps(results, indent=2, sort_keys=True))
+    if regressed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
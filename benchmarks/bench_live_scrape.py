@@ -0,0 +1,106 @@
+"""Benchmark concurrent live scraping against a local virtual fleet.
+
+Starts `infra/scripts/mock_live_endpoints.py` with ``--targets`` virtual
+node_exporter targets (path routing on one port, or one port per target with
+``--routing ports``) and runs ``--cycles`` full `Scraper` cycles against
+them, optionally with injected latency, errors and hangs. Reports, per cycle
+and overall: wall time, targets/sec, up/down counts and the p50/p99 of
+per-target scrape durations.
+
+The mock server runs in this process, so on a small machine it competes with
+the scraper for CPU; ``--latency-ms`` makes the run network-bound instead.
+
+Usage:
+    python benchmarks/bench_live_scrape.py --targets 2000 --workers 64 --cycles 5
+    python benchmarks/bench_live_scrape.py --targets 1000 --latency-ms 50 --jitter-ms 50 --error-rate 0.01 \\
+        --timeout-rate 0.005 --timeout 1.0 --payload-bytes 65536
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "src"))
+
+from scraper import SUMMARY_FAMILIES, Scraper  # noqa: E402
+
+
+def _load_mock():
+    spec = importlib.util.spec_from_file_location("mock_live_endpoints", ROOT / "infra" / "scripts" / "mock_live_endpoints.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    mock = _load_mock()
+    faults = mock.Faults(args.latency_ms / 1e3, args.jitter_ms / 1e3, args.error_rate, args.timeout_rate,
+                         args.hang_seconds)
+    servers = mock.start_fleet(args.targets, routing=args.routing, cpus=args.cpus,
+                               payload_bytes=args.payload_bytes, faults=faults)
+    targets = [("node", t) for t in mock.fleet_targets(servers)["node_exporter"]]
+    cycles = []
+    durations = []
+    try:
+        with Scraper(max_workers=args.workers, timeout=args.timeout, families=SUMMARY_FAMILIES) as scraper:
+            for _ in range(args.cycles):
+                started = time.perf_counter()
+                results = scraper.scrape(targets)
+                scraper.summarize(results)
+                elapsed = time.perf_counter() - started
+                up = sum(1 for r in results if r.ok)
+                durations.extend(r.duration for r in results if r.ok)
+                cycles.append({
+                    "seconds": round(elapsed, 4),
+                    "targets_per_sec": round(len(targets) / elapsed, 1),
+                    "up": up,
+                    "down": len(results) - up,
+                })
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+    seconds = np.array([c["seconds"] for c in cycles])
+    per_target = np.array(durations) if durations else np.zeros(1)
+    return {
+        "targets": args.targets,
+        "routing": args.routing,
+        "workers": args.workers,
+        "payload_bytes": args.payload_bytes,
+        "faults": faults._asdict(),
+        "cycles": cycles,
+        "median_cycle_seconds": round(float(np.median(seconds)), 4),
+        "targets_per_sec": round(args.targets / float(np.median(seconds)), 1),
+        "target_p50_ms": round(float(np.percentile(per_target, 50)) * 1e3, 2),
+        "target_p99_ms": round(float(np.percentile(per_target, 99)) * 1e3, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark live scraping against a mock fleet")
+    parser.add_argument("--targets", type=int, default=1000)
+    parser.add_argument("--routing", choices=["path", "ports"], default="path")
+    parser.add_argument("--workers", type=int, default=64, help="scraper max_workers")
+    parser.add_argument("--timeout", type=float, default=2.0, help="scraper per-target timeout")
+    parser.add_argument("--cycles", type=int, default=5)
+    parser.add_argument("--cpus", type=int, default=4)
+    parser.add_argument("--payload-bytes", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Benchmark the streaming exposition parser against prometheus_client.parser.
+
+Generates a node_exporter-like payload (per-CPU modes, disks, network
+interfaces, filesystems, with HELP/TYPE lines) and reports lines/sec for:
+- `prometheus_client.parser.text_string_to_metric_families`
+- `prom_parser.ExpositionParser` parsing everything, cold and with warm label caches
+- `prom_parser.ExpositionParser` with the scraper's summary allow-list
+- the same parser fed from 64 KiB byte chunks via `iter_lines`
+
+Usage:
+    python benchmarks/bench_prom_parser.py --cpus 64 --repeats 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from prometheus_client.parser import text_string_to_metric_families  # noqa: E402
+
+from prom_parser import ExpositionParser, iter_lines  # noqa: E402
+from scraper import SUMMARY_FAMILIES  # noqa: E402
+
+CPU_MODES = ("idle", "iowait", "irq", "nice", "softirq", "steal", "system", "user")
+DISK_FIELDS = ("reads_completed_total", "writes_completed_total", "read_bytes_total", "written_bytes_total",
+               "io_time_seconds_total", "read_time_seconds_total", "write_time_seconds_total")
+NET_FIELDS = ("receive_bytes_total", "transmit_bytes_total", "receive_packets_total", "transmit_packets_total",
+              "receive_errs_total", "transmit_errs_total", "receive_drop_total", "transmit_drop_total")
+FS_FIELDS = ("avail_bytes", "free_bytes", "size_bytes", "files", "files_free", "readonly")
+MEMINFO = ("Active", "Buffers", "Cached", "Dirty", "Inactive", "MemAvailable", "MemFree", "MemTotal",
+           "Shmem", "Slab", "SwapCached", "SwapFree", "SwapTotal", "Writeback")
+
+
+def _family(lines: List[str], name: str, kind: str, rows: List[str]) -> None:
+    lines.append(f"# HELP {name} {name.replace('_', ' ')}.")
+    lines.append(f"# TYPE {name} {kind}")
+    lines.extend(rows)
+
+
+def node_exporter_payload(cpus: int = 32, disks: int = 8, interfaces: int = 8, filesystems: int = 12) -> str:
+    """Return a realistic node_exporter text payload."""
+    lines: List[str] = []
+    _family(lines, "node_cpu_seconds_total", "counter", [
+        f'node_cpu_seconds_total{{cpu="{c}",mode="{m}"}} {123456.78 + c * 10 + i:.2f}'
+        for c in range(cpus) for i, m in enumerate(CPU_MODES)
+    ])
+    for field in DISK_FIELDS:
+        _family(lines, f"node_disk_{field}", "counter", [
+            f'node_disk_{field}{{device="nvme{d}n1"}} {9.87654321e+09 + d:.8e}' for d in range(disks)
+        ])
+    for field in NET_FIELDS:
+        _family(lines, f"node_network_{field}", "counter", [
+            f'node_network_{field}{{device="eth{n}"}} {4.2e+10 + n:.6e}' for n in range(interfaces)
+        ])
+    for field in FS_FIELDS:
+        _family(lines, f"node_filesystem_{field}", "gauge", [
+            f'node_filesystem_{field}{{device="/dev/sd{f}",fstype="ext4",mountpoint="/data/{f}"}} {1.23e+11 + f:.6e}'
+            for f in range(filesystems)
+        ])
+    for field in MEMINFO:
+        _family(lines, f"node_memory_{field}_bytes", "gauge", [f"node_memory_{field}_bytes {8.5e+09:.6e}"])
+    for load in ("1", "5", "15"):
+        _family(lines, f"node_load{load}", "gauge", [f"node_load{load} 0.42"])
+    _family(lines, "node_scrape_collector_duration_seconds", "gauge", [
+        f'node_scrape_collector_duration_seconds{{collector="c{i}"}} 0.000{i + 1}' for i in range(40)
+    ])
+    return "\n".join(lines) + "\n"
+
+
+def _time(fn: Callable[[], int], repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(cpus: int, repeats: int) -> Dict[str, object]:
+    payload = node_exporter_payload(cpus=cpus)
+    data = payload.encode("utf-8")
+    n_lines = payload.count("\n")
+    extra = (("instance", "10.0.0.1:9100"), ("job", "node"))
+    full = ExpositionParser()
+    filtered = ExpositionParser(families=SUMMARY_FAMILIES)
+
+    cases = {
+        "prometheus_client": lambda: sum(len(f.samples) for f in text_string_to_metric_families(payload)),
+        "prom_parser_cold": lambda: sum(1 for _ in ExpositionParser().parse(payload.split("\n"), extra)),
+        "prom_parser": lambda: sum(1 for _ in full.parse(payload.split("\n"), extra)),
+        "prom_parser_allow_list": lambda: sum(1 for _ in filtered.parse(payload.split("\n"), extra)),
+        "prom_parser_chunked": lambda: sum(
+            1 for _ in full.parse(iter_lines(data[i:i + 65536] for i in range(0, len(data), 65536)), extra)
+        ),
+    }
+    results = {}
+    for name, fn in cases.items():
+        fn()  # warm caches the way a long-running scraper would
+        seconds = _time(fn, repeats)
+        results[name] = {"seconds": seconds, "lines_per_sec": n_lines / seconds}
+    baseline = results["prometheus_client"]["seconds"]
+    for name, row in results.items():
+        row["speedup"] = baseline / row["seconds"]
+    return {"lines": n_lines, "bytes": len(data), "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark exposition parsing")
+    parser.add_argument("--cpus", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.cpus, args.repeats), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark memory and conversion cost of metric sample representations.
+
+Builds ``--samples`` observations (``--metrics`` per host, rounded down to
+whole hosts) in each representation and reports, per one million samples,
+the bytes it retains (``tracemalloc``, built from a float64 matrix so Python
+float objects are counted where they exist):
+- ``host_dicts``: ``{host: {metric: value}}``, the scrape summary shape
+- ``sample_dicts``: a list of ``{"host", "metric", "value", "ts"}`` dicts
+- ``metric_samples``: a list of ``samples.MetricSample`` (``__slots__``)
+- ``sample_frame``: one ``samples.SampleFrame`` (float64 matrix)
+
+Conversion timings (median of ``--repeats``) cover dict -> frame
+(`SampleFrame.from_hosts`), frame -> dict (`to_dict`), the zero-copy
+`to_numpy` / `column` views, frame <-> `MetricSample` lists, and the
+``np.array`` of nested lists the detectors used to build from dicts.
+
+Usage:
+    python benchmarks/bench_samples.py --samples 1000000 --metrics 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from samples import MetricSample, SampleFrame  # noqa: E402
+
+
+def _measure(build: Callable[[], Any]) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        obj = build()
+        gc.collect()
+        retained, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del obj
+    return retained
+
+
+def _time(fn: Callable[[], Any], repeats: int) -> float:
+    rounds = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        rounds.append(time.perf_counter() - started)
+    return statistics.median(rounds)
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    n_hosts = max(1, args.samples // args.metrics)
+    n = n_hosts * args.metrics
+    hosts = [f"ip-10-{i // 65536}-{i // 256 % 256}-{i % 256}:9100" for i in range(n_hosts)]
+    columns = [f"metric_{j}" for j in range(args.metrics)]
+    matrix = np.random.default_rng(0).uniform(0, 100, (n_hosts, args.metrics))
+    ts = time.time()
+
+    builders: Dict[str, Callable[[], Any]] = {
+        "host_dicts": lambda: {h: dict(zip(columns, r)) for h, r in zip(hosts, matrix.tolist())},
+        "sample_dicts": lambda: [
+            {"host": h, "metric": c, "value": v, "ts": ts}
+            for h, r in zip(hosts, matrix.tolist())
+            for c, v in zip(columns, r)
+        ],
+        "metric_samples": lambda: [
+            MetricSample(h, c, v, ts) for h, r in zip(hosts, matrix.tolist()) for c, v in zip(columns, r)
+        ],
+        "sample_frame": lambda: SampleFrame(hosts, columns, matrix.copy(), ts),
+    }
+    memory = {}
+    for name, build in builders.items():
+        held = _measure(build)
+        memory[name] = {"bytes_per_1m_samples": round(held / n * 1e6), "bytes_per_sample": round(held / n, 1)}
+
+    host_dicts = builders["host_dicts"]()
+    frame = SampleFrame.from_hosts(host_dicts, columns, ts)
+    sample_list: List[MetricSample] = list(frame.samples())
+    conversions = {
+        "from_hosts": lambda: SampleFrame.from_hosts(host_dicts, columns, ts),
+        "to_dict": frame.to_dict,
+        "to_numpy": frame.to_numpy,
+        "column": lambda: frame.column(columns[0]),
+        "samples": lambda: list(frame.samples()),
+        "from_samples": lambda: SampleFrame.from_samples(sample_list),
+        "nested_list_array": lambda: np.array([[host_dicts[h].get(c, np.nan) for c in columns] for h in hosts]),
+    }
+    timings = {}
+    for name, fn in conversions.items():
+        seconds = _time(fn, args.repeats)
+        timings[name] = {"seconds": round(seconds, 6), "ns_per_sample": round(seconds / n * 1e9, 2)}
+
+    return {"samples": n, "hosts": n_hosts, "metrics": args.metrics, "memory": memory, "conversions": timings}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark metric sample representations")
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    parser.add_argument("--metrics", type=int, default=8, help="metrics per host")
+    parser.add_argument("--repeats", type=int, default=3)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark multi-process sharded detection against the single-process path.
+
+For a synthetic fleet of ``--hosts`` hosts x (cpu, memory) it reports
+hosts/sec per cycle for:
+- the in-process baseline: one `StreamingDetector` plus `detect_anomalies_batch`
+- `ShardedDetector` with each shard count in ``--shards``
+
+The first cycle (slot allocation) is run as warmup and excluded. Speedup is
+relative to the in-process baseline and is bounded by ``os.cpu_count()``.
+
+Usage:
+    python benchmarks/bench_sharded_detection.py --hosts 200000 --cycles 20 --shards 1 2 4 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from anomaly_detection import detect_anomalies_batch  # noqa: E402
+from sharded_detection import DEFAULT_COLUMNS, ShardedDetector  # noqa: E402
+from streaming_detection import StreamingDetector  # noqa: E402
+
+
+def fleet_cycles(hosts: int, cycles: int, seed: int = 0) -> List[np.ndarray]:
+    """Return ``cycles + 1`` matrices of shape ``(hosts, 2)`` with cpu/memory percentages."""
+    rng = np.random.default_rng(seed)
+    base = rng.uniform(10, 70, size=(hosts, 2))
+    return [np.clip(base + rng.normal(0, 2, size=base.shape), 0, 100) for _ in range(cycles + 1)]
+
+
+def bench_single(frames: List[np.ndarray]) -> float:
+    hosts = frames[0].shape[0]
+    detector = StreamingDetector(max_series=hosts * 2)
+    slots = detector.slots([(h, c) for h in range(hosts) for c in range(2)])
+    detector.update_slots(slots, frames[0].ravel())
+    started = time.perf_counter()
+    for values in frames[1:]:
+        detector.update_slots(slots, values.ravel())
+        detect_anomalies_batch(values, DEFAULT_COLUMNS)
+    return (time.perf_counter() - started) / (len(frames) - 1)
+
+
+def bench_sharded(frames: List[np.ndarray], shards: int) -> float:
+    hosts = frames[0].shape[0]
+    # Headroom for ring imbalance, so no shard evicts (and re-warms) series every cycle.
+    capacity = int(hosts * 2 / shards * 1.25) + 4096
+    with ShardedDetector(n_shards=shards, max_series=capacity) as detector:
+        ids = detector.register(f"host-{i}" for i in range(hosts))
+        detector.evaluate_ids(ids, frames[0])
+        started = time.perf_counter()
+        for values in frames[1:]:
+            detector.evaluate_ids(ids, values)
+        return (time.perf_counter() - started) / (len(frames) - 1)
+
+
+def run(hosts: int, cycles: int, shard_counts: List[int]) -> Dict[str, Any]:
+    frames = fleet_cycles(hosts, cycles)
+    single = bench_single(frames)
+    results: Dict[str, Any] = {
+        "hosts": hosts,
+        "cycles": cycles,
+        "cpu_count": os.cpu_count(),
+        "single_process": {"seconds_per_cycle": round(single, 6), "hosts_per_sec": round(hosts / single)},
+        "sharded": {},
+    }
+    for shards in shard_counts:
+        seconds = bench_sharded(frames, shards)
+        results["sharded"][str(shards)] = {
+            "seconds_per_cycle": round(seconds, 6),
+            "hosts_per_sec": round(hosts / seconds),
+            "speedup": round(single / seconds, 2),
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark sharded anomaly detection")
+    parser.add_argument("--hosts", type=int, default=200_000)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    print(json.dumps(run(args.hosts, args.cycles, args.shards), indent=2))
+
+
+if __name__ == "__main__":
+    main()
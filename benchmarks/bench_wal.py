@@ -0,0 +1,131 @@
+"""Benchmark sustained ingestion throughput with and without group commit.
+
+Feeds ``--batches`` pushes of ``--hosts`` hosts x (cpu, memory) samples, each
+with its JSON snapshot, through four ingestion paths into a fresh
+`metric_store.MetricStore`:
+
+- ``direct``: the old path, ``write_text`` of the snapshot (not atomic) and a
+  store append per batch, no log
+- ``atomic``: snapshot replaced by temporary file + rename, store append per
+  batch, no log
+- ``wal_fsync_each``: `ingest_wal.IngestWriter` with ``commit_bytes=0``, one
+  write + fdatasync per batch
+- ``wal_group_commit``: `IngestWriter` committing once ``--commit-bytes`` are
+  buffered or the oldest batch is ``--commit-interval`` seconds old
+
+Reported per path: samples/sec, batches/sec, p50/p99 latency of one push, and
+commits/fsyncs issued. Run it on the disk that will hold the log: fsync cost
+is a property of the device.
+
+Usage:
+    python benchmarks/bench_wal.py --hosts 50 --batches 2000
+    python benchmarks/bench_wal.py --hosts 500 --batches 500 --commit-bytes 4194304 --dir /var/lib/smartcloudops
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from ingest_wal import IngestWriter  # noqa: E402
+from metric_store import MetricStore  # noqa: E402
+from samples import SampleFrame  # noqa: E402
+from series import SeriesBatch, SeriesRegistry  # noqa: E402
+from targets import write_if_changed  # noqa: E402
+
+
+def _pushes(args: argparse.Namespace, registry: SeriesRegistry) -> List[tuple]:
+    rng = np.random.default_rng(args.seed)
+    hosts = [f"web-{i}" for i in range(args.hosts)]
+    pushes = []
+    for i in range(args.batches):
+        frame = SampleFrame(hosts, ("cpu", "memory"), np.round(rng.uniform(0, 100, (args.hosts, 2)), 2), ts=1.7e9 + i)
+        snapshot = {"hosts": frame.to_dict(), "cpu": float(frame.column("cpu").max())}
+        pushes.append((SeriesBatch.from_frame(frame, registry), snapshot))
+    return pushes
+
+
+def _run(name: str, pushes: List[tuple], workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    root = workdir / name
+    snapshot_path = root / "metrics.json"
+    store = MetricStore(root / "store")
+    writer: IngestWriter | None = None
+    push: Callable[[SeriesBatch, Dict[str, Any]], None]
+
+    if name == "direct":
+        def push(batch, snapshot):
+            snapshot_path.write_text(json.dumps(snapshot), encoding="utf-8")
+            store.append_batch(batch)
+    elif name == "atomic":
+        def push(batch, snapshot):
+            write_if_changed(snapshot_path, json.dumps(snapshot).encode("utf-8"))
+            store.append_batch(batch)
+    else:
+        commit_bytes = 0 if name == "wal_fsync_each" else args.commit_bytes
+        writer = IngestWriter(root / "wal", store=store, snapshot_path=snapshot_path,
+                              commit_bytes=commit_bytes, commit_interval=args.commit_interval,
+                              registry=pushes[0][0].registry)
+        push = writer.add
+
+    latencies = np.empty(len(pushes))
+    started = time.perf_counter()
+    for i, (batch, snapshot) in enumerate(pushes):
+        t0 = time.perf_counter()
+        push(batch, snapshot)
+        latencies[i] = time.perf_counter() - t0
+    if writer is not None:
+        writer.commit()
+    elapsed = time.perf_counter() - started
+    stats = dict(writer.stats) if writer is not None else {}
+    if writer is not None:
+        writer.close()
+    store.close()
+
+    samples = sum(len(batch) for batch, _ in pushes)
+    return {
+        "samples_per_sec": round(samples / elapsed),
+        "batches_per_sec": round(len(pushes) / elapsed, 1),
+        "push_p50_ms": round(float(np.percentile(latencies, 50)) * 1e3, 3),
+        "push_p99_ms": round(float(np.percentile(latencies, 99)) * 1e3, 3),
+        "commits": stats.get("commits"),
+        "fsyncs": stats.get("fsyncs"),
+    }
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    pushes = _pushes(args, SeriesRegistry())
+    with tempfile.TemporaryDirectory(prefix="bench-wal-", dir=args.dir) as tmp:
+        results = {name: _run(name, pushes, Path(tmp), args)
+                   for name in ("direct", "atomic", "wal_fsync_each", "wal_group_commit")}
+    return {
+        "hosts": args.hosts,
+        "batches": args.batches,
+        "samples_per_batch": 2 * args.hosts,
+        "commit_bytes": args.commit_bytes,
+        "commit_interval": args.commit_interval,
+        "results": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark write-ahead ingestion with and without group commit")
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--batches", type=int, default=2000)
+    parser.add_argument("--commit-bytes", type=int, default=1 << 20)
+    parser.add_argument("--commit-interval", type=float, default=0.05)
+    parser.add_argument("--dir", default=None, help="directory for the store and log (default: system temp)")
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Gunicorn settings for serving the dashboard (`src/wsgi.py`).
+
+    gunicorn -c config/gunicorn.conf.py wsgi:application
+
+Every setting can be overridden through the environment:
+
+- ``DASHBOARD_BIND`` (``0.0.0.0:5000``)
+- ``DASHBOARD_WORKERS`` (``2 * cpu + 1``)
+- ``DASHBOARD_WORKER_CLASS``: ``gthread`` (default) runs ``DASHBOARD_THREADS``
+  request threads per worker, so a connected `/stream` client occupies one
+  thread rather than a whole worker. ``gevent`` is the async variant for
+  fleets with many concurrent stream clients: each connection is a greenlet
+  and a worker holds up to ``DASHBOARD_WORKER_CONNECTIONS`` of them.
+- ``DASHBOARD_STREAM_CLIENTS``: `/stream` connections a worker accepts
+  before answering 503. Each one holds a request thread (a greenlet under
+  gevent) for as long as it stays connected, so the cap is clamped to the
+  worker's threads (or connections) minus ``DASHBOARD_RESERVED_THREADS``
+  (``2``) kept free for ordinary requests. With the defaults a gthread
+  worker serves 6 stream clients; raise ``DASHBOARD_THREADS`` or switch to
+  gevent for more.
+- ``DASHBOARD_KEEPALIVE`` seconds an idle keep-alive connection is held open;
+  keep it above the load balancer's idle timeout when serving behind one.
+
+The app is preloaded in the master (see `src/wsgi.py`), and Prometheus
+collectors switch to multiprocess mode so `/metrics` aggregates all workers.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parents[1]
+
+worker_class = os.environ.get("DASHBOARD_WORKER_CLASS", "gthread")
+if worker_class == "gevent":
+    # Must happen before the preloaded app creates its locks and events.
+    from gevent import monkey
+
+    monkey.patch_all()
+
+# prometheus_client picks its value backend at import, so this must be set
+# (and the directory emptied of a previous run's files) before the app, and
+# with it `instrumentation`, is preloaded. Gunicorn calls on_starting only
+# after preloading, hence module level.
+_metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "dashboard-prometheus")
+)
+shutil.rmtree(_metrics_dir, ignore_errors=True)
+os.makedirs(_metrics_dir, exist_ok=True)
+
+bind = os.environ.get("DASHBOARD_BIND", "0.0.0.0:5000")
+chdir = str(_ROOT)
+pythonpath = str(_ROOT / "src")
+workers = int(os.environ.get("DASHBOARD_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("DASHBOARD_THREADS", 8))
+worker_connections = int(os.environ.get("DASHBOARD_WORKER_CONNECTIONS", 1000))
+keepalive = int(os.environ.get("DASHBOARD_KEEPALIVE", 75))
+
+# A connected /stream client never returns its thread, so the broadcaster's
+# cap must leave room for plain requests or 8 clients stall the worker. Read
+# by `dashboard` when the app is preloaded, which happens after this file.
+_slots = worker_connections if worker_class == "gevent" else threads
+_stream_cap = max(1, _slots - int(os.environ.get("DASHBOARD_RESERVED_THREADS", 2)))
+os.environ["DASHBOARD_STREAM_CLIENTS"] = str(
+    min(int(os.environ.get("DASHBOARD_STREAM_CLIENTS", _stream_cap)), _stream_cap)
+)
+preload_app = True
+# Worker heartbeat, not a request deadline: /stream responses stay open
+# indefinitely while the worker keeps reporting in.
+timeout = 30
+graceful_timeout = 10
+accesslog = os.environ.get("DASHBOARD_ACCESS_LOG")  # off unless set; it costs a write per request
+
+
+def child_exit(server, worker) -> None:
+    """Drop the live-gauge files of a worker that exited."""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
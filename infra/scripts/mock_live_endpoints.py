@@ -1,54 +1,230 @@
-"""Mock live endpoints for Phase 7 aws_live tests.
+"""Mock live endpoints for Phase 7 aws_live tests and live-scrape load tests.
 
-Starts lightweight HTTP servers to simulate:
+Without arguments it starts lightweight HTTP servers to simulate:
 - Node Exporter metrics at http://127.0.0.1:9100/metrics
 - App health at http://127.0.0.1:5000/health
 - Prometheus readiness at http://127.0.0.1:9090/-/ready
 - Grafana health at http://127.0.0.1:3000/api/health
 
+With ``--targets N`` it instead emulates N virtual node_exporter targets for
+benchmarking the concurrent scraper, addressed by ``--routing``:
+- ``path``: one port, targets at ``/targets/<i>/metrics`` (full-URL targets)
+- ``host``: one port, the target is picked from the ``Host`` header
+  (``t<i>.<anything>``); scrape it through a resolver or proxy that maps
+  those names to the port
+- ``ports``: one listener per port on ``--port`` .. ``--port + N - 1``
+
+Payloads are generated node_exporter text: per-CPU counters that advance
+with wall time (so rate-based cpu utilisation is stable per target), memory
+gauges, and filler series up to ``--payload-bytes``. Latency (with jitter),
+HTTP 500 errors and hung responses can be injected per request. Each server
+is a `ThreadingHTTPServer` speaking HTTP/1.1 keep-alive, so pooled scraper
+connections are reused and slow targets only hold their own thread.
+
 Usage:
   python infra/scripts/mock_live_endpoints.py
+  python infra/scripts/mock_live_endpoints.py --targets 2000 --port 9100 --targets-file /tmp/targets.json \\
+      --payload-bytes 65536 --latency-ms 20 --jitter-ms 10 --error-rate 0.01 --timeout-rate 0.005
 Press Ctrl+C to stop.
+
+Tests can start a single endpoint on an ephemeral port with
+`start_server("node_exporter")`, or a virtual fleet with `start_fleet(...)`,
+and stop it with `server.shutdown()`.
 """
 
 from __future__ import annotations
 
+import argparse
 import json
+import random
 import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+
+_ROLE_BY_PORT = {9100: "node_exporter", 5000: "app", 9090: "prometheus", 3000: "grafana"}
+
+NODE_EXPORTER_BODY = (
+    "# HELP dummy Dummy metric\n"
+    "# TYPE dummy gauge\n"
+    "dummy 1\n"
+    "# HELP node_cpu_seconds_total Seconds the CPUs spent in each mode.\n"
+    "# TYPE node_cpu_seconds_total counter\n"
+    'node_cpu_seconds_total{cpu="0",mode="idle"} 7500\n'
+    'node_cpu_seconds_total{cpu="0",mode="user"} 2000\n'
+    'node_cpu_seconds_total{cpu="0",mode="system"} 500\n'
+    'node_cpu_seconds_total{cpu="1",mode="idle"} 7500\n'
+    'node_cpu_seconds_total{cpu="1",mode="user"} 2000\n'
+    'node_cpu_seconds_total{cpu="1",mode="system"} 500\n'
+    "# HELP node_memory_MemTotal_bytes Memory information field MemTotal_bytes.\n"
+    "# TYPE node_memory_MemTotal_bytes gauge\n"
+    "node_memory_MemTotal_bytes 8.0e+09\n"
+    "# HELP node_memory_MemAvailable_bytes Memory information field MemAvailable_bytes.\n"
+    "# TYPE node_memory_MemAvailable_bytes gauge\n"
+    "node_memory_MemAvailable_bytes 6.0e+09\n"
+).encode("utf-8")
+
+
+class Faults(NamedTuple):
+    """Per-request fault injection for virtual targets.
+
+    Attributes
+    ----------
+    latency: float
+        Base delay before answering, in seconds.
+    jitter: float
+        Uniform extra delay in ``[0, jitter)`` seconds.
+    error_rate: float
+        Probability of answering HTTP 500.
+    timeout_rate: float
+        Probability of stalling for ``hang`` seconds before answering, which
+        a scraper with a shorter timeout sees as a timeout.
+    hang: float
+        Stall duration for timed-out requests, in seconds.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    timeout_rate: float = 0.0
+    hang: float = 30.0
+
+
+class PayloadFactory:
+    """Generate node_exporter payloads for virtual target ``i``.
+
+    Each target gets a fixed cpu utilisation in 5..85% and memory usage in
+    20..80%, derived from its index. CPU counters are ``(boot + elapsed) *
+    share`` so consecutive scrapes yield that utilisation as a rate. The
+    filler block is rendered once and shared by all targets.
+    """
+
+    def __init__(self, cpus: int = 4, payload_bytes: int = 0, seed: int = 0) -> None:
+        self.cpus = int(cpus)
+        self.seed = int(seed)
+        self.started = time.time()
+        lines: List[str] = []
+        size = 0
+        series = 0
+        while size < payload_bytes:
+            if series % 100 == 0:
+                family = f"node_mock_filler_{series // 100}"
+                block = f"# HELP {family} Filler series for payload sizing.\n# TYPE {family} gauge\n"
+                lines.append(block)
+                size += len(block)
+            line = f'{family}{{device="dev{series % 100}",series="{series}"}} {series * 1.5:.6e}\n'
+            lines.append(line)
+            size += len(line)
+            series += 1
+        self._filler = "".join(lines).encode("utf-8")
+
+    def profile(self, i: int) -> tuple[float, float, float]:
+        """Return ``(cpu fraction busy, memory fraction used, boot seconds)`` for target ``i``."""
+        rng = random.Random(self.seed * 1_000_003 + i)
+        return rng.uniform(0.05, 0.85), rng.uniform(0.2, 0.8), rng.uniform(3600, 86400 * 30)
+
+    def render(self, i: int) -> bytes:
+        """Return the node_exporter exposition body of target ``i`` at the current time."""
+        busy, used, boot = self.profile(i)
+        per_cpu = boot + (time.time() - self.started)
+        lines = [
+            "# HELP node_cpu_seconds_total Seconds the CPUs spent in each mode.",
+            "# TYPE node_cpu_seconds_total counter",
+        ]
+        for cpu in range(self.cpus):
+            lines.append(f'node_cpu_seconds_total{{cpu="{cpu}",mode="idle"}} {per_cpu * (1 - busy):.3f}')
+            lines.append(f'node_cpu_seconds_total{{cpu="{cpu}",mode="system"}} {per_cpu * busy * 0.25:.3f}')
+            lines.append(f'node_cpu_seconds_total{{cpu="{cpu}",mode="user"}} {per_cpu * busy * 0.75:.3f}')
+        total = 16 * 2**30
+        lines += [
+            "# HELP node_memory_MemTotal_bytes Memory information field MemTotal_bytes.",
+            "# TYPE node_memory_MemTotal_bytes gauge",
+            f"node_memory_MemTotal_bytes {total:.6e}",
+            "# HELP node_memory_MemAvailable_bytes Memory information field MemAvailable_bytes.",
+            "# TYPE node_memory_MemAvailable_bytes gauge",
+            f"node_memory_MemAvailable_bytes {total * (1 - used):.6e}",
+            "",
+        ]
+        return "\n".join(lines).encode("utf-8") + self._filler
 
 
 class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
     def do_GET(self):  # noqa: N802
-        if self.server.server_port == 9100 and self.path == "/metrics":
-            body = (
-                "# HELP dummy Dummy metric\n"
-                "# TYPE dummy gauge\n"
-                "dummy 1\n"
-            ).encode("utf-8")
-            self._send(200, "text/plain; version=0.0.4", body)
+        server = self.server
+        if getattr(server, "payloads", None) is not None:
+            self._serve_target(server)
             return
 
-        if self.server.server_port == 5000 and self.path == "/health":
+        role = getattr(server, "role", None) or _ROLE_BY_PORT.get(server.server_port)
+
+        if role == "node_exporter" and self.path == "/metrics":
+            self._send(200, "text/plain; version=0.0.4", NODE_EXPORTER_BODY)
+            return
+
+        if role == "app" and self.path == "/health":
             body = json.dumps({"status": "ok"}).encode("utf-8")
             self._send(200, "application/json", body)
             return
 
-        if self.server.server_port == 9090 and self.path == "/-/ready":
+        if role == "app" and self.path == "/metrics":
+            body = b"# HELP app_info Application info gauge\n# TYPE app_info gauge\napp_info 1.0\n"
+            self._send(200, "text/plain; version=0.0.4", body)
+            return
+
+        if role == "prometheus" and self.path == "/-/ready":
             self._send(200, "text/plain", b"ready\n")
             return
 
-        if self.server.server_port == 3000 and self.path == "/api/health":
+        if role == "grafana" and self.path == "/api/health":
             body = json.dumps({"database": "ok"}).encode("utf-8")
             self._send(200, "application/json", body)
             return
 
         self._send(404, "text/plain", b"not found\n")
 
+    def _target_index(self, server) -> int | None:
+        """Return the virtual target addressed by this request, or None if it names none."""
+        if server.routing == "ports":
+            return server.first_target if self.path == "/metrics" else None
+        if server.routing == "host":
+            name = (self.headers.get("Host") or "").split(".", 1)[0]
+            if self.path != "/metrics" or not name.startswith("t") or not name[1:].isdigit():
+                return None
+            index = int(name[1:])
+        else:
+            parts = self.path.strip("/").split("/")
+            if len(parts) != 3 or parts[0] != "targets" or parts[2] != "metrics" or not parts[1].isdigit():
+                return None
+            index = int(parts[1])
+        return index if index < server.n_targets else None
+
+    def _serve_target(self, server) -> None:
+        """Answer a fleet scrape, applying the server's injected latency, hangs and errors."""
+        index = self._target_index(server)
+        if index is None:
+            self._send(404, "text/plain", b"not found\n")
+            return
+        faults: Faults = server.faults
+        rng = random.random
+        delay = faults.latency + (rng() * faults.jitter if faults.jitter else 0.0)
+        if faults.timeout_rate and rng() < faults.timeout_rate:
+            delay += faults.hang
+        if delay > 0:
+            time.sleep(delay)
+        if faults.error_rate and rng() < faults.error_rate:
+            self._send(500, "text/plain", b"injected error\n")
+            return
+        self._send(200, "text/plain; version=0.0.4", server.payloads.render(index))
+
     def log_message(self, format, *args):  # noqa: A003 - silence default logging
         return
 
     def _send(self, code: int, ctype: str, body: bytes):
+        """Write a complete keep-alive response with ``body``."""
         self.send_response(code)
         self.send_header("Content-Type", ctype)
         self.send_header("Content-Length", str(len(body)))
@@ -56,27 +232,127 @@ class _Handler(BaseHTTPRequestHandler):
         self.wfile.write(body)
 
 
+class MockServer(ThreadingHTTPServer):
+    """Thread-per-connection server with a deep accept backlog for scrape bursts."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+    role: str | None = None
+    payloads: PayloadFactory | None = None
+
+
+def _start(server: MockServer) -> MockServer:
+    """Run ``server`` in a daemon thread and return it."""
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    return server
+
+
 def _serve(port: int):
-    server = HTTPServer(("127.0.0.1", port), _Handler)
+    server = MockServer(("127.0.0.1", port), _Handler)
     server.serve_forever()
 
 
+def start_server(role: str, port: int = 0) -> MockServer:
+    """Serve one mock endpoint of the given role in a daemon thread.
+
+    Returns the running server; `server.server_port` holds the bound port.
+    """
+    server = MockServer(("127.0.0.1", port), _Handler)
+    server.role = role
+    return _start(server)
+
+
+def start_fleet(
+    n_targets: int,
+    port: int = 0,
+    routing: str = "path",
+    cpus: int = 4,
+    payload_bytes: int = 0,
+    faults: Faults = Faults(),
+    host: str = "127.0.0.1",
+) -> List[MockServer]:
+    """Serve ``n_targets`` virtual node_exporter targets.
+
+    Returns the running servers: one for ``path``/``host`` routing, one per
+    target for ``ports`` routing (consecutive from ``port``; ``port=0`` binds
+    ephemeral ports). Use :func:`fleet_targets` for the scrape target list.
+    """
+    if routing not in ("path", "host", "ports"):
+        raise ValueError(f"unknown routing {routing!r}")
+    payloads = PayloadFactory(cpus=cpus, payload_bytes=payload_bytes)
+    count = n_targets if routing == "ports" else 1
+    servers = []
+    for i in range(count):
+        server = MockServer((host, port + i if port else 0), _Handler)
+        server.payloads = payloads
+        server.faults = faults
+        server.routing = routing
+        server.n_targets = n_targets
+        server.first_target = i
+        servers.append(_start(server))
+    return servers
+
+
+def fleet_targets(servers: List[MockServer]) -> Dict[str, List[str]]:
+    """Targets for :func:`start_fleet` servers in the `config/aws_targets.json` format.
+
+    ``host`` routing returns ``t<i>.mock:<port>`` names, which need a
+    resolver entry pointing at the server.
+    """
+    first = servers[0]
+    host, port = first.server_address[:2]
+    if first.routing == "ports":
+        targets = [f"{s.server_address[0]}:{s.server_address[1]}" for s in servers]
+    elif first.routing == "host":
+        targets = [f"t{i}.mock:{port}" for i in range(first.n_targets)]
+    else:
+        targets = [f"http://{host}:{port}/targets/{i}/metrics" for i in range(first.n_targets)]
+    return {"node_exporter": targets, "app": []}
+
+
 def main():
-    ports = [9100, 5000, 9090, 3000]
-    threads = []
-    for p in ports:
-        t = threading.Thread(target=_serve, args=(p,), daemon=True)
-        t.start()
-        threads.append(t)
+    """Serve the fixed role endpoints, or a virtual fleet with ``--targets``, until interrupted."""
+    parser = argparse.ArgumentParser(description="Serve mock live endpoints")
+    parser.add_argument("--targets", type=int, default=0, help="number of virtual node_exporter targets")
+    parser.add_argument("--port", type=int, default=9100, help="port (first port for --routing ports)")
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--routing", choices=["path", "host", "ports"], default="path")
+    parser.add_argument("--cpus", type=int, default=4)
+    parser.add_argument("--payload-bytes", type=int, default=0, help="pad each payload with filler series")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-seconds", type=float, default=30.0)
+    parser.add_argument("--targets-file", type=Path, help="write an aws_targets.json-style target list here")
+    args = parser.parse_args()
+
+    if args.targets:
+        faults = Faults(args.latency_ms / 1e3, args.jitter_ms / 1e3, args.error_rate, args.timeout_rate,
+                        args.hang_seconds)
+        servers = start_fleet(args.targets, args.port, args.routing, args.cpus, args.payload_bytes, faults, args.bind)
+        if args.targets_file:
+            args.targets_file.write_text(json.dumps(fleet_targets(servers), indent=2), encoding="utf-8")
+        print(f"serving {args.targets} targets on {len(servers)} listener(s)")
+        threads = []
+    else:
+        ports = [9100, 5000, 9090, 3000]
+        threads = []
+        for p in ports:
+            t = threading.Thread(target=_serve, args=(p,), daemon=True)
+            t.start()
+            threads.append(t)
     # Keep the main thread alive
     try:
-        for t in threads:
-            t.join()
+        if threads:
+            for t in threads:
+                t.join()
+        else:
+            while True:
+                time.sleep(3600)
     except KeyboardInterrupt:
         pass
 
 
 if __name__ == "__main__":
     main()
-
-
@@ -1,42 +1,43 @@
 """Generate Prometheus file_sd targets from config/aws_targets.json.
 
 This helper reads `config/aws_targets.json` which should contain keys
-`app` and `node_exporter` listing host:port entries. It writes a
-Prometheus file_sd JSON at `infra/prometheus/file_sd/app-and-node.json`.
+`app` and `node_exporter` listing host:port entries (optionally objects with
+per-target labels, see `src/targets.py`). It writes a Prometheus file_sd
+JSON at `infra/prometheus/file_sd/app-and-node.json`, or, with `--shards N`,
+N files `targets-<k>-of-<N>.json` split by Prometheus `hashmod` of the
+address, one per Prometheus shard. Files are replaced atomically and only
+when their content changed.
 
 Usage:
     python -m infra.scripts.prometheus_config \
         --config config/aws_targets.json \
         --out infra/prometheus/file_sd/app-and-node.json
+    python -m infra.scripts.prometheus_config --shards 4 --out-dir infra/prometheus/file_sd
 """
 
 from __future__ import annotations
 
 import argparse
-import json
+import sys
 from pathlib import Path
-from typing import Dict, List
+from typing import List
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
 
-def _load_targets(config_path: Path) -> Dict[str, List[str]]:
-    if not config_path.exists():
-        return {"app": [], "node_exporter": []}
-    data = json.loads(config_path.read_text(encoding="utf-8"))
-    return {
-        "app": list(data.get("app", [])) or [],
-        "node_exporter": list(data.get("node_exporter", [])) or [],
-    }
+from targets import TargetIndex, write_file_sd  # noqa: E402
 
 
-def generate_file_sd(config_path: Path, output_path: Path) -> None:
-    """Generate file_sd JSON for Prometheus based on aws_targets.json."""
-    targets = _load_targets(config_path)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    payload = [
-        {"labels": {"job": "app"}, "targets": targets["app"]},
-        {"labels": {"job": "node"}, "targets": targets["node_exporter"]},
-    ]
-    output_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+def generate_file_sd(config_path: Path, output_path: Path) -> bool:
+    """Generate file_sd JSON for Prometheus based on aws_targets.json.
+
+    Returns True if ``output_path`` was (re)written.
+    """
+    return write_file_sd(TargetIndex(config_path), output_path)
+
+
+def generate_sharded_file_sd(config_path: Path, out_dir: Path, n_shards: int) -> List[Path]:
+    """Write one hashmod shard of the targets per file; return the files that changed."""
+    return TargetIndex(config_path).write_file_sd(out_dir, n_shards)
 
 
 def main() -> None:
@@ -47,11 +48,18 @@ def main() -> None:
         type=Path,
         default=Path("infra/prometheus/file_sd/app-and-node.json"),
     )
+    parser.add_argument("--shards", type=int, default=0, help="write N hashmod shard files instead of --out")
+    parser.add_argument("--out-dir", type=Path, default=Path("infra/prometheus/file_sd"))
     args = parser.parse_args()
-    generate_file_sd(args.config, args.out)
+    index = TargetIndex(args.config)
+    if index.error:
+        sys.exit(f"invalid targets file: {index.error}")
+    if args.shards:
+        for path in index.write_file_sd(args.out_dir, args.shards):
+            print(f"wrote {path}")
+    elif write_file_sd(index, args.out):
+        print(f"wrote {args.out}")
 
 
 if __name__ == "__main__":
     main()
-
-
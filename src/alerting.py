@@ -0,0 +1,477 @@
+"""Incremental alert evaluation with pending durations, hysteresis and burn rates.
+
+`detect_anomaly` judges one snapshot, so a single spike is an anomaly.
+`AlertEvaluator` instead tracks every ``(rule, series)`` pair through the
+states ``inactive -> pending -> firing -> inactive``:
+
+- a threshold rule becomes active when a sample exceeds ``fire_above``. It
+  is ``pending`` while samples stay above ``fire_above`` and ``firing`` once
+  it has been active for ``for_seconds`` (Prometheus ``for: 5m``); a pending
+  pair resets on the first sample at or below ``fire_above``;
+- a firing pair stays firing until a sample drops below ``clear_below``
+  (hysteresis, e.g. fire above 90, clear below 80);
+- a burn-rate rule counts samples above ``fire_above`` as bad events against
+  an ``objective`` (e.g. 99% of samples at or below 90). For each
+  ``(long, short, factor)`` window pair it fires when the bad ratio over
+  *both* windows exceeds ``factor`` times the error budget ``1 - objective``
+  (the multi-window, multi-burn-rate pattern). A window counts only once
+  the series has been observed for its whole length;
+- a series without a sample for more than ``stale_after`` evaluation
+  intervals is expired: its firing alerts resolve and its state is reset,
+  so a host that disappears does not keep alerting.
+
+State is kept in numpy arrays per rule group, with one row per matching
+series. Rules for the same metric and label matchers share a group, so an
+update scores all their thresholds as one ``series x rules`` comparison.
+Burn-rate windows are sums over ring buffers of per-``resolution`` buckets:
+a sample adds to the current bucket and the running window sums, and a
+bucket leaving a window is subtracted once. Each sample therefore costs
+O(1) whatever the window length.
+
+Series are matched on first sight through `series.SeriesRegistry` and
+addressed by integer id afterwards. See `benchmarks/bench_alerts.py`.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from instrumentation import ALERT_TRANSITIONS
+from samples import SampleFrame
+from series import SeriesBatch, SeriesRegistry, get_registry
+
+Labels = Tuple[Tuple[str, str], ...]
+Window = Tuple[float, float, float]
+
+INACTIVE, PENDING, FIRING = 0, 1, 2
+
+
+class AlertRule(NamedTuple):
+    """One alerting rule.
+
+    Attributes
+    ----------
+    name: str
+        Rule identifier, reported in events.
+    metric: str
+        Metric the rule watches.
+    fire_above: float
+        A sample strictly above this value activates a threshold rule, or is
+        a bad event for a burn-rate rule.
+    clear_below: float | None
+        A firing threshold rule clears only when a sample is strictly below
+        this value; None means ``fire_above``. A pending rule resets as soon
+        as a sample is at or below ``fire_above``.
+    for_seconds: float
+        How long the rule must stay active before it fires.
+    windows: Tuple[Window, ...]
+        ``(long seconds, short seconds, burn factor)`` pairs. When given the
+        rule is a burn-rate rule.
+    objective: float
+        Burn-rate rules: target fraction of samples at or below ``fire_above``.
+    severity: str
+        Passed through to events.
+    labels: Labels
+        Label pairs a series must carry, e.g. ``(("job", "node"),)``.
+    """
+
+    name: str
+    metric: str
+    fire_above: float
+    clear_below: float | None = None
+    for_seconds: float = 0.0
+    windows: Tuple[Window, ...] = ()
+    objective: float = 0.99
+    severity: str = "warning"
+    labels: Labels = ()
+
+
+class AlertEvent(NamedTuple):
+    """A state change (or, from :meth:`AlertEvaluator.firing`, a firing alert).
+
+    ``state`` is ``pending``, ``firing`` or ``resolved``; ``ts`` is when the
+    change happened (for firing alerts: since when the rule has been active).
+    """
+
+    rule: str
+    series: str
+    state: str
+    value: float
+    ts: float
+    severity: str = "warning"
+
+
+DEFAULT_ALERT_RULES: Tuple[AlertRule, ...] = (
+    AlertRule("cpu-high", "cpu", 90.0, clear_below=80.0, for_seconds=300.0),
+    AlertRule("memory-high", "memory", 90.0, clear_below=80.0, for_seconds=300.0),
+    AlertRule("cpu-saturation-burn", "cpu", 90.0, windows=((3600.0, 300.0, 14.4), (21600.0, 1800.0, 6.0)),
+              objective=0.99, severity="critical"),
+)
+
+
+def load_alert_rules(path: str | Path) -> List[AlertRule]:
+    """Load alert rules from a JSON list of objects with `AlertRule` fields.
+
+    ``labels`` may be given as an object and ``windows`` as lists, e.g.
+    ``{"name": "cpu", "metric": "cpu", "fire_above": 90, "for_seconds": 300}``.
+    """
+    rows = json.loads(Path(path).read_text(encoding="utf-8"))
+    rules = []
+    for row in rows:
+        labels = tuple(sorted(dict(row.get("labels") or {}).items()))
+        windows = tuple(tuple(float(x) for x in w) for w in row.get("windows") or ())
+        rules.append(AlertRule(**{**row, "labels": labels, "windows": windows}))
+    return rules
+
+
+def _grow(array: np.ndarray, rows: int, fill: Any) -> np.ndarray:
+    """Return ``array`` with at least ``rows`` rows, doubling its capacity."""
+    if len(array) >= rows:
+        return array
+    grown = np.full((max(64, 1 << (rows - 1).bit_length()),) + array.shape[1:], fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class _StateMachine:
+    """``inactive -> pending -> firing`` state of (series x rules) cells."""
+
+    def __init__(self, for_seconds: Sequence[float]) -> None:
+        self.for_seconds = np.asarray(for_seconds, dtype=np.float64)
+        self.state = np.zeros((0, len(self.for_seconds)), dtype=np.int8)
+        self.since = np.zeros((0, len(self.for_seconds)))
+
+    def ensure(self, rows: int) -> None:
+        """Grow the state arrays to hold at least ``rows`` series, new ones inactive."""
+        self.state = _grow(self.state, rows, INACTIVE)
+        self.since = _grow(self.since, rows, 0.0)
+
+    def step(self, rows: np.ndarray, enter: np.ndarray, stay: np.ndarray, now: float) -> Tuple[np.ndarray, ...]:
+        """Apply one observation; return (became pending, became firing, resolved) masks.
+
+        ``enter`` starts (and keeps) a pending cell; only a firing cell is
+        held by ``stay``.
+        """
+        state, since = self.state[rows], self.since[rows]
+        active = state != INACTIVE
+        started = ~active & enter
+        resolved = (state == FIRING) & ~stay
+        left = ((state == PENDING) & ~enter) | resolved
+        state[left] = INACTIVE
+        state[started] = PENDING
+        since[started] = now
+        promoted = (state == PENDING) & (now - since >= self.for_seconds)
+        state[promoted] = FIRING
+        self.state[rows], self.since[rows] = state, since
+        return started & ~promoted, promoted, resolved
+
+    def expire(self, rows: np.ndarray) -> np.ndarray:
+        """Reset ``rows`` to inactive; return the mask of cells that were firing."""
+        resolved = self.state[rows] == FIRING
+        self.state[rows] = INACTIVE
+        return resolved
+
+
+class _BurnRate:
+    """Ring buffers of bad/total sample counts and running sums per window."""
+
+    def __init__(self, rule: AlertRule, resolution: float) -> None:
+        self.rule = rule
+        lengths = sorted({max(1, math.ceil(w / resolution)) for pair in rule.windows for w in pair[:2]})
+        self.slots = {n: i for i, n in enumerate(lengths)}
+        self.size = lengths[-1]
+        self.lengths = np.asarray(lengths)
+        self.pairs = [
+            (self.slots[max(1, math.ceil(long / resolution))], self.slots[max(1, math.ceil(short / resolution))], factor)
+            for long, short, factor in rule.windows
+        ]
+        self.budget = max(1.0 - rule.objective, 1e-12)
+        # Per-bucket counts (a bucket holds one or a few scrapes) stay small.
+        self.bad = np.zeros((0, self.size), dtype=np.uint16)
+        self.total = np.zeros((0, self.size), dtype=np.uint16)
+        self.bad_sums = np.zeros((0, len(lengths)), dtype=np.int64)
+        self.total_sums = np.zeros((0, len(lengths)), dtype=np.int64)
+        # Bucket of each row's first sample since its windows were last empty (-1: none).
+        self.first = np.zeros(0, dtype=np.int64)
+        self.bucket: int | None = None
+        self.machine = _StateMachine([rule.for_seconds])
+
+    def ensure(self, rows: int) -> None:
+        """Grow the buffers to hold at least ``rows`` series, new ones empty."""
+        self.bad, self.total = _grow(self.bad, rows, 0), _grow(self.total, rows, 0)
+        self.bad_sums, self.total_sums = _grow(self.bad_sums, rows, 0), _grow(self.total_sums, rows, 0)
+        self.first = _grow(self.first, rows, -1)
+        self.machine.ensure(rows)
+
+    def advance(self, bucket: int) -> None:
+        """Slide every window forward to ``bucket``, dropping buckets that leave them."""
+        if self.bucket is None or bucket - self.bucket >= self.size:
+            for array in (self.bad, self.total, self.bad_sums, self.total_sums):
+                array[:] = 0
+            self.first[:] = -1
+        else:
+            for step in range(self.bucket + 1, bucket + 1):
+                leaving = (step - self.lengths) % self.size
+                self.bad_sums -= self.bad[:, leaving]
+                self.total_sums -= self.total[:, leaving]
+                self.bad[:, step % self.size] = 0
+                self.total[:, step % self.size] = 0
+        self.bucket = bucket if self.bucket is None else max(self.bucket, bucket)
+
+    def observe(self, rows: np.ndarray, values: np.ndarray, counts: np.ndarray) -> None:
+        """Count samples into the current bucket; ``counts`` is samples per row."""
+        n = len(counts)
+        bad = np.bincount(rows, weights=values > self.rule.fire_above, minlength=n).astype(np.int64)
+        pos = self.bucket % self.size
+        self.bad[:n, pos] += bad.astype(np.uint16)
+        self.total[:n, pos] += counts.astype(np.uint16)
+        self.bad_sums[:n] += bad[:, None]
+        self.total_sums[:n] += counts[:, None]
+        first = self.first[:n]
+        first[(counts > 0) & (first < 0)] = self.bucket
+
+    def forget(self, rows: np.ndarray) -> None:
+        """Empty the windows of ``rows``, so their condition clears on the next step."""
+        for array in (self.bad, self.total, self.bad_sums, self.total_sums):
+            array[rows] = 0
+        self.first[rows] = -1
+
+    def condition(self, n: int) -> np.ndarray:
+        """Rows whose bad ratio exceeds the burn factor over both windows of a pair.
+
+        A window only counts once the row has been observed for its whole
+        length; otherwise the first few samples of a new series would stand
+        for the entire window.
+        """
+        ratio = self.bad_sums[:n] / np.maximum(self.total_sums[:n], 1) / self.budget
+        first = self.first[:n]
+        age = np.where(first >= 0, self.bucket - first + 1, 0)
+        filled = age[:, None] >= self.lengths
+        hot = np.zeros(n, dtype=bool)
+        for long, short, factor in self.pairs:
+            hot |= filled[:, long] & (ratio[:, long] >= factor) & (ratio[:, short] >= factor)
+        return hot
+
+
+class _RuleGroup:
+    """Rules sharing one metric and label matchers, over the series they select."""
+
+    def __init__(self, metric: str, labels: Labels, rules: List[AlertRule], resolution: float,
+                 stale_after: int) -> None:
+        self.metric = metric
+        self.stale_after = int(stale_after)
+        self.labels = dict(labels)
+        self.threshold_rules = [r for r in rules if not r.windows]
+        self.burn_rules = [_BurnRate(r, resolution) for r in rules if r.windows]
+        self.fire = np.asarray([r.fire_above for r in self.threshold_rules], dtype=np.float64)
+        self.clear = np.asarray(
+            [r.fire_above if r.clear_below is None else r.clear_below for r in self.threshold_rules], dtype=np.float64
+        )
+        self.machine = _StateMachine([r.for_seconds for r in self.threshold_rules])
+        self.ids: List[int] = []
+        self.table = np.full(0, -1, dtype=np.int64)  # registry id -> row, -1 unseen, -2 not matching
+        self.values = np.zeros(0)
+        self.last_seen = np.zeros(0, dtype=np.int64)  # bucket of each row's latest sample
+        self.live = np.zeros(0, dtype=bool)  # False once a row has been expired
+
+    def rows(self, registry: SeriesRegistry, ids: np.ndarray) -> np.ndarray:
+        """Rows of ``ids`` (-2 where a series does not match), adding unseen series."""
+        if len(self.table) < len(registry):
+            self.table = _grow(self.table, len(registry), -1)
+        rows = self.table[ids]
+        unseen = rows == -1
+        if unseen.any():
+            for sid in np.unique(ids[unseen]).tolist():
+                labels = registry.labels(sid)
+                if all(labels.get(k) == v for k, v in self.labels.items()):
+                    self.table[sid] = len(self.ids)
+                    self.ids.append(sid)
+                else:
+                    self.table[sid] = -2
+            n = len(self.ids)
+            self.values = _grow(self.values, n, np.nan)
+            self.last_seen = _grow(self.last_seen, n, 0)
+            self.live = _grow(self.live, n, False)
+            self.machine.ensure(n)
+            for burn in self.burn_rules:
+                burn.ensure(n)
+            rows = self.table[ids]
+        return rows
+
+    def update(self, registry: SeriesRegistry, ids: np.ndarray, values: np.ndarray, now: float,
+               bucket: int) -> List[AlertEvent]:
+        """Fold the samples of ``ids`` matching this group in; return the state changes.
+
+        Series last seen more than ``stale_after`` buckets before ``bucket``
+        are expired first.
+        """
+        rows = self.rows(registry, ids) if len(ids) else np.empty(0, dtype=np.int64)
+        keep = rows >= 0
+        rows, values = rows[keep], values[keep]
+        self.values[rows] = values
+        self.last_seen[rows] = bucket
+        self.live[rows] = True
+        events = self._expire(registry, bucket, now)
+        if self.threshold_rules and len(rows):
+            enter = values[:, None] > self.fire
+            stay = values[:, None] >= self.clear
+            changes = self.machine.step(rows, enter, stay, now)
+            events.extend(self._events(registry, rows, self.threshold_rules, changes, now))
+        n = len(self.ids)
+        counts = np.bincount(rows, minlength=n) if self.burn_rules and len(rows) else None
+        for burn in self.burn_rules:
+            burn.advance(bucket)
+            if counts is not None:
+                burn.observe(rows, values, counts)
+            all_rows = np.arange(n)
+            hot = burn.condition(n)[:, None]
+            changes = burn.machine.step(all_rows, hot, hot, now)
+            events.extend(self._events(registry, all_rows, [burn.rule], changes, now))
+        return events
+
+    def _expire(self, registry: SeriesRegistry, bucket: int, now: float) -> List[AlertEvent]:
+        """Reset series without a sample for more than ``stale_after`` buckets; resolve their alerts."""
+        n = len(self.ids)
+        stale = np.flatnonzero(self.live[:n] & (self.last_seen[:n] < bucket - self.stale_after))
+        if not len(stale):
+            return []
+        self.live[stale] = False
+        none = np.zeros((len(stale), len(self.threshold_rules)), dtype=bool)
+        resolved = self.machine.expire(stale)
+        events = self._events(registry, stale, self.threshold_rules, (none, none, resolved), now)
+        for burn in self.burn_rules:
+            burn.forget(stale)  # resolved by this update's burn step
+        return events
+
+    def _events(self, registry: SeriesRegistry, rows: np.ndarray, rules: List[AlertRule],
+                changes: Tuple[np.ndarray, ...], now: float) -> List[AlertEvent]:
+        """Turn (pending, firing, resolved) masks over ``rows x rules`` into events, counting transitions."""
+        events: List[AlertEvent] = []
+        for state, mask in zip(("pending", "firing", "resolved"), changes):
+            hit, cols = np.nonzero(mask)
+            if not len(hit):
+                continue
+            counts = np.bincount(cols, minlength=len(rules))
+            for c in np.flatnonzero(counts).tolist():
+                ALERT_TRANSITIONS.labels(rule=rules[c].name, state=state).inc(int(counts[c]))
+            hit = rows[hit]
+            keys = [registry.key(self.ids[row]) for row in hit.tolist()]
+            events.extend(
+                AlertEvent(rules[c].name, key, state, value, now, rules[c].severity)
+                for c, key, value in zip(cols.tolist(), keys, self.values[hit].tolist())
+            )
+        return events
+
+    def firing(self, registry: SeriesRegistry) -> List[AlertEvent]:
+        """Every firing ``(rule, series)`` pair of this group."""
+        out = []
+        n = len(self.ids)
+        machines = [(self.machine, self.threshold_rules)] + [(b.machine, [b.rule]) for b in self.burn_rules]
+        for machine, rules in machines:
+            for row, c in zip(*np.nonzero(machine.state[:n] == FIRING)):
+                rule = rules[c]
+                out.append(AlertEvent(rule.name, registry.key(self.ids[row]), "firing",
+                                      float(self.values[row]), float(machine.since[row, c]), rule.severity))
+        return out
+
+
+class AlertEvaluator:
+    """Evaluate alert rules incrementally over `series.SeriesBatch` updates.
+
+    Parameters
+    ----------
+    rules: Iterable[AlertRule]
+        Rule table (defaults to `DEFAULT_ALERT_RULES`).
+    resolution: float
+        Bucket width in seconds of the burn-rate ring buffers; normally the
+        scrape interval.
+    registry: SeriesRegistry | None
+        Registry of the batches fed to :meth:`update`; defaults to the
+        process-wide one.
+    stale_after: int
+        Number of ``resolution`` intervals a series may go without a sample
+        before it is expired and its firing alerts resolve.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[AlertRule] = DEFAULT_ALERT_RULES,
+        resolution: float = 15.0,
+        registry: SeriesRegistry | None = None,
+        stale_after: int = 5,
+    ) -> None:
+        if resolution <= 0:
+            raise ValueError("resolution must be positive")
+        if stale_after < 0:
+            raise ValueError("stale_after must not be negative")
+        self.rules = list(rules)
+        self.resolution = float(resolution)
+        self.registry = get_registry() if registry is None else registry
+        grouped: Dict[Tuple[str, Labels], List[AlertRule]] = {}
+        for rule in self.rules:
+            for long, short, factor in rule.windows:
+                if long < short or factor <= 0:
+                    raise ValueError(f"rule {rule.name!r}: windows must be (long, short, factor > 0)")
+            grouped.setdefault((rule.metric, tuple(sorted(rule.labels))), []).append(rule)
+        self._groups = [
+            _RuleGroup(metric, labels, rules, self.resolution, stale_after) for (metric, labels), rules in grouped.items()
+        ]
+        self._by_metric: Dict[str, List[_RuleGroup]] = {}
+        for group in self._groups:
+            self._by_metric.setdefault(group.metric, []).append(group)
+
+    def update(self, batch: SeriesBatch, now: float | None = None) -> List[AlertEvent]:
+        """Fold one tick of samples into every rule; return the state changes.
+
+        ``now`` defaults to the newest sample timestamp. Burn-rate windows
+        slide on every update, also for series without a sample this tick,
+        and every group expires its stale series.
+        """
+        if batch.registry is not self.registry:
+            raise ValueError("batch belongs to a different registry")
+        if now is None:
+            if not len(batch):
+                return []
+            now = float(batch.ts.max())
+        bucket = int(now // self.resolution)
+        codes = self.registry.metric_codes(batch.ids)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.flatnonzero(np.diff(codes[order])) + 1
+        events: List[AlertEvent] = []
+        seen = set()
+        for part in np.split(order, bounds) if len(order) else ():
+            metric = self.registry.metric_names[int(codes[part[0]])]
+            for group in self._by_metric.get(metric, ()):
+                events.extend(group.update(self.registry, batch.ids[part], batch.values[part], now, bucket))
+                seen.add(id(group))
+        empty_ids, empty_values = np.empty(0, dtype=np.int64), np.empty(0)
+        for group in self._groups:
+            if id(group) not in seen:
+                events.extend(group.update(self.registry, empty_ids, empty_values, now, bucket))
+        return events
+
+    def update_frame(self, frame: SampleFrame, label: str = "host", ts: float | None = None) -> List[AlertEvent]:
+        """:meth:`update` with the present cells of a frame, one row per ``label`` value."""
+        stamp = frame.ts if ts is None else ts
+        if stamp is None:
+            raise ValueError("frame has no timestamp")
+        return self.update(SeriesBatch.from_frame(frame, self.registry, label=label, ts=stamp), now=stamp)
+
+    def firing(self) -> List[AlertEvent]:
+        """Every firing ``(rule, series)`` pair; ``ts`` is when it became active."""
+        return [event for group in self._groups for event in group.firing(self.registry)]
+
+    def firing_by(self, label: str = "host") -> Dict[str, List[str]]:
+        """Metrics with a firing alert, per value of ``label``: ``{host: [metric, ...]}``."""
+        out: Dict[str, set] = {}
+        for event in self.firing():
+            sid = self.registry.id_for_key(event.series)
+            labels = self.registry.labels(sid)
+            if label in labels:
+                out.setdefault(labels[label], set()).add(self.registry.metric(sid))
+        return {key: sorted(metrics) for key, metrics in out.items()}
@@ -1,8 +1,126 @@
 from __future__ import annotations
 
-from typing import Dict, Any
+from typing import Any, Dict, Mapping, NamedTuple, Sequence
 import json
 import time
+import uuid
+
+import numpy as np
+
+from instrumentation import record_s3_upload
+from samples import SampleFrame
+from series import SeriesBatch
+
+
+DEFAULT_THRESHOLDS: Dict[str, float] = {"cpu": 90.0, "memory": 90.0}
+
+
+class BatchAnomalyResult(NamedTuple):
+    """Result of :func:`detect_anomalies_batch`.
+
+    Attributes
+    ----------
+    mask: np.ndarray
+        Boolean vector of shape ``(n_hosts,)``; True where any metric tripped.
+    tripped: np.ndarray
+        Integer vector of shape ``(n_hosts,)`` holding the column index of the
+        first metric (in column order) that exceeded its threshold, or -1.
+    exceeded: np.ndarray
+        Boolean matrix of shape ``(n_hosts, n_metrics)`` with per-cell verdicts.
+    columns: tuple[str, ...]
+        Column names, so ``columns[tripped[i]]`` names the offending metric.
+    """
+
+    mask: np.ndarray
+    tripped: np.ndarray
+    exceeded: np.ndarray
+    columns: tuple[str, ...]
+
+
+def _threshold_vector(
+    columns: Sequence[str],
+    thresholds: Mapping[str, float] | None,
+    default_threshold: float | None,
+) -> np.ndarray:
+    """Build a per-column threshold vector; unchecked columns get +inf."""
+    limits = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    fallback = np.inf if default_threshold is None else float(default_threshold)
+    return np.fromiter(
+        (float(limits.get(name, fallback)) for name in columns),
+        dtype=np.float64,
+        count=len(columns),
+    )
+
+
+def detect_anomalies_batch(
+    values: Any,
+    columns: Sequence[str],
+    thresholds: Mapping[str, float] | None = None,
+    default_threshold: float | None = None,
+) -> BatchAnomalyResult:
+    """Score a hosts x metrics matrix against per-metric thresholds in one pass.
+
+    A cell is anomalous when its value is strictly greater than the threshold
+    of its column. NaN cells (missing samples) never trip.
+
+    Parameters
+    ----------
+    values: array-like
+        2-D array of shape ``(n_hosts, n_metrics)``; one row per host.
+    columns: Sequence[str]
+        Metric name for each column of ``values``.
+    thresholds: Mapping[str, float] | None
+        Per-metric thresholds. Defaults to :data:`DEFAULT_THRESHOLDS`.
+    default_threshold: float | None
+        Threshold for columns absent from ``thresholds``. When None, such
+        columns are carried along but never evaluated.
+
+    Returns
+    -------
+    BatchAnomalyResult
+        Host mask, index of the tripping metric per host and the full
+        per-cell verdict matrix.
+    """
+    matrix = np.asarray(values, dtype=np.float64)
+    if matrix.ndim != 2 or matrix.shape[1] != len(columns):
+        raise ValueError(
+            f"values must have shape (n_hosts, {len(columns)}), got {matrix.shape}"
+        )
+
+    limits = _threshold_vector(columns, thresholds, default_threshold)
+    exceeded = matrix > limits
+    mask = exceeded.any(axis=1)
+    tripped = np.where(mask, exceeded.argmax(axis=1), -1)
+    return BatchAnomalyResult(mask, tripped, exceeded, tuple(columns))
+
+
+def detect_frame(
+    frame: SampleFrame,
+    thresholds: Mapping[str, float] | None = None,
+    default_threshold: float | None = None,
+) -> BatchAnomalyResult:
+    """:func:`detect_anomalies_batch` over a `samples.SampleFrame`, without copying it."""
+    return detect_anomalies_batch(frame.to_numpy(), frame.columns, thresholds, default_threshold)
+
+
+def detect_batch(
+    batch: SeriesBatch,
+    thresholds: Mapping[str, float] | None = None,
+    default_threshold: float | None = None,
+) -> np.ndarray:
+    """Per-sample verdicts for a `series.SeriesBatch`, by the rule of :func:`detect_anomalies_batch`.
+
+    Thresholds are resolved once per metric name in the batch registry and
+    gathered by metric code, so the cost does not depend on label sets.
+
+    Returns
+    -------
+    np.ndarray
+        Boolean vector aligned with ``batch.values``; use ``batch.select`` to
+        keep the anomalous samples.
+    """
+    limits = _threshold_vector(batch.registry.metric_names, thresholds, default_threshold)
+    return batch.values > limits[batch.registry.metric_codes(batch.ids)]
 
 
 def detect_anomaly(metrics: Dict[str, Any]) -> bool:
@@ -12,6 +130,8 @@ def detect_anomaly(metrics: Dict[str, Any]) -> bool:
     - metrics["cpu"]
     - metrics["memory"]
 
+    This is a single-row wrapper around :func:`detect_anomalies_batch`.
+
     Parameters
     ----------
     metrics: Dict[str, Any]
@@ -22,15 +142,31 @@ def detect_anomaly(metrics: Dict[str, Any]) -> bool:
     bool
         True if an anomaly is detected, otherwise False.
     """
-    cpu_value = float(metrics.get("cpu", 0))
-    mem_value = float(metrics.get("memory", 0))
-    return cpu_value > 90 or mem_value > 90
+    row = [[float(metrics.get("cpu", 0)), float(metrics.get("memory", 0))]]
+    return bool(detect_anomalies_batch(row, ("cpu", "memory")).mask[0])
+
+
+def anomalous_metrics(metrics: Dict[str, Any], thresholds: Mapping[str, float] | None = None) -> list[str]:
+    """Return the names of the metrics in ``metrics`` that exceed their threshold.
+
+    Uses the same rule as :func:`detect_anomaly`; only metrics that have a
+    threshold are checked.
+    """
+    limits = DEFAULT_THRESHOLDS if thresholds is None else thresholds
+    names = tuple(name for name in limits if name in metrics)
+    if not names:
+        return []
+    row = [[float(metrics[name]) for name in names]]
+    exceeded = detect_anomalies_batch(row, names, limits).exceeded[0]
+    return [name for name, flag in zip(names, exceeded) if flag]
 
 
 def log_anomaly_to_s3(metrics: Dict[str, Any], bucket_name: str, s3_client: Any) -> str:
     """Log the provided metrics payload to S3 as a JSON object.
 
-    The S3 object key is generated using the current epoch milliseconds for uniqueness.
+    The S3 object key combines the current epoch milliseconds with a random
+    suffix, so events logged within the same millisecond do not collide. For
+    high event rates use `s3_shipper.S3LogShipper`, which batches uploads.
 
     Parameters
     ----------
@@ -46,9 +182,15 @@ def log_anomaly_to_s3(metrics: Dict[str, Any], bucket_name: str, s3_client: Any)
     str
         The S3 object key used for the upload.
     """
-    object_key = f"anomalies/metrics-{int(time.time() * 1000)}.json"
+    object_key = f"anomalies/metrics-{int(time.time() * 1000)}-{uuid.uuid4().hex[:12]}.json"
     body = json.dumps(metrics).encode("utf-8")
-    s3_client.put_object(Bucket=bucket_name, Key=object_key, Body=body)
+    started = time.perf_counter()
+    try:
+        s3_client.put_object(Bucket=bucket_name, Key=object_key, Body=body)
+    except Exception:
+        record_s3_upload("anomaly", 1, time.perf_counter() - started, ok=False)
+        raise
+    record_s3_upload("anomaly", 1, time.perf_counter() - started, ok=True)
     return object_key
 
 
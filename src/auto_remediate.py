@@ -2,6 +2,9 @@ from __future__ import annotations
 
 from typing import Any
 import time
+import uuid
+
+from instrumentation import record_s3_upload
 
 
 def remediate_action(issue: str) -> str:
@@ -23,8 +26,9 @@ def remediate_action(issue: str) -> str:
 def log_remediation_to_s3(action: str, bucket_name: str, s3_client: Any) -> str:
     """Log the provided remediation action string to S3.
 
-    The S3 object key is generated using epoch milliseconds for uniqueness under
-    the `remediations/` prefix.
+    The S3 object key combines epoch milliseconds with a random suffix under
+    the `remediations/` prefix, so actions logged within the same millisecond
+    do not collide. For high event rates use `s3_shipper.S3LogShipper`.
 
     Parameters
     ----------
@@ -40,8 +44,14 @@ def log_remediation_to_s3(action: str, bucket_name: str, s3_client: Any) -> str:
     str
         The S3 object key used for the upload.
     """
-    object_key = f"remediations/action-{int(time.time() * 1000)}.txt"
-    s3_client.put_object(Bucket=bucket_name, Key=object_key, Body=action.encode("utf-8"))
+    object_key = f"remediations/action-{int(time.time() * 1000)}-{uuid.uuid4().hex[:12]}.txt"
+    started = time.perf_counter()
+    try:
+        s3_client.put_object(Bucket=bucket_name, Key=object_key, Body=action.encode("utf-8"))
+    except Exception:
+        record_s3_upload("remediation", 1, time.perf_counter() - started, ok=False)
+        raise
+    record_s3_upload("remediation", 1, time.perf_counter() - started, ok=True)
     return object_key
 
 
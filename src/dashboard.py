@@ -1,74 +1,475 @@
 from __future__ import annotations
 
+from collections import deque
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Deque, Dict, Iterator, Set, Tuple
 import json
+import math
+import os
+import threading
+import time
 
-from flask import Flask, jsonify, Response
-from prometheus_client import (
-    CONTENT_TYPE_LATEST,
-    CollectorRegistry,
-    Gauge,
-    generate_latest,
-)
+import numpy as np
+from flask import Flask, jsonify, Response, request
+from prometheus_client import CONTENT_TYPE_LATEST
 
-from anomaly_detection import detect_anomaly
+from anomaly_detection import detect_anomaly, detect_frame
+from metric_store import AGGREGATIONS, MetricStore
+from monitor import DEFAULT_METRICS, DEFAULT_POINTS, get_latest_frame, get_series
+from instrumentation import STREAM_CLIENTS, STREAM_FRAMES, record_cache, render_latest
+from targets import get_target_index
 
 
 app = Flask(__name__)
 
+METRICS_PATH = Path("data/metrics.json")
+TARGETS_PATH = Path("config/aws_targets.json")
+STORE_PATH = Path("data/store")
+# Longest window `/api/series` accepts, and its hard cap on points per series.
+MAX_SERIES_WINDOW = 90 * 86400.0
+MAX_SERIES_POINTS = 5000
+# Concurrent /stream clients per process; config/gunicorn.conf.py lowers it
+# to fit the worker's request threads.
+STREAM_MAX_CLIENTS = int(os.environ.get("DASHBOARD_STREAM_CLIENTS", 256))
+
+
+class _CachedJSONView:
+    """Serve a JSON file-derived payload, rebuilt only when the file changes.
+
+    The file is identified by ``(mtime_ns, size)``. While that signature is
+    unchanged, requests reuse the parsed payload and its pre-serialized
+    response body; the signature itself is re-checked at most once per
+    ``check_interval`` seconds, so a burst of polls costs no file I/O at all.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        path: Path,
+        build: Callable[[Any], Dict[str, Any]],
+        check_interval: float = 0.25,
+    ) -> None:
+        self.name = name
+        self.path = path
+        self.build = build
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._signature: Tuple[int, int] | None = None
+        self._checked_at = float("-inf")
+        self._entry: Tuple[Dict[str, Any], bytes, str] | None = None
+
+    def _stat(self) -> Tuple[int, int] | None:
+        """``(mtime_ns, size)`` of the file, or None if it cannot be stat'ed."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def get(self) -> Tuple[Dict[str, Any], bytes, str]:
+        """Return ``(payload, serialized body, etag)`` for the current file."""
+        now = time.monotonic()
+        entry = self._entry
+        if entry is not None and now - self._checked_at < self.check_interval:
+            self.hits += 1
+            record_cache(self.name, hit=True)
+            return entry
+        with self._lock:
+            signature = self._stat()
+            self._checked_at = now
+            if self._entry is not None and signature == self._signature:
+                self.hits += 1
+                record_cache(self.name, hit=True)
+                return self._entry
+            self.misses += 1
+            record_cache(self.name, hit=False)
+            data: Any = None
+            if signature is not None:
+                try:
+                    data = json.loads(Path(self.path).read_text(encoding="utf-8"))
+                except Exception:
+                    data = None
+            payload = self.build(data)
+            body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            etag = f"{signature[0]:x}-{signature[1]:x}" if signature else "missing"
+            self._entry = (payload, body, etag)
+            self._signature = signature
+            return self._entry
+
+    def response(self) -> Response:
+        """Build a JSON response, answering conditional GETs with 304."""
+        _, body, etag = self.get()
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            resp = Response(body, mimetype="application/json")
+        resp.set_etag(etag)
+        return resp
+
+
+def _index_payload(data: Any) -> Dict[str, Any]:
+    """Build the ``/`` payload: the snapshot metrics and their anomaly verdict."""
+    metrics = data if isinstance(data, dict) else {}
+    anomaly = False
+    if metrics:
+        anomaly = detect_anomaly(metrics)
+    return {"metrics": metrics, "anomaly": anomaly}
+
+
+class _TargetsView(_CachedJSONView):
+    """Target addresses per kind, served from the shared `targets.TargetIndex`.
+
+    The index already re-reads the file only when it changes; this view
+    re-serializes only when the index content changes. The ETag is derived
+    from the index digest, so it is the same in every worker process.
+    """
+
+    def __init__(self, name: str, path: Path) -> None:
+        super().__init__(name, path, lambda data: data)
+        self._digest: str | None = None
+
+    def get(self) -> Tuple[Dict[str, Any], bytes, str]:
+        """Return ``(payload, serialized body, etag)``, re-serializing only when the index changed."""
+        index = get_target_index(self.path)
+        entry = self._entry
+        if entry is not None and index.digest == self._digest:
+            self.hits += 1
+            record_cache(self.name, hit=True)
+            return entry
+        with self._lock:
+            self.misses += 1
+            record_cache(self.name, hit=False)
+            payload = index.addresses_by_kind()
+            body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+            self._entry = (payload, body, f"targets-{index.digest[:16]}")
+            self._digest = index.digest
+            return self._entry
+
+
+_index_view = _CachedJSONView("dashboard_metrics", METRICS_PATH, _index_payload)
+_aws_health_view = _TargetsView("dashboard_targets", TARGETS_PATH)
+
+
+class StreamFull(RuntimeError):
+    """Raised by :meth:`_Broadcaster.subscribe` when the connection cap is reached."""
+
+
+class _Subscriber:
+    """One connected stream client: a small latest-wins frame buffer."""
+
+    def __init__(self, maxlen: int) -> None:
+        self.frames: Deque[bytes] = deque(maxlen=maxlen)
+        self.ready = threading.Condition()
+        self.dropped = 0
+
+    def offer(self, frame: bytes) -> None:
+        """Queue ``frame``, dropping the oldest buffered frame if full, and wake the client."""
+        with self.ready:
+            if len(self.frames) == self.frames.maxlen:
+                # Snapshots are full state: a slow client skips to the newest.
+                self.dropped += 1
+                STREAM_FRAMES.labels(outcome="dropped").inc()
+            self.frames.append(frame)
+            self.ready.notify()
+
+    def next(self, timeout: float) -> bytes | None:
+        """Return the oldest buffered frame, waiting up to ``timeout`` seconds; None on timeout."""
+        with self.ready:
+            if not self.frames:
+                self.ready.wait(timeout)
+            return self.frames.popleft() if self.frames else None
+
+
+class _Broadcaster:
+    """Single producer fanning one serialized SSE frame out to every client.
+
+    A daemon thread polls ``source`` (the change-aware `_index_view`, so a
+    poll is a cached lookup) every ``poll_interval`` seconds. When the etag
+    changes, the ``event: snapshot`` frame is encoded once and the same bytes
+    are offered to all subscribers. Each subscriber buffers at most
+    ``queue_size`` frames; when it is full the oldest frame is discarded, so a
+    slow client never blocks the producer or other clients.
+
+    Parameters
+    ----------
+    source: Callable[[], Tuple[Dict[str, Any], bytes, str]]
+        Returns ``(payload, serialized body, etag)``.
+    poll_interval: float
+        Seconds between checks for a new snapshot.
+    max_clients: int
+        Connection cap; further subscribers get :class:`StreamFull`.
+    queue_size: int
+        Frames buffered per client.
+    heartbeat: float
+        Seconds of silence after which a comment frame is sent, keeping
+        proxies from closing the connection and surfacing dead clients.
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], Tuple[Dict[str, Any], bytes, str]],
+        poll_interval: float = 0.2,
+        max_clients: int = 256,
+        queue_size: int = 4,
+        heartbeat: float = 15.0,
+    ) -> None:
+        self.source = source
+        self.poll_interval = poll_interval
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.published = 0
+        self._lock = threading.Lock()
+        self._subscribers: Set[_Subscriber] = set()
+        self._frame: bytes | None = None
+        self._etag: str | None = None
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def encode(body: bytes, etag: str) -> bytes:
+        """Serialize a snapshot body as one SSE ``snapshot`` event with ``etag`` as its id."""
+        return b"id: " + etag.encode("ascii") + b"\nevent: snapshot\ndata: " + body + b"\n\n"
+
+    def poll(self) -> bool:
+        """Check the source once and publish a frame if it changed."""
+        _, body, etag = self.source()
+        if etag == self._etag:
+            return False
+        frame = self.encode(body, etag)
+        with self._lock:
+            self._frame, self._etag = frame, etag
+            subscribers = list(self._subscribers)
+        self.published += 1
+        for subscriber in subscribers:
+            subscriber.offer(frame)
+        STREAM_FRAMES.labels(outcome="sent").inc(len(subscribers))
+        return True
+
+    def _run(self) -> None:
+        """Producer loop: poll every ``poll_interval`` seconds until stopped, logging failures."""
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                app.logger.exception("stream producer poll failed")
+
+    def _ensure_started(self) -> None:
+        """Start the producer thread if it is not running (called with the lock held)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="dashboard-stream", daemon=True)
+            self._thread.start()
+
+    def subscribe(self) -> Tuple[_Subscriber, bytes | None, str | None]:
+        """Register a client; return it with the current frame and its id."""
+        if self._etag is None:
+            self.poll()
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                raise StreamFull(f"stream connection limit ({self.max_clients}) reached")
+            subscriber = _Subscriber(self.queue_size)
+            self._subscribers.add(subscriber)
+            current, etag = self._frame, self._etag
+            self._ensure_started()
+        STREAM_CLIENTS.inc()
+        return subscriber, current, etag
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        """Remove ``subscriber``, releasing its connection slot; safe to call twice."""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+                STREAM_CLIENTS.dec()
+
+    @property
+    def clients(self) -> int:
+        """Number of connected stream clients."""
+        return len(self._subscribers)
+
+    def stop(self) -> None:
+        """Ask the producer thread to exit; the next subscriber restarts it."""
+        self._stop.set()
+
+    def stream(self, last_event_id: str | None = None) -> Iterator[bytes]:
+        """Yield SSE frames for one client until it disconnects."""
+        subscriber, current, etag = self.subscribe()
+        try:
+            yield b"retry: 2000\n\n"
+            if current is not None and etag != last_event_id:
+                yield current
+            while True:
+                frame = subscriber.next(self.heartbeat)
+                yield frame if frame is not None else b": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
+
+
+_stream = _Broadcaster(lambda: _index_view.get(), max_clients=STREAM_MAX_CLIENTS)
+
 
 def _load_metrics_default() -> Dict[str, Any]:
-    """Load metrics from the default Phase 1/2 path `data/metrics.json` if present."""
-    path = Path("data/metrics.json")
-    if not path.exists():
-        return {}
-    try:
-        return json.loads(path.read_text(encoding="utf-8"))
-    except Exception:
-        return {}
+    """Load metrics from the default Phase 1/2 path `data/metrics.json` if present.
+
+    Served from the change-aware cache; the file is only re-read after it changes.
+    """
+    return _index_view.get()[0]["metrics"]
 
 
 @app.get("/health")
 def health() -> Response:
+    """Liveness probe."""
     return jsonify({"status": "ok"})
 
 
 @app.get("/")
 def index() -> Response:
-    metrics = _load_metrics_default()
-    anomaly = False
-    if metrics:
-        anomaly = detect_anomaly(metrics)
-    return jsonify({"metrics": metrics, "anomaly": anomaly})
+    """Return the latest metrics snapshot and its anomaly verdict (ETag-cached)."""
+    return _index_view.response()
+
+
+@app.get("/stream")
+def stream() -> Response:
+    """Server-Sent Events: push each new metrics snapshot and anomaly verdict.
+
+    Clients receive the current snapshot immediately and then one
+    ``snapshot`` event per change. Reconnecting clients sending
+    ``Last-Event-ID`` skip a snapshot they already have.
+    """
+    broadcaster = _stream
+    try:
+        frames = broadcaster.stream(request.headers.get("Last-Event-ID"))
+        first = next(frames)  # subscribes now, so a full server answers 503
+    except StreamFull as exc:
+        resp = jsonify({"error": str(exc)})
+        resp.status_code = 503
+        resp.headers["Retry-After"] = "5"
+        return resp
+
+    def _frames() -> Iterator[bytes]:
+        """Yield the first frame, then the rest, closing the stream when the client goes."""
+        try:
+            yield first
+            yield from frames
+        finally:
+            frames.close()  # releases the connection slot on disconnect
+
+    resp = Response(_frames(), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+_store_lock = threading.Lock()
+_store: MetricStore | None = None
+
+
+def _open_store() -> MetricStore | None:
+    """Return a shared read-only handle on `STORE_PATH`, or None if it does not exist."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.root != STORE_PATH:
+            if not (STORE_PATH / "series.ndjson").exists():
+                return None
+            _store = MetricStore(STORE_PATH, readonly=True)
+        return _store
+
+
+_SERIES_PARAMS = {"metric", "start", "end", "step", "agg", "points"}
+
+
+@app.get("/api/series")
+def api_series() -> Response:
+    """Return one metric series over a time window, downsampled server-side.
+
+    Query parameters: ``metric`` (required), ``start``/``end`` (epoch seconds;
+    default the last hour), ``step`` (seconds; default chosen from
+    ``points``), ``agg`` (comma-separated from avg,min,max,sum,count,last,p95,
+    or ``lttb``), ``points`` (default 500). Any other parameter is a series
+    label, e.g. ``host=web-1``.
+    """
+    args = request.args
+    metric = args.get("metric")
+    if not metric:
+        return _bad_request("missing 'metric'")
+    try:
+        end = float(args["end"]) if "end" in args else time.time()
+        start = float(args["start"]) if "start" in args else end - 3600.0
+        step = float(args["step"]) if "step" in args else None
+        points = min(int(args.get("points", DEFAULT_POINTS)), MAX_SERIES_POINTS)
+    except ValueError:
+        return _bad_request("start, end, step and points must be numbers")
+    if not all(math.isfinite(v) for v in (start, end, step if step is not None else 0.0)):
+        return _bad_request("start, end, step and points must be finite")
+    aggs = [a for a in args.get("agg", "avg").split(",") if a]
+    if not aggs:
+        return _bad_request("empty 'agg'")
+    if aggs != ["lttb"] and any(a not in AGGREGATIONS for a in aggs):
+        return _bad_request(f"agg must be 'lttb' or a list of {','.join(AGGREGATIONS)}")
+    if not start < end or end - start > MAX_SERIES_WINDOW or points < 2:
+        return _bad_request("invalid window or points")
+    if step is not None and (step <= 0 or (end - start) / step > MAX_SERIES_POINTS):
+        return _bad_request(f"step must be positive and give at most {MAX_SERIES_POINTS} buckets")
+    labels = {k: v for k, v in args.items() if k not in _SERIES_PARAMS}
+
+    store = _open_store()
+    if store is None:
+        return jsonify({"series": metric, "timestamps": [], "values": {a: [] for a in aggs}})
+    return jsonify(get_series(store, metric, start, end, labels=labels, aggs=aggs, step=step, points=points))
+
+
+_LATEST_PARAMS = {"metric", "by"}
+
+
+@app.get("/api/latest")
+def api_latest() -> Response:
+    """Return the latest value of each metric for every host in the store.
+
+    Query parameters: ``metric`` (comma-separated; default cpu,memory) and
+    ``by`` (the label naming a row; default ``host``). Any other parameter
+    is a label matcher, e.g. ``job=node``. ``anomalies`` lists, per row, the
+    metrics above their threshold.
+    """
+    args = request.args
+    metrics = [m for m in args.get("metric", ",".join(DEFAULT_METRICS)).split(",") if m]
+    if not metrics:
+        return _bad_request("empty 'metric'")
+    by = args.get("by", "host")
+    matchers = {k: v for k, v in args.items() if k not in _LATEST_PARAMS}
+
+    store = _open_store()
+    if store is None:
+        return jsonify({"by": by, "columns": metrics, "ts": None, "hosts": {}, "anomalies": {}})
+    frame = get_latest_frame(store, metrics, matchers, by)
+    verdict = detect_frame(frame)
+    anomalies = {
+        frame.hosts[row]: [frame.columns[col] for col in np.flatnonzero(verdict.exceeded[row])]
+        for row in np.flatnonzero(verdict.mask)
+    }
+    return jsonify({"by": by, "columns": list(frame.columns), "ts": frame.ts, "hosts": frame.to_dict(), "anomalies": anomalies})
+
+
+def _bad_request(message: str) -> Response:
+    """JSON 400 response carrying ``message`` as its error."""
+    resp = jsonify({"error": message})
+    resp.status_code = 400
+    return resp
 
 
 @app.get("/metrics")
 def metrics_endpoint() -> Response:
-    # Expose at least one metric in a local registry so output contains HELP/TYPE
-    registry = CollectorRegistry()
-    app_info = Gauge("app_info", "Application info gauge", registry=registry)
-    app_info.set(1)
-    output = generate_latest(registry)
-    return Response(output, mimetype=CONTENT_TYPE_LATEST)
+    """Prometheus exposition of the process-wide registry."""
+    # The process-wide registry is built once at import; a scrape only serializes it
+    return Response(render_latest(), mimetype=CONTENT_TYPE_LATEST)
 
 
 @app.get("/aws-health")
 def aws_health() -> Response:
-    """Return a simple structure sourced from `config/aws_targets.json` if present."""
-    cfg_path = Path("config/aws_targets.json")
-    if not cfg_path.exists():
-        return jsonify({"app": [], "node_exporter": []})
-    try:
-        data = json.loads(cfg_path.read_text(encoding="utf-8"))
-        app_targets = data.get("app", [])
-        node_targets = data.get("node_exporter", [])
-        return jsonify({"app": app_targets, "node_exporter": node_targets})
-    except Exception:
-        return jsonify({"app": [], "node_exporter": []})
+    """Return the configured target addresses per kind (`config/aws_targets.json`)."""
+    return _aws_health_view.response()
 
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=False)
-
-
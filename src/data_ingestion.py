@@ -1,30 +1,139 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Dict
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Tuple
 import json
+import time
 
+import numpy as np
 
-def fetch_metrics(file_path: str | Path, live: bool = False) -> Dict[str, float]:
-    """Create synthetic metrics JSON (Phase 1).
+from metric_store import MetricStore
+from samples import SampleFrame
+from scraper import DEFAULT_TARGETS_PATH, Scraper, scrape_fleet
+from series import SeriesBatch, SeriesRegistry, get_registry
+from targets import write_if_changed
+
+if TYPE_CHECKING:
+    from ingest_wal import IngestWriter
+
+
+def fetch_metrics(
+    file_path: str | Path,
+    live: bool = False,
+    store: MetricStore | None = None,
+    targets_path: str | Path = DEFAULT_TARGETS_PATH,
+    scraper: Scraper | None = None,
+    writer: IngestWriter | None = None,
+) -> Dict[str, Any]:
+    """Create synthetic metrics JSON (Phase 1), or scrape live targets.
 
     Parameters
     ----------
     file_path: str | Path
         Output path for metrics JSON.
     live: bool
-        Reserved for future live mode (AWS/EC2). Ignored in Phase 1.
+        When True, scrape every `node_exporter` and `app` target listed in
+        `targets_path` concurrently instead of writing synthetic values.
+    store: MetricStore | None
+        Optional time-series store; when given, the samples are also appended
+        to its history in addition to the snapshot file. In live mode each
+        host is stored under its own ``host`` label.
+    targets_path: str | Path
+        Target list used in live mode.
+    scraper: Scraper | None
+        Scraper to use in live mode; defaults to the process-wide one.
+    writer: IngestWriter | None
+        Optional write-ahead writer (see `ingest_wal.IngestWriter`). When
+        given, samples and snapshot go through its group-committed log
+        instead, into the writer's own store and snapshot path; ``store``
+        and the file written are then the writer's concern.
+
+    Without a writer the snapshot is replaced atomically (temporary file +
+    rename), so concurrent readers never see a partial file.
 
     Returns
     -------
-    Dict[str, float]
-        Dictionary with at least keys `cpu` and `memory`.
+    Dict[str, Any]
+        Dictionary with at least keys `cpu` and `memory`. In live mode these
+        are the worst values across hosts, and `hosts`, `up` and `down`
+        describe the individual targets.
+    """
+    return fetch_samples(file_path, live=live, store=store, targets_path=targets_path, scraper=scraper, writer=writer)[0]
+
+
+def fetch_samples(
+    file_path: str | Path,
+    live: bool = False,
+    store: MetricStore | None = None,
+    targets_path: str | Path = DEFAULT_TARGETS_PATH,
+    scraper: Scraper | None = None,
+    writer: IngestWriter | None = None,
+) -> Tuple[Dict[str, Any], SampleFrame]:
+    """Like :func:`fetch_metrics`, also returning the per-host samples as a frame.
+
+    The frame holds the ``hosts`` section of a live scrape (empty in
+    synthetic mode) and is what the store appends in one batch, so the
+    pipeline can analyze it without walking the nested dicts again.
     """
     path = Path(file_path)
     path.parent.mkdir(parents=True, exist_ok=True)
 
-    metrics: Dict[str, float] = {"cpu": 10.0, "memory": 20.0}
-    path.write_text(json.dumps(metrics), encoding="utf-8")
-    return metrics
+    if live:
+        metrics: Dict[str, Any] = scrape_fleet(targets_path, scraper=scraper)
+    else:
+        metrics = {"cpu": 10.0, "memory": 20.0}
+    frame = SampleFrame.from_hosts(metrics.get("hosts", {}), ts=time.time())
+    if writer is not None:
+        writer.add(SeriesBatch.concat([_fleet_batch(metrics, frame.ts), SeriesBatch.from_frame(frame)]), snapshot=metrics)
+        return metrics, frame
+    write_if_changed(path, json.dumps(metrics).encode("utf-8"))
+    if store is not None:
+        store.append_metrics(metrics, ts=frame.ts)
+        if len(frame):
+            store.append_frame(frame)
+    return metrics, frame
+
 
+def _fleet_batch(metrics: Mapping[str, Any], ts: float | None, registry: SeriesRegistry | None = None) -> SeriesBatch:
+    """The unlabeled top-level values of a snapshot, as `MetricStore.append_metrics` stores them."""
+    registry = get_registry() if registry is None else registry
+    names = [n for n, v in metrics.items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    return SeriesBatch(registry.ids(names), [metrics[n] for n in names], time.time() if ts is None else ts, registry)
+
+
+def ingest_batch(
+    file_path: str | Path,
+    batch: SeriesBatch,
+    store: MetricStore | None = None,
+    label: str = "host",
+    writer: IngestWriter | None = None,
+) -> Tuple[Dict[str, Any], SampleFrame]:
+    """Ingest a pushed multi-host `series.SeriesBatch` instead of scraping.
+
+    The snapshot written to ``file_path`` has the shape of a live scrape:
+    ``hosts`` pivoted by ``label`` and ``cpu``/``memory`` of the worst host.
+    The store receives the batch itself, with every label of every series,
+    plus the fleet-level values. With ``writer`` both go through its
+    write-ahead log, as in :func:`fetch_samples`.
+
+    Returns
+    -------
+    Tuple[Dict[str, Any], SampleFrame]
+        The snapshot and the per-host frame, as :func:`fetch_samples` does.
+    """
+    path = Path(file_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
 
+    frame = batch.to_frame(label)
+    metrics: Dict[str, Any] = {"hosts": frame.to_dict()}
+    for metric in ("cpu", "memory"):
+        if metric in frame.columns and not np.isnan(frame.column(metric)).all():
+            metrics[metric] = float(np.nanmax(frame.column(metric)))
+    if writer is not None:
+        writer.add(SeriesBatch.concat([batch, _fleet_batch(metrics, frame.ts, batch.registry)]), snapshot=metrics)
+        return metrics, frame
+    write_if_changed(path, json.dumps(metrics).encode("utf-8"))
+    if store is not None:
+        store.append_batch(batch)
+        store.append_metrics(metrics, ts=frame.ts)
+    return metrics, frame
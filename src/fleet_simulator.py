@@ -0,0 +1,591 @@
+"""Synthetic fleet with realistic workload shapes and labelled anomalies.
+
+`FleetSimulator` advances thousands of hosts one scrape interval at a time,
+fully vectorized. Each host has a cpu/memory baseline with a diurnal cycle
+(per-host phase, as if spread across time zones) and Gaussian noise, plus:
+
+- bursts: short benign cpu surges, *not* labelled (a source of false positives)
+- spike / saturation: cpu or memory pinned above 90% for a few / many ticks
+- shift: a sudden level change of about 30 points that stays under the
+  static threshold (only a baseline-aware detector can see it)
+- leak: memory climbing steadily from the start of the leak until the
+  process "restarts" near 100%
+
+Every injected anomaly is ground truth: `FleetFrame.labels` marks the
+affected (host, metric) cells and `FleetSimulator.events` lists each
+incident with its start and end time.
+
+The fleet can be emitted as per-tick snapshot files (the same shape as a
+live `scraper` summary), or served over HTTP as node_exporter-style
+endpoints, one URL per host, with targets written in the
+`config/aws_targets.json` format so `fetch_metrics(live=True)` scrapes it.
+
+Usage:
+    python src/fleet_simulator.py files --hosts 5000 --ticks 240 --out data/fleet
+    python src/fleet_simulator.py serve --hosts 2000 --port 9100 --speed 15 --targets data/fleet_targets.json
+    python src/fleet_simulator.py evaluate --hosts 5000 --ticks 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from anomaly_detection import detect_anomalies_batch
+from streaming_detection import StreamingDetector
+
+
+COLUMNS: Tuple[str, ...] = ("cpu", "memory")
+ANOMALY_KINDS: Tuple[str, ...] = ("spike", "saturation", "shift", "leak")
+_SPIKE, _SATURATION, _SHIFT, _LEAK = range(4)
+_DAY = 86400.0
+
+
+class FleetFrame(NamedTuple):
+    """One scrape interval of the whole fleet.
+
+    Attributes
+    ----------
+    tick: int
+        Zero-based interval number.
+    timestamp: float
+        Simulated time of the interval, in seconds.
+    values: np.ndarray
+        ``(hosts, 2)`` cpu and memory percentages.
+    labels: np.ndarray
+        ``(hosts, 2)`` boolean ground truth; True while an injected anomaly
+        affects that cell.
+    """
+
+    tick: int
+    timestamp: float
+    values: np.ndarray
+    labels: np.ndarray
+
+
+class AnomalyEvent(NamedTuple):
+    """One injected incident; ``end`` is None while it is still active."""
+
+    host: str
+    metric: str
+    kind: str
+    start: float
+    end: float | None
+
+
+class DetectionScore(NamedTuple):
+    """Sample-level confusion counts and derived rates."""
+
+    true_positives: int
+    false_positives: int
+    false_negatives: int
+    precision: float
+    recall: float
+    f1: float
+
+
+def score(predicted: Any, labels: Any) -> DetectionScore:
+    """Compare boolean predictions with ground-truth labels of the same shape."""
+    pred = np.asarray(predicted, dtype=bool)
+    truth = np.asarray(labels, dtype=bool)
+    tp = int(np.count_nonzero(pred & truth))
+    fp = int(np.count_nonzero(pred & ~truth))
+    fn = int(np.count_nonzero(~pred & truth))
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return DetectionScore(tp, fp, fn, precision, recall, f1)
+
+
+class FleetSimulator:
+    """Vectorized simulation of ``hosts`` hosts sampled every ``interval`` seconds.
+
+    Parameters
+    ----------
+    hosts: int
+        Fleet size.
+    interval: float
+        Simulated seconds per :meth:`step`.
+    seed: int
+        Seed for the random generator; equal seeds give identical fleets.
+    start: float
+        Simulated timestamp of the first frame.
+    anomaly_rate: float
+        Probability per (host, metric) and tick that a spike, saturation or
+        shift incident starts.
+    burst_rate: float
+        Probability per host and tick of a benign cpu burst.
+    leak_rate: float
+        Probability per host and tick that a memory leak starts.
+    cpus: int
+        CPUs per host in the node_exporter payload.
+    name_format: str
+        Host naming pattern, formatted with the host index ``i``.
+    """
+
+    def __init__(
+        self,
+        hosts: int = 1000,
+        interval: float = 15.0,
+        seed: int = 0,
+        start: float = 0.0,
+        anomaly_rate: float = 2e-4,
+        burst_rate: float = 2e-3,
+        leak_rate: float = 5e-5,
+        cpus: int = 4,
+        name_format: str = "host-{i:05d}",
+    ) -> None:
+        if hosts <= 0:
+            raise ValueError("hosts must be positive")
+        self.n_hosts = int(hosts)
+        self.interval = float(interval)
+        self.start = float(start)
+        self.anomaly_rate = float(anomaly_rate)
+        self.burst_rate = float(burst_rate)
+        self.leak_rate = float(leak_rate)
+        self.cpus = int(cpus)
+        self.hosts: List[str] = [name_format.format(i=i) for i in range(self.n_hosts)]
+        self.tick = -1
+
+        rng = self._rng = np.random.default_rng(seed)
+        n = self.n_hosts
+        self._base = np.column_stack([rng.uniform(10, 55, n), rng.uniform(30, 65, n)])
+        self._amplitude = np.column_stack([rng.uniform(3, 20, n), rng.uniform(1, 6, n)])
+        self._noise = np.column_stack([rng.uniform(1.0, 3.0, n), rng.uniform(0.2, 0.8, n)])
+        self._phase = rng.uniform(0, 1, n)
+
+        self._burst_left = np.zeros(n, dtype=np.int32)
+        self._burst_size = np.zeros(n)
+        self._anomaly_left = np.zeros((n, 2), dtype=np.int32)
+        self._anomaly_kind = np.full((n, 2), -1, dtype=np.int8)
+        self._anomaly_level = np.zeros((n, 2))
+        self._leak_slope = np.zeros(n)
+        self._leak_offset = np.zeros(n)
+
+        uptime = rng.uniform(3600, 30 * _DAY, n) * self.cpus
+        self._cpu_total = uptime
+        self._cpu_idle = uptime * 0.7
+        self._mem_total = rng.choice([8.0, 16.0, 32.0, 64.0], n) * 2**30
+
+        self._open: Dict[Tuple[int, int], AnomalyEvent] = {}
+        self._closed: List[AnomalyEvent] = []
+        self._lock = threading.Lock()
+        self._payloads: Dict[int, bytes] = {}
+        self.frame: FleetFrame | None = None
+
+    # ------------------------------------------------------------------ simulation
+
+    def _open_events(self, cells: np.ndarray, kinds: np.ndarray, now: float) -> None:
+        """Start an incident of ``kinds`` on each ``(host, column)`` of ``cells``."""
+        for (host, col), kind in zip(cells, kinds):
+            key = (int(host), int(col))
+            self._open[key] = AnomalyEvent(self.hosts[key[0]], COLUMNS[key[1]], ANOMALY_KINDS[kind], now, None)
+
+    def _close_events(self, cells: np.ndarray, now: float) -> None:
+        """End the open incidents on ``cells`` at ``now`` and move them to the closed list."""
+        for host, col in cells:
+            event = self._open.pop((int(host), int(col)), None)
+            if event is not None:
+                self._closed.append(event._replace(end=now))
+
+    def step(self) -> FleetFrame:
+        """Advance one interval and return the new frame."""
+        rng = self._rng
+        n = self.n_hosts
+        self.tick += 1
+        now = self.start + self.tick * self.interval
+
+        diurnal = np.sin(2 * np.pi * (now / _DAY + self._phase))[:, None] * self._amplitude
+        values = self._base + diurnal + rng.standard_normal((n, 2)) * self._noise
+
+        # Benign bursts: 1-4 ticks of +10..30 cpu points.
+        new = (self._burst_left == 0) & (rng.random(n) < self.burst_rate)
+        count = int(new.sum())
+        self._burst_left[new] = rng.integers(1, 5, count)
+        self._burst_size[new] = rng.uniform(10, 30, count)
+        bursting = self._burst_left > 0
+        values[bursting, 0] += self._burst_size[bursting]
+        self._burst_left[bursting] -= 1
+
+        # Leaks: memory grows 0.05..0.4 points per tick until a restart near 100%.
+        leaking = self._leak_slope > 0
+        new = ~leaking & (self._anomaly_left[:, 1] == 0) & (rng.random(n) < self.leak_rate)
+        self._leak_slope[new] = rng.uniform(0.05, 0.4, int(new.sum()))
+        new_cells = np.column_stack([np.flatnonzero(new), np.ones(int(new.sum()), dtype=np.intp)])
+        self._open_events(new_cells, np.full(len(new_cells), _LEAK), now)
+        self._leak_offset += self._leak_slope
+        values[:, 1] += self._leak_offset
+        restarted = (self._leak_slope > 0) & (values[:, 1] >= 99.0)
+        if restarted.any():
+            values[restarted, 1] = self._base[restarted, 1]
+            self._leak_slope[restarted] = 0.0
+            self._leak_offset[restarted] = 0.0
+            cells = np.column_stack([np.flatnonzero(restarted), np.ones(int(restarted.sum()), dtype=np.intp)])
+            self._close_events(cells, now)
+        leaking = self._leak_slope > 0
+
+        # Spikes, saturations and shifts on cells that are not already anomalous.
+        free = self._anomaly_left == 0
+        free[:, 1] &= ~leaking
+        new = free & (rng.random((n, 2)) < self.anomaly_rate)
+        cells = np.argwhere(new)
+        if len(cells):
+            kinds = rng.integers(0, 3, len(cells))
+            durations = np.select(
+                [kinds == _SPIKE, kinds == _SATURATION],
+                [rng.integers(1, 4, len(cells)), rng.integers(10, 41, len(cells))],
+                rng.integers(5, 21, len(cells)),
+            )
+            levels = np.where(kinds == _SHIFT, rng.uniform(25, 35, len(cells)), rng.uniform(92, 99.5, len(cells)))
+            rows, cols = cells[:, 0], cells[:, 1]
+            self._anomaly_left[rows, cols] = durations
+            self._anomaly_kind[rows, cols] = kinds
+            self._anomaly_level[rows, cols] = levels
+            self._open_events(cells, kinds, now)
+
+        active = self._anomaly_left > 0
+        pinned = active & (self._anomaly_kind != _SHIFT)
+        shifted = active & (self._anomaly_kind == _SHIFT)
+        values[pinned] = self._anomaly_level[pinned] + rng.normal(0, 0.3, int(pinned.sum()))
+        values[shifted] += self._anomaly_level[shifted]
+
+        labels = active.copy()
+        labels[:, 1] |= leaking
+        self._anomaly_left[active] -= 1
+        ended = active & (self._anomaly_left == 0)
+        if ended.any():
+            self._anomaly_kind[ended] = -1
+            self._close_events(np.argwhere(ended), now + self.interval)
+
+        np.clip(values, 0.0, 100.0, out=values)
+        busy = values[:, 0] / 100.0
+        seconds = self.interval * self.cpus
+        with self._lock:
+            self._cpu_total += seconds
+            self._cpu_idle += seconds * (1.0 - busy)
+            self._payloads.clear()
+            self.frame = FleetFrame(self.tick, now, values, labels)
+        return self.frame
+
+    def run(self, ticks: int) -> List[FleetFrame]:
+        """Advance ``ticks`` intervals and return every frame."""
+        return [self.step() for _ in range(ticks)]
+
+    def events(self, include_open: bool = True) -> List[AnomalyEvent]:
+        """Injected incidents so far, ordered by start time."""
+        events = list(self._closed)
+        if include_open:
+            events.extend(self._open.values())
+        return sorted(events, key=lambda e: (e.start, e.host, e.metric))
+
+    # ------------------------------------------------------------------ output
+
+    def snapshot(self, frame: FleetFrame | None = None) -> Dict[str, Any]:
+        """Render a frame in the shape of a live `scraper` fleet summary."""
+        frame = frame or self.frame or self.step()
+        rounded = np.round(frame.values, 3).tolist()
+        hosts = {name: {"cpu": row[0], "memory": row[1]} for name, row in zip(self.hosts, rounded)}
+        top = frame.values.max(axis=0)
+        return {
+            "hosts": hosts,
+            "up": self.n_hosts,
+            "down": 0,
+            "cpu": round(float(top[0]), 3),
+            "memory": round(float(top[1]), 3),
+            "timestamp": frame.timestamp,
+        }
+
+    def write_files(self, out_dir: str | Path, ticks: int) -> List[Path]:
+        """Write ``ticks`` snapshot files plus ``labels.jsonl`` into ``out_dir``.
+
+        Each snapshot is written to a temporary name and renamed into place,
+        so a concurrent reader never sees a partial file. ``labels.jsonl``
+        holds one `AnomalyEvent` per line.
+        """
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        written = []
+        for _ in range(ticks):
+            frame = self.step()
+            path = out / f"metrics-{frame.tick:06d}.json"
+            tmp = path.with_suffix(".json.tmp")
+            tmp.write_text(json.dumps(self.snapshot(frame), separators=(",", ":")), encoding="utf-8")
+            os.replace(tmp, path)
+            written.append(path)
+        with (out / "labels.jsonl").open("w", encoding="utf-8") as fh:
+            for event in self.events():
+                fh.write(json.dumps(event._asdict()) + "\n")
+        return written
+
+    def render_node_exporter(self, index: int) -> bytes:
+        """node_exporter text payload for host ``index`` at the current frame."""
+        with self._lock:
+            cached = self._payloads.get(index)
+            if cached is not None:
+                return cached
+            total = self._cpu_total[index] / self.cpus
+            idle = self._cpu_idle[index] / self.cpus
+            mem_total = self._mem_total[index]
+            memory = self.frame.values[index, 1] if self.frame is not None else self._base[index, 1]
+        busy = total - idle
+        lines = [
+            "# HELP node_cpu_seconds_total Seconds the CPUs spent in each mode.",
+            "# TYPE node_cpu_seconds_total counter",
+        ]
+        for cpu in range(self.cpus):
+            lines.append(f'node_cpu_seconds_total{{cpu="{cpu}",mode="idle"}} {idle:.2f}')
+            lines.append(f'node_cpu_seconds_total{{cpu="{cpu}",mode="system"}} {busy * 0.2:.2f}')
+            lines.append(f'node_cpu_seconds_total{{cpu="{cpu}",mode="user"}} {busy * 0.8:.2f}')
+        lines += [
+            "# HELP node_memory_MemTotal_bytes Memory information field MemTotal_bytes.",
+            "# TYPE node_memory_MemTotal_bytes gauge",
+            f"node_memory_MemTotal_bytes {mem_total:.6e}",
+            "# HELP node_memory_MemAvailable_bytes Memory information field MemAvailable_bytes.",
+            "# TYPE node_memory_MemAvailable_bytes gauge",
+            f"node_memory_MemAvailable_bytes {mem_total * (1.0 - memory / 100.0):.6e}",
+        ]
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        with self._lock:
+            self._payloads[index] = body
+        return body
+
+    def targets(self, base_url: str) -> Dict[str, List[str]]:
+        """Targets in the `config/aws_targets.json` format, one URL per host."""
+        base = base_url.rstrip("/")
+        return {"node_exporter": [f"{base}/hosts/{name}/metrics" for name in self.hosts], "app": []}
+
+
+class _FleetHandler(BaseHTTPRequestHandler):
+    """Serves ``/hosts/<name>/metrics`` from the simulator of its `FleetServer`."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, as node_exporter does
+
+    def do_GET(self) -> None:  # noqa: N802
+        """Answer with the host's node_exporter payload, or 404 for other paths and hosts."""
+        server: FleetServer = self.server  # type: ignore[assignment]
+        parts = self.path.strip("/").split("/")
+        index = server.index.get(parts[1]) if len(parts) == 3 and parts[0] == "hosts" and parts[2] == "metrics" else None
+        if index is None:
+            self._send(404, "text/plain", b"not found\n")
+            return
+        self._send(200, "text/plain; version=0.0.4", server.simulator.render_node_exporter(index))
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - silence default logging
+        """Drop the per-request access log line."""
+        return
+
+    def _send(self, code: int, ctype: str, body: bytes) -> None:
+        """Write a complete response with a ``Content-Length``, keeping the connection open."""
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FleetServer(ThreadingHTTPServer):
+    """HTTP server exposing ``/hosts/<name>/metrics`` for every simulated host.
+
+    When ``speed`` is set, a daemon thread advances the simulation so that
+    ``speed`` simulated seconds pass per wall-clock second (``speed=1`` is
+    real time; one tick every ``interval / speed`` seconds). Otherwise the
+    caller advances it with :meth:`FleetSimulator.step`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, simulator: FleetSimulator, host: str = "127.0.0.1", port: int = 0, speed: float | None = None):
+        super().__init__((host, port), _FleetHandler)
+        self.simulator = simulator
+        self.index = {name: i for i, name in enumerate(simulator.hosts)}
+        self.speed = speed
+        self._stop = threading.Event()
+        if simulator.frame is None:
+            simulator.step()
+
+    @property
+    def base_url(self) -> str:
+        """``http://host:port`` the server listens on."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _advance(self) -> None:
+        """Clock thread: step the simulation every ``interval / speed`` seconds until stopped."""
+        period = self.simulator.interval / float(self.speed)
+        deadline = time.monotonic() + period
+        while not self._stop.wait(max(0.0, deadline - time.monotonic())):
+            self.simulator.step()
+            deadline += period
+
+    def start(self) -> "FleetServer":
+        """Serve (and advance, if ``speed`` is set) in daemon threads."""
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        if self.speed:
+            threading.Thread(target=self._advance, name="fleet-clock", daemon=True).start()
+        return self
+
+    def write_targets(self, path: str | Path) -> Path:
+        """Write this server's targets file for `fetch_metrics(live=True, targets_path=...)`."""
+        out = Path(path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(self.simulator.targets(self.base_url), indent=2), encoding="utf-8")
+        return out
+
+    def stop(self) -> None:
+        """Stop the clock thread, shut the server down and close its socket."""
+        self._stop.set()
+        self.shutdown()
+        self.server_close()
+
+
+# ---------------------------------------------------------------------- evaluation
+
+Detector = Callable[[FleetFrame], np.ndarray]
+
+
+def threshold_detector() -> Detector:
+    """Static per-metric thresholds (`detect_anomalies_batch` defaults)."""
+    return lambda frame: detect_anomalies_batch(frame.values, COLUMNS).exceeded
+
+
+def streaming_detector(hosts: int, **options: Any) -> Detector:
+    """EWMA z-score detector (`StreamingDetector`) over every (host, metric) series."""
+    detector = StreamingDetector(max_series=hosts * len(COLUMNS), **options)
+    slots = detector.slots([(h, c) for h in range(hosts) for c in COLUMNS])
+    return lambda frame: detector.update_slots(slots, frame.values.ravel()).anomalous.reshape(frame.values.shape)
+
+
+def evaluate(simulator: FleetSimulator, detectors: Dict[str, Detector], ticks: int, warmup: int = 0) -> Dict[str, Any]:
+    """Run ``ticks`` intervals and score each detector against the labels.
+
+    The first ``warmup`` ticks are fed to the detectors but not scored, and
+    incidents that started during them are ignored. Besides sample-level
+    precision/recall, each detector gets event-level recall: the share of
+    incidents flagged on at least one of their samples, with the mean number
+    of labelled ticks that passed before the first flag.
+    """
+    shape = (simulator.n_hosts, len(COLUMNS))
+    confusion = {name: np.zeros(3, dtype=np.int64) for name in detectors}
+    hit = {name: np.zeros(shape, dtype=bool) for name in detectors}
+    lag = {name: np.zeros(shape, dtype=np.int64) for name in detectors}
+    incidents = {name: [0, 0, 0] for name in detectors}  # total, detected, summed lag
+    seconds = dict.fromkeys(detectors, 0.0)
+    tracked = np.zeros(shape, dtype=bool)
+    previous = np.zeros(shape, dtype=bool)
+
+    def close(name: str, cells: np.ndarray) -> None:
+        """Count the incidents ending on ``cells`` and whether ``name`` flagged them."""
+        counts = incidents[name]
+        counts[0] += int(cells.sum())
+        counts[1] += int((cells & hit[name]).sum())
+        counts[2] += int(lag[name][cells & hit[name]].sum())
+
+    for _ in range(ticks):
+        frame = simulator.step()
+        labels = frame.labels
+        scored = frame.tick >= warmup
+        started, finished = labels & ~previous, previous & ~labels
+        for name, detect in detectors.items():
+            t0 = time.perf_counter()
+            predicted = detect(frame)
+            seconds[name] += time.perf_counter() - t0
+            close(name, finished & tracked)
+            hit[name][started | finished] = False
+            lag[name][started | finished] = 0
+            hit[name] |= predicted & labels
+            lag[name] += labels & ~hit[name]
+            if scored:
+                confusion[name] += score(predicted, labels)[:3]
+        tracked[finished] = False
+        tracked[started] = scored
+        previous = labels
+
+    report: Dict[str, Any] = {"hosts": simulator.n_hosts, "ticks": ticks, "warmup": warmup, "detectors": {}}
+    for name in detectors:
+        close(name, previous & tracked)  # incidents still open at the end
+        tp, fp, fn = (int(x) for x in confusion[name])
+        precision = tp / (tp + fp) if tp + fp else 1.0
+        recall = tp / (tp + fn) if tp + fn else 1.0
+        total, detected, summed = incidents[name]
+        report["detectors"][name] = {
+            "samples": {
+                "true_positives": tp,
+                "false_positives": fp,
+                "false_negatives": fn,
+                "precision": round(precision, 4),
+                "recall": round(recall, 4),
+                "f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+            },
+            "events": {
+                "total": total,
+                "detected": detected,
+                "recall": round(detected / total, 4) if total else 1.0,
+                "mean_delay_ticks": round(summed / detected, 2) if detected else None,
+            },
+            "samples_per_sec": round(simulator.n_hosts * len(COLUMNS) * ticks / seconds[name]) if seconds[name] else None,
+        }
+    return report
+
+
+def main() -> None:
+    """Command-line entry point: write labelled snapshot ``files``, ``serve`` the fleet or ``evaluate`` detectors."""
+    parser = argparse.ArgumentParser(description="Simulate a fleet with labelled anomalies")
+    sub = parser.add_subparsers(dest="command", required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--hosts", type=int, default=1000)
+    common.add_argument("--interval", type=float, default=15.0)
+    common.add_argument("--seed", type=int, default=0)
+    common.add_argument("--anomaly-rate", type=float, default=2e-4)
+    common.add_argument("--burst-rate", type=float, default=2e-3)
+    common.add_argument("--leak-rate", type=float, default=5e-5)
+
+    files = sub.add_parser("files", parents=[common], help="write per-tick snapshots and labels.jsonl")
+    files.add_argument("--ticks", type=int, default=240)
+    files.add_argument("--out", type=Path, default=Path("data/fleet"))
+
+    serve = sub.add_parser("serve", parents=[common], help="serve node_exporter-style endpoints")
+    serve.add_argument("--bind", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=9100)
+    serve.add_argument("--speed", type=float, default=1.0, help="simulated seconds per wall second")
+    serve.add_argument("--targets", type=Path, default=Path("data/fleet_targets.json"))
+
+    ev = sub.add_parser("evaluate", parents=[common], help="precision/recall of the built-in detectors")
+    ev.add_argument("--ticks", type=int, default=500)
+    ev.add_argument("--warmup", type=int, default=40)
+
+    args = parser.parse_args()
+    simulator = FleetSimulator(
+        hosts=args.hosts,
+        interval=args.interval,
+        seed=args.seed,
+        anomaly_rate=args.anomaly_rate,
+        burst_rate=args.burst_rate,
+        leak_rate=args.leak_rate,
+    )
+    if args.command == "files":
+        paths = simulator.write_files(args.out, args.ticks)
+        print(json.dumps({"files": len(paths), "out": str(args.out), "events": len(simulator.events())}))
+    elif args.command == "serve":
+        server = FleetServer(simulator, args.bind, args.port, speed=args.speed).start()
+        server.write_targets(args.targets)
+        print(f"serving {args.hosts} hosts at {server.base_url}/hosts/<name>/metrics; targets in {args.targets}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.stop()
+    else:
+        detectors = {"threshold": threshold_detector(), "streaming": streaming_detector(args.hosts)}
+        print(json.dumps(evaluate(simulator, detectors, args.ticks, args.warmup), indent=2))
+
+
+if __name__ == "__main__":
+    main()
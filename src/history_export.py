@@ -0,0 +1,675 @@
+"""Columnar export and bulk backfill of metric history and audit events.
+
+`HistoryExporter` writes Parquet files with Hive-style partitions, to a local
+directory or an S3-compatible bucket::
+
+    metrics/dt=2026-10-18/host_group=07/part-00012-<uuid>.parquet
+    anomalies/dt=2026-10-18/part-00013-<uuid>.parquet
+    remediations/dt=2026-10-18/part-00014-<uuid>.parquet
+
+Metric rows are ``(ts, value, series, metric, host)`` with epoch-second
+timestamps and dictionary-encoded strings; ``host_group`` is the Prometheus
+``hashmod`` of the host (see `targets.hashmod`) into ``host_groups`` groups.
+Event rows are ``(ts, host, metric, action, payload)`` with the original
+record as JSON in ``payload``, as batched by `s3_shipper.S3LogShipper`.
+
+Memory stays bounded while streaming: each partition buffers at most
+``row_group_rows`` rows before a row group is written, the largest buffer is
+flushed when all of them together exceed ``max_buffered_rows``, and at most
+``max_open_files`` part files are open (the least recently used is finished
+first). Part files are staged locally and published on completion: renamed
+into place, or uploaded with one ``put_object`` and removed.
+
+The reading side streams record batches file by file and prunes ``dt``
+partitions outside the requested window. :func:`backfill_store` appends them
+to a `metric_store.MetricStore`; :func:`load_training_matrix` pivots them
+into the ``(samples, features)`` matrix `ml_detection.train_model` takes,
+one partition at a time.
+
+Usage:
+    python src/history_export.py export --store data/store --out data/export
+    python src/history_export.py backfill --source data/export --store data/backfill
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from metric_store import MetricStore
+from samples import SampleFrame
+from s3_shipper import KIND_PREFIXES, read_batch
+from series import parse_series_key, series_key
+from targets import hashmod
+
+
+METRIC_SCHEMA = pa.schema([
+    ("ts", pa.float64()),
+    ("value", pa.float64()),
+    ("series", pa.dictionary(pa.int32(), pa.string())),
+    ("metric", pa.dictionary(pa.int32(), pa.string())),
+    ("host", pa.dictionary(pa.int32(), pa.string())),
+])
+EVENT_SCHEMA = pa.schema([
+    ("ts", pa.float64()),
+    ("host", pa.string()),
+    ("metric", pa.string()),
+    ("action", pa.string()),
+    ("payload", pa.string()),
+])
+DEFAULT_HOST_GROUPS = 16
+_DAY = 86400
+
+
+class ExportStats(NamedTuple):
+    """Outcome of a finished export: published file names (paths or keys), rows and bytes."""
+
+    files: List[str]
+    rows: int
+    bytes: int
+
+
+def _day_name(day: int) -> str:
+    """``YYYY-MM-DD`` of a day number since the epoch (UTC)."""
+    return time.strftime("%Y-%m-%d", time.gmtime(day * _DAY))
+
+
+def _dictionary(codes: np.ndarray, names: Sequence[str]) -> pa.DictionaryArray:
+    """Dictionary column for ``codes`` into ``names``, keeping only the names used."""
+    used, local = np.unique(codes, return_inverse=True)
+    return pa.DictionaryArray.from_arrays(
+        pa.array(local.astype(np.int32)), pa.array([names[i] for i in used.tolist()], pa.string())
+    )
+
+
+def _group_rows(groups: np.ndarray) -> List[Tuple[int, np.ndarray]]:
+    """``(group, row indices)`` for each distinct value of ``groups``."""
+    order = np.argsort(groups, kind="stable")
+    return [(int(groups[rows[0]]), rows) for rows in np.split(order, np.flatnonzero(np.diff(groups[order])) + 1) if rows.size]
+
+
+class _Partition:
+    """Buffered rows and the open part file of one partition directory."""
+
+    __slots__ = ("directory", "schema", "chunks", "rows", "writer", "staged", "name", "file_rows")
+
+    def __init__(self, directory: str, schema: pa.Schema) -> None:
+        self.directory = directory
+        self.schema = schema
+        self.chunks: List[Any] = []
+        self.rows = 0
+        self.writer: pq.ParquetWriter | None = None
+        self.staged: Path | None = None
+        self.name = ""
+        self.file_rows = 0
+
+
+class HistoryExporter:
+    """Stream metric samples and audit events into partitioned Parquet files.
+
+    Parameters
+    ----------
+    root: str | Path | None
+        Local output directory. Exactly one of ``root`` and ``s3_client`` is used.
+    s3_client: Any | None
+        A boto3 S3 client (or compatible) to upload finished files with.
+    bucket: str | None
+        Target bucket when ``s3_client`` is given.
+    prefix: str
+        Key prefix inside the bucket.
+    host_groups: int
+        Number of ``host_group`` partitions per day.
+    row_group_rows: int
+        Rows buffered per partition before a row group is written.
+    max_file_rows: int
+        Rows after which a part file is finished and a new one started.
+    max_buffered_rows: int
+        Bound on rows buffered across all partitions.
+    max_open_files: int
+        Bound on simultaneously open part files.
+    compression: str
+        Parquet codec.
+    """
+
+    def __init__(
+        self,
+        root: str | Path | None = None,
+        s3_client: Any | None = None,
+        bucket: str | None = None,
+        prefix: str = "",
+        host_groups: int = DEFAULT_HOST_GROUPS,
+        row_group_rows: int = 128 * 1024,
+        max_file_rows: int = 4 * 1024 * 1024,
+        max_buffered_rows: int = 2 * 1024 * 1024,
+        max_open_files: int = 32,
+        compression: str = "zstd",
+    ) -> None:
+        if (root is None) == (s3_client is None):
+            raise ValueError("give either root or s3_client")
+        if s3_client is not None and not bucket:
+            raise ValueError("bucket is required with s3_client")
+        self.root = None if root is None else Path(root)
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.host_groups = int(host_groups)
+        self.row_group_rows = int(row_group_rows)
+        self.max_file_rows = int(max_file_rows)
+        self.max_buffered_rows = int(max_buffered_rows)
+        self.max_open_files = int(max_open_files)
+        self.compression = compression
+        self._staging = Path(tempfile.mkdtemp(prefix="history-export-")) if s3_client is not None else None
+        self._partitions: Dict[str, _Partition] = {}
+        self._open: Dict[str, None] = {}
+        self._buffered = 0
+        self._seq = 0
+        self._series: Dict[str, int] = {}
+        self._series_names: List[str] = []
+        self._metric_of: List[int] = []
+        self._host_of: List[int] = []
+        self._group_of: List[int] = []
+        self._metrics: Dict[str, int] = {}
+        self._hosts: Dict[str, int] = {}
+        self._layout: Tuple[Any, np.ndarray, List[Tuple[int, np.ndarray]]] | None = None
+        self.files: List[str] = []
+        self.rows = 0
+        self.bytes = 0
+
+    def __enter__(self) -> "HistoryExporter":
+        """Return the exporter; leaving the block closes it, or aborts it on an exception."""
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        """Publish everything on a clean exit; discard staged files if the block raised."""
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    # ------------------------------------------------------------ metric rows
+
+    def _series_code(self, key: str, host_label: str) -> int:
+        """Code of series ``key``, registering its metric, host and host group on first use."""
+        code = self._series.get(key)
+        if code is None:
+            metric, labels = parse_series_key(key)
+            host = labels.get(host_label, "")
+            code = self._series[key] = len(self._series_names)
+            self._series_names.append(key)
+            self._metric_of.append(self._metrics.setdefault(metric, len(self._metrics)))
+            self._host_of.append(self._hosts.setdefault(host, len(self._hosts)))
+            self._group_of.append(hashmod(host, self.host_groups))
+        return code
+
+    def write_series(self, key: str, timestamps: Any, values: Any, host_label: str = "host") -> None:
+        """Add samples of one series (a `metric_store.series_key`) to the export."""
+        ts = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+        vals = np.asarray(values, dtype=np.float64).reshape(-1)
+        if ts.shape != vals.shape:
+            raise ValueError("timestamps and values must have the same length")
+        code = self._series_code(key, host_label)
+        self._add_metric_rows(ts, vals, np.full(ts.size, code, dtype=np.int64), self._group_of[code])
+
+    def write_frame(self, frame: SampleFrame, label: str = "host", ts: float | None = None) -> None:
+        """Add one scrape (`samples.SampleFrame`) as ``metric{label=host}`` series.
+
+        Series codes and host groups are cached for the frame's (hosts,
+        columns) layout, so consecutive scrapes of the same fleet only cost
+        a few array operations.
+        """
+        stamp = frame.ts if ts is None else ts
+        if stamp is None:
+            raise ValueError("frame has no timestamp")
+        layout = (frame.hosts, frame.columns, label)
+        if self._layout is None or self._layout[0] != layout:
+            codes = np.fromiter(
+                (self._series_code(series_key(m, {label: h}), label) for h in frame.hosts for m in frame.columns),
+                dtype=np.int64,
+                count=len(frame.hosts) * len(frame.columns),
+            )
+            self._layout = (layout, codes, _group_rows(np.asarray(self._group_of, dtype=np.int64)[codes]))
+        _, codes, parts = self._layout
+        flat = frame.values.reshape(-1)
+        present = ~np.isnan(flat)
+        complete = bool(present.all())
+        for group, rows in parts:
+            if not complete:
+                rows = rows[present[rows]]
+            if rows.size:
+                self._add_metric_rows(np.full(rows.size, float(stamp)), flat[rows], codes[rows], group)
+
+    def _add_metric_rows(self, ts: np.ndarray, values: np.ndarray, codes: np.ndarray, group: int) -> None:
+        """Buffer metric rows of one host group, split into their ``dt`` partitions."""
+        if not ts.size:
+            return
+        days = np.floor(ts / _DAY).astype(np.int64)
+        if (days == days[0]).all():
+            runs = [(int(days[0]), slice(None))]
+        else:
+            order = np.argsort(days, kind="stable")
+            ts, values, codes, days = ts[order], values[order], codes[order], days[order]
+            edges = [0, *(np.flatnonzero(np.diff(days)) + 1).tolist(), days.size]
+            runs = [(int(days[lo]), slice(lo, hi)) for lo, hi in zip(edges[:-1], edges[1:]) if hi > lo]
+        for day, rows in runs:
+            directory = f"metrics/dt={_day_name(day)}/host_group={group:02d}"
+            chunk = (ts[rows], values[rows], codes[rows])
+            self._append(directory, METRIC_SCHEMA, chunk, chunk[0].size)
+
+    def _metric_table(self, chunks: List[Tuple[np.ndarray, np.ndarray, np.ndarray]]) -> pa.Table:
+        """Arrow table of buffered ``(ts, values, codes)`` chunks in `METRIC_SCHEMA`."""
+        ts = np.concatenate([c[0] for c in chunks])
+        values = np.concatenate([c[1] for c in chunks])
+        codes = np.concatenate([c[2] for c in chunks])
+        metric_names = list(self._metrics)
+        host_names = list(self._hosts)
+        return pa.Table.from_arrays(
+            [
+                pa.array(ts),
+                pa.array(values),
+                _dictionary(codes, self._series_names),
+                _dictionary(np.asarray(self._metric_of)[codes], metric_names),
+                _dictionary(np.asarray(self._host_of)[codes], host_names),
+            ],
+            schema=METRIC_SCHEMA,
+        )
+
+    # ------------------------------------------------------------ events
+
+    def write_event(self, kind: str, record: Mapping[str, Any]) -> None:
+        """Add one audit event (an `S3LogShipper` record: ``ts`` plus ``metrics`` or ``action``)."""
+        ts = float(record.get("ts") or time.time())
+        metrics = record.get("metrics") if isinstance(record.get("metrics"), Mapping) else {}
+        row = (
+            ts,
+            record.get("host") or metrics.get("host"),
+            record.get("metric"),
+            record.get("action") or record.get("message"),
+            json.dumps(record, default=str, sort_keys=True),
+        )
+        directory = f"{KIND_PREFIXES.get(kind, kind)}/dt={_day_name(int(ts // _DAY))}"
+        self._append(directory, EVENT_SCHEMA, row, 1)
+
+    @staticmethod
+    def _event_table(rows: List[Tuple[Any, ...]]) -> pa.Table:
+        """Arrow table of buffered event rows in `EVENT_SCHEMA`."""
+        columns = list(zip(*rows))
+        return pa.Table.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, EVENT_SCHEMA)], schema=EVENT_SCHEMA
+        )
+
+    # ------------------------------------------------------------ buffering and files
+
+    def _append(self, directory: str, schema: pa.Schema, chunk: Any, n: int) -> None:
+        """Buffer ``n`` rows for ``directory``, flushing when a buffer bound is reached."""
+        part = self._partitions.get(directory)
+        if part is None:
+            part = self._partitions[directory] = _Partition(directory, schema)
+        part.chunks.append(chunk)
+        part.rows += n
+        self._buffered += n
+        self.rows += n
+        if part.rows >= self.row_group_rows:
+            self._flush(part)
+        while self._buffered > self.max_buffered_rows:
+            self._flush(max(self._partitions.values(), key=lambda p: p.rows))
+
+    def _flush(self, part: _Partition) -> None:
+        """Write the buffered rows of ``part`` as one row group of its open part file."""
+        if not part.rows:
+            return
+        if part.schema is METRIC_SCHEMA:
+            table = self._metric_table(part.chunks)
+        else:
+            table = self._event_table(part.chunks)
+        self._buffered -= part.rows
+        part.chunks, part.rows = [], 0
+        if part.writer is None:
+            self._open_file(part)
+        self._open.pop(part.directory, None)
+        self._open[part.directory] = None
+        part.writer.write_table(table, row_group_size=max(self.row_group_rows, table.num_rows))
+        part.file_rows += table.num_rows
+        if part.file_rows >= self.max_file_rows:
+            self._finish_file(part)
+
+    def _open_file(self, part: _Partition) -> None:
+        """Start a staged part file for ``part``, finishing the least recently used one if needed."""
+        while len(self._open) >= self.max_open_files:
+            self._finish_file(self._partitions[next(iter(self._open))])
+        self._seq += 1
+        part.name = f"{part.directory}/part-{self._seq:05d}-{uuid.uuid4().hex[:12]}.parquet"
+        base = self._staging if self._staging is not None else self.root
+        part.staged = base / (part.name + ".tmp")
+        part.staged.parent.mkdir(parents=True, exist_ok=True)
+        part.writer = pq.ParquetWriter(str(part.staged), part.schema, compression=self.compression)
+        part.file_rows = 0
+
+    def _finish_file(self, part: _Partition) -> None:
+        """Close the part file of ``part`` and publish it (rename or upload)."""
+        self._open.pop(part.directory, None)
+        if part.writer is None:
+            return
+        part.writer.close()
+        part.writer = None
+        staged = part.staged
+        self.bytes += staged.stat().st_size
+        if self.s3_client is not None:
+            key = f"{self.prefix}/{part.name}" if self.prefix else part.name
+            with staged.open("rb") as fh:
+                self.s3_client.put_object(Bucket=self.bucket, Key=key, Body=fh)
+            staged.unlink()
+            self.files.append(key)
+        else:
+            final = self.root / part.name
+            os.replace(staged, final)
+            self.files.append(str(final))
+
+    def close(self) -> ExportStats:
+        """Flush every buffer, publish every open file and return the totals."""
+        for part in list(self._partitions.values()):
+            self._flush(part)
+            self._finish_file(part)
+        self._partitions.clear()
+        if self._staging is not None:
+            shutil.rmtree(self._staging, ignore_errors=True)
+        return ExportStats(list(self.files), self.rows, self.bytes)
+
+    def abort(self) -> None:
+        """Drop every buffer and remove the staged, unpublished part files.
+
+        Files published before the abort (finished because they were full or
+        least recently used) stay in place and are listed in ``files``.
+        """
+        for part in self._partitions.values():
+            if part.writer is not None:
+                part.writer.close()
+                part.writer = None
+            if part.staged is not None:
+                part.staged.unlink(missing_ok=True)
+        self._partitions.clear()
+        self._open.clear()
+        self._buffered = 0
+        if self._staging is not None:
+            shutil.rmtree(self._staging, ignore_errors=True)
+
+
+def write_store(
+    exporter: HistoryExporter,
+    store: MetricStore,
+    start: float | None = None,
+    end: float | None = None,
+    keys: Iterable[str] | None = None,
+) -> int:
+    """Feed the raw samples of ``store`` in ``[start, end]`` to ``exporter``; return the rows."""
+    rows = 0
+    for key in (store.keys() if keys is None else keys):
+        data = store.query(key, start, end)
+        if data.timestamps.size:
+            exporter.write_series(key, data.timestamps, data.values)
+            rows += data.timestamps.size
+    return rows
+
+
+def export_store(
+    store: MetricStore,
+    start: float | None = None,
+    end: float | None = None,
+    keys: Iterable[str] | None = None,
+    **options: Any,
+) -> ExportStats:
+    """Export ``store`` in ``[start, end]`` in one go; ``options`` go to `HistoryExporter`."""
+    exporter = HistoryExporter(**options)
+    write_store(exporter, store, start, end, keys)
+    return exporter.close()
+
+
+def iter_shipped_events(s3_client: Any, bucket: str, kinds: Iterable[str] = tuple(KIND_PREFIXES)) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ``(kind, record)`` from the NDJSON batches `S3LogShipper` uploaded."""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for kind in kinds:
+        for page in paginator.paginate(Bucket=bucket, Prefix=f"{KIND_PREFIXES.get(kind, kind)}/"):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith((".ndjson", ".ndjson.gz")):
+                    body = s3_client.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read()
+                    for record in read_batch(body):
+                        yield kind, record
+
+
+# ---------------------------------------------------------------- reading
+
+
+def _partition_values(name: str) -> Dict[str, str]:
+    """Hive partition values (``key=value`` path segments) of a file name."""
+    return dict(part.split("=", 1) for part in name.split("/") if "=" in part)
+
+
+def list_files(
+    root: str | Path | None = None,
+    s3_client: Any | None = None,
+    bucket: str | None = None,
+    prefix: str = "",
+    dataset: str = "metrics",
+    start: float | None = None,
+    end: float | None = None,
+) -> List[str]:
+    """Part files of ``dataset`` whose ``dt`` partition overlaps ``[start, end]``, sorted by path.
+
+    Sorting groups files by partition directory and keeps each directory's
+    parts in write order.
+    """
+    first = None if start is None else _day_name(int(start // _DAY))
+    last = None if end is None else _day_name(int(end // _DAY))
+    if s3_client is not None:
+        base = f"{prefix.strip('/')}/{dataset}/" if prefix.strip("/") else f"{dataset}/"
+        paginator = s3_client.get_paginator("list_objects_v2")
+        names = [
+            obj["Key"]
+            for page in paginator.paginate(Bucket=bucket, Prefix=base)
+            for obj in page.get("Contents", [])
+            if obj["Key"].endswith(".parquet")
+        ]
+    else:
+        names = [str(p) for p in Path(root, dataset).glob("dt=*/**/*.parquet")]
+    kept = []
+    for name in names:
+        day = _partition_values(name).get("dt")
+        if day is None or (first is None or day >= first) and (last is None or day <= last):
+            kept.append(name)
+    return sorted(kept)
+
+
+def _read_file(
+    name: str,
+    s3_client: Any | None,
+    bucket: str | None,
+    start: float | None,
+    end: float | None,
+    columns: Sequence[str] | None,
+    batch_rows: int,
+) -> Iterator[pa.RecordBatch]:
+    """Stream the batches of one part file (local path or S3 key), clipped to ``[start, end]``."""
+    wanted = None if columns is None else list(dict.fromkeys([*columns, "ts"]))
+    source: Any = name
+    if s3_client is not None:
+        source = io.BytesIO(s3_client.get_object(Bucket=bucket, Key=name)["Body"].read())
+    for batch in pq.ParquetFile(source).iter_batches(batch_size=batch_rows, columns=wanted):
+        if start is not None or end is not None:
+            ts = batch.column("ts")
+            batch = batch.filter(pc.and_(
+                pc.greater_equal(ts, -np.inf if start is None else start),
+                pc.less_equal(ts, np.inf if end is None else end),
+            ))
+        if batch.num_rows:
+            yield batch if columns is None else batch.select(list(columns))
+
+
+def iter_batches(
+    root: str | Path | None = None,
+    s3_client: Any | None = None,
+    bucket: str | None = None,
+    prefix: str = "",
+    dataset: str = "metrics",
+    start: float | None = None,
+    end: float | None = None,
+    columns: Sequence[str] | None = None,
+    batch_rows: int = 64 * 1024,
+) -> Iterator[pa.RecordBatch]:
+    """Stream record batches of an export, one part file at a time, clipped to ``[start, end]``."""
+    for name in list_files(root, s3_client, bucket, prefix, dataset, start, end):
+        yield from _read_file(name, s3_client, bucket, start, end, columns, batch_rows)
+
+
+def _codes(column: pa.Array, table: Dict[str, int]) -> np.ndarray:
+    """Map a (dictionary) string column onto stable integer codes in ``table``."""
+    if not pa.types.is_dictionary(column.type):
+        column = column.dictionary_encode()
+    lookup = np.fromiter(
+        (table.setdefault(name, len(table)) for name in column.dictionary.to_pylist()),
+        dtype=np.int64,
+        count=len(column.dictionary),
+    )
+    return lookup[column.indices.to_numpy(zero_copy_only=False)]
+
+
+def backfill_store(store: MetricStore, **source: Any) -> Dict[str, int]:
+    """Append an exported metric history to ``store``; ``source`` goes to :func:`iter_batches`.
+
+    Each batch is appended in timestamp order with one `MetricStore.append_many` call.
+    The target store may already hold newer samples of the same series: the
+    backfilled ones are older than its open rollup buckets and are written to
+    the rollup tiers as late records, so rollup reads include them.
+    """
+    rows = 0
+    names: Dict[str, int] = {}
+    for batch in iter_batches(columns=("ts", "value", "series"), **source):
+        codes = _codes(batch.column("series"), names)
+        ts = batch.column("ts").to_numpy()
+        order = np.argsort(ts, kind="stable")
+        keys = list(names)
+        store.append_many([keys[c] for c in codes[order].tolist()], batch.column("value").to_numpy()[order], ts[order])
+        rows += batch.num_rows
+    return {"rows": rows, "series": len(names)}
+
+
+def _pivot(parts: List[Tuple[np.ndarray, ...]], n_features: int) -> np.ndarray:
+    """Pivot ``(host, ts, feature, value)`` columns into complete ``(samples, features)`` rows."""
+    host, ts, feat, value = (np.concatenate(col) for col in zip(*parts))
+    order = np.lexsort((ts, host))
+    host, ts, feat, value = host[order], ts[order], feat[order], value[order]
+    new = np.ones(host.size, dtype=bool)
+    new[1:] = (host[1:] != host[:-1]) | (ts[1:] != ts[:-1])
+    row = np.cumsum(new) - 1
+    matrix = np.full((int(row[-1]) + 1, n_features), np.nan)
+    matrix[row, feat] = value
+    return matrix[~np.isnan(matrix).any(axis=1)]
+
+
+def load_training_matrix(
+    features: Sequence[str] = ("cpu", "memory"),
+    root: str | Path | None = None,
+    s3_client: Any | None = None,
+    bucket: str | None = None,
+    prefix: str = "",
+    start: float | None = None,
+    end: float | None = None,
+    batch_rows: int = 64 * 1024,
+) -> np.ndarray:
+    """Pivot an exported metric history into a ``(samples, features)`` matrix.
+
+    Samples of one host at one timestamp form a row; rows missing any feature
+    are dropped. Partitions are pivoted one at a time, so memory is bounded
+    by the largest ``(dt, host_group)`` partition.
+    """
+    feature_index = {name: i for i, name in enumerate(features)}
+    columns = ("ts", "value", "metric", "host")
+    out: List[np.ndarray] = []
+    parts: List[Tuple[np.ndarray, ...]] = []
+    hosts: Dict[str, int] = {}
+    current = None
+    for name in list_files(root, s3_client, bucket, prefix, "metrics", start, end):
+        directory = name.rsplit("/", 1)[0]
+        if directory != current and parts:
+            out.append(_pivot(parts, len(features)))
+            parts.clear()
+        current = directory
+        for batch in _read_file(name, s3_client, bucket, start, end, columns, batch_rows):
+            metric = batch.column("metric")
+            if not pa.types.is_dictionary(metric.type):
+                metric = metric.dictionary_encode()
+            lookup = np.array([feature_index.get(m, -1) for m in metric.dictionary.to_pylist()], dtype=np.int64)
+            feat = lookup[metric.indices.to_numpy(zero_copy_only=False)]
+            keep = feat >= 0
+            if keep.any():
+                parts.append((
+                    _codes(batch.column("host"), hosts)[keep],
+                    batch.column("ts").to_numpy()[keep],
+                    feat[keep],
+                    batch.column("value").to_numpy()[keep],
+                ))
+    if parts:
+        out.append(_pivot(parts, len(features)))
+    return np.concatenate(out) if out else np.empty((0, len(features)))
+
+
+def main() -> None:
+    """Command-line entry point: ``export`` a store or ``backfill`` one from an export."""
+    parser = argparse.ArgumentParser(description="Export metric history to Parquet, or backfill a store from it")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="write a store (and shipped audit events) as partitioned Parquet")
+    export.add_argument("--store", type=Path, default=Path("data/store"))
+    export.add_argument("--out", type=Path, help="local output directory")
+    export.add_argument("--bucket", help="upload to this S3 bucket instead of --out")
+    export.add_argument("--prefix", default="")
+    export.add_argument("--events-bucket", help="also export S3LogShipper batches from this bucket")
+    export.add_argument("--host-groups", type=int, default=DEFAULT_HOST_GROUPS)
+
+    backfill = sub.add_parser("backfill", help="append an export to a metric store")
+    backfill.add_argument("--source", type=Path, help="local export directory")
+    backfill.add_argument("--bucket", help="read the export from this S3 bucket instead of --source")
+    backfill.add_argument("--prefix", default="")
+    backfill.add_argument("--store", type=Path, required=True)
+
+    for command in (export, backfill):
+        command.add_argument("--start", type=float, default=None, help="epoch seconds")
+        command.add_argument("--end", type=float, default=None, help="epoch seconds")
+    args = parser.parse_args()
+
+    s3_client = None
+    if args.bucket or getattr(args, "events_bucket", None):
+        import boto3
+
+        s3_client = boto3.client("s3")
+    started = time.perf_counter()
+    if args.command == "export":
+        target = {"s3_client": s3_client, "bucket": args.bucket, "prefix": args.prefix} if args.bucket else {"root": args.out}
+        exporter = HistoryExporter(host_groups=args.host_groups, **target)
+        write_store(exporter, MetricStore(args.store, readonly=True), args.start, args.end)
+        if args.events_bucket:
+            for kind, record in iter_shipped_events(s3_client, args.events_bucket):
+                exporter.write_event(kind, record)
+        result: Dict[str, Any] = exporter.close()._asdict()
+        result["files"] = len(result["files"])
+    else:
+        source = {"s3_client": s3_client, "bucket": args.bucket, "prefix": args.prefix} if args.bucket else {"root": args.source}
+        with MetricStore(args.store) as store:
+            result = backfill_store(store, start=args.start, end=args.end, **source)
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""Write-ahead, group-committed ingestion into the metric store and snapshot file.
+
+`IngestWriter` sits between ingestion and its two outputs, the
+`metric_store.MetricStore` history and the JSON snapshot that the monitor and
+dashboard read (``data/metrics.json``):
+
+- :meth:`IngestWriter.add` only encodes a `series.SeriesBatch` into an
+  in-memory buffer. Once ``commit_bytes`` are buffered, or the oldest
+  buffered batch is ``commit_interval`` seconds old, the whole buffer is
+  written to the log with one ``write`` and made durable with one
+  ``fdatasync`` (group commit), then applied to the store and the newest
+  snapshot is published by an atomic rename, so readers never see a torn
+  file. A failed write or sync truncates the segment back to its last commit
+  and keeps the buffer, so the next commit retries it.
+- The log lives in ``wal_dir`` as numbered segments of CRC-framed records::
+
+      kind (1 byte) | payload length (u4) | crc32 of payload (u4) | payload
+
+  ``S`` defines series: a JSON list of keys, numbered consecutively from 0
+  within the segment. ``D`` holds samples as `metric_store.RECORD_DTYPE`
+  records whose ``sid`` is that segment-local number. ``J`` is a snapshot.
+- When a segment reaches ``segment_bytes``, and on :meth:`IngestWriter.close`,
+  the store is fsynced and the segment deleted (a checkpoint).
+- Opening a writer replays every segment left behind by a crash: records up
+  to the first torn or corrupt one are applied to the store, skipping
+  samples not newer than their series' latest stored sample, and the last
+  logged snapshot is published again. Without a store only the snapshot is
+  recovered.
+
+Benchmark: ``python benchmarks/bench_wal.py``.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import weakref
+import zlib
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Tuple
+
+import numpy as np
+
+from metric_store import RECORD_DTYPE, MetricStore
+from series import SeriesBatch, SeriesRegistry, get_registry
+from targets import write_if_changed
+
+logger = logging.getLogger(__name__)
+
+
+_HEADER = struct.Struct("<cII")
+_SEGMENT_GLOB = "wal-*.log"
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+
+def _segment_number(path: Path) -> int:
+    """Sequence number in a ``wal-NNNNNNNN.log`` file name."""
+    return int(path.stem.split("-", 1)[1])
+
+
+def _frame(kind: bytes, payload: bytes) -> bytes:
+    """One log record: ``kind``, payload length and CRC-32, then the payload."""
+    return _HEADER.pack(kind, len(payload), zlib.crc32(payload)) + payload
+
+
+def read_segment(path: str | Path) -> Tuple[List[Tuple[bytes, bytes]], int]:
+    """Return the intact ``(kind, payload)`` records of a segment and their byte length.
+
+    Reading stops at the first truncated or corrupt record; everything after
+    it was never acknowledged by a commit.
+    """
+    data = Path(path).read_bytes()
+    records: List[Tuple[bytes, bytes]] = []
+    pos = 0
+    while pos + _HEADER.size <= len(data):
+        kind, length, crc = _HEADER.unpack_from(data, pos)
+        payload = data[pos + _HEADER.size:pos + _HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            break
+        records.append((kind, payload))
+        pos += _HEADER.size + length
+    return records, pos
+
+
+class IngestWriter:
+    """Buffer samples, group-commit them to a write-ahead log, then apply them.
+
+    Parameters
+    ----------
+    wal_dir: str | Path
+        Directory of the log segments; created if missing.
+    store: MetricStore | None
+        Store the committed samples are appended to.
+    snapshot_path: str | Path | None
+        JSON snapshot replaced atomically with the newest committed snapshot.
+    commit_bytes: int
+        Commit once this many encoded bytes are buffered; 0 commits (and
+        fsyncs) on every :meth:`add`.
+    commit_interval: float
+        Commit once the oldest buffered batch is this many seconds old.
+        Checked on :meth:`add` and, after :meth:`start`, by a background
+        thread.
+    segment_bytes: int
+        Segment size that triggers a checkpoint.
+    fsync: bool
+        Make each commit durable with ``fdatasync``. Disable only for tests
+        and benchmarks.
+    registry: SeriesRegistry | None
+        Registry replayed samples are mapped into; defaults to the
+        process-wide one.
+    """
+
+    def __init__(
+        self,
+        wal_dir: str | Path,
+        store: MetricStore | None = None,
+        snapshot_path: str | Path | None = None,
+        commit_bytes: int = 1 << 20,
+        commit_interval: float = 0.05,
+        segment_bytes: int = 64 << 20,
+        fsync: bool = True,
+        registry: SeriesRegistry | None = None,
+    ) -> None:
+        self.wal_dir = Path(wal_dir)
+        self.store = store
+        self.snapshot_path = Path(snapshot_path) if snapshot_path is not None else None
+        self.commit_bytes = int(commit_bytes)
+        self.commit_interval = float(commit_interval)
+        self.segment_bytes = int(segment_bytes)
+        self.fsync = fsync
+        self.registry = get_registry() if registry is None else registry
+        self.stats: Dict[str, int] = {
+            "batches": 0,
+            "samples": 0,
+            "commits": 0,
+            "fsyncs": 0,
+            "bytes": 0,
+            "checkpoints": 0,
+            "replayed_samples": 0,
+            "torn_bytes": 0,
+            "errors": 0,
+        }
+
+        self._lock = threading.RLock()
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._oldest: float | None = None
+        self._pending: List[SeriesBatch] = []
+        self._snapshot: bytes | None = None
+        self._wal_ids: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._next_id = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._fd: int | None = None
+        self._segment_size = 0
+
+        self.wal_dir.mkdir(parents=True, exist_ok=True)
+        leftover = sorted(self.wal_dir.glob(_SEGMENT_GLOB), key=_segment_number)
+        self._segment = _segment_number(leftover[-1]) + 1 if leftover else 1
+        if leftover:
+            self._replay(leftover)
+        self._open_segment()
+
+    def __enter__(self) -> "IngestWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # -- producer side ---------------------------------------------------
+
+    def add(self, batch: SeriesBatch, snapshot: Mapping[str, Any] | None = None) -> None:
+        """Buffer ``batch`` (and optionally the snapshot describing it); commit if due."""
+        payload = json.dumps(snapshot).encode("utf-8") if snapshot is not None else None
+        with self._lock:
+            if len(batch):
+                self._encode(batch)
+                self._pending.append(batch)
+            if payload is not None:
+                self._buffer.append(_frame(b"J", payload))
+                self._buffered += len(self._buffer[-1])
+                self._snapshot = payload
+            self.stats["batches"] += 1
+            self.stats["samples"] += len(batch)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._buffered >= self.commit_bytes or time.monotonic() - self._oldest >= self.commit_interval:
+                self.commit()
+
+    def _encode(self, batch: SeriesBatch) -> None:
+        """Buffer ``batch`` as a data record, preceded by the keys of series new to this segment."""
+        table = self._wal_ids.get(batch.registry)
+        if table is None or len(table) < len(batch.registry):
+            grown = np.full(max(1024, 1 << (len(batch.registry) - 1).bit_length()), -1, dtype=np.int64)
+            if table is not None:
+                grown[:len(table)] = table
+            table = self._wal_ids[batch.registry] = grown
+        wal_ids = table[batch.ids]
+        missing = wal_ids < 0
+        if missing.any():
+            new = np.unique(batch.ids[missing])
+            table[new] = np.arange(self._next_id, self._next_id + len(new))
+            self._next_id += len(new)
+            self._buffer.append(_frame(b"S", json.dumps(batch.registry.keys(new)).encode("utf-8")))
+            self._buffered += len(self._buffer[-1])
+            wal_ids = table[batch.ids]
+        records = np.empty(len(batch), dtype=RECORD_DTYPE)
+        records["sid"] = wal_ids
+        records["ts"] = batch.ts
+        records["value"] = batch.values
+        self._buffer.append(_frame(b"D", records.tobytes()))
+        self._buffered += len(self._buffer[-1])
+
+    def commit(self) -> int:
+        """Write and fsync everything buffered, then apply it; return the bytes logged.
+
+        Raises
+        ------
+        OSError
+            If the write or sync fails. The segment is truncated back to its
+            last commit and the buffer kept, so a later commit retries it.
+        """
+        with self._lock:
+            if not self._buffer:
+                return 0
+            data = b"".join(self._buffer)
+            view = memoryview(data)
+            try:
+                while view:
+                    view = view[os.write(self._fd, view):]
+                if self.fsync:
+                    _fdatasync(self._fd)
+                    self.stats["fsyncs"] += 1
+            except OSError:
+                # Drop the partial write, so a retry does not log records twice.
+                os.ftruncate(self._fd, self._segment_size)
+                raise
+            self._segment_size += len(data)
+            self.stats["commits"] += 1
+            self.stats["bytes"] += len(data)
+
+            pending, snapshot = self._pending, self._snapshot
+            self._buffer, self._buffered, self._oldest = [], 0, None
+            self._pending, self._snapshot = [], None
+            if self.store is not None:
+                for batch in pending:
+                    self.store.append_batch(batch)
+            if snapshot is not None and self.snapshot_path is not None:
+                write_if_changed(self.snapshot_path, snapshot)
+            if self._segment_size >= self.segment_bytes:
+                self.checkpoint()
+            return len(data)
+
+    def checkpoint(self) -> None:
+        """Commit, fsync the store and start a new segment, deleting the old one."""
+        with self._lock:
+            self.commit()
+            if self.store is not None:
+                self.store.sync()
+            os.close(self._fd)
+            previous = self._segment_path()
+            self._segment += 1
+            self._open_segment()
+            previous.unlink()
+            self.stats["checkpoints"] += 1
+
+    # -- background commits ------------------------------------------------
+
+    def start(self) -> "IngestWriter":
+        """Start a thread committing batches older than ``commit_interval`` (idempotent)."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="ingest-wal", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        """Background loop committing buffered batches older than ``commit_interval``."""
+        while not self._stop.wait(self.commit_interval / 2):
+            with self._lock:
+                if self._oldest is not None and time.monotonic() - self._oldest >= self.commit_interval:
+                    try:
+                        self.commit()
+                    except Exception:
+                        # Keep committing; the failed buffer is retried on the next tick.
+                        self.stats["errors"] += 1
+                        logger.exception("background WAL commit failed")
+
+    def close(self) -> None:
+        """Stop the background thread, commit and checkpoint; the log is left empty."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            if self._fd is None:
+                return
+            self.checkpoint()
+            os.close(self._fd)
+            self._fd = None
+            self._segment_path().unlink()
+
+    # -- segments and replay ---------------------------------------------
+
+    def _segment_path(self) -> Path:
+        """Path of the active segment."""
+        return self.wal_dir / f"wal-{self._segment:08d}.log"
+
+    def _open_segment(self) -> None:
+        """Open the active segment for appending and reset its series-id table."""
+        self._fd = os.open(self._segment_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._segment_size = 0
+        self._wal_ids = weakref.WeakKeyDictionary()
+        self._next_id = 0
+
+    def _replay(self, segments: List[Path]) -> None:
+        """Apply the intact records of leftover ``segments`` to the store, then delete them.
+
+        Samples the store already holds are skipped, so replaying after a
+        crash between a checkpoint and its log truncation is harmless.
+        """
+        snapshot: bytes | None = None
+        for path in segments:
+            records, intact = read_segment(path)
+            self.stats["torn_bytes"] += path.stat().st_size - intact
+            ids = np.empty(0, dtype=np.int64)
+            for kind, payload in records:
+                if kind == b"S":
+                    ids = np.concatenate([ids, self.registry.ids_for_keys(json.loads(payload))])
+                elif kind == b"D" and self.store is not None:
+                    rows = np.frombuffer(payload, dtype=RECORD_DTYPE)
+                    batch = SeriesBatch(ids[rows["sid"]], rows["value"], rows["ts"], self.registry)
+                    self.stats["replayed_samples"] += self.store.append_batch(batch, only_newer=True)
+                elif kind == b"J":
+                    snapshot = payload
+        if snapshot is not None and self.snapshot_path is not None:
+            write_if_changed(self.snapshot_path, snapshot)
+        if self.store is not None:
+            self.store.sync()
+        for path in segments:
+            path.unlink()
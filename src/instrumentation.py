@@ -0,0 +1,169 @@
+"""Process-wide Prometheus registry and pipeline metrics.
+
+Every collector is created exactly once, at import time, on a dedicated
+`REGISTRY`. `/metrics` in the dashboard then only serializes it. Importing
+modules record into these collectors; nothing here performs I/O.
+
+Under a multi-worker server (see `config/gunicorn.conf.py`) each worker has
+its own registry; when ``PROMETHEUS_MULTIPROC_DIR`` is set, prometheus_client
+backs the collectors with per-process files in that directory and
+`render_latest` aggregates them, so a scrape sees the whole server.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+REGISTRY = CollectorRegistry()
+
+# Latency buckets from 100 us to 10 s: stages range from a dict lookup to a live scrape.
+_STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+APP_INFO = Gauge("app_info", "Application info gauge", multiprocess_mode="max", registry=REGISTRY)
+APP_INFO.set(1)
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds",
+    "Latency of each run_pipeline stage (ingest, monitor, detect, remediate).",
+    ["stage"],
+    buckets=_STAGE_BUCKETS,
+    registry=REGISTRY,
+)
+PIPELINE_SECONDS = Histogram(
+    "pipeline_run_duration_seconds",
+    "End-to-end latency of one run_pipeline call.",
+    buckets=_STAGE_BUCKETS,
+    registry=REGISTRY,
+)
+CYCLE_SECONDS = Histogram(
+    "scheduler_cycle_latency_seconds",
+    "Scheduled tick to end of detection/remediation, per scheduler cycle.",
+    buckets=_STAGE_BUCKETS,
+    registry=REGISTRY,
+)
+SCHEDULER_TICKS = Counter(
+    "scheduler_ticks_total",
+    "Scheduler ticks by outcome: run, skipped (ingest overran) or coalesced (detection busy).",
+    ["outcome"],
+    registry=REGISTRY,
+)
+PARSE_SECONDS = Histogram(
+    "scrape_parse_duration_seconds",
+    "Time spent streaming and parsing one target's exposition payload.",
+    buckets=_STAGE_BUCKETS,
+    registry=REGISTRY,
+)
+SCRAPE_SECONDS = Histogram(
+    "scrape_target_duration_seconds",
+    "Wall time of one target scrape, including parsing.",
+    ["job"],
+    buckets=_STAGE_BUCKETS,
+    registry=REGISTRY,
+)
+SCRAPE_FAILURES = Counter(
+    "scrape_failures_total",
+    "Target scrapes that failed (network, HTTP or parse errors).",
+    ["job"],
+    registry=REGISTRY,
+)
+ANOMALIES = Counter(
+    "anomalies_total",
+    "Anomalies detected, by host and metric.",
+    ["host", "metric"],
+    registry=REGISTRY,
+)
+REMEDIATIONS = Counter(
+    "remediations_total",
+    "Remediation actions taken, by host.",
+    ["host"],
+    registry=REGISTRY,
+)
+REMEDIATION_DECISIONS = Counter(
+    "remediation_decisions_total",
+    "Remediation engine decisions and action outcomes (dispatched, duplicate, cooldown, rate_limited, ok, ...).",
+    ["outcome"],
+    registry=REGISTRY,
+)
+ALERT_TRANSITIONS = Counter(
+    "alert_transitions_total",
+    "Alert state changes, by rule and new state (pending, firing, resolved).",
+    ["rule", "state"],
+    registry=REGISTRY,
+)
+S3_UPLOAD_SECONDS = Histogram(
+    "s3_upload_duration_seconds",
+    "Latency of S3 audit uploads, including retries.",
+    ["kind"],
+    buckets=_STAGE_BUCKETS,
+    registry=REGISTRY,
+)
+S3_UPLOAD_FAILURES = Counter(
+    "s3_upload_failures_total",
+    "S3 audit uploads that failed after all retries.",
+    ["kind"],
+    registry=REGISTRY,
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total",
+    "In-process cache lookups, by cache and result (hit or miss).",
+    ["cache", "result"],
+    registry=REGISTRY,
+)
+STREAM_CLIENTS = Gauge(
+    "dashboard_stream_clients",
+    "Currently connected /stream (Server-Sent Events) clients.",
+    multiprocess_mode="livesum",
+    registry=REGISTRY,
+)
+STREAM_FRAMES = Counter(
+    "dashboard_stream_frames_total",
+    "Snapshot frames fanned out to /stream clients, by outcome (sent or dropped for a slow client).",
+    ["outcome"],
+    registry=REGISTRY,
+)
+
+
+@contextmanager
+def time_stage(stage: str, sink: Dict[str, float] | None = None) -> Iterator[None]:
+    """Observe the duration of a pipeline stage into `STAGE_SECONDS`.
+
+    When ``sink`` is given the elapsed seconds are also stored under ``stage``.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+        if sink is not None:
+            sink[stage] = elapsed
+
+
+def record_s3_upload(kind: str, n_events: int, seconds: float, ok: bool) -> None:
+    """`S3LogShipper.on_upload` callback feeding the S3 upload metrics."""
+    S3_UPLOAD_SECONDS.labels(kind=kind).observe(seconds)
+    if not ok:
+        S3_UPLOAD_FAILURES.labels(kind=kind).inc()
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count one cache lookup."""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def render_latest() -> bytes:
+    """Serialize the process-wide registry in the text exposition format.
+
+    With ``PROMETHEUS_MULTIPROC_DIR`` set, the values of all live and exited
+    worker processes are merged instead.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
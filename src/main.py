@@ -1,15 +1,59 @@
 from __future__ import annotations
 
+import argparse
+import logging
+import queue
+import random
+import signal
+import threading
+import time
+from collections import deque
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
 
-from data_ingestion import fetch_metrics
-from monitor import get_latest_metrics
-from anomaly_detection import detect_anomaly
+from alerting import AlertEvaluator
+from data_ingestion import fetch_samples, ingest_batch
+from monitor import get_latest_from_store, get_latest_metrics
+from anomaly_detection import anomalous_metrics, detect_anomaly
 from auto_remediate import remediate_action, log_remediation_to_s3
+from ingest_wal import IngestWriter
+from instrumentation import (
+    ANOMALIES,
+    CYCLE_SECONDS,
+    PIPELINE_SECONDS,
+    REMEDIATIONS,
+    SCHEDULER_TICKS,
+    time_stage,
+)
+from metric_store import MetricStore
+from ml_detection import DEFAULT_MODEL_PATH, ModelScorer, get_scorer
+from remediation_engine import Decision, RemediationEngine
+from samples import SampleFrame
+from series import SeriesBatch, parse_series_key
+from s3_shipper import S3LogShipper
+from sharded_detection import ShardedDetector
+from streaming_detection import StreamingDetector
 
 
-def run_pipeline(metrics_path: str | Path, s3_client: Any | None = None, bucket_name: str | None = None) -> Dict[str, Any]:
+logger = logging.getLogger(__name__)
+
+
+def run_pipeline(
+    metrics_path: str | Path,
+    s3_client: Any | None = None,
+    bucket_name: str | None = None,
+    detector: StreamingDetector | None = None,
+    host: str = "local",
+    scorer: ModelScorer | None = None,
+    store: MetricStore | None = None,
+    live: bool = False,
+    log_shipper: S3LogShipper | None = None,
+    sharded: ShardedDetector | None = None,
+    engine: RemediationEngine | None = None,
+    batch: SeriesBatch | None = None,
+    writer: IngestWriter | None = None,
+    alerts: AlertEvaluator | None = None,
+) -> Dict[str, Any]:
     """Run the end-to-end pipeline: ingest → monitor → analyze → (optional) remediate.
 
     Parameters
@@ -20,44 +64,506 @@ def run_pipeline(metrics_path: str | Path, s3_client: Any | None = None, bucket_
         Optional S3 client for logging remediation actions.
     bucket_name: str | None
         Optional bucket name for logging remediation actions.
+    detector: StreamingDetector | None
+        Optional long-lived streaming detector. When given, the latest metrics
+        are folded into its rolling state and statistical outliers also count
+        as an anomaly.
+    host: str
+        Host identity used as the streaming detector series key.
+    scorer: ModelScorer | None
+        Optional pre-loaded IsolationForest scorer (see `ml_detection.get_scorer`).
+        A model outlier also counts as an anomaly.
+    store: MetricStore | None
+        Optional time-series store. Ingestion appends to it and the monitor
+        step reads the latest values back from it instead of re-parsing JSON.
+    live: bool
+        Scrape the targets in `config/aws_targets.json` instead of writing
+        synthetic metrics.
+    log_shipper: S3LogShipper | None
+        Optional background shipper. When given, anomaly and remediation
+        events are queued for batched upload instead of a blocking
+        `put_object` per event, and `remediation_s3_key` stays None.
+    sharded: ShardedDetector | None
+        Optional multi-process detector for the per-host section of a live
+        scrape (`latest_metrics["hosts"]`). Flagged metrics are returned
+        per host under `host_anomalies`.
+    engine: RemediationEngine | None
+        Optional rule-driven remediation engine. When given it replaces the
+        one-action-per-anomalous-cycle behaviour: incidents are matched to
+        rules, deduplicated, cooled down and rate limited, and the outcome
+        per ``host/metric`` is returned under `remediation_decisions`.
+    batch: SeriesBatch | None
+        Optional pushed multi-host samples (see `series.SeriesBatch`). When
+        given they are ingested instead of writing synthetic metrics or
+        scraping, and analyzed per ``host`` label like a live scrape.
+    writer: IngestWriter | None
+        Optional write-ahead writer owning the store and snapshot file.
+        Ingested samples are group-committed through its log and reach
+        ``writer.store`` asynchronously, so the cycle analyzes what it
+        ingested instead of reading it back.
+    alerts: AlertEvaluator | None
+        Optional long-lived alert evaluator. When given, the cycle's samples
+        (``host`` and every fleet host) are folded into its rules and only
+        *firing* alerts trigger remediation, so a single spike that clears
+        within a rule's pending duration does not. Without an engine the
+        action runs once per alert of ``host`` that starts firing, not on
+        every cycle it keeps firing. Firing alerts and this cycle's state
+        changes are returned under `alerts`.
 
     Returns
     -------
     Dict[str, Any]
-        Summary of the run, including metrics and whether anomaly/remediation occurred.
+        Summary of the run, including metrics, whether anomaly/remediation
+        occurred and per-stage `timings` in seconds.
     """
-    path = Path(metrics_path)
+    timings: Dict[str, float] = {}
+    with PIPELINE_SECONDS.time():
+        written_metrics, latest_metrics, frame = _ingest_stage(Path(metrics_path), live, store, timings, batch, writer)
+        result = _analyze_stage(
+            latest_metrics,
+            timings,
+            frame=frame,
+            s3_client=s3_client,
+            bucket_name=bucket_name,
+            detector=detector,
+            host=host,
+            scorer=scorer,
+            log_shipper=log_shipper,
+            sharded=sharded,
+            engine=engine,
+            alerts=alerts,
+        )
+    return {"written_metrics": written_metrics, "latest_metrics": latest_metrics, **result, "timings": timings}
+
+
+def _ingest_stage(
+    path: Path,
+    live: bool,
+    store: MetricStore | None,
+    timings: Dict[str, float],
+    batch: SeriesBatch | None = None,
+    writer: IngestWriter | None = None,
+) -> Tuple[Dict[str, Any], Dict[str, Any], SampleFrame]:
+    """Ingest (Phase 1) and read back (Phase 2); return (written, latest, per-host frame)."""
+    with time_stage("ingest", timings):
+        if batch is None:
+            written_metrics, frame = fetch_samples(path, live=live, store=store, writer=writer)
+        else:
+            written_metrics, frame = ingest_batch(path, batch, store=store, writer=writer)
+
+    with time_stage("monitor", timings):
+        if writer is not None:
+            # The samples may still be buffered for group commit.
+            latest_metrics = dict(written_metrics)
+        elif store is not None:
+            latest_metrics = get_latest_from_store(store, written_metrics.keys())
+            if "hosts" in written_metrics:
+                latest_metrics["hosts"] = written_metrics["hosts"]
+        else:
+            latest_metrics = get_latest_metrics(path)
+    return written_metrics, latest_metrics, frame
+
 
-    # Ingest (Phase 1)
-    written_metrics = fetch_metrics(path)
+def _analyze_stage(
+    latest_metrics: Dict[str, Any],
+    timings: Dict[str, float],
+    s3_client: Any | None = None,
+    bucket_name: str | None = None,
+    detector: StreamingDetector | None = None,
+    host: str = "local",
+    scorer: ModelScorer | None = None,
+    log_shipper: S3LogShipper | None = None,
+    sharded: ShardedDetector | None = None,
+    engine: RemediationEngine | None = None,
+    frame: SampleFrame | None = None,
+    alerts: AlertEvaluator | None = None,
+) -> Dict[str, Any]:
+    """Analyze (Phase 3) and remediate (Phase 4) one metrics snapshot.
 
-    # Monitor (Phase 2)
-    latest_metrics = get_latest_metrics(path)
+    ``frame`` holds the per-host samples of a live scrape; it is built from
+    ``latest_metrics["hosts"]`` when not given. With ``alerts``, remediation
+    follows firing alerts instead of this snapshot's anomaly verdicts.
+    """
+    if frame is None:
+        frame = SampleFrame.from_hosts(latest_metrics.get("hosts") or {})
+    with time_stage("detect", timings):
+        anomaly = detect_anomaly(latest_metrics)
+        streaming_anomalies: Dict[str, float] = {}
+        if detector is not None:
+            streaming_anomalies = detector.update_metrics(host, latest_metrics)
+            anomaly = anomaly or bool(streaming_anomalies)
+        host_anomalies: Dict[str, list] = {}
+        if sharded is not None and len(frame):
+            host_anomalies = sharded.evaluate_frame(frame)
+            anomaly = anomaly or bool(host_anomalies)
+        model_anomaly: bool | None = None
+        if scorer is not None:
+            model_anomaly = scorer.score_metrics(latest_metrics)  # None: not scored
+            anomaly = anomaly or bool(model_anomaly)
 
-    # Analyze (Phase 3)
-    anomaly = detect_anomaly(latest_metrics)
+    alert_summary: Dict[str, Any] | None = None
+    if alerts is not None:
+        with time_stage("alerts", timings):
+            now = frame.ts if frame.ts is not None else time.time()
+            events = alerts.update_frame(SampleFrame.from_metrics(latest_metrics, host=host), ts=now)
+            if len(frame):
+                events += alerts.update_frame(frame, ts=now)
+            firing = alerts.firing_by("host")
+        alert_summary = {"firing": firing, "events": [event._asdict() for event in events]}
 
     remediation_action: str | None = None
     s3_key: str | None = None
+    decisions: Dict[str, str] = {}
 
+    tripped: set = set()
     if anomaly:
-        # Remediate (Phase 4)
-        remediation_action = remediate_action("Anomaly detected")
-        if s3_client is not None and bucket_name:
-            s3_key = log_remediation_to_s3(remediation_action, bucket_name=bucket_name, s3_client=s3_client)
+        tripped = set(anomalous_metrics(latest_metrics)) | set(streaming_anomalies)
+        if model_anomaly:
+            tripped.add("model")
+        for metric in tripped:
+            ANOMALIES.labels(host=host, metric=metric).inc()
+        for fleet_host, metrics in host_anomalies.items():
+            for metric in metrics:
+                ANOMALIES.labels(host=fleet_host, metric=metric).inc()
+
+    if alert_summary is not None:
+        # Only alerts that outlasted their pending duration reach remediation.
+        firing = alert_summary["firing"]
+        tripped, flagged = set(firing.get(host, ())), {h: m for h, m in firing.items() if h != host}
+        # The engine deduplicates open incidents itself; the one-shot action
+        # runs once, when an alert of this host starts firing.
+        act = any(
+            event["state"] == "firing" and parse_series_key(event["series"])[1].get("host") == host
+            for event in alert_summary["events"]
+        )
+    else:
+        flagged, act = host_anomalies, anomaly
+
+    if engine is not None:
+        # The engine also needs recovered cycles, to close open incidents.
+        with time_stage("remediate", timings):
+            actions = []
+            for decision in _engine_decisions(engine, host, latest_metrics, tripped, flagged, frame):
+                incident = decision.incident
+                decisions[f"{incident.host}/{incident.metric}"] = decision.status
+                if decision.status == "dispatched":
+                    actions.append(f"{decision.rule.action} {incident.host}/{incident.metric}")
+                    REMEDIATIONS.labels(host=incident.host).inc()
+            if actions:
+                remediation_action = "; ".join(actions)
+                if log_shipper is not None:
+                    log_shipper.log_anomaly(latest_metrics)
+                    for action in actions:
+                        log_shipper.log_remediation(action)
+                elif s3_client is not None and bucket_name:
+                    s3_key = log_remediation_to_s3(remediation_action, bucket_name=bucket_name, s3_client=s3_client)
+    elif act:
+        with time_stage("remediate", timings):
+            remediation_action = remediate_action("Alert firing" if alert_summary is not None else "Anomaly detected")
+            REMEDIATIONS.labels(host=host).inc()
+            if log_shipper is not None:
+                log_shipper.log_anomaly(latest_metrics)
+                log_shipper.log_remediation(remediation_action)
+            elif s3_client is not None and bucket_name:
+                s3_key = log_remediation_to_s3(remediation_action, bucket_name=bucket_name, s3_client=s3_client)
 
     return {
-        "written_metrics": written_metrics,
-        "latest_metrics": latest_metrics,
         "anomaly": anomaly,
+        "streaming_anomalies": streaming_anomalies,
+        "host_anomalies": host_anomalies,
+        "model_anomaly": model_anomaly,
         "remediation_action": remediation_action,
         "remediation_s3_key": s3_key,
+        "remediation_decisions": decisions,
+        "alerts": alert_summary,
     }
 
 
-if __name__ == "__main__":
-    # Example local run target
-    result = run_pipeline(Path("data/metrics.json"))
-    print(result)
+def _engine_decisions(
+    engine: RemediationEngine,
+    host: str,
+    latest_metrics: Dict[str, Any],
+    tripped: set,
+    host_anomalies: Dict[str, list],
+    frame: SampleFrame,
+) -> List[Decision]:
+    """Feed this cycle's verdicts to the engine; return its decisions."""
+    out = list(engine.evaluate(host, latest_metrics, tripped).values())
+    if len(frame):
+        for fleet_host, metrics in host_anomalies.items():
+            out.extend(engine.evaluate(fleet_host, frame.row(fleet_host), metrics).values())
+        for open_host, metric in engine.open_incidents():
+            if open_host in frame and metric not in host_anomalies.get(open_host, ()):
+                engine.resolve(open_host, metric)
+    return out
+
+
+class CycleReport(NamedTuple):
+    """Timing and outcome of one scheduler cycle."""
 
+    cycle: int
+    scheduled_at: float
+    ingest_seconds: float
+    analyze_seconds: float
+    latency_seconds: float
+    anomaly: bool
+    timings: Dict[str, float]
+
+
+_DONE = object()
+
+
+class PipelineScheduler:
+    """Run ingest → detect → remediate continuously on a fixed interval.
+
+    Ingestion and analysis run in two threads connected by a one-slot
+    hand-off, so ingestion of cycle N+1 overlaps detection/remediation of
+    cycle N. Overruns are absorbed rather than queued:
+
+    - if ingestion overruns the interval, the missed ticks are skipped;
+    - if detection is still busy when a newer snapshot arrives, the waiting
+      snapshot is replaced by the newer one (coalesced).
+
+    Long-lived state (streaming detector, model scorer, store, S3 shipper,
+    alert evaluator) is passed once and reused every cycle.
+
+    Parameters
+    ----------
+    metrics_path: str | Path
+        Snapshot path passed to the ingest stage.
+    interval: float
+        Seconds between ticks.
+    jitter: float
+        Random delay of up to this many seconds added to each tick, so many
+        schedulers started together do not hit targets in lockstep.
+    max_cycles: int | None
+        Stop after this many ingest cycles (None runs until :meth:`stop`).
+    history: int
+        Number of recent :class:`CycleReport` entries kept in `reports`.
+    on_cycle: Callable[[CycleReport], None] | None
+        Optional callback invoked after each analyzed cycle.
+    **pipeline_options
+        Keyword arguments of `run_pipeline` other than `metrics_path`
+        (s3_client, bucket_name, detector, host, scorer, store, live,
+        log_shipper, writer, alerts).
+    """
 
+    def __init__(
+        self,
+        metrics_path: str | Path,
+        interval: float = 15.0,
+        jitter: float = 0.0,
+        max_cycles: int | None = None,
+        history: int = 1000,
+        on_cycle: Callable[[CycleReport], None] | None = None,
+        **pipeline_options: Any,
+    ) -> None:
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.metrics_path = Path(metrics_path)
+        self.interval = float(interval)
+        self.jitter = float(jitter)
+        self.max_cycles = max_cycles
+        self.on_cycle = on_cycle
+        self.reports: deque[CycleReport] = deque(maxlen=history)
+        self.stats: Dict[str, int] = {"cycles": 0, "skipped_ticks": 0, "coalesced": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+
+        self._live = bool(pipeline_options.pop("live", False))
+        self._store: MetricStore | None = pipeline_options.pop("store", None)
+        self._writer: IngestWriter | None = pipeline_options.pop("writer", None)
+        self._analyze_options = pipeline_options
+        self._stop = threading.Event()
+        self._handoff: "queue.Queue[Any]" = queue.Queue(maxsize=1)
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "PipelineScheduler":
+        """Start the ingest and analyze threads and return immediately."""
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._ingest_loop, name="pipeline-ingest", daemon=True),
+            threading.Thread(target=self._analyze_loop, name="pipeline-analyze", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def join(self, timeout: float | None = None) -> None:
+        """Wait for both stage threads to finish."""
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def run(self) -> List[CycleReport]:
+        """Run in the foreground until `max_cycles` or :meth:`stop`."""
+        self.start()
+        while any(t.is_alive() for t in self._threads):
+            self.join(timeout=0.5)
+        return list(self.reports)
+
+    def stop(self, timeout: float | None = 30.0) -> None:
+        """Stop ticking, finish the in-flight cycle and flush the S3 shipper."""
+        self._stop.set()
+        self.join(timeout)
+
+    def _count(self, name: str, n: int = 1) -> None:
+        """Add ``n`` to ``stats[name]``; both stage threads update the counters."""
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def _ingest_loop(self) -> None:
+        next_tick = time.monotonic()
+        cycle = 0
+        try:
+            while not self._stop.is_set():
+                delay = next_tick + (random.uniform(0, self.jitter) if self.jitter else 0.0) - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                scheduled_at = next_tick
+                timings: Dict[str, float] = {}
+                started = time.perf_counter()
+                try:
+                    _, latest, frame = _ingest_stage(self.metrics_path, self._live, self._store, timings, writer=self._writer)
+                except Exception:
+                    self._count("errors")
+                    logger.exception("ingest failed in cycle %d", cycle)
+                else:
+                    self._offer((cycle, scheduled_at, latest, frame, timings, time.perf_counter() - started))
+                SCHEDULER_TICKS.labels(outcome="run").inc()
+
+                cycle += 1
+                if self.max_cycles is not None and cycle >= self.max_cycles:
+                    break
+                next_tick += self.interval
+                now = time.monotonic()
+                if now > next_tick:
+                    missed = int((now - next_tick) // self.interval) + 1
+                    next_tick += missed * self.interval
+                    self._count("skipped_ticks", missed)
+                    SCHEDULER_TICKS.labels(outcome="skipped").inc(missed)
+        finally:
+            self._handoff.put(_DONE)
+
+    def _offer(self, item: Tuple[Any, ...]) -> None:
+        """Hand a snapshot to the analyze thread, replacing one still waiting."""
+        while True:
+            try:
+                self._handoff.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._handoff.get_nowait()
+                except queue.Empty:
+                    continue
+                self._count("coalesced")
+                SCHEDULER_TICKS.labels(outcome="coalesced").inc()
+
+    def _analyze_loop(self) -> None:
+        try:
+            while True:
+                item = self._handoff.get()
+                if item is _DONE:
+                    break
+                cycle, scheduled_at, latest, frame, timings, ingest_seconds = item
+                started = time.perf_counter()
+                try:
+                    result = _analyze_stage(latest, timings, frame=frame, **self._analyze_options)
+                except Exception:
+                    self._count("errors")
+                    logger.exception("analysis failed in cycle %d", cycle)
+                    continue
+                latency = time.monotonic() - scheduled_at
+                report = CycleReport(
+                    cycle=cycle,
+                    scheduled_at=scheduled_at,
+                    ingest_seconds=ingest_seconds,
+                    analyze_seconds=time.perf_counter() - started,
+                    latency_seconds=latency,
+                    anomaly=bool(result["anomaly"]),
+                    timings=timings,
+                )
+                CYCLE_SECONDS.observe(latency)
+                self._count("cycles")
+                self.reports.append(report)
+                if self.on_cycle is not None:
+                    self.on_cycle(report)
+        finally:
+            engine = self._analyze_options.get("engine")
+            if engine is not None:
+                engine.wait()
+            shipper = self._analyze_options.get("log_shipper")
+            if shipper is not None:
+                shipper.flush()
+
+
+def install_signal_handlers(scheduler: PipelineScheduler) -> None:
+    """Stop `scheduler` gracefully on SIGTERM/SIGINT (call from the main thread)."""
+
+    def _handle(signum: int, _frame: Any) -> None:
+        logger.info("received signal %d, stopping scheduler", signum)
+        # Don't block the handler; `run` keeps joining the stage threads.
+        scheduler.stop(timeout=0)
+
+    signal.signal(signal.SIGTERM, _handle)
+    signal.signal(signal.SIGINT, _handle)
+
+
+def main(argv: List[str] | None = None) -> None:
+    """Command-line entry point: run one pipeline cycle, or the scheduler with ``--loop``.
+
+    The metric store and write-ahead log writer are closed on exit, the
+    writer first so its final commit reaches the store.
+    """
+    parser = argparse.ArgumentParser(description="Run the ai-smartcloudops pipeline")
+    parser.add_argument("--metrics-path", type=Path, default=Path("data/metrics.json"))
+    parser.add_argument("--loop", action="store_true", help="run continuously instead of once")
+    parser.add_argument("--interval", type=float, default=15.0, help="seconds between cycles (--loop)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="max random delay per tick (--loop)")
+    parser.add_argument("--max-cycles", type=int, default=None, help="stop after N cycles (--loop)")
+    parser.add_argument("--live", action="store_true", help="scrape config/aws_targets.json targets")
+    parser.add_argument("--store", type=Path, default=None, help="metric store directory")
+    parser.add_argument("--wal", type=Path, default=None, help="write-ahead log directory for group-committed ingestion")
+    args = parser.parse_args(argv)
+
+    # Long-lived state is created once, before the first cycle
+    store = MetricStore(args.store) if args.store else None
+    writer: IngestWriter | None = None
+    try:
+        options: Dict[str, Any] = {
+            "scorer": get_scorer() if DEFAULT_MODEL_PATH.exists() else None,
+            "store": store,
+            "live": args.live,
+        }
+        if args.wal:
+            # Replays whatever a crashed run left in the log before the first cycle
+            writer = options["writer"] = IngestWriter(args.wal, store=store, snapshot_path=args.metrics_path).start()
+        if not args.loop:
+            print(run_pipeline(args.metrics_path, **options))
+            return
+
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+        scheduler = PipelineScheduler(
+            args.metrics_path,
+            interval=args.interval,
+            jitter=args.jitter,
+            max_cycles=args.max_cycles,
+            detector=StreamingDetector(),
+            engine=RemediationEngine(),
+            alerts=AlertEvaluator(resolution=args.interval),
+            on_cycle=lambda r: logger.info(
+                "cycle %d ingest=%.4fs analyze=%.4fs latency=%.4fs anomaly=%s",
+                r.cycle, r.ingest_seconds, r.analyze_seconds, r.latency_seconds, r.anomaly,
+            ),
+            **options,
+        )
+        install_signal_handlers(scheduler)
+        scheduler.run()
+        logger.info("scheduler stopped: %s", scheduler.stats)
+    finally:
+        if writer is not None:
+            writer.close()
+        if store is not None:
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
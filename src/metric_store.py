@@ -0,0 +1,1078 @@
+"""Append-only, segmented time-series store for metric history.
+
+Layout of a store directory::
+
+    series.ndjson      one JSON string per line; the line number is the series id
+    latest.bin         fixed 16-byte (ts, value) slot per series id -> O(1) latest reads;
+                       NaN until the series' first sample is written
+    manifest.json      segment list with sealed time ranges
+    seg-00000001.bin   packed (sid: u4, ts: f8, value: f8) records
+    seg-00000001.idx   per-series start offsets of a sealed segment
+    rollup60.manifest.json, rollup60-00000001.bin/.idx, ...
+                       the same segment layout for each rollup tier, holding
+                       (sid, bucket start, count, sum, min, max, last) records
+
+New samples are appended to the active segment in arrival order. When it
+reaches ``segment_records`` it is sealed: records are re-sorted by
+(series id, timestamp) and an offset index is written next to it, so range
+reads on sealed segments are two binary searches over a memory map. Only the
+active segment is ever scanned.
+
+Rollups are maintained incrementally at ingestion: for every tier (1 minute
+and 1 hour by default) the writer keeps one open bucket per series in memory
+and appends it to the tier's log once a sample for a later bucket arrives.
+A late sample (older than its series' open bucket, e.g. a backfill) is
+appended as an extra record for its own bucket; reads merge records that
+share a bucket. :meth:`MetricStore.series` answers long windows from the
+coarsest tier that fits the requested step and fills the still-open tail
+from raw samples.
+
+A single writer process is assumed; any number of readers may open the same
+directory with ``readonly=True`` and call :meth:`MetricStore.refresh` (done
+automatically on lookups) to pick up new series and segments.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from samples import SampleFrame
+from series import SeriesBatch, SeriesRegistry, get_registry, series_key
+
+
+RECORD_DTYPE = np.dtype([("sid", "<u4"), ("ts", "<f8"), ("value", "<f8")])
+LATEST_DTYPE = np.dtype([("ts", "<f8"), ("value", "<f8")])
+ROLLUP_DTYPE = np.dtype([
+    ("sid", "<u4"), ("ts", "<f8"), ("count", "<u4"),
+    ("sum", "<f8"), ("min", "<f8"), ("max", "<f8"), ("last", "<f8"),
+])
+AGGREGATIONS = ("avg", "min", "max", "sum", "count", "last", "p95")
+DEFAULT_ROLLUPS = (60.0, 3600.0)
+# Aggregations that rollup records (count, sum, min, max, last) can answer exactly.
+ROLLUP_AGGREGATIONS = ("avg", "min", "max", "sum", "count", "last")
+
+_SERIES_FILE = "series.ndjson"
+_LATEST_FILE = "latest.bin"
+_MANIFEST_FILE = "manifest.json"
+
+
+class Series(NamedTuple):
+    """Samples of one series, ordered by timestamp."""
+
+    timestamps: np.ndarray
+    values: np.ndarray
+
+
+class BucketedSeries(NamedTuple):
+    """Output of :meth:`MetricStore.series`.
+
+    Attributes
+    ----------
+    timestamps: np.ndarray
+        Bucket start times (multiples of ``step``); empty buckets are omitted.
+    values: Dict[str, np.ndarray]
+        One array per requested aggregation, aligned with ``timestamps``.
+    resolution: float
+        Resolution of the data read: a rollup tier in seconds, or 0 for raw.
+    """
+
+    timestamps: np.ndarray
+    values: Dict[str, np.ndarray]
+    resolution: float
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """Replace ``path`` with ``data`` via a temporary file, so readers never see a partial file."""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class _Segment:
+    """Manifest entry plus lazily opened read-side state for one segment."""
+
+    __slots__ = ("name", "count", "min_ts", "max_ts", "sealed", "_records", "_sids", "_starts")
+
+    def __init__(self, name: str, count: int = 0, min_ts: float | None = None,
+                 max_ts: float | None = None, sealed: bool = False) -> None:
+        self.name = name
+        self.count = count
+        self.min_ts = min_ts
+        self.max_ts = max_ts
+        self.sealed = sealed
+        self._records: np.ndarray | None = None
+        self._sids: np.ndarray | None = None
+        self._starts: np.ndarray | None = None
+
+    def to_json(self) -> Dict[str, Any]:
+        """Manifest entry of this segment."""
+        return {
+            "name": self.name,
+            "count": self.count,
+            "min_ts": self.min_ts,
+            "max_ts": self.max_ts,
+            "sealed": self.sealed,
+        }
+
+    def overlaps(self, start: float, end: float) -> bool:
+        """True if the segment may hold samples in ``[start, end]`` (always, while empty)."""
+        if self.min_ts is None or self.max_ts is None:
+            return True
+        return self.max_ts >= start and self.min_ts <= end
+
+    def read_sealed(self, root: Path, sid: int, dtype: np.dtype = RECORD_DTYPE) -> np.ndarray:
+        """Return the contiguous (memory-mapped) records of ``sid``."""
+        if self._records is None:
+            self._records = np.memmap(root / f"{self.name}.bin", dtype=dtype, mode="r")
+            index = np.load(root / f"{self.name}.idx")
+            self._sids, self._starts = index[0], index[1]
+        pos = int(np.searchsorted(self._sids, sid))
+        if pos >= len(self._sids) or self._sids[pos] != sid:
+            return self._records[:0]
+        stop = int(self._starts[pos + 1]) if pos + 1 < len(self._starts) else len(self._records)
+        return self._records[int(self._starts[pos]):stop]
+
+
+class _SegmentLog:
+    """Segmented append-only log of ``dtype`` records keyed by (sid, ts).
+
+    Holds the segment list and manifest of one record stream: raw samples use
+    the ``seg`` prefix and ``manifest.json``; each rollup tier has its own log.
+    """
+
+    def __init__(self, root: Path, prefix: str, dtype: np.dtype, segment_records: int, manifest: str) -> None:
+        self.root = root
+        self.prefix = prefix
+        self.dtype = dtype
+        self.segment_records = int(segment_records)
+        self.manifest = manifest
+        self.segments: List[_Segment] = []
+        self._manifest_mtime: int | None = None
+        self._active_file: Any = None
+
+    def refresh(self) -> None:
+        """Reload the segment list if the manifest changed, keeping opened sealed segments."""
+        manifest = self.root / self.manifest
+        try:
+            mtime = manifest.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        data = json.loads(manifest.read_text(encoding="utf-8"))
+        known = {seg.name: seg for seg in self.segments if seg.sealed}
+        segments = []
+        for entry in data["segments"]:
+            seg = known.get(entry["name"]) or _Segment(**entry)
+            seg.count = entry["count"]
+            segments.append(seg)
+        self.segments = segments
+        self._manifest_mtime = mtime
+
+    def open_writer(self) -> None:
+        """Create or recover the active segment and open it for appending."""
+        if not self.segments:
+            self.segments.append(_Segment(f"{self.prefix}-00000001"))
+            self._write_manifest()
+        self._recover_active()
+        self._open_active()
+        if self.segments[-1].count >= self.segment_records:
+            # A crash right after the last record of a segment left it full but unsealed.
+            self._seal_active()
+
+    def close(self) -> None:
+        """Close the active segment file, if open."""
+        if self._active_file is not None:
+            self._active_file.close()
+            self._active_file = None
+
+    def _write_manifest(self) -> None:
+        """Atomically rewrite the manifest and remember its mtime."""
+        payload = json.dumps({"segments": [seg.to_json() for seg in self.segments]})
+        _write_atomic(self.root / self.manifest, payload.encode("utf-8"))
+        self._manifest_mtime = (self.root / self.manifest).stat().st_mtime_ns
+
+    def _recover_active(self) -> None:
+        """Rebuild in-memory state of the active segment after a restart.
+
+        A torn trailing record from an interrupted write is truncated away.
+        """
+        active = self.segments[-1]
+        path = self.root / f"{active.name}.bin"
+        if not path.exists():
+            return
+        size = path.stat().st_size
+        n_records = size // self.dtype.itemsize
+        if size != n_records * self.dtype.itemsize:
+            os.truncate(path, n_records * self.dtype.itemsize)
+        active.count = n_records
+        if n_records:
+            ts = np.memmap(path, dtype=self.dtype, mode="r", shape=(n_records,))["ts"]
+            active.min_ts, active.max_ts = float(ts.min()), float(ts.max())
+
+    def _open_active(self) -> None:
+        """Open the active segment file for appending."""
+        self._active_file = open(self.root / f"{self.segments[-1].name}.bin", "ab")
+
+    def append(self, records: np.ndarray) -> None:
+        """Append ``records`` in order, sealing each segment as it fills up."""
+        written = 0
+        while written < len(records):
+            active = self.segments[-1]
+            room = self.segment_records - active.count
+            if room <= 0:
+                self._seal_active()
+                continue
+            part = records[written:written + room]
+            self._active_file.write(part.tobytes())
+            active.count += len(part)
+            lo, hi = float(part["ts"].min()), float(part["ts"].max())
+            active.min_ts = lo if active.min_ts is None else min(active.min_ts, lo)
+            active.max_ts = hi if active.max_ts is None else max(active.max_ts, hi)
+            written += len(part)
+            if active.count >= self.segment_records:
+                self._seal_active()
+        self._active_file.flush()
+
+    def _seal_active(self) -> None:
+        """Sort the full active segment by (sid, ts), index it and start a new one."""
+        active = self.segments[-1]
+        self._active_file.close()
+        path = self.root / f"{active.name}.bin"
+        data = np.fromfile(path, dtype=self.dtype)
+        data = data[np.lexsort((data["ts"], data["sid"]))]
+        sids, starts = np.unique(data["sid"], return_index=True)
+        _write_atomic(path, data.tobytes())
+        with (self.root / f"{active.name}.idx.tmp").open("wb") as fh:
+            np.save(fh, np.stack([sids.astype(np.int64), starts.astype(np.int64)]))
+        os.replace(self.root / f"{active.name}.idx.tmp", self.root / f"{active.name}.idx")
+        active.sealed = True
+
+        number = int(active.name.rsplit("-", 1)[1]) + 1
+        self.segments.append(_Segment(f"{self.prefix}-{number:08d}"))
+        self._write_manifest()
+        self._open_active()
+
+    def read(self, sid: int, lo: float, hi: float) -> np.ndarray:
+        """Return the records of ``sid`` with ``lo <= ts <= hi``, ordered by ts.
+
+        Sealed segments outside the window are skipped by their manifest time
+        range; overlapping ones are memory-mapped and sliced by binary search.
+        """
+        parts = []
+        for seg in self.segments:
+            if seg.sealed:
+                if not seg.overlaps(lo, hi):
+                    continue
+                rows = seg.read_sealed(self.root, sid, self.dtype)
+                ts = rows["ts"]
+                rows = rows[np.searchsorted(ts, lo, "left"):np.searchsorted(ts, hi, "right")]
+            else:
+                rows = self._scan_active(seg, sid, lo, hi)
+            if len(rows):
+                parts.append(rows)
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        rows = np.concatenate(parts) if len(parts) > 1 else np.array(parts[0])
+        if len(rows) > 1 and np.any(np.diff(rows["ts"]) < 0):
+            rows = rows[np.argsort(rows["ts"], kind="stable")]
+        return rows
+
+    def _scan_active(self, seg: _Segment, sid: int, lo: float, hi: float) -> np.ndarray:
+        """Return the records of ``sid`` in ``[lo, hi]`` from an unsorted, unsealed segment."""
+        path = self.root / f"{seg.name}.bin"
+        try:
+            n_records = path.stat().st_size // self.dtype.itemsize
+        except FileNotFoundError:
+            n_records = 0
+        if n_records == 0:
+            return np.empty(0, dtype=self.dtype)
+        records = np.memmap(path, dtype=self.dtype, mode="r", shape=(n_records,))
+        ts = records["ts"]
+        return records[(records["sid"] == sid) & (ts >= lo) & (ts <= hi)]
+
+
+class _RollupState:
+    """Open (not yet written) rollup bucket of every series for one tier.
+
+    Kept as parallel arrays indexed by series id, so folding a batch in is a
+    handful of fancy-indexed numpy updates.
+    """
+
+    _FIELDS = ("count", "sum", "min", "max", "last")
+
+    def __init__(self, resolution: float) -> None:
+        self.resolution = float(resolution)
+        self.ts = np.full(0, np.nan)
+        self.count = np.zeros(0, dtype=np.uint32)
+        self.sum = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+        self.last = np.zeros(0)
+
+    def ensure(self, n_series: int) -> None:
+        """Grow the arrays (to a power of two) to hold at least ``n_series`` series."""
+        if len(self.ts) >= n_series:
+            return
+        size = max(1024, 1 << (n_series - 1).bit_length())
+        self.ts = np.concatenate([self.ts, np.full(size - len(self.ts), np.nan)])
+        for name in self._FIELDS:
+            old = getattr(self, name)
+            setattr(self, name, np.concatenate([old, np.zeros(size - len(old), dtype=old.dtype)]))
+
+    def records(self, sids: np.ndarray) -> np.ndarray:
+        """Open buckets of ``sids`` as rollup records."""
+        out = np.empty(len(sids), dtype=ROLLUP_DTYPE)
+        out["sid"] = sids
+        out["ts"] = self.ts[sids]
+        for name in self._FIELDS:
+            out[name] = getattr(self, name)[sids]
+        return out
+
+    def update(self, sids: np.ndarray, stamps: np.ndarray, values: np.ndarray) -> np.ndarray | None:
+        """Fold samples (at most one per series) into open buckets.
+
+        Returns the rollup records to append, or None: buckets closed by later
+        samples, and one single-sample record per sample older than its
+        series' open bucket (merged with the bucket's other records on read).
+        """
+        bucket = np.floor(stamps / self.resolution) * self.resolution
+        current = self.ts[sids]
+        same = bucket == current
+        if same.all():
+            self.count[sids] += 1
+            self.sum[sids] += values
+            self.min[sids] = np.minimum(self.min[sids], values)
+            self.max[sids] = np.maximum(self.max[sids], values)
+            self.last[sids] = values
+            return None
+
+        opened = np.isnan(current)
+        fresh = opened | (bucket > current)
+        closing = sids[fresh & ~opened]
+        closed = self.records(closing) if len(closing) else None
+        late = bucket < current
+        if late.any():
+            records = np.zeros(int(late.sum()), dtype=ROLLUP_DTYPE)
+            records["sid"] = sids[late]
+            records["ts"] = bucket[late]
+            records["count"] = 1
+            for name in ("sum", "min", "max", "last"):
+                records[name] = values[late]
+            closed = records if closed is None else np.concatenate([closed, records])
+
+        if same.any():
+            idx, v = sids[same], values[same]
+            self.count[idx] += 1
+            self.sum[idx] += v
+            self.min[idx] = np.minimum(self.min[idx], v)
+            self.max[idx] = np.maximum(self.max[idx], v)
+            self.last[idx] = v
+
+        idx, v = sids[fresh], values[fresh]
+        self.ts[idx] = bucket[fresh]
+        self.count[idx] = 1
+        self.sum[idx] = v
+        self.min[idx] = v
+        self.max[idx] = v
+        self.last[idx] = v
+        return closed
+
+    def pending(self) -> np.ndarray:
+        """Rollup records of every open bucket."""
+        return self.records(np.flatnonzero(~np.isnan(self.ts)))
+
+    def restore(self, records: np.ndarray) -> None:
+        """Reopen the buckets saved by :meth:`pending`."""
+        if not len(records):
+            return
+        sids = records["sid"].astype(np.intp)
+        self.ensure(int(sids.max()) + 1)
+        self.ts[sids] = records["ts"]
+        for name in self._FIELDS:
+            getattr(self, name)[sids] = records[name]
+
+
+def _occurrence_rounds(sids: np.ndarray) -> List[np.ndarray] | None:
+    """Split a batch with repeated series ids into rounds of unique ids.
+
+    Returns None when every id is already unique (the common case).
+    """
+    if len(sids) < 2:
+        return None
+    order = np.argsort(sids, kind="stable")
+    ordered = sids[order]
+    repeated = ordered[1:] == ordered[:-1]
+    if not repeated.any():
+        return None
+    run_start = np.concatenate(([0], np.flatnonzero(~repeated) + 1))
+    run_len = np.diff(np.append(run_start, len(sids)))
+    rank = np.empty(len(sids), dtype=np.int64)
+    rank[order] = np.arange(len(sids)) - np.repeat(run_start, run_len)
+    return [np.flatnonzero(rank == r) for r in range(int(run_len.max()))]
+
+
+class MetricStore:
+    """Segmented append-only metric history with O(1) latest-value reads.
+
+    Parameters
+    ----------
+    root: str | Path
+        Store directory; created on first write.
+    segment_records: int
+        Records per segment before it is sealed and a new one started.
+    readonly: bool
+        Open for reading only (e.g. from the dashboard process).
+    rollups: Sequence[float]
+        Rollup tier resolutions in seconds, maintained at ingestion.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        segment_records: int = 1 << 20,
+        readonly: bool = False,
+        rollups: Sequence[float] = DEFAULT_ROLLUPS,
+    ) -> None:
+        self.root = Path(root)
+        self.segment_records = int(segment_records)
+        self.readonly = readonly
+        self._lock = threading.RLock()
+
+        self._ids: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._series_offset = 0
+        self._latest_fd: int | None = None
+        self._latest_map: np.memmap | None = None
+        self._latest_view: np.ndarray | None = None
+        # Per `series.SeriesRegistry`: store sid of each registry id (-1 if not
+        # yet mapped), and registry id of each store sid.
+        self._store_sids: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._registry_ids: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._log = _SegmentLog(self.root, "seg", RECORD_DTYPE, self.segment_records, _MANIFEST_FILE)
+        self._rollups: Dict[float, Tuple[_SegmentLog, _RollupState]] = {}
+        for resolution in sorted(float(r) for r in rollups):
+            name = f"rollup{resolution:g}"
+            log = _SegmentLog(self.root, name, ROLLUP_DTYPE, self.segment_records, f"{name}.manifest.json")
+            self._rollups[resolution] = (log, _RollupState(resolution))
+
+        if not readonly:
+            self.root.mkdir(parents=True, exist_ok=True)
+            (self.root / _SERIES_FILE).touch()
+            latest = self.root / _LATEST_FILE
+            if not latest.exists():
+                latest.write_bytes(b"")
+        self.refresh()
+        if not readonly:
+            self._log.open_writer()
+            for log, state in self._rollups.values():
+                log.open_writer()
+                if not self._load_open_buckets(log, state):
+                    self._replay_open_buckets(log, state)
+            self._ensure_latest_capacity(max(1, len(self._keys)))
+
+    @property
+    def rollup_resolutions(self) -> Tuple[float, ...]:
+        """Resolutions (seconds) of the maintained rollup tiers, finest first."""
+        return tuple(self._rollups)
+
+    # -- lifecycle -------------------------------------------------------
+
+    def close(self) -> None:
+        """Flush and release file handles.
+
+        Open rollup buckets are saved and resumed by the next writer; after a
+        crash they are rebuilt by replaying raw samples on the next open.
+        """
+        with self._lock:
+            if not self.readonly and self._log._active_file is not None:
+                for log, state in self._rollups.values():
+                    pending = state.pending()
+                    if len(pending):
+                        _write_atomic(self.root / f"{log.prefix}.open.bin", pending.tobytes())
+            self._log.close()
+            for log, _ in self._rollups.values():
+                log.close()
+            if self._latest_map is not None:
+                self._latest_map.flush()
+                self._latest_map = None
+            self._latest_view = None
+            if self._latest_fd is not None:
+                os.close(self._latest_fd)
+                self._latest_fd = None
+
+    def sync(self) -> None:
+        """Force appended samples, new series and latest slots to stable storage."""
+        with self._lock:
+            if self.readonly:
+                return
+            for log in (self._log, *(log for log, _ in self._rollups.values())):
+                if log._active_file is not None:
+                    log._active_file.flush()
+                    os.fsync(log._active_file.fileno())
+            with (self.root / _SERIES_FILE).open("rb") as fh:
+                os.fsync(fh.fileno())
+            if self._latest_map is not None:
+                self._latest_map.flush()
+
+    def _load_open_buckets(self, log: _SegmentLog, state: _RollupState) -> bool:
+        """Resume a tier's open buckets saved by :meth:`close`; False if there are none."""
+        path = self.root / f"{log.prefix}.open.bin"
+        if not path.exists():
+            return False
+        pending = np.fromfile(path, dtype=ROLLUP_DTYPE)
+        # Consumed exactly once, so a later crash cannot re-emit these buckets.
+        path.unlink()
+        state.restore(pending)
+        return True
+
+    def _replay_open_buckets(self, log: _SegmentLog, state: _RollupState) -> None:
+        """Rebuild a tier's open buckets (or backfill a new tier) from raw samples.
+
+        Every raw sample at or after the end of the tier's newest written
+        bucket is folded in again, segment by segment, in time order.
+        """
+        written = [seg.max_ts for seg in log.segments if seg.max_ts is not None]
+        since = max(written) + state.resolution if written else -np.inf
+        for seg in self._log.segments:
+            path = self.root / f"{seg.name}.bin"
+            if seg.max_ts is None or seg.max_ts < since or not path.exists():
+                continue
+            records = np.fromfile(path, dtype=RECORD_DTYPE)
+            records = records[records["ts"] >= since]
+            if len(records):
+                records = records[np.argsort(records["ts"], kind="stable")]
+                self._fold_rollups(
+                    [(log, state)], records["sid"].astype(np.intp), records["ts"], records["value"]
+                )
+
+    def __enter__(self) -> "MetricStore":
+        """Return the store itself."""
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        """Close the store."""
+        self.close()
+
+    def refresh(self) -> None:
+        """Pick up series and segments added by a writer in another process."""
+        with self._lock:
+            self._load_series()
+            self._log.refresh()
+            for log, _ in self._rollups.values():
+                log.refresh()
+
+    def _load_series(self) -> None:
+        """Read series keys appended to the registry file since the last call."""
+        path = self.root / _SERIES_FILE
+        try:
+            with path.open("rb") as fh:
+                fh.seek(self._series_offset)
+                chunk = fh.read()
+        except FileNotFoundError:
+            return
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            key = json.loads(line)
+            self._ids[key] = len(self._keys)
+            self._keys.append(key)
+        self._series_offset += end
+
+    # -- series registry -------------------------------------------------
+
+    def keys(self) -> List[str]:
+        """Return all known series keys in id order."""
+        with self._lock:
+            self._load_series()
+            return list(self._keys)
+
+    def _sid(self, key: str) -> int | None:
+        """Series id of ``key``, reloading the registry once on a miss; None if unknown."""
+        sid = self._ids.get(key)
+        if sid is None:
+            self._load_series()
+            sid = self._ids.get(key)
+        return sid
+
+    def _register(self, keys: Iterable[str]) -> np.ndarray:
+        """Map keys to series ids, appending unseen keys to the registry."""
+        ids = self._ids
+        new_lines = []
+        sids = []
+        for key in keys:
+            sid = ids.get(key)
+            if sid is None:
+                sid = len(self._keys)
+                ids[key] = sid
+                self._keys.append(key)
+                new_lines.append(json.dumps(key))
+            sids.append(sid)
+        if new_lines:
+            # Latest slots exist (as NaN) before readers can see the new keys.
+            self._ensure_latest_capacity(len(self._keys))
+            data = ("\n".join(new_lines) + "\n").encode("utf-8")
+            with (self.root / _SERIES_FILE).open("ab") as fh:
+                fh.write(data)
+            self._series_offset += len(data)
+        return np.asarray(sids, dtype=np.uint32)
+
+    def _ensure_latest_capacity(self, n_series: int) -> None:
+        """Grow ``latest.bin`` to at least ``n_series`` slots, new slots set to NaN."""
+        if self._latest_map is not None and len(self._latest_map) >= n_series:
+            return
+        capacity = max(1024, 1 << (n_series - 1).bit_length())
+        path = self.root / _LATEST_FILE
+        with path.open("r+b") as fh:
+            size = os.fstat(fh.fileno()).st_size // LATEST_DTYPE.itemsize
+            if size < capacity:
+                fh.truncate(size * LATEST_DTYPE.itemsize)  # drop a torn trailing slot
+                fh.seek(0, os.SEEK_END)
+                fh.write(np.full(capacity - size, np.nan, dtype=LATEST_DTYPE).tobytes())
+        if self._latest_map is not None:
+            self._latest_map.flush()
+        self._latest_map = np.memmap(path, dtype=LATEST_DTYPE, mode="r+")
+
+    # -- writes ----------------------------------------------------------
+
+    def append_many(self, keys: Sequence[str], values: Any, ts: Any = None) -> None:
+        """Append one sample per entry of ``keys``.
+
+        Parameters
+        ----------
+        keys: Sequence[str]
+            Series keys (see :func:`series_key`).
+        values: array-like of float
+            Sample values aligned with ``keys``.
+        ts: float | array-like of float | None
+            Epoch-seconds timestamp(s); defaults to now for the whole batch.
+        """
+        if self.readonly:
+            raise PermissionError("store opened read-only")
+        vals = np.asarray(values, dtype=np.float64).reshape(-1)
+        if len(vals) != len(keys):
+            raise ValueError("keys and values must have the same length")
+        if not len(vals):
+            return
+        with self._lock:
+            self._append_sids(self._register(keys), vals, ts)
+
+    def append_batch(self, batch: SeriesBatch, only_newer: bool = False) -> int:
+        """Append a `series.SeriesBatch`; return the number of samples written.
+
+        Registry ids are translated to store ids through a per-registry
+        array, so a series seen before costs an array lookup instead of
+        building and hashing its key. With ``only_newer``, samples not newer
+        than their series' latest stored sample are skipped (used to replay
+        a write-ahead log idempotently).
+        """
+        if self.readonly:
+            raise PermissionError("store opened read-only")
+        if not len(batch):
+            return 0
+        with self._lock:
+            sids = self._sids_for(batch.registry, batch.ids)
+            values, stamps = batch.values, batch.ts
+            if only_newer:
+                keep = ~(stamps <= self._latest_map["ts"][sids])  # NaN: nothing stored yet
+                if not keep.all():
+                    sids, values, stamps = sids[keep], values[keep], stamps[keep]
+                    if not len(sids):
+                        return 0
+            self._append_sids(sids, values, stamps)
+            return len(sids)
+
+    def _sids_for(self, registry: SeriesRegistry, ids: np.ndarray) -> np.ndarray:
+        """Store ids of ``registry`` ids, registering series the store has not seen yet."""
+        table = self._store_sids.get(registry)
+        if table is None or len(table) < len(registry):
+            grown = np.full(max(1024, 1 << (len(registry) - 1).bit_length()), -1, dtype=np.int64)
+            if table is not None:
+                grown[:len(table)] = table
+            table = self._store_sids[registry] = grown
+        sids = table[ids]
+        missing = sids < 0
+        if missing.any():
+            new = np.unique(ids[missing])
+            table[new] = self._register(registry.keys(new))
+            sids = table[ids]
+        return sids.astype(np.uint32)
+
+    def _append_sids(self, sids: np.ndarray, vals: np.ndarray, ts: Any) -> None:
+        """Write samples of known series ids to the log, rollups and latest slots."""
+        stamps = np.broadcast_to(np.asarray(time.time() if ts is None else ts, dtype=np.float64), vals.shape)
+        records = np.empty(len(vals), dtype=RECORD_DTYPE)
+        records["sid"] = sids
+        records["ts"] = stamps
+        records["value"] = vals
+        self._log.append(records)
+
+        if self._rollups:
+            self._fold_rollups(self._rollups.values(), sids.astype(np.intp), records["ts"], vals)
+
+        self._latest_map["ts"][sids] = stamps
+        self._latest_map["value"][sids] = vals
+
+    def _fold_rollups(
+        self,
+        tiers: Iterable[Tuple[_SegmentLog, _RollupState]],
+        sids: np.ndarray,
+        stamps: np.ndarray,
+        values: np.ndarray,
+    ) -> None:
+        """Fold time-ordered samples into the given tiers, writing closed buckets."""
+        rounds = _occurrence_rounds(sids)
+        batches = [(sids, stamps, values)] if rounds is None else [(sids[r], stamps[r], values[r]) for r in rounds]
+        for log, state in tiers:
+            state.ensure(len(self._keys))
+            closed = [c for c in (state.update(*batch) for batch in batches) if c is not None]
+            if closed:
+                log.append(merge_rollups(np.concatenate(closed)) if len(closed) > 1 else closed[0])
+
+    def append(self, key: str, value: float, ts: float | None = None) -> None:
+        """Append a single sample."""
+        self.append_many([key], [value], ts)
+
+    def append_frame(self, frame: SampleFrame, label: str = "host", ts: float | None = None) -> None:
+        """Append every present cell of ``frame`` in one batch.
+
+        Row ``h``, column ``m`` goes to series ``m{label="h"}``; NaN cells are
+        skipped. ``ts`` defaults to ``frame.ts``, then to now.
+        """
+        stamp = frame.ts if ts is None else ts
+        self.append_batch(SeriesBatch.from_frame(frame, label=label, ts=time.time() if stamp is None else stamp))
+
+    def append_metrics(self, metrics: Mapping[str, Any], labels: Mapping[str, str] | None = None,
+                       ts: float | None = None) -> None:
+        """Append every numeric entry of a metrics dict under ``labels``."""
+        names = [
+            name
+            for name, value in metrics.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+        self.append_many([series_key(n, labels) for n in names], [metrics[n] for n in names], ts)
+
+    # -- reads -----------------------------------------------------------
+
+    def latest(self, key: str) -> Tuple[float, float] | None:
+        """Return ``(ts, value)`` of the most recently appended sample of ``key``."""
+        with self._lock:
+            sid = self._sid(key)
+            if sid is None:
+                return None
+            if self._latest_fd is None:
+                self._latest_fd = os.open(self.root / _LATEST_FILE, os.O_RDONLY)
+            raw = os.pread(self._latest_fd, LATEST_DTYPE.itemsize, sid * LATEST_DTYPE.itemsize)
+        if len(raw) < LATEST_DTYPE.itemsize:
+            return None
+        slot = np.frombuffer(raw, dtype=LATEST_DTYPE)[0]
+        if np.isnan(slot["ts"]):
+            return None
+        return float(slot["ts"]), float(slot["value"])
+
+    def latest_metrics(self, metrics: Iterable[str], labels: Mapping[str, str] | None = None) -> Dict[str, float]:
+        """Return ``{metric: latest value}`` for the given metric names under ``labels``."""
+        result: Dict[str, float] = {}
+        for name in metrics:
+            hit = self.latest(series_key(name, labels))
+            if hit is not None:
+                result[name] = hit[1]
+        return result
+
+    def registry_ids(self, registry: SeriesRegistry | None = None) -> np.ndarray:
+        """Id in ``registry`` (default: the process-wide one) of every store series, by store sid."""
+        registry = get_registry() if registry is None else registry
+        with self._lock:
+            self._load_series()
+            known = self._registry_ids.get(registry)
+            if known is None or len(known) < len(self._keys):
+                done = 0 if known is None else len(known)
+                fresh = registry.ids_for_keys(self._keys[done:])
+                known = self._registry_ids[registry] = fresh if known is None else np.concatenate([known, fresh])
+            return known
+
+    def latest_batch(
+        self,
+        metrics: Iterable[str] | None = None,
+        matchers: Mapping[str, str] | None = None,
+        registry: SeriesRegistry | None = None,
+    ) -> SeriesBatch:
+        """Latest sample of every series of ``metrics`` carrying all ``matchers`` labels.
+
+        One vectorized read of the latest slots; ``None`` means no constraint
+        and series without samples are omitted.
+        """
+        registry = get_registry() if registry is None else registry
+        ids = self.registry_ids(registry)
+        sids = np.flatnonzero(np.isin(ids, registry.select(metrics, matchers)))
+        slots = self._latest_slots(sids)
+        written = ~np.isnan(slots["ts"])
+        return SeriesBatch(ids[sids[written]], slots["value"][written], slots["ts"][written], registry)
+
+    def _latest_slots(self, sids: np.ndarray) -> np.ndarray:
+        """Latest slots of ascending ``sids``; NaN for series the file does not cover yet."""
+        with self._lock:
+            view = self._latest_map
+            if view is None and len(sids):
+                view = self._latest_view
+                if view is None or len(view) <= sids[-1]:
+                    size = os.stat(self.root / _LATEST_FILE).st_size // LATEST_DTYPE.itemsize
+                    view = np.memmap(self.root / _LATEST_FILE, dtype=LATEST_DTYPE, mode="r", shape=(size,)) if size else None
+                    self._latest_view = view
+            slots = np.full(len(sids), np.nan, dtype=LATEST_DTYPE)
+            if view is not None:
+                inside = sids < len(view)
+                slots[inside] = view[sids[inside]]
+        return slots
+
+    def query(self, key: str, start: float | None = None, end: float | None = None) -> Series:
+        """Return the samples of ``key`` with ``start <= ts <= end``."""
+        lo = -np.inf if start is None else float(start)
+        hi = np.inf if end is None else float(end)
+        with self._lock:
+            self.refresh()
+            sid = self._sid(key)
+            if sid is None:
+                return Series(np.empty(0), np.empty(0))
+            rows = self._log.read(sid, lo, hi)
+        return Series(np.array(rows["ts"]), np.array(rows["value"]))
+
+    def last_minutes(self, key: str, minutes: float, now: float | None = None) -> Series:
+        """Return the samples of ``key`` from the last ``minutes`` minutes."""
+        end = time.time() if now is None else now
+        return self.query(key, end - minutes * 60.0, end)
+
+    def downsample(self, key: str, start: float, end: float, step: float, agg: str = "avg") -> Series:
+        """Aggregate raw samples of ``key`` over ``[start, end]`` into ``step``-second buckets.
+
+        Empty buckets are omitted. Bucket timestamps are bucket start times.
+
+        Parameters
+        ----------
+        agg: str
+            One of :data:`AGGREGATIONS`.
+        """
+        if agg not in AGGREGATIONS:
+            raise ValueError(f"unknown aggregation {agg!r}; expected one of {AGGREGATIONS}")
+        if not 0 < step < np.inf:
+            raise ValueError("step must be positive and finite")
+        series = self.query(key, start, end)
+        return aggregate_buckets(series.timestamps, series.values, start, step, agg)
+
+    def rollup_tier(self, step: float, aggs: Sequence[str] = ("avg",)) -> float:
+        """Return the coarsest rollup resolution usable for ``step`` (0 means raw).
+
+        A tier qualifies when ``step`` is a whole multiple of it, so tier
+        buckets nest exactly inside output buckets. Percentiles cannot be
+        merged from rollup records, so ``p95`` always reads raw samples.
+        """
+        if any(agg not in ROLLUP_AGGREGATIONS for agg in aggs):
+            return 0.0
+        best = 0.0
+        for resolution in self._rollups:
+            multiple = step / resolution
+            if resolution <= step and abs(multiple - round(multiple)) < 1e-9:
+                best = resolution
+        return best
+
+    def series(
+        self,
+        key: str,
+        start: float,
+        end: float,
+        step: float,
+        aggs: Sequence[str] = ("avg",),
+    ) -> BucketedSeries:
+        """Aggregate ``key`` over ``[start, end]`` into epoch-aligned ``step`` buckets.
+
+        Reads the coarsest rollup tier that fits ``step`` (see
+        :meth:`rollup_tier`) for every tier bucket lying fully inside the
+        window; only the partial buckets at either edge and the tail not yet
+        covered by a written rollup bucket come from raw samples. A 24 hour
+        window at a 1 hour step therefore touches ~24 rollup records instead
+        of every raw sample, with results identical to aggregating raw data.
+        The one exception is ``last`` for a bucket that gets a late sample
+        after it was written: that bucket reports the late sample.
+
+        Parameters
+        ----------
+        aggs: Sequence[str]
+            Aggregations from :data:`AGGREGATIONS`.
+        """
+        unknown = [a for a in aggs if a not in AGGREGATIONS]
+        if unknown:
+            raise ValueError(f"unknown aggregation {unknown[0]!r}; expected one of {AGGREGATIONS}")
+        if not 0 < step < np.inf:
+            raise ValueError("step must be positive and finite")
+        origin = np.floor(start / step) * step
+        resolution = self.rollup_tier(step, aggs)
+
+        with self._lock:
+            self.refresh()
+            sid = self._sid(key)
+            if sid is None:
+                return BucketedSeries(np.empty(0), {a: np.empty(0) for a in aggs}, resolution)
+            first_full = np.ceil(start / resolution) * resolution if resolution else np.inf
+            last_full = np.floor(end / resolution) * resolution - resolution if resolution else -np.inf
+            if last_full < first_full:
+                rows = self._log.read(sid, start, end)
+                resolution = 0.0
+            else:
+                log, _ = self._rollups[resolution]
+                head = self._log.read(sid, start, first_full)
+                head = head[head["ts"] < first_full]
+                buckets = log.read(sid, first_full, last_full)
+                covered = buckets["ts"][-1] + resolution if len(buckets) else first_full
+                tail = self._log.read(sid, covered, end)
+
+        if not resolution:
+            values = {
+                agg: aggregate_buckets(np.array(rows["ts"]), np.array(rows["value"]), origin, step, agg)
+                for agg in aggs
+            }
+            first = next(iter(values.values()))
+            return BucketedSeries(first.timestamps, {a: s.values for a, s in values.items()}, 0.0)
+
+        parts = [buckets]
+        for raw in (head, tail):
+            if len(raw):
+                parts.append(rollup_records(raw["ts"], raw["value"], resolution))
+        records = np.concatenate(parts)
+        records = records[np.argsort(records["ts"], kind="stable")]
+        timestamps, values = combine_rollups(records, origin, step, aggs)
+        return BucketedSeries(timestamps, values, resolution)
+
+
+def _group_starts(groups: np.ndarray) -> np.ndarray:
+    """Start index of each run of equal values in sorted ``groups``."""
+    return np.concatenate(([0], np.flatnonzero(np.diff(groups)) + 1))
+
+
+def _grouped_percentile(groups: np.ndarray, values: np.ndarray, starts: np.ndarray, q: float) -> np.ndarray:
+    """Nearest-rank ``q`` percentile of ``values`` within each run of ``groups``."""
+    order = np.lexsort((values, groups))
+    ordered = values[order]
+    sizes = np.diff(np.append(starts, len(values)))
+    ranks = np.ceil(q * sizes).astype(np.int64) - 1
+    return ordered[starts + np.maximum(ranks, 0)]
+
+
+def aggregate_buckets(timestamps: np.ndarray, values: np.ndarray, start: float, step: float, agg: str) -> Series:
+    """Group time-ordered samples into ``step``-second buckets and reduce each."""
+    if not len(timestamps):
+        return Series(np.empty(0), np.empty(0))
+    buckets = np.floor((timestamps - start) / step).astype(np.int64)
+    starts = _group_starts(buckets)
+    if agg == "avg":
+        reduced = np.add.reduceat(values, starts) / np.diff(np.append(starts, len(values)))
+    elif agg == "sum":
+        reduced = np.add.reduceat(values, starts)
+    elif agg == "min":
+        reduced = np.minimum.reduceat(values, starts)
+    elif agg == "max":
+        reduced = np.maximum.reduceat(values, starts)
+    elif agg == "count":
+        reduced = np.diff(np.append(starts, len(values))).astype(np.float64)
+    elif agg == "p95":
+        reduced = _grouped_percentile(buckets, values, starts, 0.95)
+    else:
+        reduced = values[np.append(starts[1:], len(values)) - 1]
+    return Series(start + buckets[starts] * step, reduced)
+
+
+def rollup_records(timestamps: np.ndarray, values: np.ndarray, resolution: float) -> np.ndarray:
+    """Reduce time-ordered raw samples to rollup records at ``resolution``."""
+    buckets = np.floor(timestamps / resolution) * resolution
+    starts = _group_starts(buckets)
+    ends = np.append(starts[1:], len(values))
+    out = np.zeros(len(starts), dtype=ROLLUP_DTYPE)
+    out["ts"] = buckets[starts]
+    out["count"] = ends - starts
+    out["sum"] = np.add.reduceat(values, starts)
+    out["min"] = np.minimum.reduceat(values, starts)
+    out["max"] = np.maximum.reduceat(values, starts)
+    out["last"] = values[ends - 1]
+    return out
+
+
+def merge_rollups(records: np.ndarray) -> np.ndarray:
+    """Merge rollup records sharing ``(sid, ts)``; a later record's ``last`` wins."""
+    order = np.lexsort((records["ts"], records["sid"]))
+    ordered = records[order]
+    same = (ordered["sid"][1:] == ordered["sid"][:-1]) & (ordered["ts"][1:] == ordered["ts"][:-1])
+    if not same.any():
+        return records
+    starts = np.concatenate(([0], np.flatnonzero(~same) + 1))
+    ends = np.append(starts[1:], len(ordered))
+    out = ordered[starts].copy()
+    out["count"] = np.add.reduceat(ordered["count"], starts)
+    out["sum"] = np.add.reduceat(ordered["sum"], starts)
+    out["min"] = np.minimum.reduceat(ordered["min"], starts)
+    out["max"] = np.maximum.reduceat(ordered["max"], starts)
+    out["last"] = ordered["last"][ends - 1]
+    return out
+
+
+def combine_rollups(
+    records: np.ndarray, origin: float, step: float, aggs: Sequence[str]
+) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Merge time-ordered rollup records into ``step`` buckets starting at ``origin``."""
+    if not len(records):
+        return np.empty(0), {a: np.empty(0) for a in aggs}
+    groups = np.floor((records["ts"] - origin) / step).astype(np.int64)
+    starts = _group_starts(groups)
+    ends = np.append(starts[1:], len(records))
+    count = np.add.reduceat(records["count"].astype(np.float64), starts)
+    total = np.add.reduceat(records["sum"], starts)
+    out: Dict[str, np.ndarray] = {}
+    for agg in aggs:
+        if agg == "avg":
+            out[agg] = total / count
+        elif agg == "sum":
+            out[agg] = total
+        elif agg == "count":
+            out[agg] = count
+        elif agg == "min":
+            out[agg] = np.minimum.reduceat(records["min"], starts)
+        elif agg == "max":
+            out[agg] = np.maximum.reduceat(records["max"], starts)
+        elif agg == "last":
+            out[agg] = records["last"][ends - 1]
+        else:
+            raise ValueError(f"{agg!r} cannot be computed from rollups")
+    return origin + groups[starts] * step, out
+
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, n_out: int) -> Series:
+    """Largest-Triangle-Three-Buckets downsampling to at most ``n_out`` points.
+
+    Keeps the first and last sample and, from each of ``n_out - 2`` equal
+    buckets, the sample forming the largest triangle with the previously kept
+    point and the average of the next bucket, which preserves peaks and dips
+    that plain averaging flattens.
+    """
+    n = len(timestamps)
+    if n_out >= n or n_out < 3:
+        return Series(np.asarray(timestamps, dtype=np.float64), np.asarray(values, dtype=np.float64))
+    x = np.asarray(timestamps, dtype=np.float64)
+    y = np.asarray(values, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else x[-1]
+        avg_y = y[nxt_lo:nxt_hi].mean() if nxt_hi > nxt_lo else y[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return Series(x[keep], y[keep])
@@ -0,0 +1,291 @@
+"""Multivariate anomaly detection with a persisted IsolationForest model.
+
+Training is an offline step that fits on historical metric files and writes a
+joblib bundle to disk. Scoring loads that bundle once per process (see
+:func:`get_scorer`) and evaluates whole batches with a single
+``decision_function`` call.
+
+Usage:
+    python src/ml_detection.py train --out models/isolation_forest.joblib data/history/*.json
+    python src/ml_detection.py train --out models/isolation_forest.joblib data/export
+    python src/ml_detection.py bench --model models/isolation_forest.joblib
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Sequence
+
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+
+DEFAULT_FEATURES: tuple[str, ...] = ("cpu", "memory")
+DEFAULT_MODEL_PATH = Path("models/isolation_forest.joblib")
+_BUNDLE_VERSION = 1
+
+
+class ModelScores(NamedTuple):
+    """Output of :meth:`ModelScorer.score_batch`.
+
+    Attributes
+    ----------
+    scores: np.ndarray
+        IsolationForest decision function; negative values are outliers.
+    anomalous: np.ndarray
+        Boolean vector, True where ``scores < 0``.
+    """
+
+    scores: np.ndarray
+    anomalous: np.ndarray
+
+
+def _iter_records(path: Path) -> Iterator[Mapping[str, Any]]:
+    """Yield metric dicts from a JSON object, a JSON list or an NDJSON file."""
+    text = path.read_text(encoding="utf-8").strip()
+    if not text:
+        return
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        for line in text.splitlines():
+            if line.strip():
+                yield json.loads(line)
+        return
+    if isinstance(data, list):
+        yield from data
+    else:
+        yield data
+
+
+def load_metric_history(
+    paths: Iterable[str | Path], features: Sequence[str] = DEFAULT_FEATURES
+) -> np.ndarray:
+    """Load historical metric files into a ``(n_samples, n_features)`` matrix.
+
+    Records that lack any of the requested features are skipped.
+
+    Parameters
+    ----------
+    paths: Iterable[str | Path]
+        Metric files: a single JSON object (``metrics.json`` snapshot), a JSON
+        list of objects, or newline-delimited JSON. A directory is read as a
+        Parquet export of `history_export` (one row per host and timestamp).
+    features: Sequence[str]
+        Feature columns, in model order.
+
+    Returns
+    -------
+    np.ndarray
+        Float64 feature matrix.
+    """
+    rows: List[List[float]] = []
+    exported: List[np.ndarray] = []
+    for path in paths:
+        if Path(path).is_dir():
+            # Imported here so scoring-only processes do not load pyarrow.
+            from history_export import load_training_matrix
+
+            exported.append(load_training_matrix(features, root=path))
+            continue
+        for record in _iter_records(Path(path)):
+            try:
+                rows.append([float(record[name]) for name in features])
+            except (KeyError, TypeError, ValueError):
+                continue
+    matrix = np.asarray(rows, dtype=np.float64).reshape(-1, len(features))
+    return np.concatenate([matrix, *exported]) if exported else matrix
+
+
+def train_model(
+    paths: Iterable[str | Path] | np.ndarray,
+    model_path: str | Path = DEFAULT_MODEL_PATH,
+    features: Sequence[str] = DEFAULT_FEATURES,
+    n_estimators: int = 100,
+    contamination: float | str = "auto",
+    random_state: int | None = 0,
+) -> Path:
+    """Fit an IsolationForest on historical metrics and serialize it to disk.
+
+    Parameters
+    ----------
+    paths: Iterable[str | Path] | np.ndarray
+        Historical metric files (see :func:`load_metric_history`) or an
+        already-built feature matrix.
+    model_path: str | Path
+        Destination of the joblib bundle.
+    features: Sequence[str]
+        Feature columns, in model order.
+    n_estimators: int
+        Number of trees.
+    contamination: float | str
+        Expected outlier share, or ``"auto"``.
+    random_state: int | None
+        Seed for reproducible fits.
+
+    Returns
+    -------
+    Path
+        The path the model bundle was written to.
+    """
+    if isinstance(paths, np.ndarray):
+        matrix = np.asarray(paths, dtype=np.float64)
+    else:
+        matrix = load_metric_history(paths, features)
+    if matrix.shape[0] == 0:
+        raise ValueError("no training samples found")
+
+    model = IsolationForest(
+        n_estimators=n_estimators,
+        contamination=contamination,
+        random_state=random_state,
+    )
+    model.fit(matrix)
+
+    bundle = {
+        "version": _BUNDLE_VERSION,
+        "model": model,
+        "features": tuple(features),
+        "n_samples": int(matrix.shape[0]),
+        "trained_at": time.time(),
+    }
+    out = Path(model_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(out.suffix + ".tmp")
+    joblib.dump(bundle, tmp)
+    tmp.replace(out)
+    return out
+
+
+class ModelScorer:
+    """A loaded model plus the timing data needed to budget scrape intervals.
+
+    Attributes
+    ----------
+    load_seconds: float
+        Wall time spent deserializing the bundle (0.0 if built in memory).
+    last_batch_seconds: float
+        Wall time of the most recent :meth:`score_batch` call.
+    last_batch_size: int
+        Number of samples in the most recent :meth:`score_batch` call.
+    """
+
+    def __init__(self, model: IsolationForest, features: Sequence[str], load_seconds: float = 0.0) -> None:
+        self.model = model
+        self.features = tuple(features)
+        self.load_seconds = load_seconds
+        self.last_batch_seconds = 0.0
+        self.last_batch_size = 0
+
+    @classmethod
+    def load(cls, model_path: str | Path = DEFAULT_MODEL_PATH) -> "ModelScorer":
+        """Deserialize a bundle written by :func:`train_model`."""
+        started = time.perf_counter()
+        bundle = joblib.load(Path(model_path))
+        elapsed = time.perf_counter() - started
+        if bundle.get("version") != _BUNDLE_VERSION:
+            raise ValueError(f"unsupported model bundle version: {bundle.get('version')!r}")
+        return cls(bundle["model"], bundle["features"], load_seconds=elapsed)
+
+    def score_batch(self, values: Any) -> ModelScores:
+        """Score a ``(n_samples, n_features)`` matrix in one model call."""
+        matrix = np.asarray(values, dtype=np.float64)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        started = time.perf_counter()
+        scores = self.model.decision_function(matrix)
+        self.last_batch_seconds = time.perf_counter() - started
+        self.last_batch_size = int(matrix.shape[0])
+        return ModelScores(scores, scores < 0)
+
+    def score_metrics(self, metrics: Mapping[str, Any]) -> bool | None:
+        """Return True if a single metrics dict is an outlier under the model.
+
+        Like training (see :func:`load_metric_history`), a record lacking any
+        feature, or holding a non-numeric one, is skipped: None is returned
+        instead of scoring a made-up value.
+        """
+        try:
+            row = [float(metrics[name]) for name in self.features]
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not np.isfinite(row).all():
+            return None
+        return bool(self.score_batch(row).anomalous[0])
+
+
+_SCORERS: Dict[Path, ModelScorer] = {}
+_SCORERS_LOCK = threading.Lock()
+
+
+def get_scorer(model_path: str | Path = DEFAULT_MODEL_PATH) -> ModelScorer:
+    """Return the process-wide scorer for ``model_path``, loading it on first use."""
+    key = Path(model_path).resolve()
+    with _SCORERS_LOCK:
+        scorer = _SCORERS.get(key)
+        if scorer is None:
+            scorer = ModelScorer.load(key)
+            _SCORERS[key] = scorer
+        return scorer
+
+
+def benchmark_scorer(scorer: ModelScorer, n_samples: int = 10_000, repeats: int = 5, seed: int = 0) -> Dict[str, float]:
+    """Measure batch scoring latency on synthetic samples.
+
+    Returns
+    -------
+    Dict[str, float]
+        ``load_seconds`` of the scorer plus best/median batch latency and the
+        latency normalized to 10k samples.
+    """
+    rng = np.random.default_rng(seed)
+    matrix = rng.uniform(0, 100, size=(n_samples, len(scorer.features)))
+    timings = []
+    for _ in range(repeats):
+        scorer.score_batch(matrix)
+        timings.append(scorer.last_batch_seconds)
+    median = float(np.median(timings))
+    return {
+        "n_samples": float(n_samples),
+        "load_seconds": scorer.load_seconds,
+        "batch_seconds_best": float(min(timings)),
+        "batch_seconds_median": median,
+        "seconds_per_10k": median * 10_000 / n_samples,
+    }
+
+
+def main() -> None:
+    """Command-line entry point: ``train`` a model bundle or ``bench`` a saved one."""
+    parser = argparse.ArgumentParser(description="Train or benchmark the IsolationForest detector")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    train = sub.add_parser("train", help="fit on historical metric files")
+    train.add_argument("inputs", nargs="+", type=Path)
+    train.add_argument("--out", type=Path, default=DEFAULT_MODEL_PATH)
+    train.add_argument("--features", default=",".join(DEFAULT_FEATURES))
+    train.add_argument("--n-estimators", type=int, default=100)
+
+    bench = sub.add_parser("bench", help="report load time and scoring latency")
+    bench.add_argument("--model", type=Path, default=DEFAULT_MODEL_PATH)
+    bench.add_argument("--samples", type=int, default=10_000)
+
+    args = parser.parse_args()
+    if args.command == "train":
+        out = train_model(
+            args.inputs,
+            args.out,
+            features=tuple(args.features.split(",")),
+            n_estimators=args.n_estimators,
+        )
+        print(out)
+    else:
+        print(json.dumps(benchmark_scorer(ModelScorer.load(args.model), n_samples=args.samples), indent=2))
+
+
+if __name__ == "__main__":
+    main()
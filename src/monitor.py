@@ -1,11 +1,31 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Mapping, Sequence
 import json
+import time
 
+import numpy as np
 
-def get_latest_metrics(file_path: str | Path, live: bool = False) -> Dict[str, Any]:
+from metric_store import MetricStore, Series, lttb, series_key
+from samples import SampleFrame
+from scraper import DEFAULT_TARGETS_PATH, scrape_fleet
+from series import SeriesBatch, SeriesRegistry
+
+
+DEFAULT_METRICS: tuple[str, ...] = ("cpu", "memory")
+DEFAULT_POINTS = 500
+# Bucket widths `get_series` picks from when no step is given.
+STEP_LADDER: tuple[float, ...] = (
+    1, 5, 10, 15, 30, 60, 120, 300, 600, 900, 1800, 3600, 7200, 10800, 21600, 43200, 86400,
+)
+
+
+def get_latest_metrics(
+    file_path: str | Path,
+    live: bool = False,
+    targets_path: str | Path = DEFAULT_TARGETS_PATH,
+) -> Dict[str, Any]:
     """Load metrics from a JSON file and return them as a dictionary.
 
     Parameters
@@ -13,14 +33,180 @@ def get_latest_metrics(file_path: str | Path, live: bool = False) -> Dict[str, A
     file_path: str | Path
         Path to the JSON file containing metrics.
     live: bool
-        Reserved for future live mode. Ignored in Phase 2.
+        When True, scrape the targets in `targets_path` directly and return the
+        fleet summary (see `scraper.Scraper.summarize`); `file_path` is unused.
+    targets_path: str | Path
+        Target list used in live mode.
 
     Returns
     -------
     Dict[str, Any]
         Dictionary parsed from the JSON file.
     """
+    if live:
+        return scrape_fleet(targets_path)
     path = Path(file_path)
     return json.loads(path.read_text(encoding="utf-8"))
 
 
+def get_latest_from_store(
+    store: MetricStore,
+    metrics: Iterable[str] = DEFAULT_METRICS,
+    labels: Mapping[str, str] | None = None,
+) -> Dict[str, float]:
+    """Return the latest value of each metric from the time-series store.
+
+    Each lookup is a single fixed-offset read, independent of history size.
+
+    Parameters
+    ----------
+    store: MetricStore
+        Store written by `fetch_metrics(..., store=...)`.
+    metrics: Iterable[str]
+        Metric names to look up.
+    labels: Mapping[str, str] | None
+        Label set identifying the series (e.g. ``{"host": "web-1"}``).
+
+    Returns
+    -------
+    Dict[str, float]
+        Metrics that have at least one sample.
+    """
+    return store.latest_metrics(metrics, labels)
+
+
+def get_latest_batch(
+    store: MetricStore,
+    metrics: Iterable[str] | None = DEFAULT_METRICS,
+    matchers: Mapping[str, str] | None = None,
+    registry: SeriesRegistry | None = None,
+) -> SeriesBatch:
+    """Return the latest sample of every matching series, across all hosts.
+
+    Parameters
+    ----------
+    store: MetricStore
+        Store to read.
+    metrics: Iterable[str] | None
+        Metric names to include; None for every metric.
+    matchers: Mapping[str, str] | None
+        Labels a series must carry, e.g. ``{"job": "node"}``.
+    registry: SeriesRegistry | None
+        Registry for the returned ids; defaults to the process-wide one.
+    """
+    return store.latest_batch(metrics, matchers, registry)
+
+
+def get_latest_frame(
+    store: MetricStore,
+    metrics: Sequence[str] | None = DEFAULT_METRICS,
+    matchers: Mapping[str, str] | None = None,
+    by: str = "host",
+) -> SampleFrame:
+    """Latest values as a frame with one row per value of label ``by``.
+
+    Columns are ``metrics`` in the given order (every metric present when
+    None); series without ``by`` are left out.
+    """
+    return get_latest_batch(store, metrics, matchers).to_frame(by, metrics)
+
+
+def get_recent_metrics(
+    store: MetricStore,
+    metric: str,
+    minutes: float,
+    labels: Mapping[str, str] | None = None,
+    now: float | None = None,
+) -> Series:
+    """Return raw samples of one series from the last ``minutes`` minutes."""
+    return store.last_minutes(series_key(metric, labels), minutes, now=now)
+
+
+def get_downsampled_range(
+    store: MetricStore,
+    metric: str,
+    start: float,
+    end: float | None = None,
+    step: float = 60.0,
+    agg: str = "avg",
+    labels: Mapping[str, str] | None = None,
+) -> Series:
+    """Return one series over ``[start, end]`` aggregated into ``step``-second buckets.
+
+    Parameters
+    ----------
+    agg: str
+        One of ``avg``, ``min``, ``max``, ``sum``, ``count``, ``last`` or ``p95``.
+    """
+    stop = time.time() if end is None else end
+    return store.downsample(series_key(metric, labels), start, stop, step, agg)
+
+
+def choose_step(start: float, end: float, points: int = DEFAULT_POINTS) -> float:
+    """Return the smallest `STEP_LADDER` width giving at most ``points`` buckets."""
+    span = max(end - start, 0.0)
+    for step in STEP_LADDER:
+        if span / step <= points:
+            return float(step)
+    return float(np.ceil(span / points / STEP_LADDER[-1]) * STEP_LADDER[-1])
+
+
+def get_series(
+    store: MetricStore,
+    metric: str,
+    start: float,
+    end: float | None = None,
+    labels: Mapping[str, str] | None = None,
+    aggs: Sequence[str] = ("avg",),
+    step: float | None = None,
+    points: int = DEFAULT_POINTS,
+) -> Dict[str, Any]:
+    """Return one series over ``[start, end]`` downsampled for charting.
+
+    Parameters
+    ----------
+    aggs: Sequence[str]
+        Bucket aggregations (``avg``, ``min``, ``max``, ``sum``, ``count``,
+        ``last``, ``p95``), or ``["lttb"]`` for Largest-Triangle-Three-Buckets
+        selection of at most ``points`` real samples.
+    step: float | None
+        Bucket width in seconds; chosen from `STEP_LADDER` to stay within
+        ``points`` buckets when omitted.
+    points: int
+        Target number of points per series.
+
+    Returns
+    -------
+    Dict[str, Any]
+        JSON-ready ``series``, ``start``, ``end``, ``step``, ``resolution``
+        (rollup tier read, 0 for raw), ``timestamps`` and ``values`` (one list
+        per aggregation).
+    """
+    stop = time.time() if end is None else float(end)
+    key = series_key(metric, labels)
+    if list(aggs) == ["lttb"]:
+        # Feed LTTB from the coarsest rollup tier still ~4x finer than the output.
+        resolution = 0.0
+        for tier in store.rollup_resolutions:
+            if tier * points * 4 <= stop - start:
+                resolution = tier
+        if resolution:
+            source = store.series(key, start, stop, resolution, ("avg",))
+            picked = lttb(source.timestamps, source.values["avg"], points)
+        else:
+            raw = store.query(key, start, stop)
+            picked = lttb(raw.timestamps, raw.values, points)
+        timestamps, values, used_step = picked.timestamps, {"lttb": picked.values}, resolution
+    else:
+        used_step = float(step) if step else choose_step(start, stop, points)
+        bucketed = store.series(key, start, stop, used_step, aggs)
+        timestamps, values, resolution = bucketed.timestamps, bucketed.values, bucketed.resolution
+    return {
+        "series": key,
+        "start": start,
+        "end": stop,
+        "step": used_step,
+        "resolution": resolution,
+        "timestamps": timestamps.tolist(),
+        "values": {agg: column.tolist() for agg, column in values.items()},
+    }
@@ -0,0 +1,234 @@
+"""Streaming parser for the Prometheus text exposition format (version 0.0.4).
+
+Samples are emitted as plain tuples ``(name, labels, value, timestamp_ms)``
+where ``labels`` is a tuple of ``(name, value)`` pairs in exposition order and
+``timestamp_ms`` is an int or None. Plain tuples keep per-sample cost to one
+allocation; index them or unpack them positionally.
+
+The parser works line by line over any iterable (a list of lines, a file, or
+:func:`iter_lines` over HTTP response chunks), so a payload never has to be
+held as one string. Family allow-lists are decided once per metric name and
+cached, so unwanted families are skipped after a name lookup without parsing
+labels or values. Label blocks are interned: identical label text seen again
+(the same host scraped next cycle) reuses the already-built tuple.
+"""
+
+from __future__ import annotations
+
+import codecs
+import re
+import threading
+from collections import OrderedDict
+from typing import Collection, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Labels, float, Optional[int]]
+
+# Suffixes a sample name may carry on top of its family name.
+_FAMILY_SUFFIXES = ("_total", "_sum", "_count", "_bucket", "_created", "_info", "_gsum", "_gcount")
+
+_NAME_RE = re.compile(r"[^{\s]+")
+_LABEL_RE = re.compile(r'\s*([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"\s*(,|\})')
+_ESCAPES = {"\\\\": "\\", '\\"': '"', "\\n": "\n"}
+_ESCAPE_RE = re.compile(r'\\[\\"n]')
+
+_LABEL_CACHE_LIMIT = 200_000
+# Targets (distinct ``extra_labels``) whose label caches are kept; the least
+# recently scraped target's cache is dropped first.
+_TARGET_CACHE_LIMIT = 16_384
+
+
+class ParseError(ValueError):
+    """Raised for a malformed exposition line."""
+
+
+def iter_lines(chunks: Iterable[bytes | str], encoding: str = "utf-8") -> Iterator[str]:
+    """Reassemble text lines from arbitrarily split chunks (e.g. ``iter_content``).
+
+    Bytes are decoded incrementally, so a multi-byte character split across
+    two chunks is reassembled too.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        if not chunk:
+            continue
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        yield from lines
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def _unescape(value: str) -> str:
+    """Undo exposition escaping of backslashes, quotes and newlines in a label value."""
+    return _ESCAPE_RE.sub(lambda m: _ESCAPES[m.group(0)], value)
+
+
+def family_of(sample_name: str, families: Collection[str]) -> str | None:
+    """Return the allow-listed family ``sample_name`` belongs to, if any."""
+    if sample_name in families:
+        return sample_name
+    for suffix in _FAMILY_SUFFIXES:
+        if sample_name.endswith(suffix) and sample_name[: -len(suffix)] in families:
+            return sample_name[: -len(suffix)]
+    return None
+
+
+class ExpositionParser:
+    """Reusable parser holding name-decision and label-interning caches.
+
+    Parameters
+    ----------
+    families: Collection[str] | None
+        Allow-list of metric family names (``node_cpu_seconds`` or the full
+        ``node_cpu_seconds_total`` both match). None keeps everything.
+    prefixes: Collection[str]
+        Additional allow-list of name prefixes, e.g. ``("node_memory_",)``.
+    label_filter: Mapping[str, Collection[str]] | None
+        Keep only samples whose label ``k`` (when present) has a value in
+        ``label_filter[k]``, e.g. ``{"mode": {"idle", "user"}}``.
+    drop_labels: Collection[str]
+        Label names to strip from emitted samples.
+    """
+
+    def __init__(
+        self,
+        families: Collection[str] | None = None,
+        prefixes: Collection[str] = (),
+        label_filter: Mapping[str, Collection[str]] | None = None,
+        drop_labels: Collection[str] = (),
+    ) -> None:
+        self.families = frozenset(families) if families is not None else None
+        self.prefixes = tuple(prefixes)
+        self.label_filter = {k: frozenset(v) for k, v in (label_filter or {}).items()}
+        self.drop_labels = frozenset(drop_labels)
+        self._wanted: Dict[str, bool] = {}
+        self._labels: "OrderedDict[Labels, Dict[str, Labels | None]]" = OrderedDict()
+        self._labels_lock = threading.Lock()
+
+    def wants(self, name: str) -> bool:
+        """Return True if samples named ``name`` pass the family allow-list."""
+        decision = self._wanted.get(name)
+        if decision is None:
+            if self.families is None and not self.prefixes:
+                decision = True
+            else:
+                decision = (
+                    self.families is not None and family_of(name, self.families) is not None
+                ) or name.startswith(self.prefixes)
+            self._wanted[name] = decision
+        return decision
+
+    def _parse_labels(self, line: str, pos: int) -> Tuple[Labels | None, int]:
+        """Parse the label block starting after ``{`` at ``pos``.
+
+        Returns the label tuple (None if rejected by ``label_filter``) and the
+        index just past the closing ``}``.
+        """
+        pairs: List[Tuple[str, str]] = []
+        if line.startswith("}", pos):
+            return (), pos + 1
+        while True:
+            match = _LABEL_RE.match(line, pos)
+            if match is None:
+                # Tolerate a trailing comma before the closing brace.
+                stripped = line[pos:].lstrip()
+                if stripped.startswith("}"):
+                    return self._finish_labels(pairs), len(line) - len(stripped) + 1
+                raise ParseError(f"malformed labels: {line!r}")
+            name, value, terminator = match.groups()
+            if "\\" in value:
+                value = _unescape(value)
+            pairs.append((name, value))
+            pos = match.end()
+            if terminator == "}":
+                return self._finish_labels(pairs), pos
+
+    def _finish_labels(self, pairs: List[Tuple[str, str]]) -> Labels | None:
+        """Apply ``label_filter`` and ``drop_labels``; None if the sample is filtered out."""
+        if self.label_filter:
+            for name, value in pairs:
+                allowed = self.label_filter.get(name)
+                if allowed is not None and value not in allowed:
+                    return None
+        if self.drop_labels:
+            pairs = [pair for pair in pairs if pair[0] not in self.drop_labels]
+        return tuple(pairs)
+
+    def parse(self, lines: Iterable[str], extra_labels: Labels = ()) -> Iterator[Sample]:
+        """Yield samples from exposition lines.
+
+        Parameters
+        ----------
+        lines: Iterable[str]
+            Exposition lines, with or without trailing newlines.
+        extra_labels: Labels
+            Pairs appended to every sample's labels (e.g. instance/job).
+        """
+        wants = self.wants
+        match_name = _NAME_RE.match
+        with self._labels_lock:  # one parser is shared by the scrape threads
+            cache = self._labels.get(extra_labels)
+            if cache is None:
+                cache = self._labels[extra_labels] = {}
+                if len(self._labels) > _TARGET_CACHE_LIMIT:
+                    self._labels.popitem(last=False)
+            else:
+                self._labels.move_to_end(extra_labels)
+        unlabeled = extra_labels
+
+        for line in lines:
+            if not line or line[0] == "#":
+                continue
+            head = match_name(line)
+            if head is None:
+                continue
+            name = head.group(0)
+            if not wants(name):
+                continue
+            pos = head.end()
+            if pos < len(line) and line[pos] == "{":
+                close = line.find("}", pos)
+                body = line[pos:close + 1] if close != -1 else line[pos:]
+                labels = cache.get(body)
+                if labels is None and body not in cache:
+                    parsed, end = self._parse_labels(line, pos + 1)
+                    labels = parsed + extra_labels if parsed is not None else None
+                    if end != close + 1:
+                        # '}' inside a quoted value: the fast body slice was wrong.
+                        body = line[pos:end]
+                    if len(cache) >= _LABEL_CACHE_LIMIT:
+                        cache.clear()
+                    cache[body] = labels
+                    pos = end
+                else:
+                    pos = close + 1
+                if labels is None:
+                    continue
+            else:
+                labels = unlabeled
+            parts = line[pos:].split()
+            if not parts:
+                raise ParseError(f"missing value: {line!r}")
+            try:
+                value = float(parts[0])
+                timestamp = int(parts[1]) if len(parts) > 1 else None
+            except ValueError as exc:
+                raise ParseError(f"bad value or timestamp: {line!r}") from exc
+            yield (name, labels, value, timestamp)
+
+
+def parse_text(
+    text: str,
+    families: Collection[str] | None = None,
+    prefixes: Collection[str] = (),
+    label_filter: Mapping[str, Collection[str]] | None = None,
+    extra_labels: Labels = (),
+) -> List[Sample]:
+    """Parse a full exposition payload into a list of sample tuples."""
+    parser = ExpositionParser(families=families, prefixes=prefixes, label_filter=label_filter)
+    return list(parser.parse(text.split("\n"), extra_labels=extra_labels))
@@ -0,0 +1,442 @@
+"""Rule-driven remediation with deduplication, cooldowns and rate limiting.
+
+`remediate_action` answers every anomalous cycle with the same message, so a
+flapping host produces an action per tick. `RemediationEngine` instead:
+
+- matches each incident ``(host, metric, severity, labels)`` against a
+  declarative rule table compiled into a `RuleIndex` (one dict lookup per
+  ``(metric, severity)`` bucket, then a label check over the few candidates),
+- keeps an incident open from dispatch until the metric recovers, so identical
+  open incidents are deduplicated,
+- enforces a cooldown per host and action after each dispatch,
+- draws from a global `TokenBucket` so a fleet-wide event cannot fire
+  unbounded actions,
+- runs actions on a bounded thread pool through a pluggable executor with a
+  timeout.
+
+`FakeExecutor` records calls locally and is what tests use; `LogExecutor`
+reproduces the historical `remediate_action` message.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, NamedTuple, Tuple
+
+from auto_remediate import remediate_action
+from instrumentation import REMEDIATION_DECISIONS
+
+SEVERITIES: Tuple[str, ...] = ("info", "warning", "critical")
+# Metric value at or above which a threshold anomaly is classified critical.
+CRITICAL_THRESHOLDS: Dict[str, float] = {"cpu": 97.0, "memory": 97.0}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Rule(NamedTuple):
+    """One row of the remediation table.
+
+    Attributes
+    ----------
+    name: str
+        Rule identifier, reported in decisions.
+    metric: str
+        Metric the rule applies to, or ``"*"`` for any metric.
+    action: str
+        Action name handed to the executor.
+    severity: str
+        Minimum incident severity (one of `SEVERITIES`).
+    labels: Labels
+        Label pairs the host must carry, e.g. ``(("role", "db"),)``.
+    cooldown: float | None
+        Seconds before the same action may run again on the same host;
+        None uses the engine default.
+    priority: int
+        Higher wins among rules that match equally specifically.
+    """
+
+    name: str
+    metric: str
+    action: str
+    severity: str = "warning"
+    labels: Labels = ()
+    cooldown: float | None = None
+    priority: int = 0
+
+
+class Incident(NamedTuple):
+    """An anomalous metric on one host."""
+
+    host: str
+    metric: str
+    severity: str = "warning"
+    value: float | None = None
+    labels: Labels = ()
+
+
+class Decision(NamedTuple):
+    """Outcome of submitting one incident.
+
+    ``status`` is one of ``dispatched``, ``no_rule``, ``duplicate``,
+    ``cooldown`` or ``rate_limited``. ``future`` resolves to the executor
+    output for dispatched incidents.
+    """
+
+    incident: Incident
+    status: str
+    rule: Rule | None
+    future: Future | None
+
+
+class ActionResult(NamedTuple):
+    """Completed (or failed / timed out) action."""
+
+    incident: Incident
+    rule: Rule
+    ok: bool
+    output: str | None
+    error: str | None
+    seconds: float
+
+
+DEFAULT_RULES: Tuple[Rule, ...] = (
+    Rule("cpu-critical", "cpu", "scale_out", severity="critical", priority=10),
+    Rule("cpu-high", "cpu", "restart_service", severity="warning"),
+    Rule("memory-critical", "memory", "restart_service", severity="critical", priority=10),
+    Rule("memory-high", "memory", "clear_cache", severity="warning"),
+    Rule("fallback", "*", "notify", severity="warning", priority=-10),
+)
+
+
+def load_rules(path: str | Path) -> List[Rule]:
+    """Load a rule table from a JSON list of objects with `Rule` fields.
+
+    ``labels`` may be given as an object, e.g. ``{"role": "db"}``.
+    """
+    rows = json.loads(Path(path).read_text(encoding="utf-8"))
+    rules = []
+    for row in rows:
+        labels = row.get("labels") or {}
+        rules.append(Rule(**{**row, "labels": tuple(sorted(dict(labels).items()))}))
+    return rules
+
+
+def classify_severity(metric: str, value: float | None) -> str:
+    """Return ``critical`` at or above `CRITICAL_THRESHOLDS`, otherwise ``warning``."""
+    limit = CRITICAL_THRESHOLDS.get(metric)
+    if value is not None and limit is not None and value >= limit:
+        return "critical"
+    return "warning"
+
+
+class RuleIndex:
+    """Rules bucketed by ``(metric, severity)`` and pre-sorted by specificity.
+
+    A rule is placed in the bucket of every severity at or above its own, so
+    a lookup never scans rules for other metrics or lower severities. Within
+    a bucket, rules for the exact severity come first, then rules requiring
+    more labels, then higher priority.
+    """
+
+    def __init__(self, rules: Iterable[Rule]) -> None:
+        self.rules = list(rules)
+        ranked: Dict[Tuple[str, str], List[Tuple[Tuple[int, int, int, int], Rule]]] = {}
+        for order, rule in enumerate(self.rules):
+            if rule.severity not in SEVERITIES:
+                raise ValueError(f"rule {rule.name!r}: unknown severity {rule.severity!r}")
+            floor = SEVERITIES.index(rule.severity)
+            for level in SEVERITIES[floor:]:
+                rank = (int(level != rule.severity), -len(rule.labels), -rule.priority, order)
+                ranked.setdefault((rule.metric, level), []).append((rank, rule))
+        self._buckets: Dict[Tuple[str, str], Tuple[Rule, ...]] = {
+            key: tuple(rule for _, rule in sorted(entries, key=lambda e: e[0])) for key, entries in ranked.items()
+        }
+
+    def match(self, incident: Incident) -> Rule | None:
+        """Return the best rule for ``incident``, or None."""
+        labels = dict(incident.labels)
+        for metric in (incident.metric, "*"):
+            for rule in self._buckets.get((metric, incident.severity), ()):
+                if all(labels.get(k) == v for k, v in rule.labels):
+                    return rule
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, up to ``burst``."""
+
+    def __init__(self, rate: float, burst: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._clock = clock
+        self._tokens = float(burst)
+        self._stamp = clock()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take ``tokens`` if available; never blocks."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+
+class LogExecutor:
+    """Default executor: performs no side effects and returns the action message."""
+
+    def execute(self, action: str, incident: Incident, timeout: float) -> str:
+        """Return the message `remediate_action` builds for ``action`` on ``incident``."""
+        return remediate_action(f"{incident.metric} {incident.severity} on {incident.host}: {action}")
+
+
+class FakeExecutor:
+    """In-process executor for tests: records calls, optional delay and failures.
+
+    Parameters
+    ----------
+    delay: float
+        Seconds each action sleeps before returning.
+    fail_actions: Iterable[str]
+        Action names that raise instead of succeeding.
+    """
+
+    def __init__(self, delay: float = 0.0, fail_actions: Iterable[str] = ()) -> None:
+        self.delay = delay
+        self.fail_actions = frozenset(fail_actions)
+        self.calls: List[Tuple[str, Incident]] = []
+        self._lock = threading.Lock()
+
+    def execute(self, action: str, incident: Incident, timeout: float) -> str:
+        """Record the call, sleep ``delay`` and fail if ``action`` is in ``fail_actions``."""
+        with self._lock:
+            self.calls.append((action, incident))
+        if self.delay:
+            time.sleep(self.delay)
+        if action in self.fail_actions:
+            raise RuntimeError(f"{action} failed on {incident.host}")
+        return f"{action} done on {incident.host}"
+
+
+class RemediationEngine:
+    """Match incidents to rules and run actions with dedup, cooldown and rate limits.
+
+    Parameters
+    ----------
+    rules: Iterable[Rule]
+        Rule table (defaults to `DEFAULT_RULES`).
+    executor: Any
+        Object with ``execute(action, incident, timeout) -> str``; defaults
+        to `LogExecutor`.
+    max_workers: int
+        Size of the action thread pool.
+    timeout: float
+        Per-action timeout in seconds, passed to the executor and enforced
+        at the start of every `evaluate` and when collecting results.
+    cooldown: float
+        Default seconds between two runs of the same action on one host.
+    rate, burst: float, int
+        Global token bucket: sustained actions per second and burst size.
+    clock: Callable[[], float]
+        Monotonic clock (injectable for tests).
+    history: int
+        Number of recent :class:`ActionResult` entries kept in `results`.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[Rule] = DEFAULT_RULES,
+        executor: Any | None = None,
+        max_workers: int = 8,
+        timeout: float = 30.0,
+        cooldown: float = 300.0,
+        rate: float = 1.0,
+        burst: int = 10,
+        clock: Callable[[], float] = time.monotonic,
+        history: int = 1000,
+    ) -> None:
+        self.index = RuleIndex(rules)
+        self.executor = executor or LogExecutor()
+        self.timeout = float(timeout)
+        self.cooldown = float(cooldown)
+        self.bucket = TokenBucket(rate, burst, clock)
+        self._clock = clock
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="remediate")
+        self._lock = threading.Lock()
+        self._open: Dict[Tuple[str, str], Rule] = {}
+        self._last_run: Dict[Tuple[str, str], float] = {}
+        self._pending: Dict[Future, Tuple[Incident, Rule, float]] = {}
+        self.results: deque[ActionResult] = deque(maxlen=history)
+        self.stats: Dict[str, int] = {
+            s: 0 for s in ("dispatched", "no_rule", "duplicate", "cooldown", "rate_limited", "ok", "failed", "timeout")
+        }
+
+    def _count(self, outcome: str) -> None:
+        """Count one ``outcome`` in `stats` and the decisions metric."""
+        self.stats[outcome] += 1
+        REMEDIATION_DECISIONS.labels(outcome=outcome).inc()
+
+    def submit(self, incident: Incident) -> Decision:
+        """Decide on one incident and dispatch its action if allowed."""
+        rule = self.index.match(incident)
+        if rule is None:
+            return self._decide(incident, "no_rule", None)
+        incident_key = (incident.host, incident.metric)
+        cooldown_key = (incident.host, rule.action)
+        with self._lock:
+            if incident_key in self._open:
+                return self._decide(incident, "duplicate", rule)
+            now = self._clock()
+            last = self._last_run.get(cooldown_key)
+            window = self.cooldown if rule.cooldown is None else rule.cooldown
+            if last is not None and now - last < window:
+                return self._decide(incident, "cooldown", rule)
+            if not self.bucket.try_acquire():
+                return self._decide(incident, "rate_limited", rule)
+            self._open[incident_key] = rule
+            self._last_run[cooldown_key] = now
+            future = self._pool.submit(self.executor.execute, rule.action, incident, self.timeout)
+            self._pending[future] = (incident, rule, time.perf_counter())
+        future.add_done_callback(self._finished)
+        return self._decide(incident, "dispatched", rule, future)
+
+    def _decide(self, incident: Incident, status: str, rule: Rule | None, future: Future | None = None) -> Decision:
+        """Count ``status`` and return it as the `Decision` for ``incident``."""
+        self._count(status)
+        return Decision(incident, status, rule, future)
+
+    def _finished(self, future: Future) -> None:
+        """Done-callback of an action: record its result; a failed incident may be retried."""
+        with self._lock:
+            entry = self._pending.pop(future, None)
+        if entry is None:  # already reported as timed out
+            return
+        incident, rule, started = entry
+        error = None
+        try:
+            output = future.result()
+        except Exception as exc:
+            output, error = None, f"{type(exc).__name__}: {exc}"
+            # Let the incident be retried once the cooldown has passed.
+            with self._lock:
+                self._open.pop((incident.host, incident.metric), None)
+        self._count("ok" if error is None else "failed")
+        self.results.append(ActionResult(incident, rule, error is None, output, error, time.perf_counter() - started))
+
+    def _expire(self, future: Future) -> None:
+        """Record ``future`` as timed out and release its incident."""
+        with self._lock:
+            entry = self._pending.pop(future, None)
+            if entry is not None:
+                self._open.pop((entry[0].host, entry[0].metric), None)
+        if entry is None:  # finished meanwhile
+            return
+        # A queued action never starts; a running one keeps its worker until
+        # the executor gives up, but no longer blocks its incident.
+        future.cancel()
+        incident, rule, started = entry
+        self._count("timeout")
+        self.results.append(ActionResult(incident, rule, False, None, "timeout", time.perf_counter() - started))
+
+    def reap_overdue(self) -> int:
+        """Expire in-flight actions older than the per-action timeout; return how many."""
+        now = time.perf_counter()
+        with self._lock:
+            overdue = [f for f, (_, _, started) in self._pending.items() if now - started > self.timeout]
+        for future in overdue:
+            self._expire(future)
+        return len(overdue)
+
+    def evaluate(
+        self,
+        host: str,
+        metrics: Mapping[str, Any],
+        flagged: Iterable[str],
+        labels: Mapping[str, str] | None = None,
+    ) -> Dict[str, Decision]:
+        """Submit incidents for ``flagged`` metrics of ``host`` and resolve recovered ones.
+
+        Actions that outlived the per-action timeout are reaped first, so a
+        hung action cannot hold its incident open between `wait` calls.
+
+        Parameters
+        ----------
+        host: str
+            Host identity.
+        metrics: Mapping[str, Any]
+            Latest metric values, used to classify severity.
+        flagged: Iterable[str]
+            Metric names that are anomalous this cycle.
+        labels: Mapping[str, str] | None
+            Host labels matched against rule labels.
+
+        Returns
+        -------
+        Dict[str, Decision]
+            One decision per flagged metric.
+        """
+        self.reap_overdue()
+        label_pairs: Labels = tuple(sorted((labels or {}).items()))
+        flagged = set(flagged)
+        decisions = {}
+        for metric in sorted(flagged):
+            value = metrics.get(metric)
+            value = float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+            severity = classify_severity(metric, value)
+            decisions[metric] = self.submit(Incident(host, metric, severity, value, label_pairs))
+        with self._lock:
+            recovered = [key for key in self._open if key[0] == host and key[1] not in flagged]
+        for key in recovered:
+            self.resolve(*key)
+        return decisions
+
+    def resolve(self, host: str, metric: str) -> bool:
+        """Close the open incident for ``(host, metric)``; True if one was open."""
+        with self._lock:
+            return self._open.pop((host, metric), None) is not None
+
+    def open_incidents(self) -> List[Tuple[str, str]]:
+        """Return ``(host, metric)`` pairs with an open incident."""
+        with self._lock:
+            return sorted(self._open)
+
+    def wait(self, timeout: float | None = None) -> List[ActionResult]:
+        """Wait for in-flight actions; report those exceeding the timeout.
+
+        Actions still running after ``timeout`` (default: the per-action
+        timeout) are recorded as timed out and their incidents released.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._lock:
+            pending = list(self._pending)
+        for future in pending:
+            try:
+                future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                self._expire(future)
+            except Exception:
+                pass  # reported by _finished
+        return list(self.results)
+
+    def close(self, timeout: float | None = None) -> None:
+        """Wait for in-flight actions, then stop the pool."""
+        self.wait(timeout)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self) -> "RemediationEngine":
+        """Return the engine itself."""
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        """Close the engine, waiting for in-flight actions."""
+        self.close()
+
@@ -0,0 +1,324 @@
+"""Background, batched S3 shipping of anomaly and remediation audit events.
+
+`log_anomaly_to_s3` / `log_remediation_to_s3` make one blocking `put_object`
+per event. `S3LogShipper` instead accepts events through a bounded in-memory
+queue (never blocking the caller), groups them per kind and uploads each group
+as a single NDJSON object, gzip-compressed by default, once it reaches a size
+or age threshold. Failed uploads are retried with exponential backoff.
+
+Object keys are partitioned by date and hour and made unique with a random
+UUID, e.g. ``anomalies/dt=2026-10-18/hour=09/1792307000123-<uuid>.ndjson.gz``.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Mapping
+
+from instrumentation import record_s3_upload
+
+logger = logging.getLogger(__name__)
+
+KIND_PREFIXES: Dict[str, str] = {"anomaly": "anomalies", "remediation": "remediations"}
+
+_FLUSH = object()
+_STOP = object()
+
+
+def batch_object_key(kind: str, now: float | None = None, compressed: bool = True) -> str:
+    """Return a collision-free key for a batch of ``kind`` events."""
+    stamp = time.time() if now is None else now
+    prefix = KIND_PREFIXES.get(kind, kind)
+    day = time.strftime("%Y-%m-%d", time.gmtime(stamp))
+    hour = time.strftime("%H", time.gmtime(stamp))
+    suffix = ".ndjson.gz" if compressed else ".ndjson"
+    return f"{prefix}/dt={day}/hour={hour}/{int(stamp * 1000)}-{uuid.uuid4().hex}{suffix}"
+
+
+class S3LogShipper:
+    """Buffer audit events in memory and upload them in batches from a thread.
+
+    Parameters
+    ----------
+    s3_client: Any
+        A boto3 S3 client (or a compatible fake with ``put_object``).
+    bucket_name: str
+        Target bucket.
+    max_events: int
+        Flush a kind's buffer once it holds this many events.
+    max_bytes: int
+        Flush a kind's buffer once its serialized size reaches this many bytes.
+    flush_interval: float
+        Maximum age in seconds of the oldest buffered event before a flush.
+    compress: bool
+        Gzip the NDJSON body.
+    max_queue: int
+        Capacity of the hand-off queue; events submitted while it is full are
+        dropped and counted instead of blocking the caller.
+    max_retries: int
+        Upload attempts after the first failure before a batch is dropped.
+    backoff_base, backoff_max: float
+        Exponential backoff parameters (seconds), with full jitter.
+    on_upload: Callable | None
+        Optional ``callback(kind, n_events, seconds, ok)`` invoked after each
+        upload attempt sequence, e.g. for metrics.
+    history: int
+        Object keys of the most recent uploads kept in ``keys``.
+    """
+
+    def __init__(
+        self,
+        s3_client: Any,
+        bucket_name: str,
+        max_events: int = 1000,
+        max_bytes: int = 4 * 1024 * 1024,
+        flush_interval: float = 5.0,
+        compress: bool = True,
+        max_queue: int = 100_000,
+        max_retries: int = 5,
+        backoff_base: float = 0.2,
+        backoff_max: float = 10.0,
+        on_upload: Callable[[str, int, float, bool], None] | None = None,
+        sleep: Callable[[float], None] = time.sleep,
+        history: int = 1000,
+    ) -> None:
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.compress = compress
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_upload = on_upload
+        self._sleep = sleep
+
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._buffers: Dict[str, List[bytes]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._opened: Dict[str, float] = {}
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats: Dict[str, int] = {
+            "submitted": 0,
+            "dropped": 0,
+            "uploaded_objects": 0,
+            "uploaded_events": 0,
+            "retries": 0,
+            "failed_batches": 0,
+            "errors": 0,
+        }
+        self.keys: Deque[str] = deque(maxlen=history)
+
+    # -- producer side ---------------------------------------------------
+
+    def start(self) -> "S3LogShipper":
+        """Start the background uploader (idempotent)."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="s3-log-shipper", daemon=True)
+                self._thread.start()
+        return self
+
+    def submit(self, kind: str, event: Mapping[str, Any] | str) -> bool:
+        """Queue one event without blocking.
+
+        Parameters
+        ----------
+        kind: str
+            Event kind, e.g. ``"anomaly"`` or ``"remediation"``; selects the
+            key prefix.
+        event: Mapping[str, Any] | str
+            Event payload. Strings are wrapped as ``{"message": ...}``. A
+            ``ts`` field is added if missing.
+
+        Returns
+        -------
+        bool
+            False if the queue was full and the event was dropped.
+        """
+        if self._thread is None:
+            self.start()
+        record = {"message": event} if isinstance(event, str) else dict(event)
+        record.setdefault("ts", time.time())
+        try:
+            self._queue.put_nowait((kind, record))
+        except queue.Full:
+            with self._stats_lock:
+                self.stats["dropped"] += 1
+            return False
+        with self._stats_lock:
+            self.stats["submitted"] += 1
+        return True
+
+    def log_anomaly(self, metrics: Mapping[str, Any]) -> bool:
+        """Queue an anomaly event (batched counterpart of `log_anomaly_to_s3`)."""
+        return self.submit("anomaly", {"metrics": dict(metrics)})
+
+    def log_remediation(self, action: str) -> bool:
+        """Queue a remediation event (batched counterpart of `log_remediation_to_s3`)."""
+        return self.submit("remediation", {"action": action})
+
+    def flush(self, timeout: float | None = 10.0) -> bool:
+        """Upload everything queued so far and wait for it; True if completed in time."""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout: float | None = 10.0) -> None:
+        """Flush outstanding events and stop the background thread."""
+        if self._thread is None:
+            return
+        self._queue.put((_STOP, None))
+        self._thread.join(timeout)
+        self._thread = None
+
+    # -- consumer side ---------------------------------------------------
+
+    def _run(self) -> None:
+        """Consumer loop: buffer queued events and upload them until stopped.
+
+        A failure while handling one item is logged and counted in
+        ``stats["errors"]``; the loop keeps running and flush waiters are
+        always released.
+        """
+        while True:
+            timeout = self._next_deadline()
+            try:
+                kind, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._guarded(self._flush_due)
+                continue
+            if kind is _FLUSH:
+                try:
+                    stop = self._flush_all()
+                finally:
+                    payload.set()
+                if stop:
+                    return
+                continue
+            if kind is _STOP:
+                self._flush_all()
+                return
+            self._guarded(self._buffer, kind, payload)
+
+    def _guarded(self, step: Callable[..., None], *args: Any) -> None:
+        """Run one consumer step, logging and counting an exception instead of raising it."""
+        try:
+            step(*args)
+        except Exception:
+            logger.exception("S3 log shipper step %s failed", step.__name__)
+            with self._stats_lock:
+                self.stats["errors"] += 1
+
+    def _next_deadline(self) -> float | None:
+        """Seconds until the oldest open buffer is due, or None if nothing is buffered."""
+        if not self._opened:
+            return None
+        oldest = min(self._opened.values())
+        return max(0.0, oldest + self.flush_interval - time.monotonic())
+
+    def _buffer(self, kind: str, record: Dict[str, Any]) -> None:
+        """Append one record to its kind's buffer, uploading the buffer once it is full or due."""
+        line = json.dumps(record, default=str).encode("utf-8") + b"\n"
+        if kind not in self._buffers:
+            self._buffers[kind] = []
+            self._sizes[kind] = 0
+            self._opened[kind] = time.monotonic()
+        self._buffers[kind].append(line)
+        self._sizes[kind] += len(line)
+        if len(self._buffers[kind]) >= self.max_events or self._sizes[kind] >= self.max_bytes:
+            self._flush_kind(kind)
+        else:
+            self._flush_due()
+
+    def _flush_due(self) -> None:
+        """Upload every buffer older than ``flush_interval``."""
+        now = time.monotonic()
+        for kind, opened in list(self._opened.items()):
+            if now - opened >= self.flush_interval:
+                self._flush_kind(kind)
+
+    def _flush_all(self) -> bool:
+        """Drain the queue and upload every buffer; return True if a stop was seen."""
+        stop = False
+        waiters = []
+        try:
+            while True:
+                try:
+                    kind, payload = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if kind is _FLUSH:
+                    waiters.append(payload)
+                elif kind is _STOP:
+                    stop = True
+                else:
+                    self._guarded(self._buffer, kind, payload)
+            for kind in list(self._buffers):
+                self._guarded(self._flush_kind, kind)
+        finally:
+            for waiter in waiters:
+                waiter.set()
+        return stop
+
+    def _flush_kind(self, kind: str) -> None:
+        """Upload and clear the buffer of ``kind``."""
+        lines = self._buffers.pop(kind, [])
+        self._sizes.pop(kind, None)
+        self._opened.pop(kind, None)
+        if lines:
+            self._upload(kind, lines)
+
+    def _upload(self, kind: str, lines: List[bytes]) -> None:
+        """Upload one batch as a single object, retrying with backoff, and record the outcome."""
+        body = b"".join(lines)
+        if self.compress:
+            body = gzip.compress(body, compresslevel=6)
+        key = batch_object_key(kind, compressed=self.compress)
+
+        started = time.perf_counter()
+        ok = False
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=body)
+                ok = True
+                break
+            except Exception:
+                if attempt == self.max_retries:
+                    break
+                with self._stats_lock:
+                    self.stats["retries"] += 1
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                self._sleep(random.uniform(0, delay))
+        elapsed = time.perf_counter() - started
+
+        with self._stats_lock:
+            if ok:
+                self.stats["uploaded_objects"] += 1
+                self.stats["uploaded_events"] += len(lines)
+                self.keys.append(key)
+            else:
+                self.stats["failed_batches"] += 1
+        record_s3_upload(kind, len(lines), elapsed, ok)
+        if self.on_upload is not None:
+            self.on_upload(kind, len(lines), elapsed, ok)
+
+
+def read_batch(body: bytes) -> List[Dict[str, Any]]:
+    """Decode an uploaded batch body (gzip or plain NDJSON) back into events."""
+    if body[:2] == b"\x1f\x8b":
+        body = gzip.decompress(body)
+    return [json.loads(line) for line in body.splitlines() if line.strip()]
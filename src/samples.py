@@ -0,0 +1,204 @@
+"""Compact metric sample types.
+
+Two representations replace ad-hoc ``Dict[str, Any]`` metrics inside the
+pipeline:
+
+- `MetricSample`: one ``(host, metric, value, ts)`` observation in a
+  ``__slots__`` record (no per-instance ``__dict__``).
+- `SampleFrame`: many observations as a ``hosts x columns`` float64 matrix
+  with the host and column names held once. Missing cells are NaN.
+  :meth:`SampleFrame.to_numpy` and :meth:`SampleFrame.column` return views,
+  so detectors and the store consume the batch without copying.
+
+Conversions back to plain dicts (:meth:`SampleFrame.to_dict`,
+:meth:`SampleFrame.row`) exist for the JSON snapshot and the HTTP API, which
+keep their ``{host: {metric: value}}`` shape. See
+`benchmarks/bench_samples.py` for memory per sample and conversion costs.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+
+class MetricSample:
+    """One observation of ``metric`` on ``host`` (``ts`` in epoch seconds, or None)."""
+
+    __slots__ = ("host", "metric", "value", "ts")
+
+    def __init__(self, host: str, metric: str, value: float, ts: float | None = None) -> None:
+        self.host = host
+        self.metric = metric
+        self.value = value
+        self.ts = ts
+
+    def __repr__(self) -> str:
+        """Constructor-style representation."""
+        return f"MetricSample({self.host!r}, {self.metric!r}, {self.value!r}, {self.ts!r})"
+
+    def __eq__(self, other: object) -> bool:
+        """Field-wise equality with another `MetricSample`."""
+        if not isinstance(other, MetricSample):
+            return NotImplemented
+        return (self.host, self.metric, self.value, self.ts) == (other.host, other.metric, other.value, other.ts)
+
+    def as_tuple(self) -> Tuple[str, str, float, float | None]:
+        """``(host, metric, value, ts)``."""
+        return self.host, self.metric, self.value, self.ts
+
+
+def _numeric(value: Any) -> bool:
+    """True for int and float values, but not bools."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class SampleFrame:
+    """Column batch of samples: one row per host, one column per metric.
+
+    Parameters
+    ----------
+    hosts: Sequence[str]
+        Row names.
+    columns: Sequence[str]
+        Metric names.
+    values: array-like
+        ``(len(hosts), len(columns))`` values; converted to float64 without a
+        copy when already a float64 array. NaN marks a missing sample.
+    ts: float | None
+        Common timestamp of the batch (one scrape), if known.
+    """
+
+    __slots__ = ("hosts", "columns", "values", "ts", "_rows")
+
+    def __init__(self, hosts: Sequence[str], columns: Sequence[str], values: Any, ts: float | None = None) -> None:
+        self.hosts: Tuple[str, ...] = tuple(hosts)
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.values = np.asarray(values, dtype=np.float64).reshape(len(self.hosts), len(self.columns))
+        self.ts = ts
+        self._rows: Dict[str, int] | None = None
+
+    # ------------------------------------------------------------ construction
+
+    @classmethod
+    def from_hosts(
+        cls,
+        hosts: Mapping[str, Mapping[str, Any]],
+        columns: Sequence[str] | None = None,
+        ts: float | None = None,
+    ) -> "SampleFrame":
+        """Build from ``{host: {metric: value}}`` (the ``hosts`` section of a live summary).
+
+        ``columns`` defaults to every numeric metric seen, in first-seen order.
+        """
+        if columns is None:
+            seen: Dict[str, None] = {}
+            for metrics in hosts.values():
+                for name, value in metrics.items():
+                    if name not in seen and _numeric(value):
+                        seen[name] = None
+            columns = tuple(seen)
+        names = list(hosts)
+        nan = float("nan")
+        flat = np.fromiter(
+            (_as_float(hosts[h].get(c, nan)) for h in names for c in columns),
+            dtype=np.float64,
+            count=len(names) * len(columns),
+        )
+        return cls(names, columns, flat, ts)
+
+    @classmethod
+    def from_metrics(
+        cls, metrics: Mapping[str, Any], host: str = "local", columns: Sequence[str] | None = None
+    ) -> "SampleFrame":
+        """Build a one-row frame from a flat ``{metric: value}`` snapshot."""
+        return cls.from_hosts({host: metrics}, columns)
+
+    @classmethod
+    def from_samples(cls, samples: Iterable[MetricSample]) -> "SampleFrame":
+        """Pivot individual samples into a frame; the last sample per cell wins."""
+        rows: Dict[str, int] = {}
+        cols: Dict[str, int] = {}
+        cells: List[Tuple[int, int, float]] = []
+        ts = None
+        for s in samples:
+            r = rows.setdefault(s.host, len(rows))
+            c = cols.setdefault(s.metric, len(cols))
+            cells.append((r, c, s.value))
+            ts = s.ts if ts is None else max(ts, s.ts or ts)
+        values = np.full((len(rows), len(cols)), np.nan)
+        if cells:
+            r, c, v = zip(*cells)
+            values[list(r), list(c)] = v
+        return cls(list(rows), list(cols), values, ts)
+
+    # ------------------------------------------------------------ access
+
+    def __len__(self) -> int:
+        """Number of hosts (rows)."""
+        return len(self.hosts)
+
+    def __contains__(self, host: object) -> bool:
+        """True if ``host`` has a row."""
+        return host in self._row_index()
+
+    def _row_index(self) -> Dict[str, int]:
+        """``{host: row}``, built on first use."""
+        if self._rows is None:
+            self._rows = {h: i for i, h in enumerate(self.hosts)}
+        return self._rows
+
+    def __repr__(self) -> str:
+        """Summary with the host count and column names."""
+        return f"SampleFrame(hosts={len(self.hosts)}, columns={self.columns!r})"
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the value matrix."""
+        return self.values.nbytes
+
+    def to_numpy(self) -> np.ndarray:
+        """The ``(hosts, columns)`` value matrix itself (no copy)."""
+        return self.values
+
+    def column(self, name: str) -> np.ndarray:
+        """Values of one metric across hosts, as a view."""
+        return self.values[:, self.columns.index(name)]
+
+    def index(self, host: str) -> int:
+        """Row number of ``host``."""
+        return self._row_index()[host]
+
+    def row(self, host: str) -> Dict[str, float]:
+        """Metrics of one host as a dict, without missing cells."""
+        values = self.values[self.index(host)].tolist()
+        return {c: v for c, v in zip(self.columns, values) if v == v}
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """``{host: {metric: value}}`` for JSON output, without missing cells."""
+        columns = self.columns
+        return {
+            host: {c: v for c, v in zip(columns, row) if v == v}
+            for host, row in zip(self.hosts, self.values.tolist())
+        }
+
+    def samples(self) -> Iterator[MetricSample]:
+        """Yield one `MetricSample` per present cell, row by row."""
+        for host, row in zip(self.hosts, self.values.tolist()):
+            for metric, value in zip(self.columns, row):
+                if value == value:
+                    yield MetricSample(host, metric, value, self.ts)
+
+    def select(self, rows: Any) -> "SampleFrame":
+        """Subset of rows by boolean mask or index array."""
+        idx = np.flatnonzero(rows) if np.asarray(rows).dtype == bool else np.asarray(rows, dtype=np.intp)
+        return SampleFrame([self.hosts[i] for i in idx], self.columns, self.values[idx], self.ts)
+
+
+def _as_float(value: Any) -> float:
+    """``float(value)``, or NaN where it cannot be converted."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
@@ -0,0 +1,263 @@
+"""Concurrent live scraping of Prometheus-style `/metrics` targets.
+
+Targets come from `config/aws_targets.json` (`node_exporter` and `app` lists)
+through the shared `targets.TargetIndex`. Each scrape cycle fans out over a
+bounded thread pool that shares one keep-alive `requests.Session`, so
+connections are reused across cycles and a slow host only costs its own
+timeout rather than serializing the fleet.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Collection, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import PARSE_SECONDS, SCRAPE_FAILURES, SCRAPE_SECONDS
+from prom_parser import ExpositionParser, Sample, iter_lines
+from targets import DEFAULT_TARGETS_PATH, Target, TargetConfigError, get_target_index
+
+
+# Families needed by `node_summary`; the default scraper skips everything else.
+SUMMARY_FAMILIES = ("node_cpu_seconds", "node_memory_MemTotal_bytes", "node_memory_MemAvailable_bytes")
+
+
+class ScrapeResult(NamedTuple):
+    """Outcome of scraping one target."""
+
+    job: str
+    instance: str
+    ok: bool
+    samples: List[Sample]
+    error: str | None
+    duration: float
+
+
+class LiveScrapeError(RuntimeError):
+    """Raised when live mode is requested but no target could be scraped."""
+
+
+def load_targets(config_path: str | Path = DEFAULT_TARGETS_PATH) -> List[Target]:
+    """Return the `targets.Target` entries of an aws_targets.json file.
+
+    Entries under ``node_exporter`` get job ``node`` and entries under ``app``
+    get job ``app``, matching the Prometheus file_sd jobs; per-target labels
+    are kept so scraped samples carry them. Reads go through the shared
+    `targets.TargetIndex`, so an unchanged file is not re-parsed and an
+    invalid edit keeps the last good target list.
+
+    Raises
+    ------
+    TargetConfigError
+        If the file is invalid and no earlier version of it loaded.
+    """
+    index = get_target_index(config_path)
+    if index.error is not None and not len(index):
+        raise TargetConfigError(index.error)
+    return list(index.targets)
+
+
+def _target_labels(
+    instance: str, job: str, labels: Tuple[Tuple[str, str], ...] = ()
+) -> Tuple[Tuple[str, str], ...]:
+    """Labels added to every sample of a target: non-empty ``instance``/``job`` plus ``labels``."""
+    pairs = tuple(pair for pair in (("instance", instance), ("job", job)) if pair[1])
+    return tuple(sorted(pairs + tuple(labels))) if labels else pairs
+
+
+def parse_exposition(text: str, instance: str = "", job: str = "") -> List[Sample]:
+    """Parse Prometheus text exposition into sample tuples tagged with instance/job."""
+    return list(ExpositionParser().parse(text.split("\n"), _target_labels(instance, job)))
+
+
+class Scraper:
+    """Bounded-concurrency scraper with a pooled keep-alive HTTP session.
+
+    Parameters
+    ----------
+    max_workers: int
+        Maximum number of targets scraped at once.
+    timeout: float
+        Per-target connect/read timeout in seconds.
+    cycle_timeout: float | None
+        Upper bound for a whole :meth:`scrape` call. Targets still pending at
+        the deadline are reported as timed out. Defaults to ``2 * timeout``.
+    families: Collection[str] | None
+        Metric family allow-list passed to the parser; None keeps everything.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 64,
+        timeout: float = 2.0,
+        cycle_timeout: float | None = None,
+        families: Collection[str] | None = None,
+    ) -> None:
+        self.timeout = float(timeout)
+        self.cycle_timeout = float(cycle_timeout) if cycle_timeout is not None else 2 * self.timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scrape")
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._parser = ExpositionParser(families=families)
+        self._cpu_counters: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        """Stop the worker pool and close pooled connections."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
+
+    def __enter__(self) -> "Scraper":
+        """Return the scraper itself."""
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        """Close the scraper."""
+        self.close()
+
+    def _scrape_one(self, job: str, instance: str, labels: Tuple[Tuple[str, str], ...] = ()) -> ScrapeResult:
+        """Fetch and parse one target; a failure is returned as a down result, never raised."""
+        started = time.perf_counter()
+        url = instance if "://" in instance else f"http://{instance}/metrics"
+        try:
+            with self._session.get(url, timeout=self.timeout, stream=True) as resp:
+                resp.raise_for_status()
+                parse_started = time.perf_counter()
+                lines = iter_lines(resp.iter_content(chunk_size=65536), resp.encoding or "utf-8")
+                samples = list(self._parser.parse(lines, _target_labels(instance, job, labels)))
+                PARSE_SECONDS.observe(time.perf_counter() - parse_started)
+        except Exception as exc:  # network, HTTP and parse errors all mark the target down
+            elapsed = time.perf_counter() - started
+            SCRAPE_FAILURES.labels(job=job).inc()
+            SCRAPE_SECONDS.labels(job=job).observe(elapsed)
+            return ScrapeResult(job, instance, False, [], f"{type(exc).__name__}: {exc}", elapsed)
+        elapsed = time.perf_counter() - started
+        SCRAPE_SECONDS.labels(job=job).observe(elapsed)
+        return ScrapeResult(job, instance, True, samples, None, elapsed)
+
+    def scrape(self, targets: Iterable[Tuple[str, ...]]) -> List[ScrapeResult]:
+        """Scrape all ``(job, instance)`` targets concurrently.
+
+        A `targets.Target` (or any ``(job, instance, labels)`` triple) also
+        attaches its labels to every scraped sample. Returns one result per
+        target, in input order. Targets that have not finished by
+        ``cycle_timeout`` are returned as failed with a timeout error; their
+        requests are abandoned rather than awaited.
+        """
+        pairs = list(targets)
+        futures = [self._executor.submit(self._scrape_one, *target) for target in pairs]
+        wait(futures, timeout=self.cycle_timeout)
+        results = []
+        for (job, instance, *_), future in zip(pairs, futures):
+            if future.done():
+                results.append(future.result())
+            else:
+                future.cancel()
+                results.append(ScrapeResult(job, instance, False, [], "cycle timeout", self.cycle_timeout))
+        return results
+
+    def summarize(self, results: Sequence[ScrapeResult]) -> Dict[str, Any]:
+        """Reduce scrape results to per-host cpu/memory percentages.
+
+        CPU utilisation is derived from ``node_cpu_seconds_total``: as a rate
+        between this and the previous scrape of the same instance, or from the
+        since-boot totals on the first scrape. Memory utilisation is
+        ``1 - MemAvailable / MemTotal``.
+
+        Returns
+        -------
+        Dict[str, Any]
+            ``cpu``/``memory`` of the worst host (so the fleet-level snapshot
+            stays compatible with `detect_anomaly`), ``hosts`` with per-instance
+            values, and ``up``/``down`` target counts.
+        """
+        hosts: Dict[str, Dict[str, float]] = {}
+        for result in results:
+            if not result.ok:
+                continue
+            host = node_summary(result.samples)
+            if "cpu_seconds_total" in host:
+                total, idle = host.pop("cpu_seconds_total"), host.pop("cpu_seconds_idle")
+                with self._lock:
+                    previous = self._cpu_counters.get(result.instance)
+                    self._cpu_counters[result.instance] = (total, idle)
+                if previous is not None and total > previous[0]:
+                    total, idle = total - previous[0], idle - previous[1]
+                if total > 0:
+                    host["cpu"] = round(100.0 * (1.0 - idle / total), 3)
+            if host:
+                hosts[result.instance] = host
+
+        summary: Dict[str, Any] = {
+            "hosts": hosts,
+            "up": sum(1 for r in results if r.ok),
+            "down": sum(1 for r in results if not r.ok),
+        }
+        for metric in ("cpu", "memory"):
+            values = [h[metric] for h in hosts.values() if metric in h]
+            if values:
+                summary[metric] = max(values)
+        return summary
+
+
+def node_summary(samples: Iterable[Sample]) -> Dict[str, float]:
+    """Extract cpu counter totals and memory percentage from node_exporter samples."""
+    cpu_total = cpu_idle = 0.0
+    mem_total = mem_available = None
+    for name, labels, value, _ in samples:
+        if name == "node_cpu_seconds_total":
+            cpu_total += value
+            if ("mode", "idle") in labels:
+                cpu_idle += value
+        elif name == "node_memory_MemTotal_bytes":
+            mem_total = value
+        elif name == "node_memory_MemAvailable_bytes":
+            mem_available = value
+
+    out: Dict[str, float] = {}
+    if cpu_total > 0:
+        out["cpu_seconds_total"] = cpu_total
+        out["cpu_seconds_idle"] = cpu_idle
+    if mem_total and mem_available is not None:
+        out["memory"] = round(100.0 * (1.0 - mem_available / mem_total), 3)
+    return out
+
+
+_DEFAULT_SCRAPER: Scraper | None = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+def get_scraper() -> Scraper:
+    """Return the process-wide scraper so sessions and CPU counters persist."""
+    global _DEFAULT_SCRAPER
+    with _DEFAULT_LOCK:
+        if _DEFAULT_SCRAPER is None:
+            _DEFAULT_SCRAPER = Scraper(families=SUMMARY_FAMILIES)
+        return _DEFAULT_SCRAPER
+
+
+def scrape_fleet(
+    config_path: str | Path = DEFAULT_TARGETS_PATH,
+    scraper: Scraper | None = None,
+    targets: Iterable[Tuple[str, ...]] | None = None,
+) -> Dict[str, Any]:
+    """Scrape every configured target and return the fleet summary.
+
+    Raises
+    ------
+    LiveScrapeError
+        If no target produced cpu or memory readings.
+    """
+    active = scraper or get_scraper()
+    pairs = list(targets) if targets is not None else load_targets(config_path)
+    summary = active.summarize(active.scrape(pairs))
+    if "cpu" not in summary and "memory" not in summary:
+        raise LiveScrapeError(f"no live metrics from {len(pairs)} target(s) ({summary['down']} down)")
+    return summary
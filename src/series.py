@@ -0,0 +1,444 @@
+"""Label-aware series identity for multi-host metric batches.
+
+A series is a metric name plus a label set, e.g. ``cpu`` with
+``{host="web-1", job="node"}``; its canonical text form is
+:func:`series_key`. `SeriesRegistry` gives every series a dense integer id:
+
+- label sets are interned: equal sets share one canonical sorted tuple and a
+  label-set id, and a label tuple seen before resolves with one dict lookup
+  instead of being sorted again;
+- ``(metric id, label-set id)`` maps to the series id, and per-id columns
+  (key, metric, label set) answer the reverse lookups;
+- an inverted index of ``(label, value)`` pairs serves selections such as
+  every ``cpu`` series of ``job="node"``;
+- the ids of a whole `samples.SampleFrame` layout (hosts x columns under one
+  row label) are cached, so consecutive scrapes of the same fleet cost no
+  per-sample work at all.
+
+`SeriesBatch` is the multi-host ingestion schema: parallel ``ids``,
+``values`` and ``ts`` arrays tied to a registry. The store appends it
+(`metric_store.MetricStore.append_batch`), `anomaly_detection.detect_batch`
+scores it, and :meth:`SeriesBatch.to_frame` pivots it into the hosts x
+metrics frame the detectors and the dashboard use.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from samples import SampleFrame
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_LABEL_PAIR = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+# Label value escapes of the Prometheus exposition format.
+_ESCAPES = {"\\": "\\\\", '"': '\\"', "\n": "\\n"}
+_ESCAPE = re.compile(r'[\\"\n]')
+_UNESCAPES = {v: k for k, v in _ESCAPES.items()}
+_UNESCAPE = re.compile(r'\\[\\"n]')
+# Frame layouts whose ids are cached per registry.
+_MAX_LAYOUTS = 16
+
+
+def series_key(metric: str, labels: Mapping[str, str] | None = None) -> str:
+    """Return the canonical series key, e.g. ``cpu{host="web-1",job="node"}``.
+
+    Labels are sorted by name so the same label set always maps to the same key.
+    Backslashes, double quotes and newlines in values are escaped as in the
+    exposition format, so distinct label sets never share a key. A metric without labels is
+    keyed by its bare name.
+    """
+    if not labels:
+        return metric
+    body = ",".join(
+        f'{name}="{_ESCAPE.sub(lambda m: _ESCAPES[m.group(0)], str(labels[name]))}"' for name in sorted(labels)
+    )
+    return f"{metric}{{{body}}}"
+
+
+def parse_series_key(key: str) -> Tuple[str, Dict[str, str]]:
+    """Inverse of :func:`series_key`: ``'cpu{host="a"}'`` -> ``("cpu", {"host": "a"})``."""
+    metric, brace, body = key.partition("{")
+    if not brace:
+        return key, {}
+    return metric, {
+        name: _UNESCAPE.sub(lambda m: _UNESCAPES[m.group(0)], value) for name, value in _LABEL_PAIR.findall(body)
+    }
+
+
+def _canonical(labels: Mapping[str, Any] | Iterable[Tuple[str, Any]] | None) -> Labels:
+    """Labels as sorted ``(name, value)`` string pairs; raises ValueError on a repeated name."""
+    if not labels:
+        return ()
+    pairs = labels.items() if isinstance(labels, Mapping) else labels
+    canonical = tuple(sorted((str(name), str(value)) for name, value in pairs))
+    for (name, _), (following, _) in zip(canonical, canonical[1:]):
+        if name == following:
+            raise ValueError(f"duplicate label {name!r}")
+    return canonical
+
+
+class SeriesRegistry:
+    """Interned label sets and dense integer series ids.
+
+    Ids are assigned in registration order and never reused. Lookups of known
+    series are lock-free dict reads; registration takes a lock, so one
+    registry can be shared by the ingest and analyze threads.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._labelset_ids: Dict[Labels, int] = {}
+        self._labelsets: List[Labels] = []
+        self._metric_ids: Dict[str, int] = {}
+        self.metric_names: List[str] = []
+        self._ids: Dict[Tuple[int, int], int] = {}
+        self._key_ids: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._series_metric: List[int] = []
+        self._series_labelset: List[int] = []
+        self._postings: Dict[Tuple[str, str], List[int]] = {}
+        self._metric_postings: Dict[int, List[int]] = {}
+        self._columns: Tuple[int, np.ndarray, np.ndarray] | None = None
+        self._label_values: Dict[str, Tuple[List[int], Dict[str, int], List[str]]] = {}
+        self._layouts: Dict[Tuple[Any, ...], np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    # ------------------------------------------------------------ interning
+
+    def labelset_id(self, labels: Mapping[str, Any] | Iterable[Tuple[str, Any]] | None = None) -> int:
+        """Id of the interned label set; a label tuple seen before costs one dict lookup."""
+        if isinstance(labels, tuple):
+            lid = self._labelset_ids.get(labels)
+            if lid is not None:
+                return lid
+        canonical = _canonical(labels)
+        lid = self._labelset_ids.get(canonical)
+        if lid is None:
+            with self._lock:
+                lid = self._labelset_ids.get(canonical)
+                if lid is None:
+                    lid = self._labelset_ids[canonical] = len(self._labelsets)
+                    self._labelsets.append(canonical)
+        if isinstance(labels, tuple) and labels != canonical:
+            self._labelset_ids[labels] = lid
+        return lid
+
+    def intern(self, labels: Mapping[str, Any] | Iterable[Tuple[str, Any]] | None = None) -> Labels:
+        """Canonical ``((name, value), ...)`` tuple shared by every equal label set."""
+        return self._labelsets[self.labelset_id(labels)]
+
+    def metric_id(self, metric: str) -> int:
+        """Index of ``metric`` in :attr:`metric_names`."""
+        mid = self._metric_ids.get(metric)
+        if mid is None:
+            with self._lock:
+                mid = self._metric_ids.setdefault(metric, len(self.metric_names))
+                if mid == len(self.metric_names):
+                    self.metric_names.append(metric)
+        return mid
+
+    def _series(self, mid: int, lid: int) -> int:
+        """Id of the (metric id, label-set id) series, registering it on first use."""
+        sid = self._ids.get((mid, lid))
+        if sid is not None:
+            return sid
+        with self._lock:
+            sid = self._ids.get((mid, lid))
+            if sid is not None:
+                return sid
+            labels = self._labelsets[lid]
+            key = series_key(self.metric_names[mid], dict(labels))
+            sid = self._key_ids.get(key)
+            if sid is None:
+                sid = len(self._keys)
+                self._key_ids[key] = sid
+                self._keys.append(key)
+                self._series_metric.append(mid)
+                self._series_labelset.append(lid)
+                self._metric_postings.setdefault(mid, []).append(sid)
+                for pair in labels:
+                    self._postings.setdefault(pair, []).append(sid)
+            self._ids[(mid, lid)] = sid
+            return sid
+
+    def series_id(self, metric: str, labels: Mapping[str, Any] | Iterable[Tuple[str, Any]] | None = None) -> int:
+        """Id of the series ``metric`` + ``labels``, registering it if new."""
+        return self._series(self.metric_id(metric), self.labelset_id(labels))
+
+    def ids(self, metrics: Sequence[str], labels: Mapping[str, Any] | None = None) -> np.ndarray:
+        """Ids of several metrics sharing one label set."""
+        lid = self.labelset_id(labels)
+        return np.fromiter((self._series(self.metric_id(m), lid) for m in metrics), dtype=np.int64, count=len(metrics))
+
+    def frame_ids(self, frame: SampleFrame, label: str = "host", labels: Mapping[str, Any] | None = None) -> np.ndarray:
+        """Ids of every cell of ``frame``, row-major (``hosts x columns``).
+
+        Row ``h``, column ``m`` is series ``m`` with ``labels`` plus
+        ``{label: h}``. The result is cached per (hosts, columns) layout.
+        """
+        base = self._labelsets[self.labelset_id(labels)]
+        layout = (frame.hosts, frame.columns, label, base)
+        cached = self._layouts.get(layout)
+        if cached is not None:
+            return cached
+        mids = [self.metric_id(c) for c in frame.columns]
+        extra = dict(base)
+        out = np.empty(len(frame.hosts) * len(mids), dtype=np.int64)
+        pos = 0
+        for host in frame.hosts:
+            extra[label] = host
+            lid = self.labelset_id(extra)
+            for mid in mids:
+                out[pos] = self._series(mid, lid)
+                pos += 1
+        out.flags.writeable = False
+        with self._lock:
+            if len(self._layouts) >= _MAX_LAYOUTS:
+                self._layouts.clear()
+            self._layouts[layout] = out
+        return out
+
+    def id_for_key(self, key: str) -> int:
+        """Id of the series with canonical key ``key`` (see :func:`series_key`)."""
+        sid = self._key_ids.get(key)
+        if sid is None:
+            metric, labels = parse_series_key(key)
+            sid = self.series_id(metric, labels)
+        return sid
+
+    def ids_for_keys(self, keys: Sequence[str]) -> np.ndarray:
+        """Ids of ``keys`` as an int64 array, registering unknown series."""
+        return np.fromiter((self.id_for_key(k) for k in keys), dtype=np.int64, count=len(keys))
+
+    # ------------------------------------------------------------ reverse lookups
+
+    def key(self, sid: int) -> str:
+        """Canonical key of series ``sid``."""
+        return self._keys[sid]
+
+    def keys(self, ids: Iterable[int]) -> List[str]:
+        """Canonical keys of ``ids``, in order."""
+        keys = self._keys
+        return [keys[i] for i in np.asarray(ids, dtype=np.int64).tolist()]
+
+    def metric(self, sid: int) -> str:
+        """Metric name of series ``sid``."""
+        return self.metric_names[self._series_metric[sid]]
+
+    def labels(self, sid: int) -> Dict[str, str]:
+        """Labels of series ``sid`` as a new dict."""
+        return dict(self._labelsets[self._series_labelset[sid]])
+
+    def _id_columns(self) -> Tuple[np.ndarray, np.ndarray]:
+        """``(metric id, label-set id)`` per series as arrays, rebuilt after registrations."""
+        columns = self._columns
+        n = len(self._keys)
+        if columns is None or columns[0] != n:
+            with self._lock:
+                n = len(self._keys)
+                columns = self._columns = (
+                    n,
+                    np.asarray(self._series_metric[:n], dtype=np.int64),
+                    np.asarray(self._series_labelset[:n], dtype=np.int64),
+                )
+        return columns[1], columns[2]
+
+    def metric_codes(self, ids: Any) -> np.ndarray:
+        """Index into :attr:`metric_names` for each id."""
+        return self._id_columns()[0][np.asarray(ids, dtype=np.int64)]
+
+    def label_codes(self, ids: Any, name: str) -> Tuple[np.ndarray, List[str]]:
+        """Value of label ``name`` for each id, as ``(codes, values)``.
+
+        ``values[codes[i]]`` is the label value of ``ids[i]``; code -1 marks
+        series without that label.
+        """
+        with self._lock:
+            per_labelset, value_ids, values = self._label_values.setdefault(name, ([], {}, []))
+            for labels in self._labelsets[len(per_labelset):]:
+                value = dict(labels).get(name)
+                per_labelset.append(-1 if value is None else value_ids.setdefault(value, len(value_ids)))
+                if len(value_ids) > len(values):
+                    values.append(value)
+            table = np.asarray(per_labelset, dtype=np.int64)
+        return table[self._id_columns()[1][np.asarray(ids, dtype=np.int64)]], list(values)
+
+    def select(self, metrics: Iterable[str] | None = None, matchers: Mapping[str, str] | None = None) -> np.ndarray:
+        """Sorted ids of the series named in ``metrics`` carrying every ``matchers`` label.
+
+        ``None`` for either argument means no constraint.
+        """
+        selected: np.ndarray | None = None
+        if metrics is not None:
+            lists = [self._metric_postings.get(self._metric_ids.get(m, -1), []) for m in metrics]
+            selected = np.unique(np.concatenate([np.asarray(p, dtype=np.int64) for p in lists] or [np.empty(0, np.int64)]))
+        for pair in (matchers or {}).items():
+            posting = np.asarray(self._postings.get((str(pair[0]), str(pair[1])), []), dtype=np.int64)
+            selected = posting if selected is None else np.intersect1d(selected, posting, assume_unique=True)
+        if selected is None:
+            return np.arange(len(self._keys), dtype=np.int64)
+        return selected
+
+
+class SeriesBatch:
+    """Samples of many series as parallel arrays.
+
+    Parameters
+    ----------
+    ids: array-like of int
+        Series ids in ``registry``.
+    values: array-like of float
+        Sample values aligned with ``ids``.
+    ts: float | array-like of float
+        Epoch-seconds timestamp(s); a scalar applies to the whole batch.
+    registry: SeriesRegistry | None
+        Registry the ids belong to; defaults to the process-wide one.
+    """
+
+    __slots__ = ("ids", "values", "ts", "registry")
+
+    def __init__(self, ids: Any, values: Any, ts: Any, registry: SeriesRegistry | None = None) -> None:
+        self.ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        self.values = np.asarray(values, dtype=np.float64).reshape(-1)
+        if len(self.ids) != len(self.values):
+            raise ValueError("ids and values must have the same length")
+        self.ts = np.broadcast_to(np.asarray(ts, dtype=np.float64), self.values.shape)
+        self.registry = get_registry() if registry is None else registry
+
+    # ------------------------------------------------------------ construction
+
+    @classmethod
+    def from_frame(
+        cls,
+        frame: SampleFrame,
+        registry: SeriesRegistry | None = None,
+        label: str = "host",
+        labels: Mapping[str, Any] | None = None,
+        ts: float | None = None,
+    ) -> "SeriesBatch":
+        """Every present cell of ``frame``: row ``h`` becomes label ``{label: h}`` on top of ``labels``."""
+        registry = get_registry() if registry is None else registry
+        stamp = frame.ts if ts is None else ts
+        if stamp is None:
+            raise ValueError("frame has no timestamp")
+        ids = registry.frame_ids(frame, label, labels)
+        values = frame.values.reshape(-1)
+        present = ~np.isnan(values)
+        if not present.all():
+            ids, values = ids[present], values[present]
+        return cls(ids, values, stamp, registry)
+
+    @classmethod
+    def from_samples(
+        cls,
+        samples: Iterable[Tuple[str, Any, float, float]],
+        registry: SeriesRegistry | None = None,
+        labels: Mapping[str, Any] | None = None,
+    ) -> "SeriesBatch":
+        """Build from ``(metric, labels, value, ts)`` tuples such as `scraper.Sample`.
+
+        ``labels`` (e.g. ``{"instance": ..., "job": ...}`` of the scraped
+        target) are added to every sample's own labels; a missing ``ts``
+        means now.
+        """
+        registry = get_registry() if registry is None else registry
+        extra = _canonical(labels)
+        ids: List[int] = []
+        values: List[float] = []
+        stamps: List[float] = []
+        now = time.time()
+        for metric, sample_labels, value, ts in samples:
+            if extra:
+                sample_labels = tuple(sample_labels.items() if isinstance(sample_labels, Mapping) else sample_labels) + extra
+            ids.append(registry.series_id(metric, sample_labels))
+            values.append(value)
+            stamps.append(now if ts is None else ts)
+        return cls(ids, values, np.asarray(stamps, dtype=np.float64), registry)
+
+    @classmethod
+    def concat(cls, batches: Sequence["SeriesBatch"]) -> "SeriesBatch":
+        """Join batches of one registry into a single batch, in order."""
+        if not batches:
+            return cls(np.empty(0, np.int64), np.empty(0), np.empty(0))
+        registry = batches[0].registry
+        if any(b.registry is not registry for b in batches):
+            raise ValueError("batches belong to different registries")
+        return cls(
+            np.concatenate([b.ids for b in batches]),
+            np.concatenate([b.values for b in batches]),
+            np.concatenate([b.ts for b in batches]),
+            registry,
+        )
+
+    # ------------------------------------------------------------ access
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __repr__(self) -> str:
+        return f"SeriesBatch(samples={len(self.ids)}, series={len(np.unique(self.ids))})"
+
+    def keys(self) -> List[str]:
+        """Canonical series key of each sample."""
+        return self.registry.keys(self.ids)
+
+    def select(self, rows: Any) -> "SeriesBatch":
+        """Subset of samples by boolean mask or index array."""
+        return SeriesBatch(self.ids[rows], self.values[rows], self.ts[rows], self.registry)
+
+    def to_frame(self, label: str = "host", metrics: Sequence[str] | None = None) -> SampleFrame:
+        """Pivot into a frame with one row per value of ``label``.
+
+        Columns are ``metrics`` (default: every metric in first-seen order).
+        Samples without ``label`` or of other metrics are dropped, the latest
+        sample per cell wins, and the frame timestamp is the newest sample's.
+        """
+        registry = self.registry
+        rows, row_names = registry.label_codes(self.ids, label)
+        cols = registry.metric_codes(self.ids)
+        if metrics is None:
+            keep = rows >= 0
+            present, first = np.unique(cols[keep], return_index=True)
+            col_ids = present[np.argsort(first)]
+        else:
+            col_ids = np.array([registry.metric_id(m) for m in metrics], dtype=np.int64)
+        lookup = np.full(len(registry.metric_names), -1, dtype=np.int64)
+        lookup[col_ids] = np.arange(len(col_ids))
+        cols = lookup[cols]
+        keep = np.flatnonzero((rows >= 0) & (cols >= 0))
+        keep = keep[np.argsort(self.ts[keep], kind="stable")]
+        row_ids, first = np.unique(rows[keep], return_index=True)
+        row_ids = row_ids[np.argsort(first)]
+        row_lookup = np.full(len(row_names), -1, dtype=np.int64)
+        row_lookup[row_ids] = np.arange(len(row_ids))
+        values = np.full((len(row_ids), len(col_ids)), np.nan)
+        values[row_lookup[rows[keep]], cols[keep]] = self.values[keep]
+        ts = float(self.ts[keep].max()) if len(keep) else None
+        return SampleFrame(
+            [row_names[i] for i in row_ids.tolist()],
+            [registry.metric_names[i] for i in col_ids.tolist()],
+            values,
+            ts,
+        )
+
+
+_REGISTRY: SeriesRegistry | None = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> SeriesRegistry:
+    """Return the process-wide series registry."""
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            _REGISTRY = SeriesRegistry()
+        return _REGISTRY
@@ -0,0 +1,443 @@
+"""Multi-process anomaly detection for large fleets.
+
+`ShardedDetector` partitions hosts across a pool of worker processes with a
+consistent-hash ring, so each host is always evaluated by the same worker and
+adding or removing a shard only moves ~1/N of the hosts. Every worker owns a
+resident `StreamingDetector` for its shard; detector state never crosses the
+process boundary.
+
+Per cycle the parent writes host ids and metric values into a shared-memory
+input block, grouped contiguously by shard, and sends each worker only a
+``(start, stop)`` row range over a pipe. Workers write z-scores and verdict
+flags into a shared-memory output block at the same rows, so the only
+serialized traffic per cycle is a few small tuples.
+
+A worker that fails a request answers with the error, and one that died is
+noticed while the parent waits; both surface as :class:`ShardWorkerError`
+instead of a hang.
+"""
+
+from __future__ import annotations
+
+import bisect
+import hashlib
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+from anomaly_detection import DEFAULT_THRESHOLDS, detect_anomalies_batch
+from samples import SampleFrame
+from streaming_detection import StreamingDetector
+
+DEFAULT_COLUMNS: Tuple[str, ...] = ("cpu", "memory")
+
+# Bits of the per-cell verdict byte written by workers.
+STREAMING_BIT = 1
+THRESHOLD_BIT = 2
+
+
+class ShardWorkerError(RuntimeError):
+    """Raised when a shard worker failed a request or is no longer running."""
+
+
+class HashRing:
+    """Consistent-hash ring mapping host names to shard numbers.
+
+    Parameters
+    ----------
+    n_shards: int
+        Number of shards (0 .. n_shards - 1).
+    vnodes: int
+        Virtual nodes per shard; more vnodes give a more even spread.
+    """
+
+    def __init__(self, n_shards: int, vnodes: int = 128) -> None:
+        if n_shards < 1:
+            raise ValueError("n_shards must be at least 1")
+        self.n_shards = n_shards
+        points = sorted(
+            (_hash64(f"shard-{shard}#{v}"), shard) for shard in range(n_shards) for v in range(vnodes)
+        )
+        self._points = [p for p, _ in points]
+        self._owners = [s for _, s in points]
+
+    def shard(self, host: str) -> int:
+        """Return the shard owning ``host``."""
+        i = bisect.bisect(self._points, _hash64(host))
+        return self._owners[i % len(self._owners)]
+
+
+def _hash64(text: str) -> int:
+    """First 8 bytes of the MD5 of ``text`` as an integer (stable across processes)."""
+    return int.from_bytes(hashlib.md5(text.encode("utf-8")).digest()[:8], "big")
+
+
+class ShardedVerdicts(NamedTuple):
+    """Per-host output of :meth:`ShardedDetector.evaluate`, in input order.
+
+    Attributes
+    ----------
+    mask: np.ndarray
+        Boolean vector ``(n_hosts,)``; True where any cell was flagged.
+    zscores: np.ndarray
+        Streaming z-scores ``(n_hosts, n_metrics)``.
+    streaming: np.ndarray
+        Boolean matrix; True where the streaming detector flagged the cell.
+    exceeded: np.ndarray
+        Boolean matrix; True where the static threshold was exceeded.
+    columns: tuple[str, ...]
+        Metric names of the columns.
+    """
+
+    mask: np.ndarray
+    zscores: np.ndarray
+    streaming: np.ndarray
+    exceeded: np.ndarray
+    columns: Tuple[str, ...]
+
+
+class _Blocks:
+    """Input/output arrays over two shared-memory segments of ``capacity`` rows.
+
+    The parent creates the segments (``names`` None); a worker attaches to
+    them by the ``names`` the parent sends.
+    """
+
+    def __init__(self, capacity: int, n_columns: int, names: Tuple[str, str] | None = None) -> None:
+        in_bytes = capacity * (8 + 8 * n_columns)
+        out_bytes = capacity * (8 * n_columns + n_columns)
+        if names is None:
+            self.inputs = shared_memory.SharedMemory(create=True, size=max(in_bytes, 1))
+            self.outputs = shared_memory.SharedMemory(create=True, size=max(out_bytes, 1))
+        else:
+            self.inputs = shared_memory.SharedMemory(name=names[0])
+            self.outputs = shared_memory.SharedMemory(name=names[1])
+        self.capacity = capacity
+        self.n_columns = n_columns
+        self.hids = np.ndarray((capacity,), dtype=np.int64, buffer=self.inputs.buf)
+        self.values = np.ndarray((capacity, n_columns), dtype=np.float64, buffer=self.inputs.buf, offset=8 * capacity)
+        self.zscores = np.ndarray((capacity, n_columns), dtype=np.float64, buffer=self.outputs.buf)
+        self.flags = np.ndarray(
+            (capacity, n_columns), dtype=np.uint8, buffer=self.outputs.buf, offset=8 * capacity * n_columns
+        )
+
+    @property
+    def names(self) -> Tuple[str, str]:
+        """Names of the input and output segments, for attaching from a worker."""
+        return self.inputs.name, self.outputs.name
+
+    def close(self, unlink: bool = False) -> None:
+        """Release this process' mapping; the creator also ``unlink``s the segments."""
+        # Views must be dropped before the mmap can be closed.
+        del self.hids, self.values, self.zscores, self.flags
+        for segment in (self.inputs, self.outputs):
+            segment.close()
+            if unlink:
+                segment.unlink()
+
+
+def _worker(conn: Any, columns: Tuple[str, ...], thresholds: Dict[str, float], options: Dict[str, Any]) -> None:
+    """Shard worker loop: owns one StreamingDetector for the process lifetime."""
+    detector = StreamingDetector(**options)
+    n_columns = len(columns)
+    # Slot cache: row-major (hid, column) -> detector slot, validated against
+    # `owner` because LRU eviction inside the detector can reassign slots
+    # (never to a cell of the batch being resolved, see `StreamingDetector.slots`).
+    slot_table = np.full((0, n_columns), -1, dtype=np.intp)
+    owner = np.full(detector.max_series, -1, dtype=np.int64)
+    col_index = np.arange(n_columns, dtype=np.int64)
+    blocks: _Blocks | None = None
+    # Rows are identical from cycle to cycle while the fleet does not change;
+    # the parent then repeats the layout number and slot resolution is reused.
+    cached_layout: int | None = None
+    flat_slots = np.zeros(0, dtype=np.intp)
+    try:
+        while True:
+            message = conn.recv()
+            command = message[0]
+            if command == "attach":
+                if blocks is not None:
+                    blocks.close()
+                blocks = _Blocks(message[2], n_columns, names=message[1])
+                cached_layout = None
+                conn.send(("ok",))
+            elif command == "run":
+                start, stop, layout = message[1], message[2], message[3]
+                try:
+                    values = blocks.values[start:stop]
+                    if layout != cached_layout:
+                        cached_layout = None
+                        hids = blocks.hids[start:stop]
+                        if len(hids) and int(hids.max()) >= len(slot_table):
+                            grown = np.full((int(hids.max()) * 2 + 1, n_columns), -1, dtype=np.intp)
+                            grown[: len(slot_table)] = slot_table
+                            slot_table = grown
+                        codes = hids[:, None] * n_columns + col_index
+                        slots = slot_table[hids]
+                        stale = (slots < 0) | (owner[np.maximum(slots, 0)] != codes)
+                        if stale.any():
+                            # Protect the cells still cached before allocating the rest.
+                            detector.touch(slots[~stale])
+                            rows, cols = np.nonzero(stale)
+                            fresh = detector.slots([(int(hids[r]), int(c)) for r, c in zip(rows, cols)])
+                            slot_table[hids[rows], cols] = fresh
+                            owner[fresh] = codes[rows, cols]
+                            slots[rows, cols] = fresh
+                        flat_slots = slots.ravel()
+                        cached_layout = layout
+                    result = detector.update_slots(flat_slots, values.ravel())
+                    blocks.zscores[start:stop] = result.zscores.reshape(values.shape)
+                    exceeded = detect_anomalies_batch(values, columns, thresholds).exceeded
+                    blocks.flags[start:stop] = (
+                        result.anomalous.reshape(values.shape) * STREAMING_BIT + exceeded * THRESHOLD_BIT
+                    )
+                except Exception as exc:
+                    conn.send(("error", f"{type(exc).__name__}: {exc}"))
+                else:
+                    conn.send(("done", stop - start))
+            elif command == "stats":
+                conn.send(("stats", {"pid": os.getpid(), "series": len(detector), "nbytes": detector.nbytes}))
+            elif command == "close":
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        if blocks is not None:
+            blocks.close()
+        conn.close()
+
+
+class ShardedDetector:
+    """Evaluate many hosts per cycle across a pool of resident shard workers.
+
+    Parameters
+    ----------
+    n_shards: int | None
+        Number of worker processes; defaults to ``os.cpu_count()``.
+    columns: Sequence[str]
+        Metric columns evaluated for every host.
+    thresholds: Mapping[str, float] | None
+        Static per-column thresholds (defaults to `DEFAULT_THRESHOLDS`).
+    start_method: str
+        multiprocessing start method. ``spawn`` is safe to use from a threaded
+        parent such as `PipelineScheduler`.
+    poll_interval: float
+        Seconds between liveness checks of a worker while awaiting its reply.
+    **detector_options
+        Keyword arguments for each worker's `StreamingDetector`.
+    """
+
+    def __init__(
+        self,
+        n_shards: int | None = None,
+        columns: Sequence[str] = DEFAULT_COLUMNS,
+        thresholds: Mapping[str, float] | None = None,
+        start_method: str = "spawn",
+        poll_interval: float = 1.0,
+        **detector_options: Any,
+    ) -> None:
+        self.n_shards = n_shards or os.cpu_count() or 1
+        self.poll_interval = float(poll_interval)
+        self.columns = tuple(columns)
+        self.ring = HashRing(self.n_shards)
+        self._host_ids: Dict[str, int] = {}
+        self._shard_of = np.zeros(0, dtype=np.int64)
+        self._blocks: _Blocks | None = None
+        self._layout = 0
+        self._last_ids: np.ndarray | None = None
+        self._order = self._bounds = np.zeros(0, dtype=np.int64)
+
+        ctx = mp.get_context(start_method)
+        merged = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self._conns = []
+        self._procs = []
+        for shard in range(self.n_shards):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(
+                target=_worker,
+                args=(child, self.columns, merged, detector_options),
+                name=f"shard-{shard}",
+                daemon=True,
+            )
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+
+    def __enter__(self) -> "ShardedDetector":
+        """Return the detector itself."""
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        """Stop the workers and release the shared-memory blocks."""
+        self.close()
+
+    def register(self, hosts: Iterable[str]) -> np.ndarray:
+        """Return stable integer ids for ``hosts``, assigning shards to new ones."""
+        ids = self._host_ids
+        out = []
+        new_shards = []
+        for host in hosts:
+            hid = ids.get(host)
+            if hid is None:
+                hid = ids[host] = len(ids)
+                new_shards.append(self.ring.shard(host))
+            out.append(hid)
+        if new_shards:
+            self._shard_of = np.concatenate([self._shard_of, np.asarray(new_shards, dtype=np.int64)])
+        return np.asarray(out, dtype=np.int64)
+
+    def _send(self, shard: int, message: Tuple[Any, ...]) -> None:
+        """Send ``message`` to the worker of ``shard``."""
+        try:
+            self._conns[shard].send(message)
+        except (BrokenPipeError, OSError) as exc:
+            raise ShardWorkerError(self._describe(shard, f"cannot be reached ({exc})")) from exc
+
+    def _gather(self, shards: Iterable[int]) -> List[Tuple[Any, ...]]:
+        """Collect one reply from each of ``shards``; raise once all have answered or died.
+
+        Every pending reply is read even after a failure, so the pipes stay
+        in step for the next request.
+        """
+        replies, errors = [], []
+        for shard in shards:
+            conn, proc = self._conns[shard], self._procs[shard]
+            reply: Tuple[Any, ...] = ("error", "no reply")
+            try:
+                while not conn.poll(self.poll_interval):
+                    if not proc.is_alive():
+                        reply = ("error", f"exited with code {proc.exitcode}")
+                        break
+                else:
+                    reply = conn.recv()
+            except (EOFError, OSError) as exc:
+                reply = ("error", f"closed its pipe ({exc})")
+            if reply[0] == "error":
+                errors.append(self._describe(shard, reply[1]))
+            replies.append(reply)
+        if errors:
+            raise ShardWorkerError("; ".join(errors))
+        return replies
+
+    def _describe(self, shard: int, problem: str) -> str:
+        """Error text naming the worker of ``shard``."""
+        return f"shard {shard} worker (pid {self._procs[shard].pid}) {problem}"
+
+    def _ensure_capacity(self, rows: int) -> _Blocks:
+        """Return shared blocks of at least ``rows`` rows, attaching every worker to new ones."""
+        if self._blocks is None or self._blocks.capacity < rows:
+            blocks = _Blocks(max(rows + rows // 2, 1024), len(self.columns))
+            for shard in range(self.n_shards):
+                self._send(shard, ("attach", blocks.names, blocks.capacity))
+            self._gather(range(self.n_shards))
+            if self._blocks is not None:
+                self._blocks.close(unlink=True)
+            self._blocks = blocks
+            self._last_ids = None
+        return self._blocks
+
+    def evaluate_ids(self, host_ids: Any, values: Any) -> ShardedVerdicts:
+        """Evaluate one cycle for hosts already mapped by :meth:`register`.
+
+        Parameters
+        ----------
+        host_ids: array-like of int
+            Host ids, each at most once.
+        values: array-like of float
+            Matrix ``(n_hosts, n_metrics)`` aligned with ``columns``; NaN cells
+            are skipped by the streaming detector.
+        """
+        hids = np.asarray(host_ids, dtype=np.int64)
+        x = np.asarray(values, dtype=np.float64).reshape(len(hids), len(self.columns))
+        n = len(hids)
+        blocks = self._ensure_capacity(n)
+
+        if self._last_ids is None or not np.array_equal(hids, self._last_ids):
+            shards = self._shard_of[hids]
+            self._order = np.argsort(shards, kind="stable")
+            self._bounds = np.concatenate([[0], np.cumsum(np.bincount(shards, minlength=self.n_shards))])
+            blocks.hids[:n] = hids[self._order]
+            self._last_ids = hids.copy()
+            self._layout += 1
+        order, bounds = self._order, self._bounds
+        np.take(x, order, axis=0, out=blocks.values[:n])
+
+        busy = []
+        for shard in range(self.n_shards):
+            start, stop = int(bounds[shard]), int(bounds[shard + 1])
+            if stop > start:
+                self._send(shard, ("run", start, stop, self._layout))
+                busy.append(shard)
+        self._gather(busy)
+
+        zscores = np.empty_like(x)
+        flags = np.empty(x.shape, dtype=np.uint8)
+        zscores[order] = blocks.zscores[:n]
+        flags[order] = blocks.flags[:n]
+        streaming = (flags & STREAMING_BIT).astype(bool)
+        exceeded = (flags & THRESHOLD_BIT).astype(bool)
+        return ShardedVerdicts(flags.any(axis=1), zscores, streaming, exceeded, self.columns)
+
+    def evaluate(self, hosts: Sequence[str], values: Any) -> ShardedVerdicts:
+        """Evaluate one cycle for ``hosts`` (names) and their metric rows."""
+        return self.evaluate_ids(self.register(hosts), values)
+
+    def evaluate_metrics(self, hosts: Mapping[str, Mapping[str, Any]]) -> Dict[str, List[str]]:
+        """Evaluate a ``{host: {metric: value}}`` mapping; return flagged metrics per host.
+
+        This accepts the ``hosts`` section of a live scrape summary directly.
+        Missing metrics are treated as NaN.
+        """
+        return self.evaluate_frame(SampleFrame.from_hosts(hosts, self.columns))
+
+    def evaluate_frame(self, frame: SampleFrame) -> Dict[str, List[str]]:
+        """Evaluate a `samples.SampleFrame`; return flagged metrics per host.
+
+        A frame already in ``self.columns`` order is passed through without a
+        copy; otherwise its columns are realigned, with absent metrics as NaN.
+        """
+        if not len(frame):
+            return {}
+        if frame.columns == self.columns:
+            values = frame.to_numpy()
+        else:
+            values = np.full((len(frame), len(self.columns)), np.nan)
+            position = {c: i for i, c in enumerate(frame.columns)}
+            for j, column in enumerate(self.columns):
+                if column in position:
+                    values[:, j] = frame.values[:, position[column]]
+        names = list(frame.hosts)
+        verdicts = self.evaluate(names, values)
+        flagged = verdicts.streaming | verdicts.exceeded
+        return {
+            names[i]: [self.columns[c] for c in np.flatnonzero(flagged[i])]
+            for i in np.flatnonzero(verdicts.mask)
+        }
+
+    def shard_stats(self) -> List[Dict[str, int]]:
+        """Return ``{pid, series, nbytes}`` for each worker's resident detector."""
+        for shard in range(self.n_shards):
+            self._send(shard, ("stats",))
+        return [reply[1] for reply in self._gather(range(self.n_shards))]
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the workers and release the shared-memory blocks."""
+        for conn in self._conns:
+            try:
+                conn.send(("close",))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        for conn in self._conns:
+            conn.close()
+        self._conns, self._procs = [], []
+        if self._blocks is not None:
+            self._blocks.close(unlink=True)
+            self._blocks = None
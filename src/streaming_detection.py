@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Hashable, List, Mapping, NamedTuple, Sequence
+
+import numpy as np
+
+
+class StreamingResult(NamedTuple):
+    """Per-sample output of :meth:`StreamingDetector.update_batch`.
+
+    Attributes
+    ----------
+    zscores: np.ndarray
+        Deviation of each sample from its series baseline, in standard deviations.
+    anomalous: np.ndarray
+        Boolean vector; True where ``|z|`` exceeded the threshold after warmup.
+    """
+
+    zscores: np.ndarray
+    anomalous: np.ndarray
+
+
+class StreamingDetector:
+    """Rolling per-series anomaly detector with constant memory per series.
+
+    Each series (e.g. ``("web-1", "cpu")``) keeps an exponentially weighted
+    mean and variance and, optionally, a seasonal offset profile of
+    ``season_length`` slots. Every sample is scored against the state *before*
+    it is folded in, then the state is updated in place, so nothing is ever
+    recomputed from history.
+
+    All state lives in arrays preallocated for ``max_series`` series. When the
+    table is full the least recently updated series is evicted, which keeps the
+    process inside a fixed memory budget regardless of host churn. Series of
+    the batch being resolved are never evicted; a batch with more distinct
+    series than ``max_series`` raises ValueError instead of merging two of them.
+
+    Parameters
+    ----------
+    alpha: float
+        EWMA smoothing factor for mean and variance (0 < alpha <= 1).
+    z_threshold: float
+        Absolute z-score above which a sample is anomalous.
+    warmup: int
+        Number of samples a series must have seen before it can be flagged.
+    max_series: int
+        Capacity of the state table.
+    season_length: int
+        Number of seasonal slots per series (e.g. 96 for 15-minute slots over a
+        day). 0 disables the seasonal baseline. Slots advance once per sample,
+        so samples are assumed to arrive at a regular interval.
+    seasonal_alpha: float
+        Smoothing factor for the seasonal offset profile.
+    min_std: float
+        Floor for the standard deviation, so flat series do not flag on noise.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.05,
+        z_threshold: float = 4.0,
+        warmup: int = 20,
+        max_series: int = 131072,
+        season_length: int = 0,
+        seasonal_alpha: float = 0.1,
+        min_std: float = 1.0,
+    ) -> None:
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        if max_series <= 0:
+            raise ValueError("max_series must be positive")
+        self.alpha = float(alpha)
+        self.z_threshold = float(z_threshold)
+        self.warmup = int(warmup)
+        self.max_series = int(max_series)
+        self.season_length = int(season_length)
+        self.seasonal_alpha = float(seasonal_alpha)
+        self.min_std = float(min_std)
+
+        self._mean = np.zeros(max_series, dtype=np.float64)
+        self._var = np.zeros(max_series, dtype=np.float64)
+        self._count = np.zeros(max_series, dtype=np.uint32)
+        self._last_tick = np.zeros(max_series, dtype=np.uint64)
+        self._phase = np.zeros(max_series if season_length else 0, dtype=np.uint32)
+        self._seasonal = np.zeros((max_series if season_length else 0, season_length), dtype=np.float64)
+
+        self._slots: Dict[Hashable, int] = {}
+        self._keys: List[Hashable | None] = [None] * max_series
+        self._free: List[int] = list(range(max_series - 1, -1, -1))
+        self._tick = 0
+
+    @staticmethod
+    def bytes_per_series(season_length: int = 0) -> int:
+        """Return the array memory used per series slot (excluding the key index)."""
+        return 8 + 8 + 4 + 8 + (4 + 8 * season_length if season_length else 0)
+
+    @property
+    def nbytes(self) -> int:
+        """Total bytes held by the state arrays."""
+        arrays = (self._mean, self._var, self._count, self._last_tick, self._phase, self._seasonal)
+        return sum(a.nbytes for a in arrays)
+
+    def __len__(self) -> int:
+        """Number of series holding a slot."""
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """True if ``key`` holds a slot."""
+        return key in self._slots
+
+    def lookup(self, key: Hashable) -> int | None:
+        """Return the state slot of ``key``, or None if it has none; changes nothing."""
+        return self._slots.get(key)
+
+    def slot(self, key: Hashable) -> int:
+        """Return the state slot for ``key``, allocating (or evicting) if needed."""
+        index = self._slots.get(key)
+        return self._allocate(key) if index is None else index
+
+    def slots(self, keys: Sequence[Hashable]) -> np.ndarray:
+        """Resolve the slots of one batch of ``keys``, allocating new ones.
+
+        Slots of keys already known are marked as used by the coming update
+        first, so allocating the rest never evicts a series of this batch.
+
+        Raises
+        ------
+        ValueError
+            If the batch holds more distinct series than ``max_series``.
+        """
+        found = [self._slots.get(k) for k in keys]
+        self.touch([index for index in found if index is not None])
+        return np.fromiter(
+            (self._allocate(k) if i is None else i for k, i in zip(keys, found)), dtype=np.intp, count=len(keys)
+        )
+
+    def touch(self, slots: Any) -> None:
+        """Mark ``slots`` as used by the coming update, protecting them from eviction until then."""
+        self._last_tick[np.asarray(slots, dtype=np.intp)] = self._tick + 1
+
+    def _allocate(self, key: Hashable) -> int:
+        """Give ``key`` a fresh slot (evicting the least recently updated one if full)."""
+        index = self._slots.get(key)
+        if index is not None:  # repeated within the batch being resolved
+            return index
+        if not self._free:
+            self._evict_oldest()
+        index = self._free.pop()
+        self._slots[key] = index
+        self._keys[index] = key
+        self._reset(index)
+        return index
+
+    def _reset(self, index: int) -> None:
+        """Clear the state of slot ``index`` and mark it as used by the coming update."""
+        self._mean[index] = 0.0
+        self._var[index] = 0.0
+        self._count[index] = 0
+        self._last_tick[index] = self._tick + 1
+        if self.season_length:
+            self._phase[index] = 0
+            self._seasonal[index] = 0.0
+
+    def _evict_oldest(self) -> None:
+        """Release the least recently updated slot.
+
+        Raises
+        ------
+        ValueError
+            If every slot is held by the batch being resolved.
+        """
+        index = int(np.argmin(self._last_tick))
+        if self._last_tick[index] > self._tick:
+            raise ValueError(f"a batch holds more than max_series ({self.max_series}) distinct series")
+        key = self._keys[index]
+        if key is not None:
+            del self._slots[key]
+        self._keys[index] = None
+        self._last_tick[index] = np.iinfo(np.uint64).max
+        self._free.append(index)
+
+    def update_slots(self, slots: Any, values: Any) -> StreamingResult:
+        """Score and fold in one sample per slot.
+
+        Parameters
+        ----------
+        slots: array-like of int
+            Slot indices as returned by :meth:`slots` or :meth:`slot`. Each slot may appear at
+            most once per call (one sample per series per scrape).
+        values: array-like of float
+            Sample values aligned with ``slots``. NaN samples are skipped.
+
+        Returns
+        -------
+        StreamingResult
+            z-scores and anomaly flags aligned with the inputs.
+        """
+        idx = np.asarray(slots, dtype=np.intp)
+        x = np.asarray(values, dtype=np.float64)
+
+        valid = ~np.isnan(x)
+        if not valid.all():
+            zscores = np.zeros(x.shape, dtype=np.float64)
+            anomalous = np.zeros(x.shape, dtype=bool)
+            sub = self.update_slots(idx[valid], x[valid])
+            zscores[valid] = sub.zscores
+            anomalous[valid] = sub.anomalous
+            return StreamingResult(zscores, anomalous)
+
+        self._tick += 1
+        mean = self._mean[idx]
+        var = self._var[idx]
+        count = self._count[idx]
+        first = count == 0
+
+        expected = mean
+        if self.season_length:
+            phase = self._phase[idx]
+            offset = self._seasonal[idx, phase]
+            expected = mean + offset
+
+        deviation = x - expected
+        std = np.maximum(np.sqrt(var), self.min_std)
+        zscores = np.where(first, 0.0, deviation / std)
+        anomalous = (count >= self.warmup) & (np.abs(zscores) > self.z_threshold)
+
+        alpha = self.alpha
+        new_mean = np.where(first, x, mean + alpha * (x - mean))
+        new_var = np.where(first, 0.0, (1.0 - alpha) * (var + alpha * deviation * deviation))
+        self._mean[idx] = new_mean
+        self._var[idx] = new_var
+        self._count[idx] = np.minimum(count.astype(np.uint64) + 1, np.iinfo(np.uint32).max)
+        self._last_tick[idx] = self._tick
+
+        if self.season_length:
+            self._seasonal[idx, phase] = offset + self.seasonal_alpha * ((x - new_mean) - offset)
+            self._phase[idx] = (phase + 1) % self.season_length
+
+        return StreamingResult(zscores, anomalous)
+
+    def update_batch(self, keys: Sequence[Hashable], values: Any) -> StreamingResult:
+        """Score and fold in one sample per series key (see :meth:`update_slots`)."""
+        return self.update_slots(self.slots(keys), values)
+
+    def update(self, key: Hashable, value: float) -> float:
+        """Score and fold in a single sample; return its z-score."""
+        return float(self.update_slots([self.slot(key)], [value]).zscores[0])
+
+    def update_metrics(self, host: str, metrics: Mapping[str, Any]) -> Dict[str, float]:
+        """Feed a host's metrics dict and return ``{metric: zscore}`` for anomalies.
+
+        Non-numeric entries are ignored, so a raw ``get_latest_metrics`` payload
+        can be passed straight through.
+        """
+        names = [
+            name
+            for name, value in metrics.items()
+            if isinstance(value, (int, float)) and not isinstance(value, bool)
+        ]
+        if not names:
+            return {}
+        result = self.update_batch([(host, name) for name in names], [metrics[n] for n in names])
+        return {
+            name: float(z)
+            for name, z, flagged in zip(names, result.zscores, result.anomalous)
+            if flagged
+        }
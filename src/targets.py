@@ -0,0 +1,293 @@
+"""Shared target discovery for live ingestion, the dashboard and Prometheus.
+
+`config/aws_targets.json` lists targets per kind (``node_exporter`` and
+``app``). Entries are either ``"host:port"`` strings or objects carrying
+per-target labels::
+
+    {"node_exporter": ["10.0.0.5:9100", {"target": "10.0.0.6:9100", "labels": {"az": "us-east-1a"}}]}
+
+`TargetIndex` loads and validates that file once and keeps the result in
+memory; consumers call :meth:`TargetIndex.refresh`, which only re-reads the
+file after its ``(mtime_ns, size)`` changes, and an invalid edit keeps the
+last good target set. `get_target_index` returns the process-wide index per
+path, so the scraper and `/aws-health` see the same targets.
+
+For Prometheus, :meth:`TargetIndex.write_file_sd` splits the targets into
+``n`` file_sd files using the same ``hashmod`` as Prometheus relabelling
+(md5 of ``__address__``, last 8 bytes big-endian, modulo ``n``), so shard
+``k``'s server can load only its file or keep ``__tmp_hash == k`` on a
+shared one. Files are written atomically, and only when their content
+changed, so Prometheus does not reload on no-op regenerations.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Sequence, Tuple
+
+
+DEFAULT_TARGETS_PATH = Path("config/aws_targets.json")
+JOB_BY_KIND = {"node_exporter": "node", "app": "app"}
+_LABEL_NAME = re.compile(r"^[a-zA-Z_][a-zA-Z0-9_]*$")
+_RESERVED_LABELS = ("job", "instance")
+
+
+class TargetConfigError(ValueError):
+    """Raised for a malformed targets file."""
+
+
+class Target(NamedTuple):
+    """One scrape target.
+
+    Attributes
+    ----------
+    job: str
+        Prometheus job (``node`` or ``app``).
+    address: str
+        ``host:port``, or a full URL for targets not served at ``/metrics``.
+    labels: tuple[tuple[str, str], ...]
+        Extra target labels, sorted by name.
+    """
+
+    job: str
+    address: str
+    labels: Tuple[Tuple[str, str], ...] = ()
+
+
+def hashmod(address: str, modulus: int) -> int:
+    """Prometheus ``hashmod`` of ``address`` (a single ``__address__`` source label)."""
+    digest = hashlib.md5(address.encode("utf-8")).digest()
+    return int.from_bytes(digest[8:], "big") % modulus
+
+
+def write_if_changed(path: str | Path, data: bytes) -> bool:
+    """Atomically replace ``path`` with ``data`` unless it already holds exactly that.
+
+    The bytes go to a temporary file in the same directory which is then
+    renamed over ``path``, so readers see either the old or the new file.
+    Returns True if the file was written.
+    """
+    target = Path(path)
+    try:
+        if target.read_bytes() == data:
+            return False
+    except OSError:
+        pass
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{target.name}.", dir=target.parent)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, target)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def parse_targets(data: Any, source: str = "targets") -> Tuple[Target, ...]:
+    """Validate a decoded targets document and return its targets in file order.
+
+    Raises
+    ------
+    TargetConfigError
+        If the document is not an object, an entry is not a non-empty
+        address string or ``{"target", "labels"}`` object, a label name is
+        invalid or reserved, or a (job, address) pair is listed twice.
+    """
+    if data is None:
+        return ()
+    if not isinstance(data, dict):
+        raise TargetConfigError(f"{source}: expected a JSON object of target lists")
+    targets: List[Target] = []
+    seen = set()
+    for kind, job in JOB_BY_KIND.items():
+        entries = data.get(kind) or []
+        if not isinstance(entries, list):
+            raise TargetConfigError(f"{source}: {kind!r} must be a list")
+        for i, entry in enumerate(entries):
+            where = f"{source}: {kind}[{i}]"
+            labels: Mapping[str, Any] = {}
+            if isinstance(entry, dict):
+                address, labels = entry.get("target"), entry.get("labels") or {}
+                if not isinstance(labels, dict):
+                    raise TargetConfigError(f"{where}: labels must be an object")
+            else:
+                address = entry
+            if not isinstance(address, str) or not address or any(c.isspace() for c in address):
+                raise TargetConfigError(f"{where}: invalid target address {address!r}")
+            for name in labels:
+                if not _LABEL_NAME.match(name) or name.startswith("__") or name in _RESERVED_LABELS:
+                    raise TargetConfigError(f"{where}: invalid label name {name!r}")
+            if (job, address) in seen:
+                raise TargetConfigError(f"{where}: duplicate target {address!r}")
+            seen.add((job, address))
+            targets.append(Target(job, address, tuple(sorted((k, str(v)) for k, v in labels.items()))))
+    return tuple(targets)
+
+
+def file_sd_groups(targets: Iterable[Target]) -> List[Dict[str, Any]]:
+    """Group targets into file_sd entries, one per distinct (job, labels)."""
+    groups: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], List[str]] = {}
+    for target in targets:
+        groups.setdefault((target.job, target.labels), []).append(target.address)
+    return [
+        {"labels": {"job": job, **dict(labels)}, "targets": addresses}
+        for (job, labels), addresses in groups.items()
+    ]
+
+
+class TargetIndex:
+    """In-memory, validated view of a targets file.
+
+    Parameters
+    ----------
+    path: str | Path
+        Targets file (`config/aws_targets.json` layout).
+    check_interval: float
+        Minimum seconds between file stats in :meth:`refresh`.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_TARGETS_PATH, check_interval: float = 0.25) -> None:
+        self.path = Path(path)
+        self.check_interval = float(check_interval)
+        self.version = 0
+        self.error: str | None = None
+        self._lock = threading.Lock()
+        self._signature: Tuple[int, int] | None = None
+        self._checked_at = float("-inf")
+        self._targets: Tuple[Target, ...] = ()
+        self._by_job: Dict[str, List[str]] = {}
+        self._digest: str | None = None
+        self.refresh(force=True)
+
+    def _stat(self) -> Tuple[int, int] | None:
+        """``(mtime_ns, size)`` of the file, or None if it cannot be stat'ed."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self, force: bool = False) -> bool:
+        """Reload the file if it changed; return True if the target set changed.
+
+        Within ``check_interval`` of the previous check this is a no-op
+        unless ``force`` is set. A file that fails validation leaves the
+        current targets in place and records the problem in ``error``.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.check_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            signature = self._stat()
+            if signature == self._signature and self._digest is not None:
+                return False
+            self._signature = signature
+            try:
+                raw = self.path.read_bytes() if signature is not None else b""
+                data = json.loads(raw) if raw.strip() else None
+                targets = parse_targets(data, str(self.path))
+            except (OSError, ValueError) as exc:
+                self.error = f"{type(exc).__name__}: {exc}"
+                if self._digest is not None:
+                    return False
+                targets = ()
+            else:
+                self.error = None
+            digest = hashlib.sha1(repr(targets).encode("utf-8")).hexdigest()
+            if digest == self._digest:
+                return False
+            by_job: Dict[str, List[str]] = {job: [] for job in JOB_BY_KIND.values()}
+            for target in targets:
+                by_job[target.job].append(target.address)
+            self._targets, self._by_job, self._digest = targets, by_job, digest
+            self.version += 1
+            return True
+
+    @property
+    def targets(self) -> Tuple[Target, ...]:
+        """The current targets, in file order."""
+        return self._targets
+
+    @property
+    def digest(self) -> str | None:
+        """Content hash of the current target set; equal across processes for equal files."""
+        return self._digest
+
+    def __len__(self) -> int:
+        """Number of current targets."""
+        return len(self._targets)
+
+    def pairs(self) -> List[Tuple[str, str]]:
+        """``(job, address)`` pairs in file order, as consumed by `scraper.Scraper.scrape`."""
+        return [(t.job, t.address) for t in self._targets]
+
+    def addresses_by_kind(self) -> Dict[str, List[str]]:
+        """Addresses keyed by config kind (``node_exporter``, ``app``)."""
+        return {kind: list(self._by_job.get(job, ())) for kind, job in JOB_BY_KIND.items()}
+
+    def shards(self, n_shards: int) -> List[List[Target]]:
+        """Partition the targets by :func:`hashmod` of their address."""
+        if n_shards <= 0:
+            raise ValueError("n_shards must be positive")
+        out: List[List[Target]] = [[] for _ in range(n_shards)]
+        for target in self._targets:
+            out[hashmod(target.address, n_shards)].append(target)
+        return out
+
+    def write_file_sd(self, out_dir: str | Path, n_shards: int = 1, prefix: str = "targets") -> List[Path]:
+        """Write ``{prefix}-{k}-of-{n}.json`` file_sd files; return those that changed.
+
+        Shard files of this prefix from a previous, different shard count
+        are removed so Prometheus does not keep scraping stale targets.
+        """
+        out = Path(out_dir)
+        written = []
+        keep = set()
+        for k, shard in enumerate(self.shards(n_shards)):
+            path = out / f"{prefix}-{k}-of-{n_shards}.json"
+            keep.add(path.name)
+            if write_if_changed(path, _encode(file_sd_groups(shard))):
+                written.append(path)
+        for stale in out.glob(f"{prefix}-*-of-*.json"):
+            if stale.name not in keep:
+                stale.unlink()
+        return written
+
+
+def _encode(groups: Sequence[Dict[str, Any]]) -> bytes:
+    """Serialize file_sd groups deterministically, so unchanged shards compare equal on disk."""
+    return (json.dumps(groups, indent=2) + "\n").encode("utf-8")
+
+
+def write_file_sd(index: TargetIndex, output_path: str | Path) -> bool:
+    """Write all targets of ``index`` to one file_sd file; return True if it changed."""
+    return write_if_changed(output_path, _encode(file_sd_groups(index.targets)))
+
+
+_INDEXES: Dict[Path, TargetIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_target_index(path: str | Path = DEFAULT_TARGETS_PATH) -> TargetIndex:
+    """Return the process-wide index for ``path``, refreshed if the file changed."""
+    key = Path(path)
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        if index is None:
+            index = _INDEXES[key] = TargetIndex(key)
+            return index
+    index.refresh()
+    return index
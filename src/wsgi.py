@@ -0,0 +1,29 @@
+"""Production WSGI entry point for the dashboard.
+
+`python src/dashboard.py` runs Flask's single-process development server.
+For real traffic, serve ``application`` with gunicorn and the settings in
+`config/gunicorn.conf.py`:
+
+    gunicorn -c config/gunicorn.conf.py wsgi:application
+
+The config preloads this module in the master, so the import of Flask,
+numpy and the dashboard modules and the first parse of `data/metrics.json`
+and `config/aws_targets.json` happen once; forked workers share those pages
+copy-on-write instead of repeating the work. Nothing started here is
+process-bound: the `/stream` producer thread and the read-only metric store
+handle are created lazily inside each worker on first use.
+"""
+
+from __future__ import annotations
+
+from dashboard import _aws_health_view, _index_view, app
+
+
+def warm() -> None:
+    """Populate the file-backed response caches before workers are forked."""
+    _index_view.get()
+    _aws_health_view.get()
+
+
+application = app
+warm()
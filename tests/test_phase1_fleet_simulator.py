@@ -0,0 +1,77 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.phase1
+
+from data_ingestion import fetch_metrics
+from fleet_simulator import (
+    ANOMALY_KINDS,
+    FleetServer,
+    FleetSimulator,
+    evaluate,
+    score,
+    streaming_detector,
+    threshold_detector,
+)
+from scraper import Scraper
+
+
+def test_simulator_is_seeded_and_labels_injected_anomalies() -> None:
+    a = FleetSimulator(hosts=300, seed=7, anomaly_rate=5e-3, leak_rate=1e-3).run(200)
+    b = FleetSimulator(hosts=300, seed=7, anomaly_rate=5e-3, leak_rate=1e-3).run(200)
+    assert all(np.array_equal(x.values, y.values) for x, y in zip(a, b))
+
+    values = np.stack([f.values for f in a])
+    labels = np.stack([f.labels for f in a])
+    assert values.shape == (200, 300, 2) and labels.shape == values.shape
+    assert values.min() >= 0.0 and values.max() <= 100.0
+    assert 0 < labels.mean() < 0.5
+
+    sim = FleetSimulator(hosts=300, seed=7, anomaly_rate=5e-3, leak_rate=1e-3)
+    sim.run(200)
+    events = sim.events()
+    assert {e.kind for e in events} == set(ANOMALY_KINDS)
+    for event in events[:50]:
+        assert event.metric in ("cpu", "memory") and (event.end is None or event.end > event.start)
+
+
+def test_score_and_evaluate_report_precision_and_recall() -> None:
+    assert score([[True, False], [True, True]], [[True, True], [False, True]])[:3] == (2, 1, 1)
+
+    sim = FleetSimulator(hosts=500, seed=1, anomaly_rate=2e-3)
+    report = evaluate(sim, {"threshold": threshold_detector(), "streaming": streaming_detector(500)}, ticks=120, warmup=30)
+    for name in ("threshold", "streaming"):
+        result = report["detectors"][name]
+        assert 0.0 <= result["samples"]["precision"] <= 1.0
+        assert 0.0 <= result["samples"]["recall"] <= 1.0
+        assert result["events"]["total"] > 0
+    # Only unlabelled bursts can push a healthy host over 90%, so static thresholds are precise.
+    assert report["detectors"]["threshold"]["samples"]["precision"] > 0.8
+
+
+def test_files_and_http_endpoints_feed_fetch_metrics(tmp_path: Path) -> None:
+    sim = FleetSimulator(hosts=25, seed=3)
+    paths = sim.write_files(tmp_path / "fleet", ticks=3)
+    snapshot = json.loads(paths[-1].read_text(encoding="utf-8"))
+    assert len(snapshot["hosts"]) == 25 and snapshot["up"] == 25
+    assert (tmp_path / "fleet" / "labels.jsonl").exists()
+
+    server = FleetServer(sim).start()
+    try:
+        targets = server.write_targets(tmp_path / "targets.json")
+        with Scraper(max_workers=8) as scraper:
+            fetch_metrics(tmp_path / "m1.json", live=True, targets_path=targets, scraper=scraper)
+            sim.step()
+            metrics = fetch_metrics(tmp_path / "m2.json", live=True, targets_path=targets, scraper=scraper)
+    finally:
+        server.stop()
+    assert metrics["up"] == 25 and len(metrics["hosts"]) == 25
+    expected = sim.frame.values
+    by_host = {url.split("/")[-2]: v for url, v in metrics["hosts"].items()}
+    for i, host in enumerate(sim.hosts[:5]):
+        assert by_host[host]["memory"] == pytest.approx(expected[i, 1], abs=0.01)
+        # cpu is a rate over counters printed with 2 decimals, as node_exporter does
+        assert by_host[host]["cpu"] == pytest.approx(expected[i, 0], abs=0.2)
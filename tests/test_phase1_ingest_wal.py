@@ -0,0 +1,156 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+pytestmark = pytest.mark.phase1
+
+from data_ingestion import fetch_metrics, fetch_samples
+from ingest_wal import IngestWriter, read_segment
+from metric_store import MetricStore
+from samples import SampleFrame
+from series import SeriesBatch, SeriesRegistry
+
+
+def _batch(registry, t, hosts=("a", "b")):
+    frame = SampleFrame(list(hosts), ["cpu", "memory"], [[10.0 + t, 50.0]] * len(hosts), ts=1000.0 + t)
+    return SeriesBatch.from_frame(frame, registry)
+
+
+def test_group_commit_batches_fsyncs_and_publishes_atomically(tmp_path: Path) -> None:
+    registry = SeriesRegistry()
+    snapshot = tmp_path / "metrics.json"
+    with MetricStore(tmp_path / "store") as store:
+        writer = IngestWriter(tmp_path / "wal", store=store, snapshot_path=snapshot,
+                              commit_bytes=1 << 20, commit_interval=60.0, registry=registry)
+        for t in range(50):
+            writer.add(_batch(registry, t), snapshot={"cpu": 10.0 + t})
+
+        assert writer.stats["fsyncs"] == 0 and not snapshot.exists()
+        assert store.latest('cpu{host="a"}') is None
+
+        writer.commit()
+        assert writer.stats["fsyncs"] == 1 and writer.stats["samples"] == 200
+        assert store.query('cpu{host="b"}').values.tolist() == [10.0 + t for t in range(50)]
+        assert json.loads(snapshot.read_text()) == {"cpu": 59.0}
+
+        writer.close()
+    assert not list((tmp_path / "wal").iterdir())
+    assert [p.name for p in tmp_path.iterdir() if p.is_file()] == ["metrics.json"]
+
+
+def test_every_add_commits_without_group_commit(tmp_path: Path) -> None:
+    registry = SeriesRegistry()
+    with IngestWriter(tmp_path / "wal", commit_bytes=0, registry=registry) as writer:
+        for t in range(5):
+            writer.add(_batch(registry, t))
+        assert writer.stats["commits"] == writer.stats["fsyncs"] == 5
+
+
+def test_failed_sync_truncates_segment_and_retry_logs_once(tmp_path: Path, monkeypatch) -> None:
+    import ingest_wal
+
+    registry = SeriesRegistry()
+    writer = IngestWriter(tmp_path / "wal", commit_interval=60.0, registry=registry)
+    writer.add(_batch(registry, 0))
+    writer.commit()
+    segment = writer._segment_path()
+    committed = segment.stat().st_size
+
+    def _fail(fd):
+        raise OSError(5, "Input/output error")
+
+    writer.add(_batch(registry, 1))
+    monkeypatch.setattr(ingest_wal, "_fdatasync", _fail)
+    with pytest.raises(OSError):
+        writer.commit()
+    assert segment.stat().st_size == committed
+
+    monkeypatch.undo()
+    writer.commit()
+    records, _ = read_segment(segment)
+    assert [kind for kind, _ in records] == [b"S", b"D", b"D"]
+    writer.close()
+
+
+def test_background_commit_failures_are_counted_not_fatal(tmp_path: Path, monkeypatch) -> None:
+    import time
+
+    import ingest_wal
+
+    def _fail(fd):
+        raise OSError(5, "Input/output error")
+
+    monkeypatch.setattr(ingest_wal, "_fdatasync", _fail)
+    registry = SeriesRegistry()
+    writer = IngestWriter(tmp_path / "wal", commit_interval=0.01, registry=registry).start()
+    writer.add(_batch(registry, 0))
+    deadline = time.monotonic() + 5
+    while writer.stats["errors"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert writer.stats["errors"] >= 2 and writer._thread.is_alive()
+    monkeypatch.undo()
+    writer.close()
+    assert writer.stats["commits"] == 1
+
+
+def test_crash_is_replayed_once_and_torn_tail_ignored(tmp_path: Path) -> None:
+    registry = SeriesRegistry()
+    writer = IngestWriter(tmp_path / "wal", snapshot_path=tmp_path / "metrics.json",
+                          commit_bytes=1 << 20, commit_interval=60.0, registry=registry)
+    for t in range(3):
+        writer.add(_batch(registry, t), snapshot={"cycle": t})
+    writer.commit()
+    writer.add(_batch(registry, 3, hosts=("c",)))
+    writer.commit()
+    # Simulate a crash: keep the log as it is on disk and cut the last record short.
+    shutil.copytree(tmp_path / "wal", tmp_path / "crashed")
+    writer.close()
+    segment = next((tmp_path / "crashed").glob("wal-*.log"))
+    records, intact = read_segment(segment)
+    assert intact == segment.stat().st_size
+    assert [kind for kind, _ in records] == [b"S", b"D", b"J", b"D", b"J", b"D", b"J", b"S", b"D"]
+    segment.write_bytes(segment.read_bytes()[:-5])
+    (tmp_path / "metrics.json").unlink()
+
+    with MetricStore(tmp_path / "store") as store:
+        store.append_metrics({"cpu": 10.0, "memory": 50.0}, {"host": "a"}, ts=1000.0)
+        replayed = IngestWriter(tmp_path / "crashed", store=store, snapshot_path=tmp_path / "metrics.json",
+                                registry=SeriesRegistry())
+        assert replayed.stats["torn_bytes"] > 0
+        # Three cycles of a and b were intact; a's first cycle was already stored.
+        assert replayed.stats["replayed_samples"] == 3 * 4 - 2
+        assert store.query('cpu{host="a"}').values.tolist() == [10.0, 11.0, 12.0]
+        assert store.latest('cpu{host="c"}') is None
+        replayed.close()
+
+    assert json.loads((tmp_path / "metrics.json").read_text()) == {"cycle": 2}
+    assert not list((tmp_path / "crashed").iterdir())
+
+
+def test_fetch_samples_routes_through_writer(tmp_path: Path) -> None:
+    path = tmp_path / "metrics.json"
+    with MetricStore(tmp_path / "store") as store:
+        with IngestWriter(tmp_path / "wal", store=store, snapshot_path=path, commit_interval=60.0) as writer:
+            metrics, frame = fetch_samples(path, store=store, writer=writer)
+            assert not path.exists()
+        assert store.latest("cpu")[1] == metrics["cpu"]
+    assert json.loads(path.read_text()) == metrics
+
+
+def test_fetch_metrics_replaces_snapshot_atomically(tmp_path: Path, monkeypatch) -> None:
+    import targets
+
+    path = tmp_path / "metrics.json"
+    path.write_text('{"cpu": 1.0, "memory": 2.0}', encoding="utf-8")
+
+    def _crash(*_):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(targets.os, "replace", _crash)
+    with pytest.raises(OSError):
+        fetch_metrics(path)
+    assert json.loads(path.read_text()) == {"cpu": 1.0, "memory": 2.0}
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.json"]
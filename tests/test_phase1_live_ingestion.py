@@ -0,0 +1,135 @@
+import importlib.util
+import json
+from pathlib import Path
+
+import pytest
+
+pytestmark = pytest.mark.phase1
+
+from data_ingestion import fetch_metrics
+from metric_store import MetricStore
+from monitor import get_latest_metrics
+from scraper import LiveScrapeError, Scraper, load_targets, parse_exposition
+
+_MOCK_PATH = Path(__file__).resolve().parents[1] / "infra" / "scripts" / "mock_live_endpoints.py"
+
+
+def _load_mock():
+    spec = importlib.util.spec_from_file_location("mock_live_endpoints", _MOCK_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture()
+def live_targets(tmp_path: Path):
+    mock = _load_mock()
+    servers = [mock.start_server("node_exporter"), mock.start_server("node_exporter"), mock.start_server("app")]
+    config = {
+        "node_exporter": [f"127.0.0.1:{s.server_port}" for s in servers[:2]],
+        "app": [f"127.0.0.1:{servers[2].server_port}"],
+    }
+    path = tmp_path / "aws_targets.json"
+    path.write_text(json.dumps(config), encoding="utf-8")
+    yield path
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_load_targets_maps_kinds_to_jobs(live_targets: Path) -> None:
+    jobs = [target.job for target in load_targets(live_targets)]
+    assert jobs == ["node", "node", "app"]
+
+
+def test_scraped_samples_carry_per_target_labels(tmp_path: Path) -> None:
+    server = _load_mock().start_server("node_exporter")
+    try:
+        address = f"127.0.0.1:{server.server_port}"
+        config = tmp_path / "aws_targets.json"
+        config.write_text(json.dumps({"node_exporter": [{"target": address, "labels": {"az": "us-east-1a"}}]}),
+                          encoding="utf-8")
+        with Scraper(max_workers=1, timeout=2.0) as scraper:
+            (result,) = scraper.scrape(load_targets(config))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert result.ok and result.samples
+    target_labels = {("az", "us-east-1a"), ("instance", address), ("job", "node")}
+    assert all(target_labels <= set(labels) for _, labels, _, _ in result.samples)
+
+
+def test_parse_exposition_adds_instance_and_job():
+    samples = parse_exposition('# TYPE up gauge\nup{a="1"} 1\n', instance="h:9100", job="node")
+    assert samples == [("up", (("a", "1"), ("instance", "h:9100"), ("job", "node")), 1.0, None)]
+
+
+def test_fetch_metrics_live_scrapes_all_targets(live_targets: Path, tmp_path: Path) -> None:
+    store = MetricStore(tmp_path / "store")
+    with Scraper(max_workers=4, timeout=2.0) as scraper:
+        metrics = fetch_metrics(tmp_path / "metrics.json", live=True, store=store,
+                                targets_path=live_targets, scraper=scraper)
+
+    assert metrics["up"] == 3 and metrics["down"] == 0
+    assert len(metrics["hosts"]) == 2
+    assert metrics["cpu"] == pytest.approx(25.0)
+    assert metrics["memory"] == pytest.approx(25.0)
+    assert json.loads((tmp_path / "metrics.json").read_text(encoding="utf-8")) == metrics
+    host = next(iter(metrics["hosts"]))
+    assert store.latest_metrics(["cpu", "memory"], labels={"host": host}) == {"cpu": 25.0, "memory": 25.0}
+
+
+def test_unreachable_target_does_not_fail_the_cycle(live_targets: Path) -> None:
+    targets = load_targets(live_targets) + [("node", "127.0.0.1:1")]
+    with Scraper(max_workers=4, timeout=1.0) as scraper:
+        results = scraper.scrape(targets)
+        summary = scraper.summarize(results)
+
+    assert [r.ok for r in results] == [True, True, True, False]
+    assert summary["up"] == 3 and summary["down"] == 1
+
+
+def test_live_mode_raises_when_nothing_responds(tmp_path: Path) -> None:
+    config = tmp_path / "aws_targets.json"
+    config.write_text(json.dumps({"node_exporter": ["127.0.0.1:1"]}), encoding="utf-8")
+    with pytest.raises(LiveScrapeError):
+        get_latest_metrics(tmp_path / "unused.json", live=True, targets_path=config)
+
+
+def test_virtual_fleet_routes_targets_and_injects_faults(tmp_path: Path) -> None:
+    import http.client
+
+    mock = _load_mock()
+    fleet = mock.start_fleet(200, payload_bytes=20_000)
+    broken = mock.start_fleet(20, faults=mock.Faults(error_rate=1.0))
+    hung = mock.start_fleet(5, faults=mock.Faults(timeout_rate=1.0, hang=2.0))
+    by_port = mock.start_fleet(3, routing="ports")
+    by_host = mock.start_fleet(10, routing="host")
+    servers = fleet + broken + hung + by_port + by_host
+    try:
+        urls = mock.fleet_targets(fleet)["node_exporter"]
+        assert len(urls) == 200 and urls[7].endswith("/targets/7/metrics")
+        targets = [("node", url) for url in urls]
+        targets += [("node", url) for url in mock.fleet_targets(broken)["node_exporter"]]
+        targets += [("node", url) for url in mock.fleet_targets(hung)["node_exporter"]]
+        targets += [("node", addr) for addr in mock.fleet_targets(by_port)["node_exporter"]]
+        with Scraper(max_workers=64, timeout=0.5) as scraper:
+            results = scraper.scrape(targets)
+            summary = scraper.summarize(results)
+        ok = [r.ok for r in results]
+        assert all(ok[:200]) and not any(ok[200:225]) and all(ok[225:])
+        assert summary["up"] == 203 and len(summary["hosts"]) == 203
+        assert len(results[0].samples) > 100  # filler series pad the payload
+        assert summary["hosts"][urls[7]]["memory"] == pytest.approx(100 * mock.PayloadFactory().profile(7)[1], abs=0.01)
+
+        conn = http.client.HTTPConnection("127.0.0.1", by_host[0].server_port, timeout=2)
+        conn.request("GET", "/metrics", headers={"Host": "t9.mock"})
+        assert conn.getresponse().read().startswith(b"# HELP node_cpu_seconds_total")
+        conn.request("GET", "/metrics", headers={"Host": "t10.mock"})
+        assert conn.getresponse().status == 404
+        conn.close()
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,97 @@
+import math
+
+import pytest
+from prometheus_client.parser import text_string_to_metric_families
+
+pytestmark = pytest.mark.phase1
+
+from prom_parser import ExpositionParser, ParseError, iter_lines, parse_text
+
+PAYLOAD = """# HELP node_cpu_seconds_total Seconds the CPUs spent in each mode.
+# TYPE node_cpu_seconds_total counter
+node_cpu_seconds_total{cpu="0",mode="idle"} 7500.5
+node_cpu_seconds_total{cpu="0",mode="user"} 2000
+# TYPE node_filesystem_avail_bytes gauge
+node_filesystem_avail_bytes{device="/dev/sda1",mountpoint="/mnt/{data}",note="a \\"q\\" \\\\ b\\nc"} 1.5e+09
+node_load1 0.25 1712000000000
+node_scrape_error NaN
+node_limit +Inf
+http_request_duration_seconds_bucket{le="0.1",} 3
+"""
+
+
+def test_parse_text_matches_prometheus_client():
+    ours = parse_text(PAYLOAD)
+    reference = [
+        (s.name, s.labels, s.value)
+        for family in text_string_to_metric_families(PAYLOAD)
+        for s in family.samples
+    ]
+    assert len(ours) == len(reference)
+    for (name, labels, value, _), (ref_name, ref_labels, ref_value) in zip(ours, reference):
+        assert name == ref_name
+        assert dict(labels) == ref_labels
+        assert value == ref_value or (math.isnan(value) and math.isnan(ref_value))
+
+
+def test_timestamps_and_escaped_label_values():
+    by_name = {sample[0]: sample for sample in parse_text(PAYLOAD)}
+    assert by_name["node_load1"][3] == 1712000000000
+    labels = dict(by_name["node_filesystem_avail_bytes"][1])
+    assert labels["mountpoint"] == "/mnt/{data}"
+    assert labels["note"] == 'a "q" \\ b\nc'
+
+
+def test_family_allow_list_prefixes_and_label_filter():
+    samples = parse_text(
+        PAYLOAD,
+        families={"node_cpu_seconds"},
+        prefixes=("node_load",),
+        label_filter={"mode": {"idle"}},
+    )
+    assert [(s[0], s[1]) for s in samples] == [
+        ("node_cpu_seconds_total", (("cpu", "0"), ("mode", "idle"))),
+        ("node_load1", ()),
+    ]
+
+
+def test_parser_reuses_interned_labels_and_appends_extra_labels():
+    parser = ExpositionParser()
+    extra = (("instance", "h:9100"),)
+    first = list(parser.parse(PAYLOAD.splitlines(), extra))
+    second = list(parser.parse(PAYLOAD.splitlines(), extra))
+    assert first[0][1] == (("cpu", "0"), ("mode", "idle"), ("instance", "h:9100"))
+    assert first[0][1] is second[0][1]
+
+
+def test_label_caches_evict_the_least_recently_scraped_target(monkeypatch):
+    monkeypatch.setattr("prom_parser._TARGET_CACHE_LIMIT", 2)
+    parser = ExpositionParser()
+    targets = [(("instance", f"h{i}:9100"),) for i in range(3)]
+    first = {t: list(parser.parse(PAYLOAD.splitlines(), t))[0][1] for t in targets[:2]}
+    list(parser.parse(PAYLOAD.splitlines(), targets[0]))  # h0 is now the most recent
+    list(parser.parse(PAYLOAD.splitlines(), targets[2]))  # evicts h1 only
+
+    assert list(parser.parse(PAYLOAD.splitlines(), targets[0]))[0][1] is first[targets[0]]
+    assert list(parser.parse(PAYLOAD.splitlines(), targets[1]))[0][1] is not first[targets[1]]
+
+
+def test_iter_lines_reassembles_split_chunks():
+    data = PAYLOAD.encode("utf-8")
+    chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+    assert list(iter_lines(chunks)) == PAYLOAD.rstrip("\n").split("\n")
+
+
+def test_iter_lines_decodes_characters_split_across_chunks():
+    data = '# HELP temp Température\ntemp{site="café"} 1\n'.encode("utf-8")
+    cut = data.index("é".encode("utf-8")) + 1
+    assert list(iter_lines([data[:cut], data[cut:]])) == ["# HELP temp Température", 'temp{site="café"} 1']
+    samples = list(ExpositionParser().parse(iter_lines([data[:cut], data[cut:]])))
+    assert samples[0][1] == (("site", "café"),)
+
+
+def test_malformed_line_raises():
+    with pytest.raises(ParseError):
+        parse_text('bad{label="x" 1\n')
+    with pytest.raises(ParseError):
+        parse_text("novalue\n")
@@ -0,0 +1,113 @@
+import hashlib
+import importlib.util
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+pytestmark = pytest.mark.phase1
+
+from scraper import load_targets
+from targets import Target, TargetConfigError, TargetIndex, get_target_index, hashmod, parse_targets
+
+_CONFIG_SCRIPT = Path(__file__).resolve().parents[1] / "infra" / "scripts" / "prometheus_config.py"
+
+
+def _write(path: Path, data) -> Path:
+    path.write_text(json.dumps(data), encoding="utf-8")
+    return path
+
+
+def test_parse_targets_validates_entries_and_labels() -> None:
+    targets = parse_targets({
+        "node_exporter": ["10.0.0.1:9100", {"target": "10.0.0.2:9100", "labels": {"az": "b", "team": "x"}}],
+        "app": ["10.0.0.1:5000"],
+    })
+    assert targets == (
+        Target("node", "10.0.0.1:9100"),
+        Target("node", "10.0.0.2:9100", (("az", "b"), ("team", "x"))),
+        Target("app", "10.0.0.1:5000"),
+    )
+    for bad in (
+        {"node_exporter": ["a:1", "a:1"]},
+        {"node_exporter": [""]},
+        {"node_exporter": [{"target": "a:1", "labels": {"job": "x"}}]},
+        {"node_exporter": [{"target": "a:1", "labels": {"__meta": "x"}}]},
+        {"node_exporter": "a:1"},
+        ["a:1"],
+    ):
+        with pytest.raises(TargetConfigError):
+            parse_targets(bad)
+
+
+def test_index_reloads_on_change_and_keeps_last_good(tmp_path: Path) -> None:
+    path = _write(tmp_path / "targets.json", {"node_exporter": ["a:9100"]})
+    index = TargetIndex(path, check_interval=0)
+    assert index.pairs() == [("node", "a:9100")] and index.version == 1
+    assert not index.refresh()
+
+    _write(path, {"node_exporter": ["a:9100", "b:9100"], "app": ["a:5000"]})
+    assert index.refresh()
+    assert index.addresses_by_kind() == {"node_exporter": ["a:9100", "b:9100"], "app": ["a:5000"]}
+
+    path.write_text("{not json", encoding="utf-8")
+    assert not index.refresh()
+    assert index.error and len(index) == 3
+
+    empty = tmp_path / "empty.json"
+    empty.write_text("", encoding="utf-8")
+    assert load_targets(empty) == []
+    with pytest.raises(TargetConfigError):
+        load_targets(_write(tmp_path / "bad.json", {"node_exporter": [1]}))
+
+
+def test_sharded_file_sd_uses_prometheus_hashmod_and_writes_only_changes(tmp_path: Path) -> None:
+    # Prometheus hashmod: md5 of the source label value, last 8 bytes big-endian, modulo N
+    assert hashmod("10.0.0.1:9100", 7) == int.from_bytes(hashlib.md5(b"10.0.0.1:9100").digest()[8:], "big") % 7
+
+    nodes = [f"10.0.{i // 250}.{i % 250}:9100" for i in range(3000)]
+    config = _write(tmp_path / "targets.json", {"node_exporter": nodes, "app": ["10.9.9.9:5000"]})
+    index = TargetIndex(config)
+    out = tmp_path / "file_sd"
+    written = index.write_file_sd(out, n_shards=4)
+    assert len(written) == 4
+    groups = [json.loads(p.read_text(encoding="utf-8")) for p in sorted(written)]
+    seen = [t for shard in groups for group in shard for t in group["targets"]]
+    assert sorted(seen) == sorted(nodes + ["10.9.9.9:5000"])
+    for k, shard in enumerate(groups):
+        assert all(hashmod(t, 4) == k for group in shard for t in group["targets"])
+        assert 600 < sum(len(g["targets"]) for g in shard) < 900
+
+    mtimes = {p: os.stat(p).st_mtime_ns for p in written}
+    assert index.write_file_sd(out, n_shards=4) == []
+    assert {p: os.stat(p).st_mtime_ns for p in written} == mtimes
+
+    _write(config, {"node_exporter": nodes + ["10.8.8.8:9100"], "app": ["10.9.9.9:5000"]})
+    index.refresh(force=True)
+    changed = index.write_file_sd(out, n_shards=4)
+    assert [p.name for p in changed] == [f"targets-{hashmod('10.8.8.8:9100', 4)}-of-4.json"]
+
+    assert len(index.write_file_sd(out, n_shards=2)) == 2
+    assert sorted(p.name for p in out.iterdir()) == ["targets-0-of-2.json", "targets-1-of-2.json"]
+
+
+def test_prometheus_config_script_and_dashboard_share_the_index(tmp_path: Path, monkeypatch) -> None:
+    spec = importlib.util.spec_from_file_location("prometheus_config", _CONFIG_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    config = _write(tmp_path / "targets.json", {"node_exporter": [{"target": "a:9100", "labels": {"az": "x"}}]})
+    out = tmp_path / "app-and-node.json"
+    assert module.generate_file_sd(config, out)
+    assert json.loads(out.read_text(encoding="utf-8")) == [{"labels": {"job": "node", "az": "x"}, "targets": ["a:9100"]}]
+    assert not module.generate_file_sd(config, out)
+
+    import dashboard
+
+    monkeypatch.setattr(dashboard._aws_health_view, "path", config)
+    with dashboard.app.test_client() as client:
+        resp = client.get("/aws-health")
+        assert resp.get_json() == {"node_exporter": ["a:9100"], "app": []}
+        etag = resp.headers["ETag"].strip('"')
+        assert client.get("/aws-health", headers={"If-None-Match": etag}).status_code == 304
+    assert get_target_index(config).pairs() == [("node", "a:9100")]
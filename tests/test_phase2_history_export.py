@@ -0,0 +1,144 @@
+import json
+from pathlib import Path
+
+import boto3
+import numpy as np
+import pytest
+from botocore.config import Config
+from moto import mock_aws
+
+pytestmark = pytest.mark.phase2
+
+from history_export import (
+    HistoryExporter,
+    backfill_store,
+    export_store,
+    iter_batches,
+    iter_shipped_events,
+    list_files,
+    load_training_matrix,
+)
+from metric_store import MetricStore, series_key
+from ml_detection import load_metric_history
+from s3_shipper import S3LogShipper
+from samples import SampleFrame
+from targets import hashmod
+
+DAY = 86400.0
+T0 = 20000 * DAY
+
+
+def _fleet_store(root: Path) -> MetricStore:
+    store = MetricStore(root)
+    hosts = {f"web-{i}": {"cpu": 10.0 + i, "memory": 50.0 + i} for i in range(6)}
+    for t in range(48):
+        store.append_frame(SampleFrame.from_hosts(hosts, ts=T0 + 3600.0 * t))
+    return store
+
+
+def test_store_round_trips_through_partitioned_export(tmp_path: Path) -> None:
+    with _fleet_store(tmp_path / "store") as store:
+        stats = export_store(store, root=tmp_path / "export", host_groups=4)
+        expected = store.query(series_key("cpu", {"host": "web-3"}))
+
+    assert stats.rows == 6 * 2 * 48
+    group = hashmod("web-3", 4)
+    assert any(f"metrics/dt=2024-10-04/host_group={group:02d}/part-" in f for f in stats.files)
+    assert len(list_files(root=tmp_path / "export", start=T0 + DAY, end=T0 + DAY + 10)) == len(stats.files) // 2
+
+    with MetricStore(tmp_path / "backfill") as copy:
+        assert backfill_store(copy, root=tmp_path / "export") == {"rows": stats.rows, "series": 12}
+        restored = copy.query(series_key("cpu", {"host": "web-3"}))
+    assert restored.timestamps.tolist() == expected.timestamps.tolist()
+    assert restored.values.tolist() == expected.values.tolist()
+
+
+def test_backfill_under_newer_history_keeps_rollup_reads_complete(tmp_path: Path) -> None:
+    with _fleet_store(tmp_path / "store") as store:
+        export_store(store, root=tmp_path / "export", host_groups=4)
+
+    key = series_key("cpu", {"host": "web-3"})
+    with MetricStore(tmp_path / "live") as live:
+        for t in range(48, 72):
+            live.append(key, 99.0, ts=T0 + 3600.0 * t)
+        backfill_store(live, root=tmp_path / "export")
+        hourly = live.series(key, T0, T0 + 72 * 3600.0, 3600.0, ("count", "max"))
+
+    assert hourly.resolution == 3600.0
+    assert hourly.values["count"].tolist() == [1.0] * 72
+    assert hourly.values["max"].tolist() == [13.0] * 48 + [99.0] * 24
+
+
+def test_window_reads_prune_and_clip(tmp_path: Path) -> None:
+    with _fleet_store(tmp_path / "store") as store:
+        export_store(store, root=tmp_path / "export")
+
+    rows = sum(b.num_rows for b in iter_batches(root=tmp_path / "export", start=T0 + 3600, end=T0 + 3 * 3600))
+    assert rows == 3 * 12
+
+
+def test_bounded_buffers_still_write_every_row(tmp_path: Path) -> None:
+    exporter = HistoryExporter(tmp_path / "export", host_groups=8, row_group_rows=50,
+                               max_buffered_rows=100, max_open_files=2)
+    hosts = {f"h{i}": {"cpu": float(i), "memory": 1.0} for i in range(40)}
+    for t in range(30):
+        exporter.write_frame(SampleFrame.from_hosts(hosts, ts=T0 + 60.0 * t))
+        assert exporter._buffered <= 100
+    stats = exporter.close()
+
+    assert stats.rows == 40 * 2 * 30
+    assert len(stats.files) > 8
+    assert sum(b.num_rows for b in iter_batches(root=tmp_path / "export")) == stats.rows
+
+
+def test_failed_export_leaves_no_staged_files(tmp_path: Path) -> None:
+    with pytest.raises(RuntimeError):
+        with HistoryExporter(tmp_path / "export", row_group_rows=1) as exporter:
+            exporter.write_series(series_key("cpu", {"host": "a"}), [T0, T0 + 1], [1.0, 2.0])
+            exporter.write_event("anomaly", {"ts": T0, "metrics": {"cpu": 99}})
+            assert list((tmp_path / "export").rglob("*.parquet.tmp"))
+            raise RuntimeError("source failed")
+
+    assert exporter.files == []
+    assert [p for p in (tmp_path / "export").rglob("*") if p.is_file()] == []
+
+
+def test_training_matrix_pivots_hosts_and_feeds_ml_detection(tmp_path: Path) -> None:
+    with HistoryExporter(tmp_path / "export", host_groups=2) as exporter:
+        for t in range(10):
+            frame = SampleFrame(["a", "b"], ["cpu", "memory", "disk"], [[t, 50.0, 1.0], [t + 1, np.nan, 2.0]], T0 + t)
+            exporter.write_frame(frame)
+
+    matrix = load_training_matrix(root=tmp_path / "export")
+    assert sorted(map(tuple, matrix.tolist())) == [(float(t), 50.0) for t in range(10)]
+    assert load_metric_history([tmp_path / "export"]).shape == (10, 2)
+
+
+@mock_aws
+def test_export_to_s3_with_shipped_events(tmp_path: Path) -> None:
+    client = boto3.client("s3", region_name="us-east-1", config=Config(s3={"addressing_style": "path"}))
+    client.create_bucket(Bucket="logs")
+    client.create_bucket(Bucket="history")
+    shipper = S3LogShipper(client, "logs")
+    shipper.log_anomaly({"cpu": 97.0, "host": "web-1"})
+    shipper.log_remediation("restart web-1/cpu")
+    shipper.close()
+
+    with _fleet_store(tmp_path / "store") as store:
+        exporter = HistoryExporter(s3_client=client, bucket="history", prefix="exports/v1")
+        for key in store.keys():
+            data = store.query(key)
+            exporter.write_series(key, data.timestamps, data.values)
+        for kind, record in iter_shipped_events(client, "logs"):
+            exporter.write_event(kind, record)
+        stats = exporter.close()
+
+    keys = [o["Key"] for o in client.list_objects_v2(Bucket="history")["Contents"]]
+    assert sorted(keys) == sorted(stats.files)
+    assert all(k.startswith("exports/v1/") for k in keys)
+    source = {"s3_client": client, "bucket": "history", "prefix": "exports/v1"}
+    assert sum(b.num_rows for b in iter_batches(**source)) == 6 * 2 * 48
+    anomalies = [b.to_pylist() for b in iter_batches(dataset="anomalies", **source)][0]
+    assert anomalies[0]["host"] == "web-1" and json.loads(anomalies[0]["payload"])["metrics"]["cpu"] == 97.0
+    remediations = [b.to_pylist() for b in iter_batches(dataset="remediations", **source)][0]
+    assert remediations[0]["action"] == "restart web-1/cpu"
@@ -0,0 +1,164 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.phase2
+
+from metric_store import MetricStore
+from series import parse_series_key, series_key
+
+
+def test_series_key_is_canonical():
+    assert series_key("cpu") == "cpu"
+    assert series_key("cpu", {"job": "node", "host": "a"}) == 'cpu{host="a",job="node"}'
+    assert parse_series_key('cpu{host="a",job="node"}') == ("cpu", {"host": "a", "job": "node"})
+    assert parse_series_key("cpu") == ("cpu", {})
+
+
+def test_segments_roll_and_range_queries_span_them(tmp_path: Path) -> None:
+    keys = [series_key("cpu", {"host": f"h{i}"}) for i in range(10)]
+    with MetricStore(tmp_path, segment_records=25) as store:
+        for t in range(20):
+            store.append_many(keys, np.arange(10, dtype=float) + t, ts=100.0 + t)
+
+    assert len(list(tmp_path.glob("seg-*.idx"))) == 8
+    reader = MetricStore(tmp_path, readonly=True)
+    series = reader.query(keys[3], 105.0, 114.0)
+    assert series.timestamps.tolist() == [100.0 + t for t in range(5, 15)]
+    assert series.values.tolist() == [3.0 + t for t in range(5, 15)]
+    assert reader.query("missing").values.size == 0
+
+
+def test_writer_reopen_recovers_active_segment(tmp_path: Path) -> None:
+    with MetricStore(tmp_path, segment_records=100) as store:
+        store.append("cpu", 1.0, ts=1.0)
+        store.append("cpu", 2.0, ts=2.0)
+    with (tmp_path / "seg-00000001.bin").open("ab") as fh:
+        fh.write(b"\x00" * 7)
+
+    with MetricStore(tmp_path, segment_records=100) as store:
+        store.append("cpu", 3.0, ts=3.0)
+        assert store.query("cpu").values.tolist() == [1.0, 2.0, 3.0]
+        assert store.latest("cpu") == (3.0, 3.0)
+
+
+def test_latest_reports_a_sample_at_epoch_zero(tmp_path: Path) -> None:
+    with MetricStore(tmp_path) as store:
+        store.append("cpu", 5.0, ts=0.0)
+        assert store.latest("cpu") == (0.0, 5.0)
+        assert store.latest_metrics(["cpu", "memory"]) == {"cpu": 5.0}
+        assert len(store.latest_batch(["cpu"])) == 1
+
+    reader = MetricStore(tmp_path, readonly=True)
+    assert reader.latest("cpu") == (0.0, 5.0)
+
+
+def test_writer_reopen_seals_full_active_segment(tmp_path: Path) -> None:
+    from metric_store import RECORD_DTYPE
+
+    with MetricStore(tmp_path, segment_records=4) as store:
+        for t in range(1, 4):
+            store.append("cpu", float(t), ts=float(t))
+        sid = store._sid("cpu")
+    # Crash after the record that fills the segment was written, before it was sealed.
+    record = np.array([(sid, 4.0, 4.0)], dtype=RECORD_DTYPE)
+    with (tmp_path / "seg-00000001.bin").open("ab") as fh:
+        fh.write(record.tobytes())
+
+    with MetricStore(tmp_path, segment_records=4) as store:
+        store.append("cpu", 5.0, ts=5.0)
+        assert store.query("cpu").values.tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert (tmp_path / "seg-00000001.idx").exists()
+
+
+def test_downsample_rejects_unknown_aggregation(tmp_path: Path) -> None:
+    store = MetricStore(tmp_path)
+    with pytest.raises(ValueError):
+        store.downsample("cpu", 0, 10, 1, agg="median")
+
+
+def _fill(store: MetricStore, key: str, start: float, hours: float, every: float = 10.0) -> np.ndarray:
+    rng = np.random.default_rng(7)
+    ts = np.arange(start, start + hours * 3600, every)
+    values = rng.normal(50.0, 10.0, len(ts))
+    for i in range(0, len(ts), 50):  # several samples per series per batch
+        store.append_many([key] * len(ts[i:i + 50]), values[i:i + 50], ts=ts[i:i + 50])
+    return ts
+
+
+def test_series_reads_rollups_and_matches_raw_aggregation(tmp_path: Path) -> None:
+    from metric_store import aggregate_buckets
+
+    store = MetricStore(tmp_path, segment_records=4096)
+    ts = _fill(store, "cpu", 1_700_000_000.0, hours=26)
+    start, end = ts[37] + 3.0, ts[-20]
+
+    for step, tier in ((60.0, 60.0), (900.0, 60.0), (3600.0, 3600.0), (45.0, 0.0)):
+        result = store.series("cpu", start, end, step, ("avg", "min", "max", "count", "last"))
+        raw = store.query("cpu", start, end)
+        origin = np.floor(start / step) * step
+        assert result.resolution == tier
+        for agg, column in result.values.items():
+            expected = aggregate_buckets(raw.timestamps, raw.values, origin, step, agg)
+            np.testing.assert_allclose(result.timestamps, expected.timestamps)
+            np.testing.assert_allclose(column, expected.values)
+
+    assert store.series("cpu", start, end, 3600.0, ("p95",)).resolution == 0.0
+    assert len(list(tmp_path.glob("rollup3600-*.bin"))) >= 1
+
+
+def test_series_includes_backfilled_samples_in_rollups(tmp_path: Path) -> None:
+    from metric_store import aggregate_buckets
+
+    hour = 472_222 * 3600.0
+    with MetricStore(tmp_path) as store:
+        _fill(store, "cpu", hour, hours=1, every=15.0)
+        _fill(store, "cpu", hour - 3600, hours=1, every=15.0)  # backfill the hour before
+        store.append("cpu", 1.0, ts=hour + 3 * 3600)  # close the open buckets
+
+    reader = MetricStore(tmp_path, readonly=True)
+    start, end = hour - 3600, hour + 3600
+    raw = reader.query("cpu", start, end)
+    assert len(raw.values) == 480
+    for step, tier in ((60.0, 60.0), (3600.0, 3600.0)):
+        result = reader.series("cpu", start, end, step, ("avg", "min", "max", "count", "last"))
+        assert result.resolution == tier
+        for agg, column in result.values.items():
+            expected = aggregate_buckets(raw.timestamps, raw.values, start, step, agg)
+            np.testing.assert_allclose(result.timestamps, expected.timestamps)
+            np.testing.assert_allclose(column, expected.values)
+
+
+def test_rollup_open_buckets_survive_restart_and_crash(tmp_path: Path) -> None:
+    hour = 472_222 * 3600.0  # hour-aligned epoch
+    with MetricStore(tmp_path) as store:
+        _fill(store, "mem", hour, hours=2)
+    reopened = MetricStore(tmp_path)
+    _fill(reopened, "mem", hour + 7200, hours=1)
+    # Simulate a crash: drop the writer without close(), losing in-memory open buckets.
+    reopened._log.close()
+    for log, _ in reopened._rollups.values():
+        log.close()
+
+    recovered = MetricStore(tmp_path)
+    recovered.append("mem", 1.0, ts=hour + 5 * 3600)  # closes the hour that was open at the crash
+    hourly = recovered.series("mem", hour, hour + 3 * 3600, 3600.0, ("count",))
+    assert hourly.resolution == 3600.0
+    written = recovered._rollups[3600.0][0].read(recovered._sid("mem"), hour, hour + 3 * 3600)
+    assert written["count"].tolist() == [360, 360, 360]
+    assert hourly.values["count"].tolist() == [360.0, 360.0, 360.0]
+
+
+def test_lttb_keeps_extremes_and_endpoints() -> None:
+    from metric_store import lttb
+
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500.0)
+    y[4321] = 25.0
+    picked = lttb(x, y, 200)
+
+    assert len(picked.timestamps) == 200
+    assert picked.timestamps[0] == 0.0 and picked.timestamps[-1] == 9999.0
+    assert 4321.0 in picked.timestamps
+    assert np.all(np.diff(picked.timestamps) > 0)
@@ -18,3 +18,24 @@ def test_get_latest_metrics_returns_dict_with_keys(tmp_path: Path) -> None:
     assert result == expected
 
 
+
+
+def test_store_backed_latest_recent_and_downsampled_reads(tmp_path: Path) -> None:
+    from metric_store import MetricStore
+    from monitor import get_downsampled_range, get_latest_from_store, get_recent_metrics
+
+    store = MetricStore(tmp_path / "store", segment_records=64)
+    for i in range(200):
+        store.append_metrics({"cpu": float(i), "memory": 50.0}, labels={"host": "web-1"}, ts=1000.0 + i)
+
+    assert get_latest_from_store(store, labels={"host": "web-1"}) == {"cpu": 199.0, "memory": 50.0}
+
+    recent = get_recent_metrics(store, "cpu", minutes=1, labels={"host": "web-1"}, now=1199.0)
+    assert recent.values.tolist() == [float(i) for i in range(139, 200)]
+
+    buckets = get_downsampled_range(store, "cpu", 1000.0, 1199.0, step=100, agg="max", labels={"host": "web-1"})
+    assert buckets.timestamps.tolist() == [1000.0, 1100.0]
+    assert buckets.values.tolist() == [99.0, 199.0]
+
+    reader = MetricStore(tmp_path / "store", readonly=True)
+    assert reader.latest('cpu{host="web-1"}') == (1199.0, 199.0)
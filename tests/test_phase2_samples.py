@@ -0,0 +1,61 @@
+import math
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.phase2
+
+from anomaly_detection import detect_anomalies_batch, detect_frame
+from metric_store import MetricStore, series_key
+from samples import MetricSample, SampleFrame
+
+
+HOSTS = {"a:9100": {"cpu": 97.0, "memory": 30.0}, "b:9100": {"cpu": 12.0, "up": 1, "job": "node"}}
+
+
+def test_metric_sample_has_no_instance_dict():
+    sample = MetricSample("a", "cpu", 1.5, 10.0)
+    assert not hasattr(sample, "__dict__")
+    assert sample.as_tuple() == ("a", "cpu", 1.5, 10.0)
+    assert sample == MetricSample("a", "cpu", 1.5, 10.0)
+
+
+def test_frame_round_trips_host_dicts_and_skips_non_numeric():
+    frame = SampleFrame.from_hosts(HOSTS, ts=5.0)
+
+    assert frame.hosts == ("a:9100", "b:9100")
+    assert frame.columns == ("cpu", "memory", "up")
+    assert math.isnan(frame.values[1, 1])
+    assert frame.to_dict() == {"a:9100": {"cpu": 97.0, "memory": 30.0}, "b:9100": {"cpu": 12.0, "up": 1.0}}
+    assert frame.row("b:9100") == {"cpu": 12.0, "up": 1.0}
+    assert "a:9100" in frame and "c:9100" not in frame
+    assert SampleFrame.from_samples(frame.samples()).to_dict() == frame.to_dict()
+
+
+def test_numpy_access_is_zero_copy():
+    values = np.arange(6, dtype=np.float64).reshape(3, 2)
+    frame = SampleFrame(["a", "b", "c"], ["cpu", "memory"], values)
+
+    assert np.shares_memory(frame.to_numpy(), values)
+    assert np.shares_memory(frame.column("memory"), values)
+    assert frame.column("memory").tolist() == [1.0, 3.0, 5.0]
+    assert frame.select([False, True, True]).hosts == ("b", "c")
+
+
+def test_detect_frame_matches_batch_detection():
+    frame = SampleFrame.from_hosts(HOSTS, ["cpu", "memory"])
+    result = detect_frame(frame)
+    expected = detect_anomalies_batch(frame.values, frame.columns)
+
+    assert result.mask.tolist() == expected.mask.tolist() == [True, False]
+    assert result.columns[result.tripped[0]] == "cpu"
+
+
+def test_store_appends_frame_per_host_series(tmp_path: Path) -> None:
+    frame = SampleFrame.from_hosts(HOSTS, ["cpu", "memory"], ts=100.0)
+    with MetricStore(tmp_path) as store:
+        store.append_frame(frame)
+        assert store.latest(series_key("cpu", {"host": "b:9100"})) == (100.0, 12.0)
+        assert store.latest(series_key("memory", {"host": "a:9100"})) == (100.0, 30.0)
+        assert store.latest(series_key("memory", {"host": "b:9100"})) is None
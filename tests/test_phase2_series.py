@@ -0,0 +1,108 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.phase2
+
+from anomaly_detection import detect_batch
+from metric_store import MetricStore
+from monitor import get_latest_batch, get_latest_frame
+from samples import SampleFrame
+from series import SeriesBatch, SeriesRegistry, parse_series_key, series_key
+
+
+def test_label_sets_are_interned_and_ids_are_stable():
+    registry = SeriesRegistry()
+    a = registry.series_id("cpu", {"job": "node", "host": "web-1"})
+    b = registry.series_id("cpu", (("host", "web-1"), ("job", "node")))
+    c = registry.series_id("memory", {"host": "web-1", "job": "node"})
+
+    assert a == b != c
+    assert registry.intern({"job": "node", "host": "web-1"}) is registry.intern((("job", "node"), ("host", "web-1")))
+    assert registry.key(a) == series_key("cpu", {"host": "web-1", "job": "node"})
+    assert registry.id_for_key('memory{host="web-1",job="node"}') == c
+    assert (registry.metric(c), registry.labels(c)) == parse_series_key(registry.key(c))
+    assert len(registry) == 2
+
+
+def test_label_values_are_escaped_in_keys():
+    registry = SeriesRegistry()
+    tricky = {"host": 'a",c="d'}
+    a = registry.series_id("cpu", tricky)
+    b = registry.series_id("cpu", {"host": "a", "c": "d"})
+
+    assert a != b and registry.key(a) != registry.key(b)
+    assert registry.key(a) == 'cpu{host="a\\",c=\\"d"}'
+    for labels in (tricky, {"path": "C:\\tmp\\"}, {"help": 'line\nnext "q"'}):
+        assert parse_series_key(series_key("cpu", labels)) == ("cpu", labels)
+
+    with pytest.raises(ValueError):
+        registry.series_id("cpu", (("host", "a"), ("host", "b")))
+    with pytest.raises(ValueError):
+        SeriesBatch.from_samples([("cpu", {"job": "x"}, 1.0, 1.0)], registry, labels={"job": "node"})
+
+
+def test_select_intersects_metric_and_label_postings():
+    registry = SeriesRegistry()
+    for host, job in (("a", "node"), ("b", "node"), ("c", "app")):
+        registry.ids(["cpu", "memory"], {"host": host, "job": job})
+
+    node_cpu = registry.select(["cpu"], {"job": "node"})
+    assert registry.keys(node_cpu) == ['cpu{host="a",job="node"}', 'cpu{host="b",job="node"}']
+    assert len(registry.select(None, {"host": "c"})) == 2
+    assert len(registry.select(["disk"])) == 0
+    assert len(registry.select()) == 6
+
+
+def test_frame_ids_are_cached_per_layout():
+    registry = SeriesRegistry()
+    frame = SampleFrame(["a", "b"], ["cpu", "memory"], [[1.0, 2.0], [3.0, np.nan]], ts=10.0)
+
+    ids = registry.frame_ids(frame, labels={"job": "node"})
+    assert registry.frame_ids(SampleFrame(frame.hosts, frame.columns, frame.values * 2), labels={"job": "node"}) is ids
+    assert registry.keys(ids[:2]) == ['cpu{host="a",job="node"}', 'memory{host="a",job="node"}']
+
+    batch = SeriesBatch.from_frame(frame, registry, labels={"job": "node"})
+    assert len(batch) == 3 and batch.ts.tolist() == [10.0] * 3
+
+
+def test_batch_pivots_to_frame_by_any_label():
+    registry = SeriesRegistry()
+    samples = [
+        ("cpu", (("instance", "10.0.0.1:9100"),), 40.0, 1.0),
+        ("cpu", (("instance", "10.0.0.1:9100"),), 95.0, 2.0),
+        ("memory", (("instance", "10.0.0.2:9100"),), 60.0, 2.0),
+        ("up", (), 1.0, 2.0),
+    ]
+    batch = SeriesBatch.from_samples(samples, registry, labels={"job": "node"})
+    assert registry.labels(batch.ids[0]) == {"instance": "10.0.0.1:9100", "job": "node"}
+
+    frame = batch.to_frame("instance")
+    assert frame.hosts == ("10.0.0.1:9100", "10.0.0.2:9100") and frame.columns == ("cpu", "memory")
+    assert frame.to_dict() == {"10.0.0.1:9100": {"cpu": 95.0}, "10.0.0.2:9100": {"memory": 60.0}}
+    assert frame.ts == 2.0
+    assert batch.to_frame("instance", ["memory"]).to_dict() == {"10.0.0.2:9100": {"memory": 60.0}}
+
+    assert detect_batch(batch).tolist() == [False, True, False, False]
+
+
+def test_store_appends_batches_and_reads_latest_across_hosts(tmp_path: Path) -> None:
+    registry = SeriesRegistry()
+    hosts = {f"web-{i}": {"cpu": 10.0 * i, "memory": 50.0} for i in range(4)}
+    with MetricStore(tmp_path / "store") as store:
+        for t in range(3):
+            frame = SampleFrame.from_hosts(hosts, ts=100.0 + t)
+            store.append_batch(SeriesBatch.from_frame(frame, registry, labels={"job": "node"}))
+        store.append_metrics({"cpu": 1.0}, {"host": "db-1", "job": "db"}, ts=103.0)
+
+        assert store.query('cpu{host="web-3",job="node"}').values.tolist() == [30.0] * 3
+
+    with MetricStore(tmp_path / "store", readonly=True) as reader:
+        latest = get_latest_batch(reader, ["cpu"], {"job": "node"}, registry=registry)
+        assert sorted(latest.keys()) == sorted(f'cpu{{host="web-{i}",job="node"}}' for i in range(4))
+        assert latest.ts.tolist() == [102.0] * 4
+
+        frame = get_latest_frame(reader)
+        assert frame.columns == ("cpu", "memory") and len(frame) == 5
+        assert frame.row("db-1") == {"cpu": 1.0} and frame.row("web-2") == {"cpu": 20.0, "memory": 50.0}
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.phase2
+
+from metric_store import MetricStore
+from series_chunks import ChunkFormatError, ChunkReader, ChunkWriter, archive_store, decode_chunk, encode_chunk, iter_chunk
+
+
+def _bits(values):
+    return np.asarray(values, dtype=np.float64).view(np.uint64).tolist()
+
+
+def test_chunk_round_trips_irregular_timestamps_and_special_values():
+    ts = 1.7e9 + np.cumsum([0.0, 15.0, 15.0, 15.004, 14.9, 0.0, 86400.0, 15.0, 15.0])
+    values = [0.0, -0.0, float("nan"), float("inf"), 1e-300, 42.5, 42.5, 5e300, -3.25]
+
+    data = encode_chunk(ts, values)
+    decoded = decode_chunk(data)
+
+    assert decoded.timestamps.tolist() == (np.rint(ts * 1000) / 1000).tolist()
+    assert _bits(decoded.values) == _bits(values)
+    assert [_bits([v])[0] for _, v in iter_chunk(data)] == _bits(values)
+
+
+def test_regular_series_compresses_to_a_few_bits_per_sample():
+    ts = 1.7e9 + 15.0 * np.arange(120)
+
+    # Header, the first delta (3 + 17 bits), then one bit each for dod and XOR.
+    assert len(encode_chunk(ts, np.full(120, 37.5))) == 18 + (20 + 119 * 2 + 7) // 8
+    assert len(encode_chunk(ts, np.round(50 + 5 * np.sin(np.arange(120) / 9), 1))) < 120 * 8
+
+
+def test_encode_rejects_backwards_timestamps():
+    with pytest.raises(ValueError):
+        encode_chunk([10.0, 9.0], [1.0, 2.0])
+
+
+def test_writer_rejects_samples_earlier_than_a_key_already_holds(tmp_path: Path) -> None:
+    with ChunkWriter(tmp_path / "h.gch", chunk_samples=2) as writer:
+        writer.add("k", [100.0, 200.0], [1.0, 2.0])
+        with pytest.raises(ValueError):
+            writer.add("k", [50.0, 150.0], [3.0, 4.0])
+        with pytest.raises(ValueError):
+            writer.add("other", [10.0, 20.0, 5.0], [1.0, 2.0, 3.0])
+        writer.add("k", [200.0, 300.0], [5.0, 6.0])
+
+    with ChunkReader(tmp_path / "h.gch") as reader:
+        assert reader.query("k", 50.0, 200.0).values.tolist() == [1.0, 2.0, 5.0]
+
+
+def test_reader_decodes_only_overlapping_chunks(tmp_path: Path) -> None:
+    ts = 1000.0 + 15.0 * np.arange(1000)
+    with ChunkWriter(tmp_path / "h.gch", chunk_samples=100) as writer:
+        writer.add('cpu{host="a"}', ts, np.arange(1000.0))
+        writer.add('cpu{host="b"}', ts[:10], np.ones(10))
+
+    with ChunkReader(tmp_path / "h.gch") as reader:
+        assert reader.keys() == ['cpu{host="a"}', 'cpu{host="b"}']
+        window = reader.chunks('cpu{host="a"}', ts[250], ts[260])
+        assert window["min_ts"].tolist() == [ts[200]]
+
+        series = reader.query('cpu{host="a"}', ts[250], ts[420])
+        assert series.values.tolist() == list(np.arange(250.0, 421.0))
+        streamed = list(reader.iter_samples('cpu{host="a"}', ts[995]))
+        assert [v for _, v in streamed] == [995.0, 996.0, 997.0, 998.0, 999.0]
+        assert reader.query("missing").values.size == 0
+
+
+def test_archive_store_matches_raw_queries(tmp_path: Path) -> None:
+    with MetricStore(tmp_path / "store") as store:
+        for t in range(300):
+            store.append_metrics({"cpu": round(40 + t % 7 * 1.5, 1), "memory": 61.0}, {"host": "a"}, ts=100.0 + 15 * t)
+        stats = archive_store(store, tmp_path / "h.gch", chunk_samples=120)
+        expected = store.query('cpu{host="a"}')
+
+    assert stats["series"] == 2 and stats["samples"] == 600 and stats["chunks"] == 6
+    with ChunkReader(tmp_path / "h.gch") as reader:
+        assert reader.query('cpu{host="a"}').values.tolist() == expected.values.tolist()
+        assert reader.nbytes < 600 * 20 / 3
+
+
+def test_truncated_file_is_rejected(tmp_path: Path) -> None:
+    path = tmp_path / "h.gch"
+    with ChunkWriter(path) as writer:
+        writer.add("cpu", [1.0, 2.0], [1.0, 2.0])
+    path.write_bytes(path.read_bytes()[:-3])
+
+    with pytest.raises(ChunkFormatError):
+        ChunkReader(path)
@@ -0,0 +1,191 @@
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.phase3
+
+from alerting import AlertEvaluator, AlertRule, load_alert_rules
+from main import run_pipeline
+from samples import SampleFrame
+from series import SeriesBatch, SeriesRegistry
+
+
+def _tick(evaluator, t, cpu, hosts=("a",)):
+    frame = SampleFrame(list(hosts), ["cpu"], [[cpu]] * len(hosts), ts=1000.0 + t)
+    return [(e.rule, e.series, e.state) for e in evaluator.update_frame(frame)]
+
+
+def test_rule_is_pending_until_its_duration_elapses():
+    evaluator = AlertEvaluator([AlertRule("cpu-high", "cpu", 90.0, for_seconds=60.0)], registry=SeriesRegistry())
+
+    assert _tick(evaluator, 0, 95.0) == [("cpu-high", 'cpu{host="a"}', "pending")]
+    assert _tick(evaluator, 30, 95.0) == []
+    assert evaluator.firing() == []
+    assert _tick(evaluator, 60, 95.0) == [("cpu-high", 'cpu{host="a"}', "firing")]
+    assert evaluator.firing_by() == {"a": ["cpu"]}
+    assert evaluator.firing()[0].ts == 1000.0
+
+    # A pending alert that clears never fires and resolves silently.
+    assert _tick(evaluator, 90, 10.0) == [("cpu-high", 'cpu{host="a"}', "resolved")]
+    _tick(evaluator, 100, 95.0)
+    assert _tick(evaluator, 110, 10.0) == []
+
+
+def test_hysteresis_keeps_alert_firing_between_thresholds():
+    evaluator = AlertEvaluator([AlertRule("cpu-high", "cpu", 90.0, clear_below=80.0)], registry=SeriesRegistry())
+
+    assert _tick(evaluator, 0, 85.0) == []
+    assert [s for *_, s in _tick(evaluator, 15, 91.0)] == ["firing"]
+    for t, cpu in ((30, 89.0), (45, 81.0), (60, 91.0), (75, 80.0)):
+        assert _tick(evaluator, t, cpu) == []
+    assert [s for *_, s in _tick(evaluator, 90, 79.9)] == ["resolved"]
+    assert evaluator.firing() == []
+
+
+def test_pending_alert_resets_between_thresholds():
+    rule = AlertRule("cpu-high", "cpu", 90.0, clear_below=80.0, for_seconds=60.0)
+    evaluator = AlertEvaluator([rule], registry=SeriesRegistry())
+
+    assert [s for *_, s in _tick(evaluator, 0, 95.0)] == ["pending"]
+    assert _tick(evaluator, 30, 85.0) == []  # above clear_below, but no longer above fire_above
+    assert [s for *_, s in _tick(evaluator, 45, 95.0)] == ["pending"]
+    assert _tick(evaluator, 60, 95.0) == []  # the duration restarted at t=45
+    assert [s for *_, s in _tick(evaluator, 105, 95.0)] == ["firing"]
+    assert evaluator.firing()[0].ts == 1045.0
+
+
+def test_stale_series_resolve_and_reset():
+    rule = AlertRule("cpu-high", "cpu", 90.0, for_seconds=30.0)
+    evaluator = AlertEvaluator([rule], resolution=15.0, registry=SeriesRegistry(), stale_after=2)
+
+    for t in range(0, 45, 15):
+        _tick(evaluator, t, 95.0, hosts=("a", "b"))
+    assert evaluator.firing_by() == {"a": ["cpu"], "b": ["cpu"]}
+
+    # "b" disappears: it stays firing for two intervals, then resolves once.
+    assert _tick(evaluator, 45, 95.0) == []
+    assert _tick(evaluator, 60, 95.0) == []
+    assert _tick(evaluator, 75, 95.0) == [("cpu-high", 'cpu{host="b"}', "resolved")]
+    assert evaluator.firing_by() == {"a": ["cpu"]}
+    assert _tick(evaluator, 90, 95.0) == []
+
+    # Back again, it starts over as pending instead of resuming as firing.
+    assert _tick(evaluator, 105, 95.0, hosts=("a", "b")) == [("cpu-high", 'cpu{host="b"}', "pending")]
+
+
+def test_rules_match_labels_and_only_their_metric():
+    registry = SeriesRegistry()
+    evaluator = AlertEvaluator(
+        [AlertRule("node-cpu", "cpu", 90.0, labels=(("job", "node"),)), AlertRule("mem", "memory", 50.0)],
+        registry=registry,
+    )
+    samples = [("cpu", {"host": "a", "job": "node"}, 95.0, 1.0), ("cpu", {"host": "b", "job": "db"}, 95.0, 1.0),
+               ("memory", {"host": "b", "job": "db"}, 60.0, 1.0)]
+    events = evaluator.update(SeriesBatch.from_samples(samples, registry))
+    assert sorted((e.rule, e.series) for e in events) == [
+        ("mem", 'memory{host="b",job="db"}'), ("node-cpu", 'cpu{host="a",job="node"}')]
+    assert evaluator.firing_by() == {"a": ["cpu"], "b": ["memory"]}
+
+    with pytest.raises(ValueError):
+        evaluator.update(SeriesBatch.from_samples(samples, SeriesRegistry()))
+
+
+def test_burn_rate_needs_both_windows_to_exceed_the_budget():
+    rule = AlertRule("cpu-burn", "cpu", 90.0, windows=((600.0, 60.0, 8.0),), objective=0.99)
+    evaluator = AlertEvaluator([rule], resolution=15.0, registry=SeriesRegistry())
+
+    for t in range(0, 570, 15):
+        assert _tick(evaluator, t, 10.0) == []
+    # Hot samples burn the short window at once, the 40-bucket long window
+    # only after four of them (4/40 bad = 10x the 1% budget).
+    for t in (570, 585, 600):
+        assert _tick(evaluator, t, 95.0) == []
+    assert _tick(evaluator, 615, 95.0) == [("cpu-burn", 'cpu{host="a"}', "firing")]
+    # Once the short window has cooled down the alert resolves, although the
+    # long window still holds the hot samples.
+    for t in (630, 645, 660):
+        assert _tick(evaluator, t, 10.0) == []
+    assert _tick(evaluator, 675, 10.0) == [("cpu-burn", 'cpu{host="a"}', "resolved")]
+
+
+def test_default_rules_ignore_a_single_spike_on_a_new_series():
+    evaluator = AlertEvaluator(registry=SeriesRegistry())
+
+    for i, cpu in enumerate([50.0, 50.0, 95.0] + [50.0] * 30):
+        assert _tick(evaluator, 15 * i, cpu) == [("cpu-high", 'cpu{host="a"}', "pending")] * (cpu > 90)
+    assert evaluator.firing() == []
+
+    # After an hour of history, a sustained saturation burns both windows.
+    for i in range(33, 240):
+        _tick(evaluator, 15 * i, 50.0)
+    events = [_tick(evaluator, 15 * i, 95.0) for i in range(240, 280)]
+    burn = [i for i, e in enumerate(events) if ("cpu-saturation-burn", 'cpu{host="a"}', "firing") in e]
+    # 14.4 x the 1% budget over the 240-bucket hour takes 35 bad samples.
+    assert burn == [34]
+
+
+def test_load_alert_rules(tmp_path: Path) -> None:
+    path = tmp_path / "alerts.json"
+    path.write_text(json.dumps([
+        {"name": "cpu", "metric": "cpu", "fire_above": 90, "clear_below": 80, "for_seconds": 300,
+         "labels": {"job": "node"}},
+        {"name": "burn", "metric": "cpu", "fire_above": 90, "windows": [[3600, 300, 14.4]]},
+    ]))
+    cpu, burn = load_alert_rules(path)
+    assert cpu.labels == (("job", "node"),) and cpu.clear_below == 80
+    assert burn.windows == ((3600.0, 300.0, 14.4),)
+
+
+def test_thousands_of_rules_over_thousands_of_series_stay_fast():
+    rules = [AlertRule(f"cpu-{i}", "cpu", 50.0 + i % 50, clear_below=40.0, for_seconds=60.0) for i in range(1000)]
+    evaluator = AlertEvaluator(rules, registry=SeriesRegistry())
+    hosts = [f"web-{i}" for i in range(2000)]
+    values = np.random.default_rng(0).uniform(0, 100, (2000, 1))
+    evaluator.update_frame(SampleFrame(hosts, ["cpu"], values, ts=0.0))
+
+    started = time.perf_counter()
+    for t in range(1, 6):
+        evaluator.update_frame(SampleFrame(hosts, ["cpu"], values, ts=15.0 * t))
+    assert (time.perf_counter() - started) / 5 < 0.5
+    assert len(evaluator.firing()) == int((values > 50.0 + np.arange(1000) % 50).sum())
+
+
+def test_pipeline_remediates_only_on_firing_alerts(tmp_path: Path, monkeypatch) -> None:
+    cycle = {"cpu": [20.0, 97.0, 20.0, 97.0, 97.0, 97.0]}
+
+    def _fetch(file_path, live=False, store=None, **_):
+        t = len(cycle["cpu"])
+        metrics = {"cpu": cycle["cpu"].pop(0), "memory": 20.0}
+        Path(file_path).write_text(json.dumps(metrics), encoding="utf-8")
+        return metrics, SampleFrame.from_hosts({}, ts=1000.0 - 15.0 * t)
+
+    monkeypatch.setattr("main.fetch_samples", _fetch)
+    evaluator = AlertEvaluator([AlertRule("cpu-high", "cpu", 90.0, clear_below=80.0, for_seconds=15.0)],
+                               registry=SeriesRegistry())
+    results = [run_pipeline(tmp_path / "metrics.json", host="web-1", alerts=evaluator) for _ in range(6)]
+
+    # The lone spike in cycle 2 is an anomaly but resolves while still pending;
+    # the action runs when the alert starts firing, not on every firing cycle.
+    assert [r["anomaly"] for r in results] == [False, True, False, True, True, True]
+    assert [r["remediation_action"] is not None for r in results] == [False, False, False, False, True, False]
+    assert [[e["state"] for e in r["alerts"]["events"]] for r in results] == [
+        [], ["pending"], [], ["pending"], ["firing"], []]
+    assert results[-1]["alerts"]["firing"] == {"web-1": ["cpu"]}
+    assert "alerts" in results[-1]["timings"]
+
+
+def test_pipeline_ignores_fleet_alerts_for_the_local_action(tmp_path: Path, monkeypatch) -> None:
+    def _fetch(file_path, live=False, store=None, **_):
+        metrics = {"cpu": 20.0, "memory": 20.0}
+        Path(file_path).write_text(json.dumps(metrics), encoding="utf-8")
+        return metrics, SampleFrame.from_hosts({"web-2": {"cpu": 97.0}}, ts=time.time())
+
+    monkeypatch.setattr("main.fetch_samples", _fetch)
+    evaluator = AlertEvaluator([AlertRule("cpu-high", "cpu", 90.0)], registry=SeriesRegistry())
+    result = run_pipeline(tmp_path / "metrics.json", host="web-1", alerts=evaluator)
+
+    assert result["alerts"]["firing"] == {"web-2": ["cpu"]}
+    assert result["remediation_action"] is None
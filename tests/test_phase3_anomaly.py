@@ -3,7 +3,9 @@ import pytest
 
 pytestmark = pytest.mark.phase3
 
-from anomaly_detection import detect_anomaly, log_anomaly_to_s3
+import numpy as np
+
+from anomaly_detection import detect_anomalies_batch, detect_anomaly, log_anomaly_to_s3
 
 
 def test_detect_anomaly_normal():
@@ -21,6 +23,36 @@ def test_detect_anomaly_anomalous_memory():
     assert detect_anomaly(metrics) is True
 
 
+def test_detect_anomalies_batch_mask_and_tripped_metric():
+    values = np.array(
+        [
+            [50.0, 60.0, 1.0],
+            [95.0, 99.0, 1.0],
+            [10.0, 20.0, 7.0],
+            [10.0, np.nan, 1.0],
+        ]
+    )
+    result = detect_anomalies_batch(
+        values, ("cpu", "memory", "load1"), thresholds={"cpu": 90, "memory": 90, "load1": 5}
+    )
+
+    assert result.mask.tolist() == [False, True, True, False]
+    assert result.tripped.tolist() == [-1, 0, 2, -1]
+    assert result.columns[result.tripped[2]] == "load1"
+    assert result.exceeded[1].tolist() == [True, True, False]
+
+
+def test_detect_anomalies_batch_unlisted_columns_are_not_checked():
+    values = np.array([[10.0, 20.0, 1e9]])
+    assert not detect_anomalies_batch(values, ("cpu", "memory", "disk")).mask[0]
+    assert detect_anomalies_batch(values, ("cpu", "memory", "disk"), default_threshold=100).mask[0]
+
+
+def test_detect_anomalies_batch_rejects_mismatched_columns():
+    with pytest.raises(ValueError):
+        detect_anomalies_batch(np.zeros((3, 2)), ("cpu",))
+
+
 class _FakeS3Client:
     def __init__(self) -> None:
         self.calls: list[dict] = []
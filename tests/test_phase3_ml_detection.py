@@ -0,0 +1,47 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.phase3
+
+from ml_detection import ModelScorer, benchmark_scorer, get_scorer, load_metric_history, train_model
+
+
+def _write_history(tmp_path: Path) -> list[Path]:
+    rng = np.random.default_rng(1)
+    rows = [{"cpu": float(c), "memory": float(m)} for c, m in rng.normal([30, 50], [3, 3], size=(400, 2))]
+    listing = tmp_path / "history.json"
+    listing.write_text(json.dumps(rows[:200]), encoding="utf-8")
+    ndjson = tmp_path / "history.ndjson"
+    ndjson.write_text("\n".join(json.dumps(r) for r in rows[200:]) + "\n", encoding="utf-8")
+    snapshot = tmp_path / "metrics.json"
+    snapshot.write_text(json.dumps({"cpu": 31.0, "memory": 49.0}), encoding="utf-8")
+    return [listing, ndjson, snapshot]
+
+
+def test_load_metric_history_accepts_json_list_ndjson_and_snapshot(tmp_path: Path) -> None:
+    matrix = load_metric_history(_write_history(tmp_path))
+    assert matrix.shape == (401, 2)
+
+
+def test_train_persist_and_score_batch(tmp_path: Path) -> None:
+    model_path = train_model(_write_history(tmp_path), tmp_path / "models" / "iforest.joblib")
+    assert model_path.is_file()
+
+    scorer = ModelScorer.load(model_path)
+    assert scorer.load_seconds > 0
+    result = scorer.score_batch(np.array([[30.0, 50.0], [99.0, 5.0]]))
+    assert result.anomalous.tolist() == [False, True]
+    assert scorer.last_batch_size == 2
+
+    assert scorer.score_metrics({"cpu": 99.0, "memory": 5.0}) is True
+    assert scorer.score_metrics({"cpu": 30.0}) is None  # not scored as memory=0
+    assert scorer.score_metrics({"cpu": 30.0, "memory": float("nan")}) is None
+    assert benchmark_scorer(scorer, n_samples=500, repeats=1)["seconds_per_10k"] > 0
+
+
+def test_get_scorer_loads_once_per_process(tmp_path: Path) -> None:
+    model_path = train_model(_write_history(tmp_path), tmp_path / "iforest.joblib", n_estimators=10)
+    assert get_scorer(model_path) is get_scorer(model_path)
@@ -0,0 +1,96 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.phase3
+
+from samples import SampleFrame
+from sharded_detection import HashRing, ShardedDetector, ShardWorkerError
+
+
+def test_hash_ring_is_stable_and_moves_few_hosts_when_resized():
+    hosts = [f"ip-10-0-{i // 256}-{i % 256}" for i in range(5000)]
+    four, five = HashRing(4), HashRing(5)
+
+    assignment = [four.shard(h) for h in hosts]
+    again = HashRing(4)
+    assert assignment == [again.shard(h) for h in hosts]
+    assert min(np.bincount(assignment)) > 5000 / 4 * 0.7
+
+    moved = sum(a != five.shard(h) for a, h in zip(assignment, hosts))
+    assert moved < 5000 * 0.35  # ~1/5 expected; modulo hashing would move ~4/5
+
+
+@pytest.fixture(scope="module")
+def sharded():
+    detector = ShardedDetector(n_shards=2, warmup=3, min_std=1.0)
+    yield detector
+    detector.close()
+
+
+def test_verdicts_are_merged_back_in_input_order(sharded):
+    hosts = [f"web-{i}" for i in range(500)]
+    rng = np.random.default_rng(1)
+    for _ in range(10):
+        sharded.evaluate(hosts, rng.normal(40.0, 0.5, size=(len(hosts), 2)))
+
+    values = rng.normal(40.0, 0.5, size=(len(hosts), 2))
+    values[17, 0] = 80.0   # streaming outlier, below the static threshold
+    values[321, 1] = 95.0  # exceeds the memory threshold (and is an outlier)
+    values[400, 0] = np.nan
+    verdicts = sharded.evaluate(list(reversed(hosts)), values[::-1])
+
+    flagged = {hosts[::-1][i] for i in np.flatnonzero(verdicts.mask)}
+    assert flagged == {"web-17", "web-321"}
+    row = hosts[::-1].index("web-321")
+    assert verdicts.exceeded[row].tolist() == [False, True]
+    assert verdicts.zscores[hosts[::-1].index("web-17"), 0] > 4.0
+
+
+def test_state_stays_resident_in_shard_workers(sharded):
+    sharded.evaluate_metrics({f"db-{i}": {"cpu": 10.0, "memory": 20.0} for i in range(100)})
+    stats = sharded.shard_stats()
+
+    assert len({s["pid"] for s in stats}) == 2
+    assert sum(s["series"] for s in stats) >= 200
+    assert all(s["series"] > 0 for s in stats)
+
+
+def test_new_hosts_never_take_slots_of_cached_hosts_in_the_same_cycle():
+    with ShardedDetector(n_shards=1, warmup=0, min_std=1.0, max_series=4) as detector:
+        detector.evaluate(["a", "b"], [[10.0, 10.0], [90.0, 90.0]])
+        # "c" needs both slots of the idle "b"; "a" must keep its own.
+        detector.evaluate(["a", "c"], [[10.0, 10.0], [90.0, 90.0]])
+        verdicts = detector.evaluate(["a", "c"], [[20.0, 20.0], [90.0, 90.0]])
+
+    # "a" still has its baseline of 10 (std floored at 1); "c" matches its own.
+    assert verdicts.zscores.tolist() == [[10.0, 10.0], [0.0, 0.0]]
+
+
+def test_dead_worker_raises_instead_of_hanging():
+    detector = ShardedDetector(n_shards=2, poll_interval=0.05)
+    try:
+        detector._procs[1].kill()
+        detector._procs[1].join()
+        with pytest.raises(ShardWorkerError, match="shard 1"):
+            detector.evaluate([f"web-{i}" for i in range(50)], np.full((50, 2), 10.0))
+    finally:
+        detector.close()
+
+
+def test_pipeline_evaluates_live_hosts_with_sharded_detector(tmp_path: Path, monkeypatch, sharded):
+    import main
+
+    def _fleet(file_path, live=False, store=None, **_):
+        summary = {"cpu": 97.0, "memory": 30.0, "hosts": {"a:9100": {"cpu": 97.0, "memory": 30.0},
+                                                          "b:9100": {"cpu": 12.0, "memory": 25.0}}}
+        Path(file_path).write_text(json.dumps(summary), encoding="utf-8")
+        return summary, SampleFrame.from_hosts(summary["hosts"])
+
+    monkeypatch.setattr(main, "fetch_samples", _fleet)
+    result = main.run_pipeline(tmp_path / "metrics.json", sharded=sharded)
+
+    assert result["host_anomalies"] == {"a:9100": ["cpu"]}
+    assert result["anomaly"] is True
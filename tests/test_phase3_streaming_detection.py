@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+pytestmark = pytest.mark.phase3
+
+from streaming_detection import StreamingDetector
+
+
+def test_sustained_high_level_is_not_anomalous_but_jump_is():
+    detector = StreamingDetector(alpha=0.1, z_threshold=4.0, warmup=5, min_std=0.5)
+    rng = np.random.default_rng(0)
+    for value in 95 + rng.normal(0, 1, size=50):
+        assert detector.update(("batch-1", "cpu"), value) < 4.0
+
+    assert detector.update(("batch-1", "cpu"), 60.0) < -4.0
+
+
+def test_warmup_suppresses_early_flags():
+    detector = StreamingDetector(warmup=10)
+    assert detector.update_metrics("h", {"cpu": 10.0}) == {}
+    assert detector.update_metrics("h", {"cpu": 99.0}) == {}
+
+
+def test_update_batch_is_vectorized_across_series():
+    detector = StreamingDetector(alpha=0.2, warmup=3, min_std=1.0)
+    keys = [(f"host-{i}", "memory") for i in range(1000)]
+    for _ in range(10):
+        detector.update_batch(keys, np.full(len(keys), 40.0))
+
+    values = np.full(len(keys), 40.0)
+    values[[3, 500]] = 80.0
+    result = detector.update_batch(keys, values)
+    assert np.flatnonzero(result.anomalous).tolist() == [3, 500]
+
+
+def test_nan_samples_are_skipped():
+    detector = StreamingDetector(warmup=0)
+    result = detector.update_batch([("a", "cpu"), ("b", "cpu")], [1.0, np.nan])
+    assert result.anomalous.tolist() == [False, False]
+    assert ("a", "cpu") in detector
+
+
+def test_fixed_capacity_evicts_least_recently_updated():
+    detector = StreamingDetector(max_series=2)
+    budget = detector.nbytes
+    detector.update("a", 1.0)
+    detector.update("b", 1.0)
+    detector.update("a", 1.0)
+    detector.update("c", 1.0)
+
+    assert len(detector) == 2
+    assert "b" not in detector and "a" in detector and "c" in detector
+    assert detector.nbytes == budget
+
+
+def test_batch_never_evicts_a_slot_it_already_resolved():
+    detector = StreamingDetector(max_series=2, warmup=0)
+    detector.update("a", 1.0)
+    detector.update("b", 1.0)
+
+    detector.update_batch(["a", "c"], [1.0, 5.0])
+
+    assert "a" in detector and "c" in detector and "b" not in detector
+    assert detector.lookup("a") != detector.lookup("c")
+    assert detector._count[detector.lookup("a")] == 2
+
+
+def test_batch_larger_than_capacity_raises_instead_of_merging_series():
+    detector = StreamingDetector(max_series=2)
+    detector.update("a", 1.0)
+
+    with pytest.raises(ValueError):
+        detector.update_batch(["a", "b", "c"], [1.0, 1.0, 1.0])
+    assert detector.lookup("zzz") is None and "zzz" not in detector
+
+
+def test_seasonal_baseline_learns_repeating_profile():
+    detector = StreamingDetector(alpha=0.02, warmup=48, season_length=4, seasonal_alpha=0.5, min_std=1.0)
+    profile = [20.0, 80.0, 20.0, 80.0]
+    for _ in range(60):
+        for value in profile:
+            detector.update("svc", value)
+    assert abs(detector.update("svc", 20.0)) < 4.0
+    assert abs(detector.update("svc", 20.0)) > 4.0
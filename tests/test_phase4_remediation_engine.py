@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+pytestmark = pytest.mark.phase4
+
+from remediation_engine import (
+    DEFAULT_RULES,
+    FakeExecutor,
+    Incident,
+    RemediationEngine,
+    Rule,
+    RuleIndex,
+    TokenBucket,
+    load_rules,
+)
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_rule_index_prefers_exact_severity_then_labels_then_fallback():
+    rules = list(DEFAULT_RULES) + [Rule("db-memory", "memory", "failover", labels=(("role", "db"),))]
+    index = RuleIndex(rules)
+
+    assert index.match(Incident("a", "cpu", "critical")).name == "cpu-critical"
+    assert index.match(Incident("a", "cpu", "warning")).name == "cpu-high"
+    assert index.match(Incident("a", "memory", "warning", labels=(("role", "db"),))).name == "db-memory"
+    assert index.match(Incident("a", "memory", "warning", labels=(("role", "web"),))).name == "memory-high"
+    assert index.match(Incident("a", "disk", "warning")).name == "fallback"
+    assert index.match(Incident("a", "disk", "info")) is None
+
+
+def test_load_rules_accepts_label_objects(tmp_path: Path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps([{"name": "r", "metric": "cpu", "action": "scale_out", "labels": {"env": "prod"}}]))
+
+    (rule,) = load_rules(path)
+    assert rule.labels == (("env", "prod"),) and rule.severity == "warning"
+
+
+def test_open_incidents_are_deduplicated_until_recovery_then_cooled_down():
+    clock = _Clock()
+    executor = FakeExecutor()
+    with RemediationEngine(executor=executor, cooldown=60.0, clock=clock) as engine:
+        first = engine.evaluate("web-1", {"cpu": 95.0}, ["cpu"])
+        engine.wait()
+        again = engine.evaluate("web-1", {"cpu": 95.0}, ["cpu"])
+        assert (first["cpu"].status, again["cpu"].status) == ("dispatched", "duplicate")
+
+        engine.evaluate("web-1", {"cpu": 20.0}, [])  # recovered: incident closed
+        assert engine.open_incidents() == []
+        clock.now += 10
+        assert engine.evaluate("web-1", {"cpu": 95.0}, ["cpu"])["cpu"].status == "cooldown"
+        clock.now += 60
+        assert engine.evaluate("web-1", {"cpu": 95.0}, ["cpu"])["cpu"].status == "dispatched"
+        # Other hosts are not affected by web-1's cooldown.
+        assert engine.evaluate("web-2", {"cpu": 99.0}, ["cpu"])["cpu"].rule.action == "scale_out"
+
+    assert [action for action, _ in executor.calls] == ["restart_service", "restart_service", "scale_out"]
+
+
+def test_token_bucket_limits_fleet_wide_bursts():
+    clock = _Clock()
+    bucket = TokenBucket(rate=2.0, burst=3, clock=clock)
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock.now += 1.0
+    assert [bucket.try_acquire() for _ in range(3)] == [True, True, False]
+
+    with RemediationEngine(executor=FakeExecutor(), rate=0.0, burst=5, clock=clock) as engine:
+        statuses = [engine.evaluate(f"h{i}", {"cpu": 95.0}, ["cpu"])["cpu"].status for i in range(8)]
+    assert statuses.count("dispatched") == 5 and statuses.count("rate_limited") == 3
+
+
+def test_actions_run_concurrently_with_timeouts_and_failures():
+    executor = FakeExecutor(delay=0.2, fail_actions={"clear_cache"})
+    engine = RemediationEngine(executor=executor, max_workers=4, timeout=1.0)
+    for i in range(4):
+        engine.evaluate(f"h{i}", {"cpu": 95.0, "memory": 92.0}, ["cpu"] if i % 2 else ["memory"])
+    results = engine.wait()
+    engine.close()
+
+    assert len(results) == 4
+    assert sorted(r.ok for r in results) == [False, False, True, True]
+    # A failed action releases its incident so it can be retried after the cooldown.
+    assert engine.open_incidents() == [("h1", "cpu"), ("h3", "cpu")]
+
+    slow = RemediationEngine(executor=FakeExecutor(delay=0.5), timeout=0.05)
+    slow.evaluate("h9", {"cpu": 95.0}, ["cpu"])
+    (result,) = slow.wait()
+    slow.close()
+    assert result.error == "timeout" and slow.stats["timeout"] == 1
+
+
+def test_evaluate_reaps_hung_actions_without_wait():
+    release = threading.Event()
+
+    class _Hung:
+        def execute(self, action, incident, timeout):
+            release.wait(5.0)
+            return "late"
+
+    engine = RemediationEngine(executor=_Hung(), timeout=0.05, cooldown=0.0)
+    assert engine.evaluate("h1", {"cpu": 95.0}, ["cpu"])["cpu"].status == "dispatched"
+    assert engine.evaluate("h1", {"cpu": 95.0}, ["cpu"])["cpu"].status == "duplicate"
+    time.sleep(0.1)
+
+    # The overdue action is reaped before the next decision, which redispatches.
+    assert engine.evaluate("h1", {"cpu": 95.0}, ["cpu"])["cpu"].status == "dispatched"
+    assert engine.stats["timeout"] == 1
+    assert [r.error for r in engine.results] == ["timeout"]
+    release.set()
+    engine.close()
+
+
+def test_pipeline_uses_engine_instead_of_acting_every_cycle(tmp_path: Path, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "detect_anomaly", lambda metrics: True)
+    monkeypatch.setattr(main, "anomalous_metrics", lambda metrics: ["cpu"])
+    executor = FakeExecutor()
+    with RemediationEngine(executor=executor) as engine:
+        results = [main.run_pipeline(tmp_path / "metrics.json", host="web-1", engine=engine) for _ in range(3)]
+
+    assert [r["remediation_decisions"] for r in results] == [
+        {"web-1/cpu": "dispatched"},
+        {"web-1/cpu": "duplicate"},
+        {"web-1/cpu": "duplicate"},
+    ]
+    assert results[0]["remediation_action"] == "restart_service web-1/cpu"
+    assert results[1]["remediation_action"] is None
+    assert len(executor.calls) == 1
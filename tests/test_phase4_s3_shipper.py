@@ -0,0 +1,140 @@
+import gzip
+import json
+import threading
+import time
+
+import boto3
+import pytest
+from botocore.config import Config
+from moto import mock_aws
+
+pytestmark = pytest.mark.phase4
+
+from s3_shipper import S3LogShipper, batch_object_key, read_batch
+
+
+class _FakeS3Client:
+    def __init__(self, failures: int = 0) -> None:
+        self.calls: list[dict] = []
+        self.failures = failures
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:  # noqa: N803
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("transient")
+        self.calls.append({"Bucket": Bucket, "Key": Key, "Body": Body})
+
+
+def test_events_are_batched_into_compressed_ndjson_objects():
+    fake = _FakeS3Client()
+    shipper = S3LogShipper(fake, "test-bucket", max_events=50, flush_interval=60)
+    for i in range(120):
+        assert shipper.log_anomaly({"cpu": 95 + i % 5, "memory": 10})
+    shipper.log_remediation("Action taken for High CPU usage")
+    shipper.close()
+
+    anomaly_calls = [c for c in fake.calls if c["Key"].startswith("anomalies/")]
+    remediation_calls = [c for c in fake.calls if c["Key"].startswith("remediations/")]
+    assert [len(read_batch(c["Body"])) for c in anomaly_calls] == [50, 50, 20]
+    assert len(remediation_calls) == 1
+    assert gzip.decompress(remediation_calls[0]["Body"]).count(b"\n") == 1
+    assert read_batch(remediation_calls[0]["Body"])[0]["action"] == "Action taken for High CPU usage"
+    assert len({c["Key"] for c in fake.calls}) == len(fake.calls)
+    assert all(c["Key"].endswith(".ndjson.gz") for c in fake.calls)
+    assert shipper.stats["uploaded_events"] == 121
+
+
+def test_only_recent_object_keys_are_kept():
+    fake = _FakeS3Client()
+    shipper = S3LogShipper(fake, "b", max_events=1, flush_interval=60, history=2)
+    for i in range(5):
+        shipper.log_remediation(f"restart {i}")
+    shipper.close()
+    assert list(shipper.keys) == [c["Key"] for c in fake.calls[-2:]]
+    assert shipper.stats["uploaded_objects"] == 5
+
+
+def test_time_threshold_flushes_without_explicit_call():
+    fake = _FakeS3Client()
+    shipper = S3LogShipper(fake, "b", flush_interval=0.05, compress=False)
+    shipper.log_anomaly({"cpu": 99})
+    deadline = time.time() + 2
+    while not fake.calls and time.time() < deadline:
+        time.sleep(0.01)
+    shipper.close()
+    assert len(fake.calls) == 1
+    assert json.loads(fake.calls[0]["Body"])["metrics"] == {"cpu": 99}
+
+
+def test_failed_uploads_are_retried_then_counted():
+    fake = _FakeS3Client(failures=2)
+    shipper = S3LogShipper(fake, "b", max_retries=3, sleep=lambda _: None)
+    shipper.log_remediation("restart")
+    assert shipper.flush()
+    assert len(fake.calls) == 1 and shipper.stats["retries"] == 2
+
+    broken = _FakeS3Client(failures=100)
+    shipper2 = S3LogShipper(broken, "b", max_retries=1, sleep=lambda _: None)
+    shipper2.log_remediation("restart")
+    shipper2.close()
+    assert shipper2.stats["failed_batches"] == 1 and not broken.calls
+    shipper.close()
+
+
+def test_consumer_survives_a_failing_callback():
+    fake = _FakeS3Client()
+    calls = []
+
+    def _on_upload(kind, n, seconds, ok):
+        calls.append(kind)
+        if len(calls) == 1:
+            raise RuntimeError("metrics backend down")
+
+    shipper = S3LogShipper(fake, "b", flush_interval=60, on_upload=_on_upload)
+    shipper.log_remediation("restart")
+    assert shipper.flush(timeout=2)
+    shipper.log_remediation("restart again")
+    assert shipper.flush(timeout=2)
+    shipper.close()
+
+    assert len(fake.calls) == 2 and calls == ["remediation", "remediation"]
+    assert shipper.stats["errors"] == 1
+
+
+def test_submit_never_blocks_when_queue_is_full():
+    started = threading.Event()
+    release = threading.Event()
+
+    class _SlowClient(_FakeS3Client):
+        def put_object(self, Bucket, Key, Body):  # noqa: N803
+            started.set()
+            release.wait(5)
+            super().put_object(Bucket, Key, Body)
+
+    shipper = S3LogShipper(_SlowClient(), "b", max_events=1, max_queue=2)
+    shipper.log_anomaly({"cpu": 1})
+    assert started.wait(2)
+    results = [shipper.log_anomaly({"cpu": i}) for i in range(5)]
+    release.set()
+    shipper.close()
+    assert results.count(False) == 3 and shipper.stats["dropped"] == 3
+
+
+def test_batch_object_key_partitions_by_hour():
+    key = batch_object_key("anomaly", now=0.0)
+    assert key.startswith("anomalies/dt=1970-01-01/hour=00/0-")
+
+
+@mock_aws
+def test_shipper_against_moto_s3():
+    client = boto3.client("s3", region_name="us-east-1", config=Config(s3={"addressing_style": "path"}))
+    client.create_bucket(Bucket="logs")
+    shipper = S3LogShipper(client, "logs")
+    for i in range(10):
+        shipper.log_anomaly({"cpu": 90 + i})
+    shipper.close()
+
+    objects = client.list_objects_v2(Bucket="logs")["Contents"]
+    assert len(objects) == 1
+    body = client.get_object(Bucket="logs", Key=objects[0]["Key"])["Body"].read()
+    assert [e["metrics"]["cpu"] for e in read_batch(body)] == list(range(90, 100))
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 
 pytestmark = pytest.mark.phase5
@@ -31,3 +33,190 @@ def test_aws_health_endpoint(client):
     assert "app" in data and "node_exporter" in data
 
 
+
+
+@pytest.fixture()
+def metrics_view(tmp_path, monkeypatch):
+    import dashboard
+
+    view = dashboard._CachedJSONView("test_metrics", tmp_path / "metrics.json", dashboard._index_payload, check_interval=0.0)
+    monkeypatch.setattr(dashboard, "_index_view", view)
+    return view
+
+
+def test_index_serves_cached_payload_until_file_changes(client, metrics_view):
+    metrics_view.path.write_text(json.dumps({"cpu": 10.0, "memory": 20.0}), encoding="utf-8")
+
+    for _ in range(3):
+        resp = client.get("/")
+        assert resp.get_json() == {"metrics": {"cpu": 10.0, "memory": 20.0}, "anomaly": False}
+    assert metrics_view.misses == 1 and metrics_view.hits == 2
+
+    metrics_view.path.write_text(json.dumps({"cpu": 95.0, "memory": 20.0, "extra": 1}), encoding="utf-8")
+    assert client.get("/").get_json()["anomaly"] is True
+    assert metrics_view.misses == 2
+
+
+def test_index_conditional_get_and_missing_file(client, metrics_view):
+    resp = client.get("/")
+    assert resp.get_json() == {"metrics": {}, "anomaly": False}
+
+    metrics_view.path.write_text(json.dumps({"cpu": 1, "memory": 2}), encoding="utf-8")
+    first = client.get("/")
+    again = client.get("/", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_index_torn_file_degrades_to_empty(client, metrics_view):
+    metrics_view.path.write_text('{"cpu": 1', encoding="utf-8")
+    assert client.get("/").get_json() == {"metrics": {}, "anomaly": False}
+
+
+def test_metrics_endpoint_serves_process_registry(client, tmp_path):
+    from instrumentation import REGISTRY
+    from main import run_pipeline
+
+    before = REGISTRY.get_sample_value("pipeline_run_duration_seconds_count") or 0.0
+    run_pipeline(tmp_path / "metrics.json")
+
+    body = client.get("/metrics").data.decode("utf-8")
+    assert "app_info 1.0" in body
+    assert 'pipeline_stage_duration_seconds_bucket{le="0.0001",stage="ingest"}' in body
+    assert "cache_requests_total" in body
+    assert REGISTRY.get_sample_value("pipeline_run_duration_seconds_count") == before + 1
+
+
+@pytest.fixture()
+def stream(metrics_view, monkeypatch):
+    import dashboard
+
+    broadcaster = dashboard._Broadcaster(metrics_view.get, poll_interval=0.02, max_clients=2, queue_size=2, heartbeat=0.05)
+    monkeypatch.setattr(dashboard, "_stream", broadcaster)
+    yield broadcaster
+    broadcaster.stop()
+
+
+def _events(frames):
+    return [json.loads(f.split(b"data: ", 1)[1]) for f in frames if b"event: snapshot" in f]
+
+
+def test_stream_pushes_snapshots_and_verdicts(client, metrics_view, stream):
+    metrics_view.path.write_text(json.dumps({"cpu": 10.0, "memory": 20.0}), encoding="utf-8")
+    resp = client.get("/stream")
+    assert resp.status_code == 200 and resp.mimetype == "text/event-stream"
+    frames = iter(resp.response)
+
+    assert next(frames).startswith(b"retry:")
+    assert _events([next(frames)]) == [{"metrics": {"cpu": 10.0, "memory": 20.0}, "anomaly": False}]
+
+    metrics_view.path.write_text(json.dumps({"cpu": 99.0, "memory": 20.0}), encoding="utf-8")
+    pushed = next(frames)
+    assert _events([pushed])[0]["anomaly"] is True
+    assert next(frames) == b": keepalive\n\n"  # no change: heartbeat only
+    resp.close()
+    assert stream.clients == 0
+
+
+def test_stream_caps_connections_and_skips_known_snapshot(client, metrics_view, stream):
+    metrics_view.path.write_text(json.dumps({"cpu": 1.0}), encoding="utf-8")
+    first = client.get("/stream")
+    frames = iter(first.response)
+    next(frames)
+    etag = next(frames).split(b"\n", 1)[0][4:].decode()
+
+    resumed = client.get("/stream", headers={"Last-Event-ID": etag})
+    resumed_frames = iter(resumed.response)
+    next(resumed_frames)
+    assert next(resumed_frames) == b": keepalive\n\n"
+
+    rejected = client.get("/stream")
+    assert rejected.status_code == 503 and rejected.headers["Retry-After"] == "5"
+    first.close()
+    resumed.close()
+    assert client.get("/stream").status_code == 200
+
+
+def test_slow_stream_client_only_keeps_latest_frames(metrics_view):
+    import dashboard
+
+    metrics_view.path.write_text(json.dumps({"cpu": 1.0}), encoding="utf-8")
+    # The background producer effectively never fires; polls are driven by hand.
+    stream = dashboard._Broadcaster(metrics_view.get, poll_interval=3600, queue_size=2)
+    subscriber, _, _ = stream.subscribe()
+    for cpu in range(2, 7):
+        metrics_view.path.write_text(json.dumps({"cpu": float(cpu)}), encoding="utf-8")
+        assert stream.poll()
+
+    assert subscriber.dropped == 3
+    assert _events([subscriber.next(0), subscriber.next(0)]) == [
+        {"metrics": {"cpu": 5.0}, "anomaly": False},
+        {"metrics": {"cpu": 6.0}, "anomaly": False},
+    ]
+    stream.unsubscribe(subscriber)
+    stream.stop()
+
+
+def test_api_series_downsamples_from_store(client, tmp_path, monkeypatch):
+    import numpy as np
+
+    import dashboard
+    from metric_store import MetricStore
+
+    store_path = tmp_path / "store"
+    with MetricStore(store_path) as store:
+        ts = np.arange(0, 86400, 10.0) + 1_700_006_400.0
+        for i in range(0, len(ts), 360):
+            chunk = ts[i:i + 360]
+            store.append_many(['cpu{host="web-1"}'] * len(chunk), np.full(len(chunk), 40.0) + (chunk % 3600 == 0), ts=chunk)
+    monkeypatch.setattr(dashboard, "STORE_PATH", store_path)
+    monkeypatch.setattr(dashboard, "_store", None)
+
+    window = {"metric": "cpu", "host": "web-1", "start": ts[0], "end": ts[-1]}
+    hourly = client.get("/api/series", query_string={**window, "step": 3600, "agg": "avg,max,count"}).get_json()
+    assert hourly["resolution"] == 3600.0 and len(hourly["timestamps"]) == 24
+    assert hourly["values"]["max"] == [41.0] * 24 and hourly["values"]["count"][0] == 360
+
+    auto = client.get("/api/series", query_string={**window, "points": 300}).get_json()
+    assert len(auto["timestamps"]) <= 300 and auto["step"] == 300.0
+
+    picked = client.get("/api/series", query_string={**window, "agg": "lttb", "points": 100}).get_json()
+    assert len(picked["values"]["lttb"]) == 100
+
+    assert client.get("/api/series", query_string={"metric": "cpu", "agg": "median"}).status_code == 400
+    assert client.get("/api/series").status_code == 400
+    for bad in ({"step": "inf"}, {"step": "nan"}, {"start": "-inf"}, {"end": "nan"}, {"points": "inf"}, {"agg": ","}):
+        assert client.get("/api/series", query_string={"metric": "cpu", **bad}).status_code == 400
+    missing = client.get("/api/series", query_string={"metric": "cpu", "host": "nope"}).get_json()
+    assert missing["timestamps"] == []
+
+
+def test_wsgi_entry_point_serves_preloaded_app():
+    import dashboard
+    import wsgi
+
+    assert wsgi.application is dashboard.app
+    assert dashboard._index_view._entry is not None  # warmed at import, before fork
+    with wsgi.application.test_client() as c:
+        assert c.get("/health").status_code == 200
+
+
+def test_api_latest_returns_every_host_with_anomalies(client, tmp_path, monkeypatch):
+    import dashboard
+    from metric_store import MetricStore
+
+    store_path = tmp_path / "store"
+    with MetricStore(store_path) as store:
+        store.append_metrics({"cpu": 95.0, "memory": 40.0}, {"host": "web-1", "job": "node"}, ts=100.0)
+        store.append_metrics({"cpu": 20.0, "memory": 30.0}, {"host": "web-2", "job": "node"}, ts=100.0)
+        store.append_metrics({"cpu": 99.0}, {"host": "db-1", "job": "db"}, ts=101.0)
+    monkeypatch.setattr(dashboard, "STORE_PATH", store_path)
+    monkeypatch.setattr(dashboard, "_store", None)
+
+    body = client.get("/api/latest", query_string={"job": "node"}).get_json()
+    assert body["columns"] == ["cpu", "memory"] and body["ts"] == 100.0
+    assert body["hosts"] == {"web-1": {"cpu": 95.0, "memory": 40.0}, "web-2": {"cpu": 20.0, "memory": 30.0}}
+    assert body["anomalies"] == {"web-1": ["cpu"]}
+
+    by_job = client.get("/api/latest", query_string={"metric": "cpu", "by": "job"}).get_json()
+    assert set(by_job["hosts"]) == {"node", "db"}
+    assert client.get("/api/latest", query_string={"metric": ","}).status_code == 400
@@ -5,6 +5,7 @@ import pytest
 pytestmark = pytest.mark.phase6
 
 from main import run_pipeline
+from samples import SampleFrame
 
 
 def test_end_to_end_pipeline(tmp_path: Path) -> None:
@@ -18,3 +19,206 @@ def test_end_to_end_pipeline(tmp_path: Path) -> None:
     assert result["anomaly"] is False
 
 
+
+
+def test_pipeline_feeds_streaming_detector(tmp_path: Path) -> None:
+    from streaming_detection import StreamingDetector
+
+    detector = StreamingDetector(warmup=1)
+    metrics_path = tmp_path / "metrics.json"
+    for _ in range(3):
+        result = run_pipeline(metrics_path, detector=detector, host="web-1")
+
+    assert ("web-1", "cpu") in detector and ("web-1", "memory") in detector
+    assert result["streaming_anomalies"] == {}
+    assert result["anomaly"] is False
+
+
+def test_pipeline_reads_latest_from_store(tmp_path: Path) -> None:
+    from metric_store import MetricStore
+
+    store = MetricStore(tmp_path / "store")
+    for _ in range(2):
+        result = run_pipeline(tmp_path / "metrics.json", store=store)
+
+    assert result["latest_metrics"] == result["written_metrics"]
+    assert store.query("cpu").values.tolist() == [10.0, 10.0]
+
+
+def test_pipeline_queues_events_on_log_shipper(tmp_path: Path, monkeypatch) -> None:
+    import main
+    from s3_shipper import S3LogShipper, read_batch
+
+    class _FakeS3Client:
+        def __init__(self) -> None:
+            self.calls: list[dict] = []
+
+        def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:  # noqa: N803
+            self.calls.append({"Bucket": Bucket, "Key": Key, "Body": Body})
+
+    monkeypatch.setattr(main, "detect_anomaly", lambda metrics: True)
+    fake = _FakeS3Client()
+    shipper = S3LogShipper(fake, "logs", flush_interval=60)
+    for _ in range(3):
+        result = run_pipeline(tmp_path / "metrics.json", log_shipper=shipper)
+    shipper.close()
+
+    assert result["remediation_action"] == "Action taken for Anomaly detected"
+    assert result["remediation_s3_key"] is None
+    events = {c["Key"].split("/")[0]: read_batch(c["Body"]) for c in fake.calls}
+    assert len(events["anomalies"]) == 3 and len(events["remediations"]) == 3
+
+
+def test_pipeline_records_timings_and_anomaly_counters(tmp_path: Path, monkeypatch) -> None:
+    from instrumentation import REGISTRY
+
+    def _hot(file_path, live=False, store=None, **_):
+        Path(file_path).write_text(json.dumps({"cpu": 97.0, "memory": 20.0}), encoding="utf-8")
+        return {"cpu": 97.0, "memory": 20.0}, SampleFrame.from_hosts({})
+
+    monkeypatch.setattr("main.fetch_samples", _hot)
+    labels = {"host": "hot-1", "metric": "cpu"}
+    before = REGISTRY.get_sample_value("anomalies_total", labels) or 0.0
+
+    result = run_pipeline(tmp_path / "metrics.json", host="hot-1")
+
+    assert result["anomaly"] is True
+    assert set(result["timings"]) == {"ingest", "monitor", "detect", "remediate"}
+    assert REGISTRY.get_sample_value("anomalies_total", labels) == before + 1
+    assert REGISTRY.get_sample_value("remediations_total", {"host": "hot-1"}) >= 1
+    assert REGISTRY.get_sample_value("anomalies_total", {"host": "hot-1", "metric": "memory"}) is None
+
+
+def test_scheduler_runs_max_cycles_with_shared_state(tmp_path: Path) -> None:
+    from main import PipelineScheduler
+    from streaming_detection import StreamingDetector
+
+    detector = StreamingDetector(warmup=1)
+    scheduler = PipelineScheduler(
+        tmp_path / "metrics.json", interval=0.02, max_cycles=4, detector=detector, host="web-1"
+    )
+    reports = scheduler.run()
+
+    assert [r.cycle for r in reports] == [0, 1, 2, 3]
+    assert scheduler.stats["cycles"] == 4 and scheduler.stats["errors"] == 0
+    assert all(r.latency_seconds >= r.analyze_seconds for r in reports)
+    assert {"ingest", "monitor", "detect"} <= set(reports[-1].timings)
+    assert ("web-1", "cpu") in detector
+
+
+def test_scheduler_coalesces_when_detection_is_slow(tmp_path: Path, monkeypatch) -> None:
+    import time
+
+    import main
+    from main import PipelineScheduler
+
+    analyze = main._analyze_stage
+
+    def _slow_analyze(*args, **kwargs):
+        time.sleep(0.1)
+        return analyze(*args, **kwargs)
+
+    monkeypatch.setattr(main, "_analyze_stage", _slow_analyze)
+    scheduler = PipelineScheduler(tmp_path / "metrics.json", interval=0.01, max_cycles=10)
+    reports = scheduler.run()
+
+    # Ingestion kept its cadence; stale snapshots were replaced, not queued.
+    assert scheduler.stats["coalesced"] > 0
+    assert scheduler.stats["cycles"] + scheduler.stats["coalesced"] == 10
+    assert reports[-1].cycle == 9
+
+
+def test_scheduler_skips_ticks_when_ingest_overruns(tmp_path: Path, monkeypatch) -> None:
+    import time
+
+    import main
+    from main import PipelineScheduler
+
+    fetch = main.fetch_samples
+
+    def _slow_fetch(*args, **kwargs):
+        time.sleep(0.05)
+        return fetch(*args, **kwargs)
+
+    monkeypatch.setattr(main, "fetch_samples", _slow_fetch)
+    scheduler = PipelineScheduler(tmp_path / "metrics.json", interval=0.02, max_cycles=3)
+    scheduler.run()
+
+    assert scheduler.stats["cycles"] == 3
+    assert scheduler.stats["skipped_ticks"] >= 2
+
+
+def test_scheduler_stop_flushes_log_shipper(tmp_path: Path, monkeypatch) -> None:
+    import time
+
+    import main
+    from main import PipelineScheduler
+    from s3_shipper import S3LogShipper, read_batch
+
+    class _FakeS3Client:
+        def __init__(self) -> None:
+            self.calls: list[dict] = []
+
+        def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:  # noqa: N803
+            self.calls.append({"Bucket": Bucket, "Key": Key, "Body": Body})
+
+    monkeypatch.setattr(main, "detect_anomaly", lambda metrics: True)
+    fake = _FakeS3Client()
+    shipper = S3LogShipper(fake, "logs", flush_interval=60)
+    scheduler = PipelineScheduler(tmp_path / "metrics.json", interval=0.01, log_shipper=shipper).start()
+    deadline = time.monotonic() + 5
+    while scheduler.stats["cycles"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop(timeout=5)
+
+    assert not any(t.is_alive() for t in scheduler._threads)
+    anomalies = [read_batch(c["Body"]) for c in fake.calls if c["Key"].startswith("anomalies/")]
+    assert sum(len(batch) for batch in anomalies) == scheduler.stats["cycles"]
+    shipper.close()
+
+
+def test_main_closes_writer_then_store_when_a_cycle_fails(tmp_path: Path, monkeypatch) -> None:
+    import main
+    from ingest_wal import IngestWriter
+    from metric_store import MetricStore
+
+    closed = []
+
+    class _Store(MetricStore):
+        def close(self) -> None:
+            closed.append("store")
+            super().close()
+
+    class _Writer(IngestWriter):
+        def close(self) -> None:
+            closed.append("writer")
+            super().close()
+
+    def _fail(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(main, "MetricStore", _Store)
+    monkeypatch.setattr(main, "IngestWriter", _Writer)
+    monkeypatch.setattr(main, "run_pipeline", _fail)
+    with pytest.raises(RuntimeError, match="boom"):
+        main.main(["--metrics-path", str(tmp_path / "metrics.json"),
+                   "--store", str(tmp_path / "store"), "--wal", str(tmp_path / "wal")])
+
+    assert closed == ["writer", "store"]
+
+
+def test_pipeline_accepts_pushed_multi_host_batch(tmp_path: Path) -> None:
+    from metric_store import MetricStore
+    from series import SeriesBatch
+
+    frame = SampleFrame(["web-1", "web-2"], ["cpu", "memory"], [[97.0, 40.0], [12.0, 30.0]], ts=1000.0)
+    batch = SeriesBatch.from_frame(frame, labels={"job": "node"})
+    with MetricStore(tmp_path / "store") as store:
+        result = run_pipeline(tmp_path / "metrics.json", store=store, batch=batch)
+        stored = store.latest('cpu{host="web-1",job="node"}')
+
+    assert stored == (1000.0, 97.0)
+    assert result["written_metrics"]["hosts"] == frame.to_dict()
+    assert result["latest_metrics"]["cpu"] == 97.0
+    assert result["anomaly"] is True
+    assert json.loads((tmp_path / "metrics.json").read_text())["memory"] == 40.0